@@ -8,6 +8,8 @@ from flask import Flask, request, render_template, session, redirect, send_from_
 from flask_compress import Compress
 import traceback
 from extensions import limiter
+import request_profiling
+import columnar
 
 # Root modules
 import upgrades
@@ -21,12 +23,9 @@ from wars.routes import wars_bp
 from treaties import treaties_bp
 import policies
 import statistics
-import requests
 import trade_agreements
 import logging
 from variables import MILDICT, PROVINCE_UNIT_PRICES
-from flaskext.markdown import Markdown
-from psycopg2.extras import RealDictCursor
 from datetime import datetime as dt
 import string
 import random
@@ -35,12 +34,11 @@ from database import (
     get_db_connection,
     get_db_cursor,
     get_request_cursor,
-    query_cache,
-    rollback_db_cursor,
     teardown_request_connection,
 )
 import province
 import game_ui
+from repositories.user_repository import UserRepository
 import bot_api
 from dotenv import load_dotenv
 
@@ -57,6 +55,16 @@ from werkzeug.middleware.proxy_fix import ProxyFix
 app = Flask(__name__)
 app.wsgi_app = ProxyFix(app.wsgi_app, x_for=1, x_proto=1, x_host=1, x_prefix=1)
 
+def player_snapshot(user_id):
+    """UserRepository.get_player_snapshot, loaded at most once per request."""
+    from flask import g
+
+    if g.get("player_snapshot_id") != user_id:
+        g.player_snapshot = UserRepository.get_player_snapshot(user_id)
+        g.player_snapshot_id = user_id
+    return g.player_snapshot
+
+
 def create_app():
     global app
     app.url_map.strict_slashes = False
@@ -119,6 +127,9 @@ def create_app():
     default_samesite = "None" if is_prod else "Lax"
     app.config["SESSION_COOKIE_SAMESITE"] = os.getenv("SESSION_COOKIE_SAMESITE", default_samesite)
 
+    # Registered first so the hooks below are profiled too
+    request_profiling.init_app(app)
+
     @app.before_request
     def before_request():
         from time import time
@@ -185,14 +196,10 @@ def create_app():
             _ctrl_stale = (time() - _ctrl_cache_ts) > admin_ctrl_refresh_seconds
             if _ctrl_stale:
                 try:
-                    with get_request_cursor() as _db:
-                        _db.execute("SELECT 1 FROM users WHERE id = %s", (user_id,))
-                        if _db.fetchone() is None:
-                            session.clear()
-                            return None
-                        _db.execute("SELECT COALESCE(is_banned, FALSE), COALESCE(ban_reason, ''), COALESCE(kick_pending, FALSE) FROM admin_user_controls WHERE user_id = %s", (user_id,))
-                        control_row = _db.fetchone()
-                    session["_admin_ctrl"] = list(control_row) if control_row else None
+                    if player_snapshot(user_id) is None:
+                        session.clear()
+                        return None
+                    session["_admin_ctrl"] = UserRepository.get_admin_controls(user_id)
                     session["_admin_ctrl_ts"] = time()
                 except Exception:
                     session["_admin_ctrl"] = None
@@ -223,6 +230,11 @@ def create_app():
                 except Exception: pass
         return None
 
+    # Compress the columnar map payloads (columnar.py) like JSON
+    app.config["COMPRESS_MIMETYPES"] = [
+        "text/html", "text/css", "text/xml", "application/json",
+        "application/javascript", columnar.COLUMNS, columnar.MSGPACK,
+    ]
     Compress(app)
     limiter.init_app(app)
 
@@ -245,12 +257,21 @@ def create_app():
         if elapsed > 1.0 and not request.path.startswith("/static/"):
             client_ip = request.headers.get("X-Forwarded-For") or request.remote_addr
             ua = request.headers.get("User-Agent", "")
-            logger.info("SLOW REQUEST: %s %s took %.2fs; ip=%s ua=%s", request.method, request.path, elapsed, client_ip, ua[:200])
+            stats = request_profiling.current_stats()
+            breakdown = f"; db={stats.db_seconds:.2f}s queries={stats.queries}" if stats else ""
+            logger.info("SLOW REQUEST: %s %s took %.2fs%s; ip=%s ua=%s", request.method, request.path, elapsed, breakdown, client_ip, ua[:200])
         if request.path.startswith("/static/"):
             if request.path.endswith((".css", ".js")):
                 response.headers["Cache-Control"] = "public, max-age=3600, must-revalidate"
             else:
                 response.headers["Cache-Control"] = "public, max-age=604800, must-revalidate"
+        elif response.cache_control.public:
+            # The view chose a shared-cache policy (image_store.py's immutable
+            # /img/ blobs and redirects, legacy flags and banners): keep it
+            pass
+        elif "ETag" in response.headers:
+            # Versioned (etags.py): revalidate every time, 304 when unchanged
+            response.headers["Cache-Control"] = "private, no-cache"
         else:
             response.headers["Cache-Control"] = "private, max-age=5, must-revalidate"
 
@@ -294,7 +315,12 @@ def create_app():
     app.jinja_env.globals["asset"] = asset
 
     logging_format = "====\\n%(levelname)s (%(created)f - %(asctime)s) (LINE %(lineno)d - %(filename)s - %(funcName)s): %(message)s"
-    logging.basicConfig(level=logging.ERROR, format=logging_format, filename="errors.log")
+    # Outside the checkout: a log file in the repo dirties the tree on every run
+    logging.basicConfig(
+        level=logging.ERROR,
+        format=logging_format,
+        filename=os.getenv("ERROR_LOG_FILE", "/tmp/ano-errors.log"),
+    )
     logger = logging.getLogger(__name__)
 
     import threading, queue as queue_module
@@ -303,6 +329,10 @@ def create_app():
     _webhook_thread_lock = threading.Lock()
 
     def _webhook_worker():
+        # Imported on first use: requests is slow to import and only the
+        # error webhook needs it
+        import requests
+
         while True:
             try:
                 data = _webhook_queue.get(timeout=5)
@@ -337,7 +367,13 @@ def create_app():
         def emit(self, record):
             send_discord_webhook(record)
 
-    Markdown(app)
+    @app.template_filter("markdown")
+    def markdown_filter(text):
+        """Same output as Flask-Markdown's filter; markdown loads on first use."""
+        import markdown as _md
+        from markupsafe import Markup
+
+        return Markup(_md.markdown(text))
 
     @app.template_filter("richmedia")
     def richmedia_filter(text):
@@ -555,40 +591,18 @@ def create_app():
         if not target_user_id:
             return default_resources
 
-        cache_key = f"resources_{target_user_id}"
-        cached = query_cache.get(cache_key)
-        if cached is not None:
-            return cached
-
         try:
-            with get_db_cursor(cursor_factory=RealDictCursor) as db:
-                db.execute("SELECT gold FROM stats WHERE id=%s", (target_user_id,))
-                gold_row = db.fetchone()
-                if gold_row:
-                    default_resources["gold"] = gold_row.get("gold", 0) or 0
-
-                db.execute(
-                    """
-                    SELECT rd.name, COALESCE(ue.quantity, 0) AS quantity
-                    FROM resource_dictionary rd
-                    LEFT JOIN user_economy ue
-                      ON ue.resource_id = rd.resource_id
-                     AND ue.user_id = %s
-                    ORDER BY rd.resource_id
-                    """,
-                    (target_user_id,),
-                )
-                rows = db.fetchall()
-                resources = default_resources.copy()
-                for row in rows:
-                    name = row.get("name")
-                    if name in resources:
-                        resources[name] = int(row.get("quantity") or 0)
-
-                query_cache.set(cache_key, resources, ttl_seconds=15)
-                return resources
+            snapshot = player_snapshot(target_user_id)
         except Exception:
             return default_resources
+        if snapshot is None:
+            return default_resources
+        resources = default_resources.copy()
+        for name, quantity in snapshot["resources"].items():
+            if name in resources:
+                resources[name] = quantity
+        resources["gold"] = snapshot["gold"]
+        return resources
 
     @app.context_processor
     def inject_layout_context():
@@ -616,64 +630,27 @@ def create_app():
             return ctx
 
         user_id = session["user_id"]
-        cache_key = f"layout_user_{user_id}"
-        cached_user = query_cache.get(cache_key)
-
+        ctx["game_ui"] = {"has_unseen_combat_logs": False}
         try:
-            with get_request_cursor() as db:
-                if cached_user is None:
-                    try:
-                        db.execute(
-                            """
-                            SELECT u.username,
-                                   c.id as col_id, c.name as col_name
-                            FROM users u
-                            LEFT JOIN colNames c ON c.id = u.coalition_id
-                            WHERE u.id = %s
-                            """,
-                            (user_id,),
-                        )
-                        row = db.fetchone()
-                        
-                        if row:
-                            cached_user = {
-                                "country_name": row[0] if row[0] else "Unknown",
-                                "coalition_id": row[1],
-                                "coalition_name": row[2]
-                            }
-                        else:
-                            cached_user = {
-                                "country_name": "Unknown",
-                                "coalition_id": None,
-                                "coalition_name": None
-                            }
-                        query_cache.set(cache_key, cached_user, ttl_seconds=60)
-                    except Exception:
-                        rollback_db_cursor(db)
-                        cached_user = {
-                            "country_name": "Error",
-                            "coalition_id": None,
-                            "coalition_name": None
-                        }
-                
-                ctx["country_name"] = cached_user["country_name"]
-                if ctx["country_name"] == "Terra Homeworld":
-                    ctx["admin_user_ids"].append(user_id)
-                ctx["coalition_id"] = cached_user["coalition_id"]
-                ctx["coalition_name"] = cached_user["coalition_name"]
-                
-                ctx["game_ui"] = {"has_unseen_combat_logs": False}
-                try:
-                    from app_core.onboarding.service import get_onboarding_status
-
-                    ctx["onboarding_checklist"] = get_onboarding_status(db, user_id)
-                except Exception:
-                    ctx["onboarding_checklist"] = None
+            snapshot = player_snapshot(user_id)
         except Exception:
             ctx["country_name"] = "Error"
             ctx["coalition_id"], ctx["coalition_name"] = None, None
-            ctx["game_ui"] = {"has_unseen_combat_logs": False}
+            return ctx
+        if snapshot is None:
+            snapshot = {
+                "country_name": "Unknown",
+                "coalition_id": None,
+                "coalition_name": None,
+                "onboarding": None,
+            }
 
+        ctx["country_name"] = snapshot["country_name"]
+        if ctx["country_name"] == "Terra Homeworld":
+            ctx["admin_user_ids"].append(user_id)
+        ctx["coalition_id"] = snapshot["coalition_id"]
+        ctx["coalition_name"] = snapshot["coalition_name"]
+        ctx["onboarding_checklist"] = snapshot["onboarding"]
         return ctx
 
 
@@ -195,6 +195,8 @@ def process_ban_user(actor, target_user_id, reason):
 
         AdminRepository.set_user_ban_status(db, target_user_id, True, reason, True)
         AdminRepository.log_admin_action(db, actor, "admin_ban_user", target_user_id, f"reason={reason}")
+    # Drops the cached player snapshot the request hooks read controls from
+    invalidate_user_cache(target_user_id)
     return None
 
 def process_unban_user(actor, target_user_id):
@@ -206,6 +208,7 @@ def process_unban_user(actor, target_user_id):
 
         AdminRepository.set_user_ban_status(db, target_user_id, False, None, False)
         AdminRepository.log_admin_action(db, actor, "admin_unban_user", target_user_id, "")
+    invalidate_user_cache(target_user_id)
     return None
 
 def process_kick_user(actor, target_user_id, reason):
@@ -220,6 +223,7 @@ def process_kick_user(actor, target_user_id, reason):
 
         AdminRepository.set_user_ban_status(db, target_user_id, False, None, True)
         AdminRepository.log_admin_action(db, actor, "admin_kick_user", target_user_id, f"reason={reason}")
+    invalidate_user_cache(target_user_id)
     return None
 
 
@@ -2,7 +2,6 @@ import os
 import datetime
 import logging
 from flask import request, session, redirect, current_app, flash, render_template
-from requests_oauthlib import OAuth2Session
 from dotenv import load_dotenv
 from helpers import error
 
@@ -43,6 +42,9 @@ if "http://" in get_google_redirect_uri():
 
 
 def make_google_session(token=None, state=None):
+    # Imported on first use to keep requests out of app startup
+    from requests_oauthlib import OAuth2Session
+
     return OAuth2Session(
         client_id=_google_client_id(),
         token=token,
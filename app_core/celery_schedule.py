@@ -5,6 +5,8 @@ import os
 
 from celery.schedules import crontab
 
+from app_core.task_thresholds import TASK_RUN_THRESHOLDS  # noqa: F401
+
 
 def get_crontab_env(var: str, default):
     val = os.getenv(var)
@@ -13,21 +15,6 @@ def get_crontab_env(var: str, default):
     return default
 
 
-TASK_RUN_THRESHOLDS = {
-    "tax_income": int(os.getenv("TAX_INCOME_MIN_INTERVAL", "65")),
-    "population_growth": int(os.getenv("POP_GROWTH_MIN_INTERVAL", "100")),
-    "generate_province_revenue": int(os.getenv("PROV_REV_MIN_INTERVAL", "100")),
-    "execute_trade_agreements": int(os.getenv("TRADE_AGR_MIN_INTERVAL", "65")),
-    "global_tick": int(os.getenv("GLOBAL_TICK_MIN_INTERVAL", "540")),
-    # Military maintenance is deducted inside global_tick but must run at most
-    # once per hour to match hourly production — otherwise upkeep is charged 6x
-    # (global_tick fires every 10 min) and armies starve their own nations.
-    "military_maintenance": int(os.getenv("MILITARY_MAINT_MIN_INTERVAL", "3300")),
-    # War supply regen (see maintenance.py global_tick) is also hourly-gated,
-    # same reasoning as military_maintenance above.
-    "war_supply_regen": int(os.getenv("WAR_SUPPLY_REGEN_MIN_INTERVAL", "3300")),
-}
-
 CELERY_BEAT_SCHEDULE = {
     "tax_income": {
         "task": "tasks.task_tax_income",
@@ -69,6 +56,12 @@ CELERY_BEAT_SCHEDULE = {
         "task": "tasks.task_global_tick",
         "schedule": get_crontab_env("GLOBAL_TICK_CRON", crontab(minute="*/10")),
     },
+    # Offset from global_tick so boards rank the freshly refreshed
+    # nation_influence snapshot.
+    "refresh_leaderboards": {
+        "task": "tasks.task_refresh_leaderboards",
+        "schedule": get_crontab_env("LEADERBOARD_CRON", crontab(minute="5-59/10")),
+    },
     "cleanup_old_spyinfo": {
         "task": "tasks.task_cleanup_old_spyinfo",
         "schedule": get_crontab_env("SPYINFO_CLEANUP_CRON", crontab(minute="30", hour="2")),
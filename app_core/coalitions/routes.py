@@ -17,7 +17,9 @@ load_dotenv()
 import variables  # noqa: E402
 import datetime  # noqa: E402
 from database import cache_response, rollback_db_cursor, get_request_cursor  # noqa: E402
-from database import get_coalition_members_table  # noqa: E402
+from database import get_coalition_members_table, table_has_column  # noqa: E402
+from image_store import image_url  # noqa: E402
+import etags  # noqa: E402
 from typing import Optional  # noqa: E402
 
 
@@ -762,8 +764,12 @@ def coalitions():
         offset = (page - 1) * per_page
 
         # Main query with pagination - all filtering/sorting in SQL
-        # flag_data is fetched here so templates can inline it as a data URI
-        # and avoid 22 separate /flag/coalition/X sub-requests per page.
+        # Flags come as image store keys (thumbnail URL) or legacy flag_data
+        # inlined as a data URI, avoiding 22 separate /flag/coalition/X
+        # sub-requests per page.
+        has_flag_key = table_has_column("colnames", "flag_key")
+        flag_key_col = "cn.flag_key" if has_flag_key else "NULL::text"
+        flag_key_group = ", cn.flag_key" if has_flag_key else ""
         main_query_flag = f"""
             SELECT
                 cn.id AS coalition_id,
@@ -773,73 +779,13 @@ def coalitions():
                 COUNT(DISTINCT cm.userid) AS members,
                 cn.date AS date,
                 COALESCE(SUM(prov.influence), 0) AS total_influence,
-                cn.flag_data
+                cn.flag_data,
+                {flag_key_col} AS flag_key
             FROM colNames cn
             LEFT JOIN {_members_tbl()} cm ON cn.id = cm.colid
-            LEFT JOIN (
-                SELECT
-                    u.id AS userid,
-                    ROUND(
-                        COALESCE(p.provinces_count, 0) * 300
-                        + COALESCE(m.soldiers, 0) * 0.02
-                        + COALESCE(m.artillery, 0) * 1.6
-                        + COALESCE(m.tanks, 0) * 0.8
-                        + COALESCE(m.fighters, 0) * 3.5
-                        + COALESCE(m.bombers, 0) * 2.5
-                        + COALESCE(m.apaches, 0) * 3.2
-                        + COALESCE(m.submarines, 0) * 4.5
-                        + COALESCE(m.destroyers, 0) * 3
-                        + COALESCE(m.cruisers, 0) * 5.5
-                        + COALESCE(m.icbms, 0) * 250
-                        + COALESCE(m.nukes, 0) * 500
-                        + COALESCE(m.spies, 0) * 25
-                        + COALESCE(p.city_count, 0) * 10
-                        + COALESCE(p.total_land, 0) * 10
-                        + COALESCE(r.total_resources, 0) * 0.001
-                        + COALESCE(s.gold, 0) * 0.00001
-                    )::bigint AS influence
-                FROM users u
-                LEFT JOIN stats s ON s.id = u.id
-                LEFT JOIN (
-                    SELECT
-                        userid AS user_id,
-                        COUNT(id) AS provinces_count,
-                        COALESCE(SUM(citycount), 0) AS city_count,
-                        COALESCE(SUM(land), 0) AS total_land
-                    FROM provinces
-                    WHERE userid IN (SELECT userid FROM {_members_tbl()})
-                    GROUP BY userid
-                ) p ON p.user_id = u.id
-                LEFT JOIN (
-                    SELECT
-                        um.user_id,
-                        SUM(CASE WHEN ud.name='soldiers' THEN um.quantity ELSE 0 END) AS soldiers,
-                        SUM(CASE WHEN ud.name='artillery' THEN um.quantity ELSE 0 END) AS artillery,
-                        SUM(CASE WHEN ud.name='tanks' THEN um.quantity ELSE 0 END) AS tanks,
-                        SUM(CASE WHEN ud.name='fighters' THEN um.quantity ELSE 0 END) AS fighters,
-                        SUM(CASE WHEN ud.name='bombers' THEN um.quantity ELSE 0 END) AS bombers,
-                        SUM(CASE WHEN ud.name='apaches' THEN um.quantity ELSE 0 END) AS apaches,
-                        SUM(CASE WHEN ud.name='submarines' THEN um.quantity ELSE 0 END) AS submarines,
-                        SUM(CASE WHEN ud.name='destroyers' THEN um.quantity ELSE 0 END) AS destroyers,
-                        SUM(CASE WHEN ud.name='cruisers' THEN um.quantity ELSE 0 END) AS cruisers,
-                        SUM(CASE WHEN ud.name='icbms' THEN um.quantity ELSE 0 END) AS icbms,
-                        SUM(CASE WHEN ud.name='nukes' THEN um.quantity ELSE 0 END) AS nukes,
-                        SUM(CASE WHEN ud.name='spies' THEN um.quantity ELSE 0 END) AS spies
-                    FROM user_military um
-                    JOIN unit_dictionary ud ON um.unit_id = ud.unit_id
-                    WHERE um.user_id IN (SELECT userid FROM {_members_tbl()})
-                    GROUP BY um.user_id
-                ) m ON m.user_id = u.id
-                LEFT JOIN (
-                    SELECT user_id, COALESCE(SUM(quantity), 0) AS total_resources
-                    FROM user_economy
-                    WHERE user_id IN (SELECT userid FROM {_members_tbl()})
-                    GROUP BY user_id
-                ) r ON r.user_id = u.id
-                WHERE u.id IN (SELECT userid FROM {_members_tbl()})
-            ) prov ON cm.userid = prov.userid
+            LEFT JOIN nation_influence prov ON cm.userid = prov.user_id
             {where_clause}
-            GROUP BY cn.id, cn.name, cn.type, cn.flag, cn.date, cn.flag_data
+            GROUP BY cn.id, cn.name, cn.type, cn.flag, cn.date, cn.flag_data{flag_key_group}
             ORDER BY {order_by}
             LIMIT %s OFFSET %s
         """
@@ -852,71 +798,11 @@ def coalitions():
                 COUNT(DISTINCT cm.userid) AS members,
                 cn.date AS date,
                 COALESCE(SUM(prov.influence), 0) AS total_influence,
-                NULL::text AS flag_data
+                NULL::text AS flag_data,
+                NULL::text AS flag_key
             FROM colNames cn
             LEFT JOIN {_members_tbl()} cm ON cn.id = cm.colid
-            LEFT JOIN (
-                SELECT
-                    u.id AS userid,
-                    ROUND(
-                        COALESCE(p.provinces_count, 0) * 300
-                        + COALESCE(m.soldiers, 0) * 0.02
-                        + COALESCE(m.artillery, 0) * 1.6
-                        + COALESCE(m.tanks, 0) * 0.8
-                        + COALESCE(m.fighters, 0) * 3.5
-                        + COALESCE(m.bombers, 0) * 2.5
-                        + COALESCE(m.apaches, 0) * 3.2
-                        + COALESCE(m.submarines, 0) * 4.5
-                        + COALESCE(m.destroyers, 0) * 3
-                        + COALESCE(m.cruisers, 0) * 5.5
-                        + COALESCE(m.icbms, 0) * 250
-                        + COALESCE(m.nukes, 0) * 500
-                        + COALESCE(m.spies, 0) * 25
-                        + COALESCE(p.city_count, 0) * 10
-                        + COALESCE(p.total_land, 0) * 10
-                        + COALESCE(r.total_resources, 0) * 0.001
-                        + COALESCE(s.gold, 0) * 0.00001
-                    )::bigint AS influence
-                FROM users u
-                LEFT JOIN stats s ON s.id = u.id
-                LEFT JOIN (
-                    SELECT
-                        userid AS user_id,
-                        COUNT(id) AS provinces_count,
-                        COALESCE(SUM(citycount), 0) AS city_count,
-                        COALESCE(SUM(land), 0) AS total_land
-                    FROM provinces
-                    WHERE userid IN (SELECT userid FROM {_members_tbl()})
-                    GROUP BY userid
-                ) p ON p.user_id = u.id
-                LEFT JOIN (
-                    SELECT
-                        um.user_id,
-                        SUM(CASE WHEN ud.name='soldiers' THEN um.quantity ELSE 0 END) AS soldiers,
-                        SUM(CASE WHEN ud.name='artillery' THEN um.quantity ELSE 0 END) AS artillery,
-                        SUM(CASE WHEN ud.name='tanks' THEN um.quantity ELSE 0 END) AS tanks,
-                        SUM(CASE WHEN ud.name='fighters' THEN um.quantity ELSE 0 END) AS fighters,
-                        SUM(CASE WHEN ud.name='bombers' THEN um.quantity ELSE 0 END) AS bombers,
-                        SUM(CASE WHEN ud.name='apaches' THEN um.quantity ELSE 0 END) AS apaches,
-                        SUM(CASE WHEN ud.name='submarines' THEN um.quantity ELSE 0 END) AS submarines,
-                        SUM(CASE WHEN ud.name='destroyers' THEN um.quantity ELSE 0 END) AS destroyers,
-                        SUM(CASE WHEN ud.name='cruisers' THEN um.quantity ELSE 0 END) AS cruisers,
-                        SUM(CASE WHEN ud.name='icbms' THEN um.quantity ELSE 0 END) AS icbms,
-                        SUM(CASE WHEN ud.name='nukes' THEN um.quantity ELSE 0 END) AS nukes,
-                        SUM(CASE WHEN ud.name='spies' THEN um.quantity ELSE 0 END) AS spies
-                    FROM user_military um
-                    JOIN unit_dictionary ud ON um.unit_id = ud.unit_id
-                    WHERE um.user_id IN (SELECT userid FROM {_members_tbl()})
-                    GROUP BY um.user_id
-                ) m ON m.user_id = u.id
-                LEFT JOIN (
-                    SELECT user_id, COALESCE(SUM(quantity), 0) AS total_resources
-                    FROM user_economy
-                    WHERE user_id IN (SELECT userid FROM {_members_tbl()})
-                    GROUP BY user_id
-                ) r ON r.user_id = u.id
-                WHERE u.id IN (SELECT userid FROM {_members_tbl()})
-            ) prov ON cm.userid = prov.userid
+            LEFT JOIN nation_influence prov ON cm.userid = prov.user_id
             {where_clause}
             GROUP BY cn.id, cn.name, cn.type, cn.flag, cn.date
             ORDER BY {order_by}
@@ -944,12 +830,15 @@ def coalitions():
                 col_date,
                 influence,
                 flag_data,
+                flag_key,
             ) = row
 
             # Build inline flag src to avoid per-row /flag/ sub-requests.
-            # If the coalition has a base64 blob, inline it as a data URI;
-            # otherwise fall back to the default static flag image.
-            if flag_data:
+            # Stored flags link their thumbnail; a legacy base64 blob is
+            # inlined as a data URI; otherwise the default static flag image.
+            if flag_key:
+                flag_src = image_url(flag_key, "thumb.webp")
+            elif flag_data:
                 import base64 as _b64
 
                 try:
@@ -1296,6 +1185,7 @@ def delete_coalition(coalition_id):
         coalition_name = row[0]
 
         db.execute("DELETE FROM colNames WHERE id=(%s)", (coalition_id,))
+        etags.bump(db, "world_map")
         members_tbl = _members_tbl()
         db.execute(f"DELETE FROM {members_tbl} WHERE colid=%s", (coalition_id,))
 
@@ -1338,26 +1228,44 @@ def update_col_info(coalition_id):
                     except OSError:
                         pass
 
-            # Save the file to database for persistent storage
-            from helpers import compress_flag_image
+            from database import query_cache
 
-            # Compress and resize flag for fast storage/retrieval
-            flag_data, extension = compress_flag_image(flag, max_size=300, quality=85)
-            filename = f"col_flag_{coalition_id}.{extension}"
+            if table_has_column("colnames", "flag_key"):
+                from image_store import database_copy, store_image
 
-            with get_request_cursor() as db:
-                db.execute(
-                    "UPDATE colNames SET flag=(%s), flag_data=(%s) WHERE id=(%s)",
-                    (filename, flag_data, coalition_id),
+                try:
+                    flag_key = store_image(flag, "flag")
+                except ValueError:
+                    return error(400, "Could not read that flag image")
+                filename = f"col_flag_{coalition_id}.jpg"
+                with get_request_cursor() as db:
+                    db.execute(
+                        "UPDATE colNames SET flag=(%s), flag_key=(%s), flag_data=(%s)"
+                        " WHERE id=(%s)",
+                        (filename, flag_key, database_copy(flag_key), coalition_id),
+                    )
+                query_cache.delete(f"flag_key_coalition_{coalition_id}")
+            else:
+                # Save the file to database for persistent storage
+                from helpers import compress_flag_image
+
+                # Compress and resize flag for fast storage/retrieval
+                flag_data, extension = compress_flag_image(
+                    flag, max_size=300, quality=85
                 )
+                filename = f"col_flag_{coalition_id}.{extension}"
+
+                with get_request_cursor() as db:
+                    db.execute(
+                        "UPDATE colNames SET flag=(%s), flag_data=(%s) WHERE id=(%s)",
+                        (filename, flag_data, coalition_id),
+                    )
 
             # Also save to filesystem for backward compatibility
             flag.seek(0)  # Reset file pointer after read
             flag.save(os.path.join(current_app.config["UPLOAD_FOLDER"], filename))
 
             # Invalidate coalition influence cache so flag changes show
-            from database import query_cache
-
             query_cache.invalidate(f"coalition_influence_{coalition_id}")
         else:
             return error(400, "File format not supported")
@@ -1453,6 +1361,7 @@ def update_col_info(coalition_id):
                         "UPDATE colNames SET name=%s, name_changes_used=%s WHERE id=%s",
                         (new_name, renames_used + 1, coalition_id),
                     )
+                    etags.bump(db, "world_map")
 
     return redirect("/my_coalition")
 
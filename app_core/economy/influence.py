@@ -0,0 +1,185 @@
+"""Nation influence: the one definition of the weights, and the snapshot table.
+
+Influence used to be recomputed with a full aggregation over user_military,
+provinces, user_economy and stats on every countries/statistics/coalitions
+page, with the weights copy-pasted into each query.  The weights now live
+here only; SQL is generated from them.  ``refresh_nation_influence`` writes
+the scores into ``nation_influence`` (migration 0045) at the end of each
+global tick, so list pages read an indexed table instead.
+"""
+from __future__ import annotations
+
+from typing import Iterable, Mapping, Optional
+
+# Per-unit weights, keyed by unit_dictionary.name
+UNIT_WEIGHTS = {
+    "soldiers": 0.02,
+    "artillery": 1.6,
+    "tanks": 0.8,
+    "fighters": 3.5,
+    "bombers": 2.5,
+    "apaches": 3.2,
+    "submarines": 4.5,
+    "destroyers": 3,
+    "cruisers": 5.5,
+    "icbms": 250,
+    "nukes": 500,
+    "spies": 25,
+}
+
+NATION_WEIGHTS = {
+    "province_count": 300,
+    "city_count": 10,
+    "total_land": 10,
+    "total_resources": 0.001,
+    "gold": 0.00001,
+}
+
+INFLUENCE_WEIGHTS = {**UNIT_WEIGHTS, **NATION_WEIGHTS}
+
+# Column order of ``components_sql`` rows, for tuple cursors
+COMPONENT_COLUMNS = (
+    "user_id",
+    *UNIT_WEIGHTS,
+    "gold",
+    "province_count",
+    "city_count",
+    "total_land",
+    "province_population",
+    "total_resources",
+)
+
+
+def influence_score(components) -> int:
+    """Influence for one nation from its component totals (missing -> 0).
+
+    Accepts a mapping or a ``components_sql`` row as a tuple.
+    """
+    if not isinstance(components, Mapping):
+        components = dict(zip(COMPONENT_COLUMNS, components))
+    return round(
+        sum(
+            float(components.get(name) or 0) * weight
+            for name, weight in INFLUENCE_WEIGHTS.items()
+        )
+    )
+
+
+def influence_expression(alias: str = "c") -> str:
+    """SQL for the influence of a row of ``components_sql`` aliased ``alias``."""
+    terms = " + ".join(
+        f"COALESCE({alias}.{name}, 0) * {weight!r}"
+        for name, weight in INFLUENCE_WEIGHTS.items()
+    )
+    return f"ROUND({terms})::bigint"
+
+
+def components_sql(user_filter: bool = False) -> str:
+    """One row of component totals per user.
+
+    With ``user_filter`` every aggregate is restricted to
+    ``%(user_ids)s`` so a handful of nations can be scored without
+    scanning the whole world.
+    """
+
+    def where(column):
+        return f"WHERE {column} = ANY(%(user_ids)s)" if user_filter else ""
+
+    unit_columns = ",\n".join(
+        f"SUM(CASE WHEN ud.name = '{name}' THEN um.quantity ELSE 0 END) AS {name}"
+        for name in UNIT_WEIGHTS
+    )
+    unit_select = ", ".join(f"COALESCE(m.{name}, 0) AS {name}" for name in UNIT_WEIGHTS)
+    return f"""
+        SELECT
+            u.id AS user_id,
+            {unit_select},
+            COALESCE(s.gold, 0) AS gold,
+            COALESCE(p.province_count, 0) AS province_count,
+            COALESCE(p.city_count, 0) AS city_count,
+            COALESCE(p.total_land, 0) AS total_land,
+            COALESCE(p.province_population, 0) AS province_population,
+            COALESCE(r.total_resources, 0) AS total_resources
+        FROM users u
+        LEFT JOIN stats s ON s.id = u.id
+        LEFT JOIN (
+            SELECT userid AS user_id,
+                   COUNT(id) AS province_count,
+                   SUM(citycount) AS city_count,
+                   SUM(land) AS total_land,
+                   SUM(population) AS province_population
+            FROM provinces
+            {where("userid")}
+            GROUP BY userid
+        ) p ON p.user_id = u.id
+        LEFT JOIN (
+            SELECT um.user_id,
+                   {unit_columns}
+            FROM user_military um
+            JOIN unit_dictionary ud ON ud.unit_id = um.unit_id
+            {where("um.user_id")}
+            GROUP BY um.user_id
+        ) m ON m.user_id = u.id
+        LEFT JOIN (
+            SELECT user_id, SUM(quantity) AS total_resources
+            FROM user_economy
+            {where("user_id")}
+            GROUP BY user_id
+        ) r ON r.user_id = u.id
+        {where("u.id")}
+    """
+
+
+def refresh_nation_influence(db, user_ids: Optional[Iterable[int]] = None) -> int:
+    """Recompute ``nation_influence`` for ``user_ids`` (default: everyone).
+
+    Also refreshes ``war_eligible`` (not banned), which /find_targets
+    filters on. Rows where none of these changed are left alone so
+    the refresh does not rewrite the whole table every tick. A full refresh
+    also drops rows of deleted nations. Returns the number of rows written.
+    """
+    params = {}
+    if user_ids is not None:
+        params["user_ids"] = list(user_ids)
+        if not params["user_ids"]:
+            return 0
+    db.execute(
+        f"""
+        INSERT INTO nation_influence
+            (user_id, influence, province_count, province_population,
+             war_eligible, updated_at)
+        SELECT c.user_id, {influence_expression("c")},
+               c.province_count, c.province_population,
+               NOT EXISTS (
+                   SELECT 1 FROM admin_user_controls a
+                   WHERE a.user_id = c.user_id AND a.is_banned
+               ),
+               now()
+        FROM ({components_sql(user_ids is not None)}) AS c
+        ON CONFLICT (user_id) DO UPDATE SET
+            influence = EXCLUDED.influence,
+            province_count = EXCLUDED.province_count,
+            province_population = EXCLUDED.province_population,
+            war_eligible = EXCLUDED.war_eligible,
+            updated_at = now()
+        WHERE (
+            nation_influence.influence,
+            nation_influence.province_count,
+            nation_influence.province_population,
+            nation_influence.war_eligible
+        ) IS DISTINCT FROM (
+            EXCLUDED.influence,
+            EXCLUDED.province_count,
+            EXCLUDED.province_population,
+            EXCLUDED.war_eligible
+        )
+        """,
+        params or None,
+    )
+    written = db.rowcount
+    if user_ids is None:
+        db.execute(
+            "DELETE FROM nation_influence ni "
+            "WHERE NOT EXISTS (SELECT 1 FROM users u WHERE u.id = ni.user_id)"
+        )
+    return written
@@ -0,0 +1,862 @@
+"""Province economy kernel shared by the hourly tick and the revenue projection.
+
+Everything in here is side-effect free: callers bulk-load provinces,
+buildings, stockpiles, upgrades and policies for a chunk, hand them in, and
+get back gold costs, resource deltas and the updated province state.
+``generate_province_revenue`` persists the result; ``countries.get_revenue``
+runs the exact same rules to project what the next tick will do.
+
+Users whose gold and input stockpiles comfortably cover every building they
+own (the common case) are computed column-by-column with NumPy across the
+whole chunk.  Users close to running out of something go through the
+sequential path, because there the order buildings are processed in decides
+which of them get the last of the coal or gold.
+"""
+
+from __future__ import annotations
+
+import math
+from functools import lru_cache
+from typing import Dict, Iterable, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+import variables
+
+# Legacy upgrade keys (used by the tick rules) -> tech_dictionary names.
+LEGACY_UPGRADE_TO_TECH = {
+    "betterengineering": "better_engineering",
+    "cheapermaterials": "cheaper_materials",
+    "onlineshopping": "online_shopping",
+    "governmentregulation": "government_regulation",
+    "nationalhealthinstitution": "national_health_institution",
+    "highspeedrail": "high_speed_rail",
+    "advancedmachinery": "advanced_machinery",
+    "strongerexplosives": "stronger_explosives",
+    "widespreadpropaganda": "widespread_propaganda",
+    "increasedfunding": "increased_funding",
+    "automationintegration": "automation_integration",
+    "largerforges": "larger_forges",
+    "lootingteams": "looting_teams",
+    "organizedsupplylines": "organized_supply_lines",
+    "largestorehouses": "large_storehouses",
+    "ballisticmissilesilo": "ballistic_missile_silo",
+    "icbmsilo": "icbm_silo",
+    "nucleartestingfacility": "nuclear_testing_facility",
+    "integratedsteelmaking": "integrated_steelmaking",
+    "electricarcfurnace": "electric_arc_furnace",
+}
+TECH_TO_LEGACY = {v: k for k, v in LEGACY_UPGRADE_TO_TECH.items()}
+
+UPGRADE_BITS = {name: 1 << i for i, name in enumerate(LEGACY_UPGRADE_TO_TECH)}
+
+PROVINCE_RESOURCES = (
+    "energy",
+    "population",
+    "happiness",
+    "pollution",
+    "productivity",
+    "consumer_spending",
+)
+PERCENTAGE_BASED = ("happiness", "productivity", "consumer_spending", "pollution")
+
+COLUMNS = tuple(variables.BUILDINGS)
+_COLUMN_INDEX = {name: i for i, name in enumerate(COLUMNS)}
+_RESOURCE_INDEX = {name: i for i, name in enumerate(variables.RESOURCES)}
+# Province-level state tracked by the kernel (energy is rebuilt every tick).
+STATE_FIELDS = ("energy", "happiness", "productivity", "pollution", "consumer_spending")
+_STATE_INDEX = {name: i for i, name in enumerate(STATE_FIELDS)}
+_STATE_DEFAULTS = {
+    "energy": 0,
+    "happiness": 50,
+    "productivity": 50,
+    "pollution": 0,
+    "consumer_spending": 50,
+}
+
+
+def upgrades_mask(upgrades) -> int:
+    """Encode a ``{legacy_key: bool}`` dict (or iterable of keys) as a bitmask."""
+    if not upgrades:
+        return 0
+    if isinstance(upgrades, dict):
+        upgrades = [k for k, v in upgrades.items() if v]
+    mask = 0
+    for name in upgrades:
+        mask |= UPGRADE_BITS.get(name, 0)
+    return mask
+
+
+def policies_mask(policies) -> int:
+    """Encode the ``policies.education`` id array as a bitmask."""
+    mask = 0
+    for policy in policies or []:
+        if isinstance(policy, int) and 0 <= policy < 63:
+            mask |= 1 << policy
+    return mask
+
+
+def _has_upgrade(mask: int, name: str) -> bool:
+    return bool(mask & UPGRADE_BITS[name])
+
+
+def _has_policy(mask: int, policy_id: int) -> bool:
+    return bool(mask & (1 << policy_id))
+
+
+def _unit_category(unit):
+    for name, buildings in variables.INFRA_TYPE_BUILDINGS.items():
+        if unit in buildings:
+            return name
+    return False
+
+
+class BuildingProfile(NamedTuple):
+    """Per-unit rules for one building type under one upgrade/policy set."""
+
+    money: int
+    cost_factors: Tuple[float, ...]
+    energy_per_unit: int
+    minus: Tuple[Tuple[str, float], ...]
+    plus: Tuple[Tuple[str, float], ...]
+    multiplier_bonus: float
+    land_bonus: bool
+    eff: Tuple[Tuple[str, float], ...]
+    effminus: Tuple[Tuple[str, float], ...]
+    pollution_factors: Tuple[float, ...]
+
+
+@lru_cache(maxsize=8192)
+def building_profile(unit: str, upgrade_mask: int, policy_mask: int) -> BuildingProfile:
+    """Resolve the tick rules for ``unit`` once per upgrade/policy combination.
+
+    Replaces copying ``variables.NEW_INFRA`` dicts per building per province;
+    multipliers are kept as ordered factor tuples so the arithmetic (and
+    therefore the rounding) matches the original step-by-step evaluation.
+    """
+    infra = variables.NEW_INFRA[unit]
+    category = _unit_category(unit)
+    subsidised = (
+        _has_policy(policy_mask, variables.POLICY_INDUSTRIAL_SUBSIDIES)
+        and unit in variables.POLICY_SUBSIDIES_AFFECTED_BUILDINGS
+    )
+
+    cost_factors = []
+    if category == "industry" and _has_upgrade(upgrade_mask, "cheapermaterials"):
+        cost_factors.append(0.8)
+    if unit == "malls" and _has_upgrade(upgrade_mask, "onlineshopping"):
+        cost_factors.append(0.7)
+    if subsidised:
+        cost_factors.append(variables.POLICY_SUBSIDIES_UPKEEP_REDUCTION)
+
+    energy_per_unit = 0
+    if unit in variables.ENERGY_CONSUMERS:
+        energy_per_unit = 1
+    elif unit == "steel_mills" and _has_upgrade(upgrade_mask, "electricarcfurnace"):
+        energy_per_unit = 2
+
+    minus = []
+    for resource, amount in infra.get("minus", {}).items():
+        if unit == "component_factories" and _has_upgrade(
+            upgrade_mask, "automationintegration"
+        ):
+            amount *= 0.75
+        if unit == "steel_mills" and _has_upgrade(upgrade_mask, "largerforges"):
+            amount *= 0.7
+        if unit == "steel_mills" and _has_upgrade(
+            upgrade_mask, "integratedsteelmaking"
+        ):
+            amount *= 1.36
+        if unit == "steel_mills" and _has_upgrade(upgrade_mask, "electricarcfurnace"):
+            amount *= 0.5
+        minus.append((resource, amount))
+
+    plus = dict(infra.get("plus", {}))
+    if unit == "nuclear_reactors" and _has_upgrade(upgrade_mask, "betterengineering"):
+        plus["energy"] += 6
+
+    multiplier_bonus = 0.0
+    if unit == "bauxite_mines" and _has_upgrade(upgrade_mask, "strongerexplosives"):
+        multiplier_bonus = 0.45
+    if unit == "farms" and _has_upgrade(upgrade_mask, "advancedmachinery"):
+        multiplier_bonus = 0.5
+    if unit == "steel_mills" and _has_upgrade(upgrade_mask, "integratedsteelmaking"):
+        multiplier_bonus = 0.36
+
+    eff = dict(infra.get("eff", {}))
+    if unit == "universities" and _has_policy(policy_mask, 3):
+        eff["productivity"] *= 1.10
+        eff["happiness"] *= 1.10
+    if unit == "hospitals" and _has_upgrade(upgrade_mask, "nationalhealthinstitution"):
+        eff["happiness"] = int(eff["happiness"] * 1.3)
+    if unit == "monorails" and _has_upgrade(upgrade_mask, "highspeedrail"):
+        eff["productivity"] = int(eff["productivity"] * 1.2)
+
+    pollution_factors = []
+    if category == "retail" and _has_upgrade(upgrade_mask, "governmentregulation"):
+        pollution_factors.append(0.75)
+    if subsidised:
+        pollution_factors.append(variables.POLICY_SUBSIDIES_POLLUTION_MULTIPLIER)
+
+    return BuildingProfile(
+        money=infra["money"],
+        cost_factors=tuple(cost_factors),
+        energy_per_unit=energy_per_unit,
+        minus=tuple(minus),
+        plus=tuple(plus.items()),
+        multiplier_bonus=multiplier_bonus,
+        land_bonus=unit == "farms",
+        eff=tuple(eff.items()),
+        effminus=tuple(infra.get("effminus", {}).items()),
+        pollution_factors=tuple(pollution_factors),
+    )
+
+
+def production_multiplier(productivity, multiplier_bonus: float, efficiency: float):
+    """Output multiplier: productivity (0.9%/point around 50), project bonus,
+    then workforce efficiency -- in that order, as the tick always did."""
+    multiplier = 1
+    if productivity is not None:
+        multiplier *= 1 + (
+            (productivity - 50) * variables.DEFAULT_PRODUCTIVITY_PRODUCTION_MULTIPLIER
+        )
+    if multiplier_bonus:
+        multiplier += multiplier_bonus
+    return multiplier * efficiency
+
+
+def workforce_debuff(demo: Optional[dict], building_counts: Optional[dict]) -> dict:
+    """Phase 3 workforce report for one nation from its demographic totals
+    (``total_pop_working``, ``total_pop_elderly``, ``edu_*``) and building
+    counts across all provinces."""
+    demo = demo or {}
+    building_counts = building_counts or {}
+    jobs_available = (
+        int(demo.get("edu_none", 0) or 0)
+        + int(demo.get("edu_highschool", 0) or 0)
+        + int(demo.get("edu_college", 0) or 0)
+    )
+    total_pop_working = int(demo.get("total_pop_working", 0) or 0)
+    total_pop_elderly = int(demo.get("total_pop_elderly", 0) or 0)
+
+    jobs_needed = 0
+    for building_name, matrix_data in variables.BUILDING_EMPLOYMENT_MATRICES.items():
+        workers_per = matrix_data.get("worker_count", 0)
+        jobs_needed += workers_per * building_counts.get(building_name, 0)
+
+    unemployment_rate = 0.0
+    pension_ratio = 0.0
+    if total_pop_working > 0:
+        unemployment_rate = max(0.0, 1.0 - (jobs_available / total_pop_working))
+        pension_ratio = total_pop_elderly / total_pop_working
+
+    if jobs_needed > 0:
+        # Shortage floors at PRODUCTION_EFFICIENCY_MIN; a surplus of workers
+        # does NOT boost production above 1.0.
+        efficiency_multiplier = min(
+            1.0, max(variables.PRODUCTION_EFFICIENCY_MIN, jobs_available / jobs_needed)
+        )
+    else:
+        efficiency_multiplier = 1.0
+
+    happiness_penalty = 0
+    gold_penalty = 0
+    if unemployment_rate > variables.UNEMPLOYMENT_THRESHOLD:
+        happiness_penalty = variables.UNEMPLOYMENT_HAPPINESS_PENALTY
+    if pension_ratio > variables.PENSION_CRISIS_RATIO:
+        gold_penalty = variables.PENSION_CRISIS_GOLD_PENALTY
+
+    return {
+        "jobs_needed": int(jobs_needed),
+        "jobs_available": int(jobs_available),
+        "unemployment_rate": float(unemployment_rate),
+        "pension_ratio": float(pension_ratio),
+        "efficiency_multiplier": float(efficiency_multiplier),
+        "happiness_penalty": int(happiness_penalty),
+        "gold_penalty": int(gold_penalty),
+    }
+
+
+class ProvinceRow(NamedTuple):
+    province_id: int
+    user_id: int
+    land: int
+    productivity: Optional[int]
+
+
+class ChunkResult(NamedTuple):
+    """Outcome of one kernel run.
+
+    ``resource_deltas`` already nets production against input upkeep;
+    ``produced`` holds gross output (including energy) of buildings that
+    actually ran.  ``shortfalls`` lists
+    ``(user_id, province_id, unit, ran, owned, issues)`` for buildings that
+    could not fully operate.
+    """
+
+    gold_costs: Dict[int, int]
+    resource_deltas: Dict[int, Dict[str, float]]
+    produced: Dict[int, Dict[str, int]]
+    provinces: Dict[int, dict]
+    shortfalls: List[Tuple[int, int, str, int, int, List[str]]]
+
+
+def _num(value, default=0):
+    return default if value is None else value
+
+
+def _clamp_effect(name: str, value):
+    if name in PERCENTAGE_BASED:
+        if value > 100:
+            value = 100
+        if value < 0:
+            value = 0
+    elif value < 0:
+        value = 0
+    return value
+
+
+def _add_delta(bucket: dict, key, delta):
+    bucket[key] = bucket.get(key, 0) + delta
+
+
+def _run_user_sequential(
+    user_id,
+    rows,
+    buildings,
+    gold,
+    stock,
+    upgrade_mask,
+    policy_mask,
+    efficiency,
+    state,
+    result,
+):
+    """Reference evaluation: provinces in order, buildings in ``COLUMNS`` order,
+    each building running as many units as gold, energy and inputs allow."""
+    gold_spent = 0
+    deltas = result.resource_deltas.setdefault(user_id, {})
+    produced = result.produced.setdefault(user_id, {})
+
+    for row in rows:
+        province_id = row.province_id
+        prov = state[province_id]
+        province_buildings = buildings.get(province_id) or {}
+        for unit in COLUMNS:
+            unit_amount = province_buildings.get(unit, 0) or 0
+            if unit_amount <= 0:
+                continue
+            profile = building_profile(unit, upgrade_mask, policy_mask)
+
+            operating_costs = profile.money * unit_amount
+            for factor in profile.cost_factors:
+                operating_costs *= factor
+            operating_costs = int(operating_costs)
+
+            affordable_units = unit_amount
+            issues = []
+
+            cost_per_unit = operating_costs / unit_amount
+            if cost_per_unit > 0:
+                affordable_units = min(
+                    affordable_units, int((gold - gold_spent) // cost_per_unit)
+                )
+                if affordable_units < unit_amount:
+                    issues.append("money")
+
+            energy_per_unit = profile.energy_per_unit
+            if energy_per_unit:
+                by_energy = int(prov["energy"] // energy_per_unit)
+                if by_energy < affordable_units:
+                    issues.append("energy")
+                affordable_units = min(affordable_units, by_energy)
+
+            for resource, amount_per_unit in profile.minus:
+                if amount_per_unit <= 0:
+                    continue
+                effective_current = _num(stock.get(resource)) + deltas.get(resource, 0)
+                by_resource = int(effective_current // amount_per_unit)
+                if by_resource < affordable_units:
+                    issues.append(resource)
+                affordable_units = min(affordable_units, by_resource)
+
+            affordable_units = max(0, affordable_units)
+            if affordable_units < unit_amount:
+                result.shortfalls.append(
+                    (user_id, province_id, unit, affordable_units, unit_amount, issues)
+                )
+            if affordable_units == 0:
+                continue
+
+            if cost_per_unit > 0:
+                gold_spent += int(round(cost_per_unit * affordable_units))
+            if energy_per_unit:
+                prov["energy"] -= energy_per_unit * affordable_units
+            for resource, amount_per_unit in profile.minus:
+                if amount_per_unit <= 0:
+                    continue
+                _add_delta(deltas, resource, -(amount_per_unit * affordable_units))
+
+            plus_amount = (
+                int(row.land * variables.LAND_FARM_PRODUCTION_ADDITION)
+                if (profile.land_bonus)
+                else 0
+            )
+            multiplier = production_multiplier(
+                row.productivity, profile.multiplier_bonus, efficiency
+            )
+            for resource, amount in profile.plus:
+                amount = math.ceil(
+                    (amount * affordable_units + plus_amount) * multiplier
+                )
+                if resource in _STATE_INDEX:
+                    prov[resource] = _clamp_effect(
+                        resource, _num(prov.get(resource)) + amount
+                    )
+                    _add_delta(produced, resource, amount)
+                elif resource in _RESOURCE_INDEX:
+                    _add_delta(deltas, resource, amount)
+                    _add_delta(produced, resource, amount)
+
+            for effect, amount in profile.eff:
+                amount *= affordable_units
+                if effect == "pollution":
+                    for factor in profile.pollution_factors:
+                        amount *= factor
+                prov[effect] = _clamp_effect(
+                    effect, _num(prov.get(effect)) + int(round(amount))
+                )
+            for effect, amount in profile.effminus:
+                amount *= affordable_units
+                prov[effect] = _clamp_effect(
+                    effect, _num(prov.get(effect)) - int(round(amount))
+                )
+
+    if gold_spent:
+        result.gold_costs[user_id] = result.gold_costs.get(user_id, 0) + gold_spent
+
+
+@lru_cache(maxsize=256)
+def _profile_tables(upgrade_mask: int, policy_mask: int):
+    """Dense per-column parameter arrays for one upgrade/policy combination."""
+    m = len(COLUMNS)
+    n_res = len(variables.RESOURCES)
+    n_state = len(STATE_FIELDS)
+    money = np.zeros(m)
+    cost_factors = np.ones((m, 3))
+    energy_per_unit = np.zeros(m)
+    minus = np.zeros((m, n_res))
+    plus_res = np.zeros((m, n_res))
+    plus_state = np.zeros((m, n_state))
+    bonus = np.zeros(m)
+    eff = np.zeros((m, n_state))
+    effminus = np.zeros((m, n_state))
+    pollution_factors = np.ones((m, 2))
+    for j, unit in enumerate(COLUMNS):
+        profile = building_profile(unit, upgrade_mask, policy_mask)
+        money[j] = profile.money
+        cost_factors[j, : len(profile.cost_factors)] = profile.cost_factors
+        energy_per_unit[j] = profile.energy_per_unit
+        for resource, amount in profile.minus:
+            if resource in _RESOURCE_INDEX and amount > 0:
+                minus[j, _RESOURCE_INDEX[resource]] = amount
+        for resource, amount in profile.plus:
+            if resource in _STATE_INDEX:
+                plus_state[j, _STATE_INDEX[resource]] = amount
+            elif resource in _RESOURCE_INDEX:
+                plus_res[j, _RESOURCE_INDEX[resource]] = amount
+        bonus[j] = profile.multiplier_bonus
+        for effect, amount in profile.eff:
+            eff[j, _STATE_INDEX[effect]] = amount
+        for effect, amount in profile.effminus:
+            effminus[j, _STATE_INDEX[effect]] = amount
+        pollution_factors[j, : len(profile.pollution_factors)] = (
+            profile.pollution_factors
+        )
+    return (
+        money,
+        cost_factors,
+        energy_per_unit,
+        minus,
+        plus_res,
+        plus_state,
+        bonus,
+        eff,
+        effminus,
+        pollution_factors,
+    )
+
+
+@lru_cache(maxsize=1)
+def _column_layout():
+    """Which state fields each column touches via plus/eff/effminus.
+
+    Presence matters separately from amounts: an effect entry of 0 still
+    clamps the field, exactly as the sequential path does.
+    """
+    plus_state, eff, effminus = [], [], []
+    for unit in COLUMNS:
+        infra = variables.NEW_INFRA[unit]
+        plus_state.append(
+            tuple(_STATE_INDEX[k] for k in infra.get("plus", {}) if k in _STATE_INDEX)
+        )
+        eff.append(tuple(_STATE_INDEX[k] for k in infra.get("eff", {})))
+        effminus.append(tuple(_STATE_INDEX[k] for k in infra.get("effminus", {})))
+    percentage = np.array([name in PERCENTAGE_BASED for name in STATE_FIELDS])
+    land = np.array([building_profile(unit, 0, 0).land_bonus for unit in COLUMNS])
+    return plus_state, eff, effminus, percentage, land
+
+
+def _clamp_state(values, field_index, percentage):
+    if percentage[field_index]:
+        return np.clip(values, 0, 100)
+    return np.maximum(values, 0)
+
+
+def _quantity_matrix(rows, buildings):
+    q = np.zeros((len(rows), len(COLUMNS)), dtype=np.int64)
+    for i, row in enumerate(rows):
+        for unit, amount in (buildings.get(row.province_id) or {}).items():
+            j = _COLUMN_INDEX.get(unit)
+            if j is not None and amount:
+                q[i, j] = amount
+    return q
+
+
+def _masks_for(rows, upgrade_masks, policy_masks):
+    keys = [
+        (upgrade_masks.get(r.user_id, 0), policy_masks.get(r.user_id, 0)) for r in rows
+    ]
+    unique = sorted(set(keys))
+    index = {key: i for i, key in enumerate(unique)}
+    return unique, np.array([index[k] for k in keys], dtype=np.int64)
+
+
+def _stacked_tables(unique_keys, key_index):
+    tables = [_profile_tables(u, p) for u, p in unique_keys]
+    return [np.stack([t[k] for t in tables])[key_index] for k in range(len(tables[0]))]
+
+
+def _multipliers(rows, bonus, efficiency):
+    productivity = np.array(
+        [r.productivity if r.productivity is not None else np.nan for r in rows],
+        dtype=float,
+    )
+    base = np.where(
+        np.isnan(productivity),
+        1.0,
+        1
+        + ((productivity - 50) * variables.DEFAULT_PRODUCTIVITY_PRODUCTION_MULTIPLIER),
+    )
+    eff = np.array([efficiency.get(r.user_id, 1.0) for r in rows], dtype=float)
+    return (base[:, None] + bonus) * eff[:, None]
+
+
+def _land_addition(rows):
+    return np.array(
+        [int(r.land * variables.LAND_FARM_PRODUCTION_ADDITION) for r in rows],
+        dtype=np.int64,
+    )
+
+
+def _user_index(rows):
+    user_ids = list(dict.fromkeys(r.user_id for r in rows))
+    position = {uid: i for i, uid in enumerate(user_ids)}
+    return user_ids, np.array([position[r.user_id] for r in rows], dtype=np.int64)
+
+
+def _vectorized_eligible(rows, q, tables, gold, stock):
+    """Users whose gold and inputs cover every owned building with one unit of
+    headroom.  For them no building can be starved of money or inputs, so
+    processing order stops mattering and the column-wise pass is exact.
+    The headroom absorbs float floor-division edge cases (``10 // (10/3)``
+    is 2.0), which simply fall back to the sequential path."""
+    money, cost_factors, _, minus = tables[:4]
+    user_ids, uidx = _user_index(rows)
+    n_users = len(user_ids)
+    n_res = len(variables.RESOURCES)
+
+    full_cost = np.trunc(
+        money
+        * q
+        * cost_factors[:, :, 0]
+        * cost_factors[:, :, 1]
+        * cost_factors[:, :, 2]
+    )
+    per_unit_cost = np.where(q > 0, full_cost / np.maximum(q, 1), 0.0)
+    per_unit_minus = np.where((q > 0)[:, :, None], minus, 0.0)
+
+    total_cost = np.zeros(n_users)
+    np.add.at(total_cost, uidx, full_cost.sum(axis=1))
+    cost_headroom = np.zeros(n_users)
+    np.maximum.at(cost_headroom, uidx, per_unit_cost.max(axis=1))
+    needed = np.zeros((n_users, n_res))
+    np.add.at(needed, uidx, np.einsum("ij,ijr->ir", q.astype(float), minus))
+    minus_headroom = np.zeros((n_users, n_res))
+    np.maximum.at(minus_headroom, uidx, per_unit_minus.max(axis=1))
+
+    user_gold = np.array([_num(gold.get(uid)) for uid in user_ids], dtype=float)
+    have = np.array(
+        [
+            [_num((stock.get(uid) or {}).get(res)) for res in variables.RESOURCES]
+            for uid in user_ids
+        ],
+        dtype=float,
+    )
+    gold_ok = user_gold - total_cost >= cost_headroom
+    stock_ok = np.all((needed <= 0) | (have - needed >= minus_headroom), axis=1)
+    return {uid for uid, ok in zip(user_ids, gold_ok & stock_ok) if ok}
+
+
+def _run_vectorized(rows, q, tables, efficiency, state, result):
+    (
+        money,
+        cost_factors,
+        energy_per_unit,
+        minus,
+        plus_res,
+        plus_state,
+        bonus,
+        eff,
+        effminus,
+        pollution_factors,
+    ) = tables
+    n = len(rows)
+    n_res = len(variables.RESOURCES)
+    layout_plus, layout_eff, layout_effminus, percentage, land = _column_layout()
+
+    values = np.array(
+        [
+            [
+                _num(state[r.province_id].get(f), _STATE_DEFAULTS[f])
+                for f in STATE_FIELDS
+            ]
+            for r in rows
+        ],
+        dtype=float,
+    )
+    multiplier = _multipliers(rows, bonus, efficiency)
+    land_add = _land_addition(rows)
+    gold_cost = np.zeros(n)
+    res_delta = np.zeros((n, n_res))
+    res_produced = np.zeros((n, n_res))
+    state_produced = np.zeros((n, len(STATE_FIELDS)))
+    energy = _STATE_INDEX["energy"]
+
+    for j, unit in enumerate(COLUMNS):
+        qty = q[:, j]
+        active = qty > 0
+        if not active.any():
+            continue
+        affordable = qty.astype(float)
+        epu = energy_per_unit[:, j]
+        needs_energy = active & (epu > 0)
+        if needs_energy.any():
+            by_energy = np.floor(values[:, energy] / np.where(epu > 0, epu, 1))
+            affordable = np.where(
+                needs_energy, np.minimum(affordable, by_energy), affordable
+            )
+            affordable = np.maximum(affordable, 0)
+            for i in np.nonzero(needs_energy & (affordable < qty))[0]:
+                result.shortfalls.append(
+                    (
+                        rows[i].user_id,
+                        rows[i].province_id,
+                        unit,
+                        int(affordable[i]),
+                        int(qty[i]),
+                        ["energy"],
+                    )
+                )
+        run = active & (affordable > 0)
+        if not run.any():
+            continue
+        ran = np.where(run, affordable, 0.0)
+        addition = land_add * run if land[j] else 0
+
+        full_cost = np.trunc(
+            money[:, j]
+            * qty
+            * cost_factors[:, j, 0]
+            * cost_factors[:, j, 1]
+            * cost_factors[:, j, 2]
+        )
+        per_unit = full_cost / np.maximum(qty, 1)
+        gold_cost += np.where(run & (per_unit > 0), np.round(per_unit * ran), 0.0)
+
+        values[:, energy] -= epu * ran
+        res_delta -= minus[:, j, :] * ran[:, None]
+
+        produced = np.ceil(
+            (plus_res[:, j, :] * ran[:, None] + np.reshape(addition, (-1, 1)))
+            * multiplier[:, j, None]
+        )
+        produced = np.where((plus_res[:, j, :] != 0) & run[:, None], produced, 0.0)
+        res_delta += produced
+        res_produced += produced
+
+        for f in layout_plus[j]:
+            amount = np.ceil((plus_state[:, j, f] * ran + addition) * multiplier[:, j])
+            values[:, f] = np.where(
+                run, _clamp_state(values[:, f] + amount, f, percentage), values[:, f]
+            )
+            state_produced[:, f] += np.where(run, amount, 0.0)
+        for f in layout_eff[j]:
+            amount = eff[:, j, f] * ran
+            if STATE_FIELDS[f] == "pollution":
+                amount = (
+                    amount * pollution_factors[:, j, 0] * pollution_factors[:, j, 1]
+                )
+            values[:, f] = np.where(
+                run,
+                _clamp_state(values[:, f] + np.round(amount), f, percentage),
+                values[:, f],
+            )
+        for f in layout_effminus[j]:
+            amount = np.round(effminus[:, j, f] * ran)
+            values[:, f] = np.where(
+                run, _clamp_state(values[:, f] - amount, f, percentage), values[:, f]
+            )
+
+    for i, row in enumerate(rows):
+        prov = state[row.province_id]
+        for f, field in enumerate(STATE_FIELDS):
+            prov[field] = int(values[i, f])
+
+    user_ids, uidx = _user_index(rows)
+    per_user = np.zeros((len(user_ids), 1 + 2 * n_res + len(STATE_FIELDS)))
+    np.add.at(
+        per_user,
+        uidx,
+        np.concatenate(
+            [gold_cost[:, None], res_delta, res_produced, state_produced], axis=1
+        ),
+    )
+    produced_names = list(variables.RESOURCES) + list(STATE_FIELDS)
+    for u, user_id in enumerate(user_ids):
+        totals = per_user[u]
+        if totals[0]:
+            result.gold_costs[user_id] = int(totals[0])
+        result.resource_deltas[user_id] = {
+            variables.RESOURCES[r]: _as_number(totals[1 + r])
+            for r in np.nonzero(totals[1 : 1 + n_res])[0]
+        }
+        produced = totals[1 + n_res :]
+        result.produced[user_id] = {
+            produced_names[k]: int(produced[k]) for k in np.nonzero(produced)[0]
+        }
+
+
+def _as_number(value):
+    value = float(value)
+    return int(value) if value.is_integer() else value
+
+
+def compute_chunk(
+    provinces: Iterable,
+    buildings: Dict[int, Dict[str, int]],
+    gold: Dict[int, int],
+    stock: Dict[int, Dict[str, int]],
+    upgrade_masks: Dict[int, int],
+    policy_masks: Dict[int, int],
+    efficiency: Dict[int, float],
+    province_state: Dict[int, dict],
+    vectorize: bool = True,
+) -> ChunkResult:
+    """Run one economy tick for a chunk of provinces.
+
+    ``provinces`` are ``(province_id, user_id, land, productivity)`` rows in
+    processing order; ``province_state`` maps province id to its current
+    ``happiness``/``productivity``/``pollution``/``consumer_spending``/
+    ``energy`` (callers reset energy to 0 -- it is rebuilt every tick).
+    Inputs are not mutated.  ``vectorize=False`` forces the sequential
+    reference path for every user.
+    """
+    rows = [ProvinceRow(*row[:4]) for row in provinces]
+    state = {
+        r.province_id: dict(province_state.get(r.province_id) or {"energy": 0})
+        for r in rows
+    }
+    for prov in state.values():
+        for field, default in _STATE_DEFAULTS.items():
+            prov.setdefault(field, default)
+    result = ChunkResult({}, {}, {}, state, [])
+    if not rows:
+        return result
+
+    eligible = set()
+    if vectorize:
+        unique_keys, key_index = _masks_for(rows, upgrade_masks, policy_masks)
+        tables = _stacked_tables(unique_keys, key_index)
+        q = _quantity_matrix(rows, buildings)
+        eligible = _vectorized_eligible(rows, q, tables, gold, stock)
+        if eligible:
+            idx = [i for i, r in enumerate(rows) if r.user_id in eligible]
+            _run_vectorized(
+                [rows[i] for i in idx],
+                q[idx],
+                [t[idx] for t in tables],
+                efficiency,
+                state,
+                result,
+            )
+
+    by_user: Dict[int, list] = {}
+    for row in rows:
+        if row.user_id not in eligible:
+            by_user.setdefault(row.user_id, []).append(row)
+    for user_id, user_rows in by_user.items():
+        _run_user_sequential(
+            user_id,
+            user_rows,
+            buildings,
+            _num(gold.get(user_id)),
+            stock.get(user_id) or {},
+            upgrade_masks.get(user_id, 0),
+            policy_masks.get(user_id, 0),
+            efficiency.get(user_id, 1.0),
+            state,
+            result,
+        )
+    return result
+
+
+def gross_production(
+    provinces: Iterable,
+    buildings: Dict[int, Dict[str, int]],
+    upgrade_masks: Dict[int, int],
+    policy_masks: Dict[int, int],
+    efficiency: Dict[int, float],
+) -> Tuple[Dict[int, Dict[str, int]], Dict[int, Dict[str, int]]]:
+    """Unconstrained output per user: ``(gross, theoretical)``.
+
+    ``gross`` applies productivity, project bonuses and workforce efficiency
+    as if every building could run; ``theoretical`` is raw capacity with no
+    multipliers.  Both include energy.
+    """
+    rows = [ProvinceRow(*row[:4]) for row in provinces]
+    gross: Dict[int, Dict[str, int]] = {}
+    theoretical: Dict[int, Dict[str, int]] = {}
+    if not rows:
+        return gross, theoretical
+    unique_keys, key_index = _masks_for(rows, upgrade_masks, policy_masks)
+    tables = _stacked_tables(unique_keys, key_index)
+    plus_res, plus_state, bonus = tables[4], tables[5], tables[6]
+    q = _quantity_matrix(rows, buildings).astype(float)
+    active = q > 0
+    multiplier = _multipliers(rows, bonus, efficiency)
+    land = _column_layout()[4]
+    land_add = (_land_addition(rows)[:, None] * (active & land))[:, :, None]
+    plus = np.concatenate([plus_res, plus_state], axis=2)
+    names = list(variables.RESOURCES) + list(STATE_FIELDS)
+    raw = np.where(plus != 0, plus * q[:, :, None] + land_add, 0.0)
+    adjusted = np.where(plus != 0, np.ceil(raw * multiplier[:, :, None]), 0.0)
+    raw_by_province = raw.sum(axis=1)
+    adjusted_by_province = adjusted.sum(axis=1)
+    for i, row in enumerate(rows):
+        g = gross.setdefault(row.user_id, {})
+        t = theoretical.setdefault(row.user_id, {})
+        for k in np.nonzero(raw_by_province[i])[0]:
+            _add_delta(g, names[k], int(adjusted_by_province[i, k]))
+            _add_delta(t, names[k], int(raw_by_province[i, k]))
+    return gross, theoretical
@@ -0,0 +1,139 @@
+"""
+Change tracking and hex adjacency for the game map
+
+Writes that change what /api/game_map/data shows (owner, population,
+deployments, coordinates) go through ``mark_changed``. It bumps the
+provinces_map ETag version and stamps the touched provinces with it in
+``map_province_versions``, so ``?since=<version>`` only has to send those
+rows. Deleted provinces keep their stamp and are reported as removed.
+
+Writes that cannot name their provinces call ``mark_changed(db)`` without
+ids; that records a resync point and clients older than it get the full map.
+
+``map_province_adjacency`` holds the hex neighbours and is rebuilt only when
+coordinates are assigned.
+"""
+
+import etags
+
+SCOPE = "provinces_map"
+RESYNC_SCOPE = "provinces_map_resync"
+
+HEX_DIRECTIONS = [(1, 0), (1, -1), (0, -1), (-1, 0), (-1, 1), (0, 1)]
+
+_DIRECTIONS_SQL = ", ".join(f"({dq}, {dr})" for dq, dr in HEX_DIRECTIONS)
+
+
+def rebuild_adjacency(cur, province_ids=None):
+    """Recompute the neighbour rows of ``province_ids`` (default: every province)."""
+    if province_ids is None:
+        cur.execute("DELETE FROM map_province_adjacency")
+        only, params = "", ()
+    else:
+        ids = sorted(set(province_ids))
+        if not ids:
+            return
+        cur.execute(
+            "DELETE FROM map_province_adjacency "
+            "WHERE province_id = ANY(%s) OR neighbor_id = ANY(%s)",
+            (ids, ids),
+        )
+        only, params = "AND (a.id = ANY(%s) OR b.id = ANY(%s))", (ids, ids)
+    cur.execute(
+        f"""
+        INSERT INTO map_province_adjacency (province_id, neighbor_id)
+        SELECT a.id, b.id
+        FROM provinces a
+        CROSS JOIN (VALUES {_DIRECTIONS_SQL}) AS d (dq, dr)
+        JOIN provinces b
+          ON b.coordinate_x = a.coordinate_x + d.dq
+         AND b.coordinate_y = a.coordinate_y + d.dr
+        WHERE a.coordinate_x IS NOT NULL AND a.coordinate_y IS NOT NULL {only}
+        ON CONFLICT DO NOTHING
+        """,
+        params,
+    )
+
+
+def _record_resync(db, version):
+    db.execute(
+        """
+        INSERT INTO etag_versions (scope, version) VALUES (%s, %s)
+        ON CONFLICT (scope) DO UPDATE
+        SET version = EXCLUDED.version, updated_at = now()
+        """,
+        (RESYNC_SCOPE, version),
+    )
+
+
+def mark_changed(db, province_ids=None, user_id=None, with_neighbors=False):
+    """Record a map change in the caller's transaction.
+
+    Stamps ``province_ids`` (plus their neighbours with ``with_neighbors``,
+    for coordinate changes) or every province of ``user_id``; with neither,
+    records a resync point. Returns the new version, or None when it could
+    not be recorded. Call it before deleting provinces so their neighbours
+    are still known.
+    """
+    version = etags.bump(db, SCOPE)
+    if version is None:
+        return None
+    try:
+        db.execute("SAVEPOINT map_changes")
+    except Exception:
+        return None
+    try:
+        if province_ids is not None:
+            ids = sorted(set(province_ids))
+            neighbors = (
+                "UNION SELECT neighbor_id FROM map_province_adjacency "
+                "WHERE province_id = ANY(%(ids)s)"
+                if with_neighbors
+                else ""
+            )
+            db.execute(
+                f"""
+                INSERT INTO map_province_versions (province_id, version)
+                SELECT id, %(version)s FROM (
+                    SELECT unnest(%(ids)s::integer[]) AS id {neighbors}
+                ) AS changed
+                ON CONFLICT (province_id) DO UPDATE SET version = EXCLUDED.version
+                """,
+                {"ids": ids, "version": version},
+            )
+        elif user_id is not None:
+            db.execute(
+                """
+                INSERT INTO map_province_versions (province_id, version)
+                SELECT id, %s FROM provinces WHERE userId = %s
+                ON CONFLICT (province_id) DO UPDATE SET version = EXCLUDED.version
+                """,
+                (version, user_id),
+            )
+        else:
+            _record_resync(db, version)
+        db.execute("RELEASE SAVEPOINT map_changes")
+    except Exception:
+        # Nothing stamped: clients behind this version get the full map
+        db.execute("ROLLBACK TO SAVEPOINT map_changes")
+        _record_resync(db, version)
+    return version
+
+
+def mark_placed(db, province_ids):
+    """Index and stamp provinces that were just given coordinates.
+
+    Best-effort like ``mark_changed``: a missing index table never aborts
+    the caller's transaction.
+    """
+    try:
+        db.execute("SAVEPOINT map_placed")
+        try:
+            rebuild_adjacency(db, province_ids)
+            db.execute("RELEASE SAVEPOINT map_placed")
+        except Exception:
+            db.execute("ROLLBACK TO SAVEPOINT map_placed")
+            return mark_changed(db)
+    except Exception:
+        return None
+    return mark_changed(db, province_ids, with_neighbors=True)
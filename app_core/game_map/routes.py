@@ -3,7 +3,10 @@ import math
 from flask import Blueprint, render_template, session, jsonify, request, redirect, abort
 
 from database import get_request_cursor
+import columnar
+import etags
 from helpers import login_required
+from .changes import HEX_DIRECTIONS, RESYNC_SCOPE, SCOPE, mark_changed, rebuild_adjacency
 
 bp = Blueprint("game_map", __name__)
 
@@ -63,8 +66,38 @@ def _ensure_tables():
         cur.execute("CREATE INDEX IF NOT EXISTS idx_map_clog_prov ON map_combat_log(province_id)")
         cur.execute("CREATE INDEX IF NOT EXISTS idx_map_clog_time ON map_combat_log(occurred_at DESC)")
 
+        # --- version counters (migration 0047) ---
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS etag_versions (
+                scope VARCHAR(64) PRIMARY KEY,
+                version BIGINT NOT NULL DEFAULT 0,
+                updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+            )
+        """)
+
+        # --- adjacency index and change stamps for ?since= (migration 0048) ---
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS map_province_adjacency (
+                province_id INTEGER NOT NULL REFERENCES provinces(id) ON DELETE CASCADE,
+                neighbor_id INTEGER NOT NULL REFERENCES provinces(id) ON DELETE CASCADE,
+                PRIMARY KEY (province_id, neighbor_id)
+            )
+        """)
+        cur.execute("""
+            CREATE TABLE IF NOT EXISTS map_province_versions (
+                province_id INTEGER PRIMARY KEY,
+                version BIGINT NOT NULL
+            )
+        """)
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_map_prov_versions ON map_province_versions(version)")
+        cur.execute("ALTER TABLE map_combat_log ADD COLUMN IF NOT EXISTS map_version BIGINT")
+        cur.execute("CREATE INDEX IF NOT EXISTS idx_map_clog_version ON map_combat_log(map_version)")
+
         # --- auto-assign hex coordinates to any province that has none ---
+        # (one transaction, so the adjacency index is never seen half built)
+        conn.autocommit = False
         _seed_coordinates(cur)
+        conn.commit()
 
         cur.close()
         conn.close()
@@ -74,7 +107,11 @@ def _ensure_tables():
 
 
 def _seed_coordinates(cur):
-    """Assign hex grid positions to provinces that don't have them yet."""
+    """Assign hex grid positions to provinces that don't have them yet.
+
+    The adjacency index is rebuilt whenever positions change (and on the
+    first boot after migration 0048, while it is still empty).
+    """
     cur.execute("""
         SELECT id FROM provinces
         WHERE coordinate_x IS NULL OR coordinate_y IS NULL
@@ -82,6 +119,9 @@ def _seed_coordinates(cur):
     """)
     unplaced = [row[0] for row in cur.fetchall()]
     if not unplaced:
+        cur.execute("SELECT 1 FROM map_province_adjacency LIMIT 1")
+        if cur.fetchone() is None:
+            rebuild_adjacency(cur)
         return
 
     # Collect occupied positions
@@ -117,6 +157,8 @@ def _seed_coordinates(cur):
             "UPDATE provinces SET coordinate_x = %s, coordinate_y = %s WHERE id = %s",
             assignments,
         )
+        rebuild_adjacency(cur)
+        mark_changed(cur)
 
 
 @bp.record_once
@@ -125,8 +167,6 @@ def _on_register(state):
 
 GAME_MAP_TOKEN = os.getenv("GAME_MAP_TOKEN", _DEFAULT_TOKEN)
 
-HEX_DIRECTIONS = [(1, 0), (1, -1), (0, -1), (-1, 0), (-1, 1), (0, 1)]
-
 
 def _is_authorized() -> bool:
     return bool(session.get("game_map_authorized"))
@@ -169,18 +209,55 @@ def game_map_data():
         return jsonify({"status": "error", "message": "Not authorized. Visit the map token URL first."}), 403
 
     user_id = session.get("user_id")
+    since = request.args.get("since", type=int)
+    fmt = columnar.negotiate()
+    # Stockpile and gold are per player; deployments share the province scope
+    tag = etags.current_etag(SCOPE, user_id, fmt)
+    response = etags.not_modified(tag)
+    if response is not None:
+        response.vary.add("Accept")
+        return response
     try:
-        return _game_map_data_inner(user_id)
+        return etags.tagged(_game_map_data_inner(user_id, since, fmt), tag)
     except Exception as e:
         import logging, traceback
         logging.getLogger(__name__).error("game_map_data error: %s\n%s", e, traceback.format_exc())
         return jsonify({"status": "error", "message": f"Server error: {type(e).__name__}: {e}"}), 500
 
 
-def _game_map_data_inner(user_id):
+PROVINCE_FIELDS = (
+    "id", "name", "owner_id", "owner_name", "q", "r", "population",
+    "deployed_soldiers", "deployer_id", "is_mine",
+)
+
+
+def _game_map_data_inner(user_id, since=None, fmt=None):
+    """The whole map, or with ``since`` only what changed after that version.
+
+    A ``since`` older than the last resync point (or newer than the current
+    version) gets the whole map; ``since`` in the response is then null.
+    With a columnar ``fmt`` the provinces are sent as a table (columnar.py).
+    """
     with get_request_cursor(read_only=True) as db:
-        # All provinces with coordinates, owner info, and deployment counts
-        db.execute("""
+        # Version first: a change that lands while the rows are read is sent
+        # again on the next poll instead of being skipped
+        db.execute(
+            "SELECT scope, version FROM etag_versions WHERE scope IN (%s, %s)",
+            (SCOPE, RESYNC_SCOPE),
+        )
+        versions = dict(db.fetchall())
+        version = versions.get(SCOPE, 0)
+        if since is not None and not versions.get(RESYNC_SCOPE, 0) <= since <= version:
+            since = None
+
+        changed_only = ""
+        if since is not None:
+            changed_only = (
+                "JOIN map_province_versions v "
+                "ON v.province_id = p.id AND v.version > %(since)s"
+            )
+        # Provinces with coordinates, owner info, and deployment counts
+        db.execute(f"""
             SELECT
                 p.id,
                 p.provinceName AS name,
@@ -193,18 +270,40 @@ def _game_map_data_inner(user_id):
                 d.user_id AS deployer_id
             FROM provinces p
             JOIN users u ON p.userId = u.id
+            {changed_only}
             LEFT JOIN map_unit_deployments d ON d.province_id = p.id
             WHERE p.coordinate_x IS NOT NULL AND p.coordinate_y IS NOT NULL
             ORDER BY p.id
-        """)
+        """, {"since": since})
         rows = db.fetchall()
+        province_ids = sorted({row[0] for row in rows})
+
+        removed = []
+        if since is None:
+            db.execute("SELECT province_id, neighbor_id FROM map_province_adjacency")
+        else:
+            db.execute(
+                """
+                SELECT v.province_id FROM map_province_versions v
+                WHERE v.version > %s
+                  AND NOT EXISTS (SELECT 1 FROM provinces p WHERE p.id = v.province_id)
+                ORDER BY v.province_id
+                """,
+                (since,),
+            )
+            removed = [row[0] for row in db.fetchall()]
+            db.execute(
+                "SELECT province_id, neighbor_id FROM map_province_adjacency WHERE province_id = ANY(%s)",
+                (province_ids,),
+            )
+        adjacency_rows = db.fetchall()
 
         # Current user's military stockpile
         db.execute("SELECT gold, soldiers FROM stats s JOIN military m ON m.id = s.id WHERE s.id = %s", (user_id,))
         stats = db.fetchone()
 
-        # Recent combat log
-        db.execute("""
+        # Recent combat log (only new entries for a delta)
+        db.execute(f"""
             SELECT
                 cl.result,
                 au.username AS attacker,
@@ -217,38 +316,26 @@ def _game_map_data_inner(user_id):
             JOIN users au ON cl.attacker_id = au.id
             LEFT JOIN users du ON cl.defender_id = du.id
             JOIN provinces p ON cl.province_id = p.id
+            {"" if since is None else "WHERE cl.map_version > %(since)s"}
             ORDER BY cl.occurred_at DESC
             LIMIT 20
-        """)
+        """, {"since": since})
         combat_rows = db.fetchall()
 
-    provinces = []
-    coord_to_province = {}
-    for row in rows:
-        prov = {
-            "id": row[0],
-            "name": str(row[1]),
-            "owner_id": row[2],
-            "owner_name": str(row[3]),
-            "q": row[4],
-            "r": row[5],
-            "population": row[6],
-            "deployed_soldiers": row[7],
-            "deployer_id": row[8],
-            "is_mine": row[2] == user_id,
-        }
-        provinces.append(prov)
-        coord_to_province[(row[4], row[5])] = prov["id"]
-
-    # Build adjacency: mark which provinces border each other
-    adjacency = {}
-    for prov in provinces:
-        neighbors = []
-        for nq, nr in _hex_neighbors(prov["q"], prov["r"]):
-            neighbor_id = coord_to_province.get((nq, nr))
-            if neighbor_id is not None:
-                neighbors.append(neighbor_id)
-        adjacency[prov["id"]] = neighbors
+    province_rows = [
+        (
+            row[0], str(row[1]), row[2], str(row[3]), row[4], row[5], row[6],
+            row[7], row[8], row[2] == user_id,
+        )
+        for row in rows
+    ]
+
+    # Neighbours from the persisted index; the full map only links
+    # provinces it actually lists
+    adjacency = {province_id: [] for province_id in province_ids}
+    for province_id, neighbor_id in sorted(adjacency_rows):
+        if province_id in adjacency and (since is not None or neighbor_id in adjacency):
+            adjacency[province_id].append(neighbor_id)
 
     combat_log = []
     for row in combat_rows:
@@ -262,15 +349,26 @@ def _game_map_data_inner(user_id):
             "occurred_at": row[6].isoformat() if row[6] else None,
         })
 
-    return jsonify({
+    payload = {
         "status": "success",
+        "version": version,
+        "since": since,
         "user_id": user_id,
         "gold": int(stats[0]) if stats else 0,
         "soldiers_stockpile": int(stats[1]) if stats else 0,
-        "provinces": provinces,
+        "removed": removed,
         "adjacency": adjacency,
         "combat_log": combat_log,
-    })
+    }
+    if fmt:
+        strings = columnar.StringTable()
+        payload["provinces"] = columnar.table(
+            PROVINCE_FIELDS, province_rows, strings, indexed=("owner_name",)
+        )
+        payload["strings"] = strings.strings
+    else:
+        payload["provinces"] = columnar.records(PROVINCE_FIELDS, province_rows)
+    return columnar.respond(payload, fmt)
 
 
 @bp.route("/api/game_map/deploy", methods=["POST"])
@@ -311,6 +409,7 @@ def game_map_deploy():
               SET soldiers = map_unit_deployments.soldiers + EXCLUDED.soldiers,
                   updated_at = NOW()
         """, (province_id, user_id, amount))
+        mark_changed(db, [province_id])
 
     return jsonify({"status": "success", "message": f"Deployed {amount:,} soldiers."})
 
@@ -351,6 +450,7 @@ def game_map_retreat():
             )
 
         db.execute("UPDATE military SET soldiers = soldiers + %s WHERE id = %s", (amount, user_id))
+        mark_changed(db, [province_id])
 
     return jsonify({"status": "success", "message": f"Retreated {amount:,} soldiers back to stockpile."})
 
@@ -448,11 +548,12 @@ def game_map_attack():
             )
 
             # Log the battle
+            map_version = mark_changed(db, [from_province_id, target_province_id])
             db.execute("""
                 INSERT INTO map_combat_log
-                  (attacker_id, defender_id, province_id, attacker_soldiers, defender_soldiers, result)
-                VALUES (%s, %s, %s, %s, %s, 'attacker_won')
-            """, (user_id, actual_defender_id, target_province_id, attacker_soldiers, defender_soldiers))
+                  (attacker_id, defender_id, province_id, attacker_soldiers, defender_soldiers, result, map_version)
+                VALUES (%s, %s, %s, %s, %s, 'attacker_won', %s)
+            """, (user_id, actual_defender_id, target_province_id, attacker_soldiers, defender_soldiers, map_version))
 
             result_msg = (
                 f"Victory! Captured {target_name} with {remaining_attackers:,} survivors. "
@@ -486,11 +587,12 @@ def game_map_attack():
                 )
 
             # Log
+            map_version = mark_changed(db, [from_province_id, target_province_id])
             db.execute("""
                 INSERT INTO map_combat_log
-                  (attacker_id, defender_id, province_id, attacker_soldiers, defender_soldiers, result)
-                VALUES (%s, %s, %s, %s, %s, 'defender_won')
-            """, (user_id, actual_defender_id, target_province_id, attacker_soldiers, defender_soldiers))
+                  (attacker_id, defender_id, province_id, attacker_soldiers, defender_soldiers, result, map_version)
+                VALUES (%s, %s, %s, %s, %s, 'defender_won', %s)
+            """, (user_id, actual_defender_id, target_province_id, attacker_soldiers, defender_soldiers, map_version))
 
             result_msg = (
                 f"Repelled! {target_name} held. You lost {attacker_losses:,} soldiers. "
@@ -556,5 +658,6 @@ def game_map_move():
               SET soldiers = map_unit_deployments.soldiers + EXCLUDED.soldiers,
                   updated_at = NOW()
         """, (to_province_id, user_id, amount))
+        mark_changed(db, [from_province_id, to_province_id])
 
     return jsonify({"status": "success", "message": f"Moved {amount:,} soldiers."})
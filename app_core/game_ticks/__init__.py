@@ -0,0 +1,6 @@
+"""Game tick implementations.
+
+These modules only need the database: the Celery app, beat schedule and
+task wrappers live in ``tasks.py``, so web code can import tick helpers
+(e.g. ``food.food_stats``) without pulling in Celery or Redis.
+"""
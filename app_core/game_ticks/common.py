@@ -1,55 +1,13 @@
-from celery import Celery
 import psycopg2
 import os
 import time
-import logging
-from dotenv import load_dotenv
-from attack_scripts import Economy
-import math
-from celery.schedules import crontab
-import variables
-import redis
 
-logger = logging.getLogger(__name__)
-
-load_dotenv()
-import config  # Parse Railway environment variables  # noqa: E402
+import metrics
+from app_core.task_thresholds import TASK_RUN_THRESHOLDS
 
 # Toggle noisy per-building revenue logs (default off in production)
 VERBOSE_REVENUE_LOGS = os.getenv("VERBOSE_REVENUE_LOGS") == "1"
 
-from app_core.celery_schedule import CELERY_BEAT_SCHEDULE, TASK_RUN_THRESHOLDS
-
-# Mapping from normalized building names to produced resource names.
-# Used by the global tick economy engine.
-# NOTE: BUILDING_PRODUCTION_RESOURCE_MAP was removed.  These buildings are
-# now handled exclusively by generate_province_revenue() (hourly) which
-# enforces energy, gold upkeep, and input-resource checks.  Having them
-# here too caused DOUBLE production and free resources (steel mills
-# produced steel without consuming coal/iron, etc.).
-BUILDING_PRODUCTION_RESOURCE_MAP = {}
-
-
-redis_url = config.get_redis_url()
-celery = Celery("app", broker=redis_url)
-celery.conf.update(
-    broker_url=redis_url, result_backend=redis_url, CELERY_BROKER_URL=redis_url
-)
-
-celery.conf.update(
-    timezone="UTC",
-    task_serializer="json",
-    accept_content=["json"],
-    result_serializer="json",
-    beat_schedule=CELERY_BEAT_SCHEDULE,
-)
-
-
-# Centralized helper for last_run threshold check
-
-# Maximum 32-bit signed integer to guard against overflow when writing to DB
-MAX_INT_32 = 2_147_483_647
-
 
 # Maximum 32-bit signed integer to guard against overflow when writing to DB
 MAX_INT_32 = 2_147_483_647
@@ -64,6 +22,7 @@ def should_skip_task(row, task_name):
     threshold = TASK_RUN_THRESHOLDS.get(task_name, 90)
     if row and row[0] and (now - row[0]).total_seconds() < threshold:
         print(f"{task_name}: last run too recent, skipping (interval={threshold}s)")
+        metrics.count_lock_skip(task_name, "recent_run")
         return True
     return False
 
@@ -235,3 +194,62 @@ def _run_with_deadlock_retries(fn, label: str, max_retries: int = 3):
             continue
 
 
+
+
+def _copy_field(value):
+    """Render one value in COPY text format."""
+    if value is None:
+        return "\\N"
+    if isinstance(value, bool):
+        return "t" if value else "f"
+    return (
+        str(value)
+        .replace("\\", "\\\\")
+        .replace("\t", "\\t")
+        .replace("\n", "\\n")
+        .replace("\r", "\\r")
+    )
+
+
+def bulk_write(
+    db, apply_sql, rows, columns, fallback_sql, page_size=100, stage="tick_stage"
+):
+    """Stage ``rows`` in a temp table with COPY and apply them in one statement.
+
+    ``columns`` is a sequence of ``(name, pg_type)`` matching each row tuple;
+    ``apply_sql`` is the set-based UPDATE ... FROM / INSERT ... SELECT that
+    reads the staged rows from ``{stage}``.  Temp tables skip WAL and the
+    stage is dropped on commit, so a chunk costs three round trips and holds
+    row locks for a single statement instead of one page per 100 rows.
+
+    Cursors without ``copy_expert`` (test fakes) run ``fallback_sql`` -- the
+    equivalent per-row statement -- through ``execute_batch`` instead.
+    Returns the number of rows written.
+    """
+    if not rows:
+        return 0
+
+    copy_expert = getattr(db, "copy_expert", None)
+    if copy_expert is None:
+        from psycopg2.extras import execute_batch
+
+        execute_batch(db, fallback_sql, rows, page_size=page_size)
+        return len(rows)
+
+    import io
+
+    db.execute(
+        f"DROP TABLE IF EXISTS {stage}; "
+        f"CREATE TEMP TABLE {stage} ("
+        + ", ".join(f"{name} {pg_type}" for name, pg_type in columns)
+        + ") ON COMMIT DROP"
+    )
+    payload = io.StringIO(
+        "".join("\t".join(_copy_field(v) for v in row) + "\n" for row in rows)
+    )
+    copy_expert(
+        f"COPY {stage} ({', '.join(name for name, _ in columns)}) FROM STDIN",
+        payload,
+    )
+    db.execute(apply_sql.format(stage=stage))
+    return len(rows)
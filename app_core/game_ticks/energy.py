@@ -1,52 +1,4 @@
-from celery import Celery
-import psycopg2
-import os
-import time
-import logging
-from dotenv import load_dotenv
-from attack_scripts import Economy
-import math
-from celery.schedules import crontab
 import variables
-import redis
-
-logger = logging.getLogger(__name__)
-
-load_dotenv()
-import config  # Parse Railway environment variables  # noqa: E402
-
-# Toggle noisy per-building revenue logs (default off in production)
-VERBOSE_REVENUE_LOGS = os.getenv("VERBOSE_REVENUE_LOGS") == "1"
-
-from app_core.celery_schedule import CELERY_BEAT_SCHEDULE, TASK_RUN_THRESHOLDS
-
-# Mapping from normalized building names to produced resource names.
-# Used by the global tick economy engine.
-# NOTE: BUILDING_PRODUCTION_RESOURCE_MAP was removed.  These buildings are
-# now handled exclusively by generate_province_revenue() (hourly) which
-# enforces energy, gold upkeep, and input-resource checks.  Having them
-# here too caused DOUBLE production and free resources (steel mills
-# produced steel without consuming coal/iron, etc.).
-BUILDING_PRODUCTION_RESOURCE_MAP = {}
-
-
-redis_url = config.get_redis_url()
-celery = Celery("app", broker=redis_url)
-celery.conf.update(
-    broker_url=redis_url, result_backend=redis_url, CELERY_BROKER_URL=redis_url
-)
-
-celery.conf.update(
-    timezone="UTC",
-    task_serializer="json",
-    accept_content=["json"],
-    result_serializer="json",
-    beat_schedule=CELERY_BEAT_SCHEDULE,
-)
-
-
-# Centralized helper for last_run threshold check
-
 
 
 # Returns energy production and consumption from a certain province
@@ -1,53 +1,6 @@
-from celery import Celery
-import psycopg2
 import os
-import time
-import logging
-from dotenv import load_dotenv
-from attack_scripts import Economy
-import math
-from celery.schedules import crontab
-import variables
-import redis
 
-logger = logging.getLogger(__name__)
-
-load_dotenv()
-import config  # Parse Railway environment variables  # noqa: E402
-
-# Toggle noisy per-building revenue logs (default off in production)
-VERBOSE_REVENUE_LOGS = os.getenv("VERBOSE_REVENUE_LOGS") == "1"
-
-from app_core.celery_schedule import CELERY_BEAT_SCHEDULE, TASK_RUN_THRESHOLDS
-
-# Mapping from normalized building names to produced resource names.
-# Used by the global tick economy engine.
-# NOTE: BUILDING_PRODUCTION_RESOURCE_MAP was removed.  These buildings are
-# now handled exclusively by generate_province_revenue() (hourly) which
-# enforces energy, gold upkeep, and input-resource checks.  Having them
-# here too caused DOUBLE production and free resources (steel mills
-# produced steel without consuming coal/iron, etc.).
-BUILDING_PRODUCTION_RESOURCE_MAP = {}
-
-
-redis_url = config.get_redis_url()
-celery = Celery("app", broker=redis_url)
-celery.conf.update(
-    broker_url=redis_url, result_backend=redis_url, CELERY_BROKER_URL=redis_url
-)
-
-celery.conf.update(
-    timezone="UTC",
-    task_serializer="json",
-    accept_content=["json"],
-    result_serializer="json",
-    beat_schedule=CELERY_BEAT_SCHEDULE,
-)
-
-
-# Centralized helper for last_run threshold check
-
-_redis_pool = None
+import metrics
 
 
 _delete_lock_lua = """
@@ -85,6 +38,7 @@ def try_pg_advisory_lock(conn, lock_id: int, label: str) -> bool:
         acquired = row[0]
         if not acquired:
             print(f"{label}: another run is already in progress, " "skipping")
+            metrics.count_lock_skip(label, "advisory_lock")
         return acquired
     except Exception as e:
         print(f"{label}: failed to acquire advisory lock: {e}")
@@ -105,6 +59,12 @@ def release_pg_advisory_lock(conn, lock_id: int):
 
 def _get_redis_client():
     global _redis_pool
+    # Imported here so the tick modules can be loaded without redis
+    try:
+        import redis
+    except ImportError:
+        return None
+
     if _redis_pool is None:
         import urllib.parse
         url = os.getenv("REDIS_URL") or os.getenv("REDIS_PUBLIC_URL")
@@ -124,8 +84,6 @@ def _get_redis_client():
 def leader_only(ttl_seconds=60, key_prefix="task_lock"):
     def decorator(fn):
         def wrapper(*args, **kwargs):
-            if redis is None:
-                return fn(*args, **kwargs)
             try:
                 r = _get_redis_client()
                 if not r:
@@ -138,6 +96,7 @@ def leader_only(ttl_seconds=60, key_prefix="task_lock"):
                 got = r.set(key, lock_id, nx=True, ex=ttl_seconds)
                 if not got:
                     print(f"{fn.__name__}: skipped (leader lock not acquired)")
+                    metrics.count_lock_skip(fn.__name__, "leader_lock")
                     return
                 try:
                     return fn(*args, **kwargs)
@@ -1,22 +1,13 @@
-from celery import Celery
 import psycopg2
 import os
 import time
 import logging
-from dotenv import load_dotenv
-from attack_scripts import Economy
-import math
-from celery.schedules import crontab
-import variables
-import redis
 
-logger = logging.getLogger(__name__)
-
-load_dotenv()
-import config  # Parse Railway environment variables  # noqa: E402
+import metrics
+from app_core.game_map.changes import mark_changed
+from app_core.task_thresholds import TASK_RUN_THRESHOLDS
 
-# Toggle noisy per-building revenue logs (default off in production)
-VERBOSE_REVENUE_LOGS = os.getenv("VERBOSE_REVENUE_LOGS") == "1"
+logger = logging.getLogger(__name__)
 
 # War supplies started at a fixed 200 per side and nothing ever refilled them
 # (Discord report: "no matter how many troops I send, it keeps telling me I
@@ -29,8 +20,6 @@ WAR_SUPPLY_REGEN_PER_HOUR = int(os.getenv("WAR_SUPPLY_REGEN_PER_HOUR", "20"))
 WAR_SUPPLY_CAP = int(os.getenv("WAR_SUPPLY_CAP", "2000"))
 WAR_SUPPLY_LINES_BONUS = 1.15
 
-from app_core.celery_schedule import CELERY_BEAT_SCHEDULE, TASK_RUN_THRESHOLDS
-
 # Mapping from normalized building names to produced resource names.
 # Used by the global tick economy engine.
 # NOTE: BUILDING_PRODUCTION_RESOURCE_MAP was removed.  These buildings are
@@ -40,24 +29,7 @@ from app_core.celery_schedule import CELERY_BEAT_SCHEDULE, TASK_RUN_THRESHOLDS
 # produced steel without consuming coal/iron, etc.).
 BUILDING_PRODUCTION_RESOURCE_MAP = {}
 
-
-redis_url = config.get_redis_url()
-celery = Celery("app", broker=redis_url)
-celery.conf.update(
-    broker_url=redis_url, result_backend=redis_url, CELERY_BROKER_URL=redis_url
-)
-
-celery.conf.update(
-    timezone="UTC",
-    task_serializer="json",
-    accept_content=["json"],
-    result_serializer="json",
-    beat_schedule=CELERY_BEAT_SCHEDULE,
-)
-
-
-# Centralized helper for last_run threshold check
-from app_core.game_ticks.common import should_skip_task, handle_exception
+from app_core.game_ticks.common import should_skip_task, handle_exception, bulk_write
 from app_core.game_ticks.locks import try_pg_advisory_lock, release_pg_advisory_lock
 
 # Bot market offers configuration
@@ -282,6 +254,9 @@ def cleanup_orphan_user_rows():
                 db.execute(sql)
                 deleted[label] = db.rowcount
 
+            if deleted["provinces"]:
+                # Ids are unknown here: map clients resync
+                mark_changed(db)
             conn.commit()
 
             total_deleted = sum(deleted.values())
@@ -596,7 +571,7 @@ def global_tick():
     If any phase exceeds 30 seconds, a warning is logged.
     """
     from database import get_db_connection
-    from psycopg2.extras import execute_batch, RealDictCursor
+    from psycopg2.extras import RealDictCursor
 
     with get_db_connection() as conn:
         if not try_pg_advisory_lock(conn, 9010, "global_tick"):
@@ -614,6 +589,7 @@ def global_tick():
         total_consumption = 0
         production_phase_ms = 0
         consumption_phase_ms = 0
+        rows_written = {"user_economy": 0, "wars": 0}
 
         try:
             # Ensure we do not double-run in short windows.
@@ -703,22 +679,38 @@ def global_tick():
                 total_production += produced_amount
 
             if prod_updates:
-                execute_batch(
+                # Several buildings can feed the same resource, so collapse the
+                # staged rows first: ON CONFLICT cannot touch a row twice.
+                bulk_write(
                     db,
                     """
                     INSERT INTO user_economy
                         (user_id, resource_id, quantity, updated_at)
-                    VALUES (%s, %s, %s, now())
+                    SELECT user_id, resource_id, SUM(amount), now()
+                    FROM {stage}
+                    GROUP BY user_id, resource_id
                     ON CONFLICT (user_id, resource_id)
                     DO UPDATE SET
                         quantity = user_economy.quantity + EXCLUDED.quantity,
                         updated_at = now()
                     """,
                     prod_updates,
+                    (("user_id", "int"), ("resource_id", "int"), ("amount", "numeric")),
+                    """
+                    INSERT INTO user_economy
+                        (user_id, resource_id, quantity, updated_at)
+                    VALUES (%s, %s, %s, now())
+                    ON CONFLICT (user_id, resource_id)
+                    DO UPDATE SET
+                        quantity = user_economy.quantity + EXCLUDED.quantity,
+                        updated_at = now()
+                    """,
                     page_size=500,
                 )
+                rows_written["user_economy"] += len(prod_updates)
 
             production_phase_ms = int((time.time() - production_start) * 1000)
+            metrics.observe_phase("global_tick", "production", production_phase_ms / 1000)
             if production_phase_ms > 30000:
                 logger.warning(
                     f"Production phase exceeded 30s: {production_phase_ms}ms, "
@@ -819,19 +811,40 @@ def global_tick():
                         }
 
                 if deductions:
-                    execute_batch(
+                    bulk_write(
                         db,
                         """
+                        UPDATE user_economy AS ue
+                        SET quantity = GREATEST(ue.quantity - v.amount, 0),
+                            updated_at = now()
+                        FROM (
+                            SELECT user_id, resource_id, SUM(amount) AS amount
+                            FROM {stage}
+                            GROUP BY user_id, resource_id
+                        ) AS v
+                        WHERE ue.user_id = v.user_id
+                          AND ue.resource_id = v.resource_id
+                        """,
+                        deductions,
+                        (
+                            ("amount", "numeric"),
+                            ("user_id", "int"),
+                            ("resource_id", "int"),
+                        ),
+                        """
                         UPDATE user_economy
                         SET quantity = GREATEST(quantity - %s, 0),
                             updated_at = now()
                         WHERE user_id = %s AND resource_id = %s
                         """,
-                        deductions,
                         page_size=500,
                     )
+                    rows_written["user_economy"] += len(deductions)
 
                 consumption_phase_ms = int((time.time() - consumption_start) * 1000)
+                metrics.observe_phase(
+                    "global_tick", "consumption", consumption_phase_ms / 1000
+                )
                 if consumption_phase_ms > 30000:
                     logger.warning(
                         f"Consumption phase exceeded 30s: {consumption_phase_ms}ms, "
@@ -913,15 +926,26 @@ def global_tick():
                             supply_updates.append((new_attacker, new_defender, w["id"]))
 
                     if supply_updates:
-                        execute_batch(
+                        bulk_write(
                             db,
+                            "UPDATE wars AS w SET "
+                            "attacker_supplies = v.attacker_supplies, "
+                            "defender_supplies = v.defender_supplies "
+                            "FROM {stage} AS v WHERE w.id = v.id",
+                            supply_updates,
+                            (
+                                ("attacker_supplies", "numeric"),
+                                ("defender_supplies", "numeric"),
+                                ("id", "int"),
+                            ),
                             "UPDATE wars SET attacker_supplies=%s, "
                             "defender_supplies=%s WHERE id=%s",
-                            supply_updates,
                             page_size=500,
                         )
+                        rows_written["wars"] += len(supply_updates)
 
             supply_phase_ms = int((time.time() - supply_start) * 1000)
+            metrics.observe_phase("global_tick", "supply", supply_phase_ms / 1000)
             if supply_phase_ms > 30000:
                 logger.warning(f"War supply regen phase exceeded 30s: {supply_phase_ms}ms")
 
@@ -988,6 +1012,9 @@ def global_tick():
                 total_deserted_units=0,
             )
             conn.commit()
+            metrics.observe_phase("global_tick", "total", total_duration_ms / 1000)
+            for table, n in rows_written.items():
+                metrics.count_rows("global_tick", table, n)
 
             print(
                 "global_tick: completed "
@@ -997,6 +1024,25 @@ def global_tick():
                 f"total_ms={total_duration_ms}"
             )
 
+            # Refresh the influence snapshot after the tick's own commit so a
+            # failure here never rolls back production or upkeep.
+            try:
+                from app_core.economy.influence import refresh_nation_influence
+
+                influence_start = time.time()
+                refreshed = refresh_nation_influence(db)
+                conn.commit()
+                print(
+                    f"global_tick: nation_influence refreshed rows={refreshed} "
+                    f"ms={int((time.time() - influence_start) * 1000)}"
+                )
+            except Exception as inf_err:
+                logger.warning(f"nation_influence refresh failed: {inf_err}")
+                try:
+                    conn.rollback()
+                except Exception:
+                    pass
+
         except Exception as e:
             err = str(e)
             total_duration_ms = int((time.time() - tick_start) * 1000)
@@ -1,52 +1,15 @@
-from celery import Celery
 import psycopg2
-import os
 import time
-import logging
-from dotenv import load_dotenv
-from attack_scripts import Economy
-import math
-from celery.schedules import crontab
 import variables
-import redis
 
-logger = logging.getLogger(__name__)
-
-load_dotenv()
-import config  # Parse Railway environment variables  # noqa: E402
-
-# Toggle noisy per-building revenue logs (default off in production)
-VERBOSE_REVENUE_LOGS = os.getenv("VERBOSE_REVENUE_LOGS") == "1"
-
-from app_core.celery_schedule import CELERY_BEAT_SCHEDULE, TASK_RUN_THRESHOLDS
-
-# Mapping from normalized building names to produced resource names.
-# Used by the global tick economy engine.
-# NOTE: BUILDING_PRODUCTION_RESOURCE_MAP was removed.  These buildings are
-# now handled exclusively by generate_province_revenue() (hourly) which
-# enforces energy, gold upkeep, and input-resource checks.  Having them
-# here too caused DOUBLE production and free resources (steel mills
-# produced steel without consuming coal/iron, etc.).
-BUILDING_PRODUCTION_RESOURCE_MAP = {}
-
-
-redis_url = config.get_redis_url()
-celery = Celery("app", broker=redis_url)
-celery.conf.update(
-    broker_url=redis_url, result_backend=redis_url, CELERY_BROKER_URL=redis_url
-)
-
-celery.conf.update(
-    timezone="UTC",
-    task_serializer="json",
-    accept_content=["json"],
-    result_serializer="json",
-    beat_schedule=CELERY_BEAT_SCHEDULE,
+import metrics
+from app_core.game_map.changes import mark_changed
+from app_core.game_ticks.common import (
+    should_skip_task,
+    handle_exception,
+    log_verbose,
+    bulk_write,
 )
-
-
-# Centralized helper for last_run threshold check
-from app_core.game_ticks.common import should_skip_task, handle_exception, log_verbose
 from app_core.game_ticks.locks import try_pg_advisory_lock, release_pg_advisory_lock
 from app_core.game_ticks.food import rations_needed
 
@@ -143,7 +106,7 @@ def calc_pg(pId, rations):
 # Optimized population growth to minimize per-province queries and log noise
 def population_growth():  # Function for growing population
     from database import get_db_connection
-    from psycopg2.extras import execute_batch, RealDictCursor
+    from psycopg2.extras import RealDictCursor
 
     with get_db_connection() as conn:
         # Acquire advisory lock to prevent concurrent runs
@@ -178,54 +141,65 @@ def population_growth():  # Function for growing population
                 pass
             return
 
+        phase_start = time.perf_counter()
         dbdict = conn.cursor(cursor_factory=RealDictCursor)
 
         CHUNK_SIZE = 200
 
-        # Preload province IDs only (lightweight) to chunk the work
+        # Per-user aggregates only; provinces themselves are read in pages below
+        # so worker memory does not grow with the size of the world.
         dbdict.execute(
             """
-             SELECT p.id, p.userId, p.population, p.citycount, p.land,
-                 p.happiness, p.pollution, p.productivity,
-                 COALESCE(p.pop_children, 0) AS pop_children,
-                 COALESCE(p.pop_working, 0) AS pop_working,
-                 COALESCE(p.pop_elderly, 0) AS pop_elderly
-             FROM provinces p
-             JOIN users u ON u.id = p.userId
-            ORDER BY userId ASC
-            """
+            SELECT p.userId AS userid,
+                   COUNT(*) AS province_count,
+                   COALESCE(SUM(p.land), 0)::bigint AS total_land,
+                   SUM(GREATEST(COALESCE(p.population, 0) / %s, 1))::bigint
+                       AS rations_needed
+            FROM provinces p
+            JOIN users u ON u.id = p.userId
+            GROUP BY p.userId
+            ORDER BY p.userId ASC
+            """,
+            (variables.RATIONS_PER,),
         )
-        all_provinces = dbdict.fetchall()
-
         user_total_provinces = {}
         user_total_land = {}
-        for prov in all_provinces:
-            uid = prov["userid"]
-            user_total_provinces[uid] = user_total_provinces.get(uid, 0) + 1
-            user_total_land[uid] = user_total_land.get(uid, 0) + (prov["land"] or 0)
+        # PHASE 1: Total rations needed per user (sum across all provinces)
+        user_total_rations_needed = {}
+        for row in dbdict.fetchall():
+            uid = row["userid"]
+            user_total_provinces[uid] = row["province_count"]
+            user_total_land[uid] = row["total_land"] or 0
+            user_total_rations_needed[uid] = row["rations_needed"]
 
-        if not all_provinces:
+        if not user_total_provinces:
             try:
                 release_pg_advisory_lock(conn, 9003)
             except Exception:
                 pass
             return
 
-        all_user_ids = sorted(set(row["userid"] for row in all_provinces))
+        all_user_ids = sorted(user_total_provinces)
 
         # Get rations resource_id (constant, one query)
         db.execute("SELECT resource_id FROM resource_dictionary WHERE name='rations'")
         rations_resource_id = db.fetchone()[0]
 
         # Ensure user_economy rows exist for rations (batch, all users)
-        execute_batch(
+        bulk_write(
             db,
             """
             INSERT INTO user_economy (user_id, resource_id, quantity)
-            VALUES (%s, %s, 0)
+            SELECT user_id, resource_id, 0 FROM {stage}
             ON CONFLICT (user_id, resource_id) DO NOTHING
             """,
             [(uid, rations_resource_id) for uid in all_user_ids],
+            (("user_id", "int"), ("resource_id", "int")),
+            """
+            INSERT INTO user_economy (user_id, resource_id, quantity)
+            VALUES (%s, %s, 0)
+            ON CONFLICT (user_id, resource_id) DO NOTHING
+            """,
         )
 
         # Preload rations for all users (one query)
@@ -267,18 +241,9 @@ def population_growth():  # Function for growing population
                 dist_cap_map[uid] = dist_cap_map.get(uid, 0) + qty * cap
 
         conn.commit()  # Release read locks from preload queries
-
-        # PHASE 1: Calculate total rations needed per user (sum across all provinces)
-        user_total_rations_needed = {}
-        for province_row in all_provinces:
-            user_id = province_row["userid"]
-            curPop = province_row["population"] or 0
-            rations_needed = curPop // variables.RATIONS_PER
-            if rations_needed < 1:
-                rations_needed = 1
-            user_total_rations_needed[user_id] = (
-                user_total_rations_needed.get(user_id, 0) + rations_needed
-            )
+        metrics.observe_phase(
+            "population_growth", "preload", time.perf_counter() - phase_start
+        )
 
         # PHASE 2: Apply distribution-center bottleneck.
         user_rations_to_deduct = {}
@@ -353,10 +318,39 @@ def population_growth():  # Function for growing population
         total_rations_deducted = 0
         rations_deducted_users = set()
 
-        for chunk_start in range(0, len(all_provinces), CHUNK_SIZE):
-            chunk = all_provinces[chunk_start : chunk_start + CHUNK_SIZE]
+        # Keyset pages over idx_provinces_userid_id: only CHUNK_SIZE
+        # provinces are held in the worker at a time, and every page is a
+        # plain query inside the chunk's own transaction, so nothing outlives
+        # the per-chunk commit (a holdable cursor would, which PgBouncer in
+        # transaction mode cannot follow across server connections).
+        last_key = (0, 0)
+        while True:
+            phase_start = time.perf_counter()
+            dbdict.execute(
+                """
+                SELECT p.id, p.userId, p.population, p.citycount, p.land,
+                       p.happiness, p.pollution, p.productivity,
+                       COALESCE(p.pop_children, 0) AS pop_children,
+                       COALESCE(p.pop_working, 0) AS pop_working,
+                       COALESCE(p.pop_elderly, 0) AS pop_elderly
+                FROM provinces p
+                JOIN users u ON u.id = p.userId
+                WHERE (p.userId, p.id) > (%s, %s)
+                ORDER BY p.userId ASC, p.id ASC
+                LIMIT %s
+                """,
+                (*last_key, CHUNK_SIZE),
+            )
+            chunk = dbdict.fetchall()
+            if not chunk:
+                break
+            last_key = (chunk[-1]["userid"], chunk[-1]["id"])
+            now = time.perf_counter()
+            metrics.observe_phase("population_growth", "preload", now - phase_start)
+            phase_start = now
 
             population_updates = []
+            map_changed = []
             for province_row in chunk:
                 try:
                     old_population = province_row["population"] or 0
@@ -402,6 +396,8 @@ def population_growth():  # Function for growing population
                             province_row["id"],
                         )
                     )
+                    if population_updates[-1][1:4] != (pop_c, pop_w, pop_e):
+                        map_changed.append(province_row["id"])
                 except Exception as e:
                     handle_exception(e)
                     continue
@@ -416,38 +412,75 @@ def population_growth():  # Function for growing population
                 if uid in user_rations_to_deduct
             ]
             rations_deducted_users.update(new_ration_users)
+            now = time.perf_counter()
+            metrics.observe_phase("population_growth", "compute", now - phase_start)
+            phase_start = now
 
             # Write this chunk's updates
             if rations_updates:
-                execute_batch(
+                bulk_write(
                     db,
                     """
+                    UPDATE user_economy AS ue
+                    SET quantity = GREATEST(0, ue.quantity - v.qty)
+                    FROM {stage} AS v
+                    WHERE ue.user_id = v.user_id AND ue.resource_id = v.resource_id
+                    """,
+                    rations_updates,
+                    (("qty", "numeric"), ("user_id", "int"), ("resource_id", "int")),
+                    """
                     UPDATE user_economy
                     SET quantity = GREATEST(0, quantity - %s)
                     WHERE user_id=%s AND resource_id=%s
                     """,
-                    rations_updates,
                 )
                 total_rations_deducted += len(rations_updates)
 
             if population_updates:
-                execute_batch(
+                bulk_write(
                     db,
+                    """UPDATE provinces AS p
+                       SET population = v.population,
+                           pop_children = v.pop_children,
+                           pop_working = v.pop_working,
+                           pop_elderly = v.pop_elderly
+                       FROM {stage} AS v
+                       WHERE p.id = v.id""",
+                    population_updates,
+                    (
+                        ("population", "numeric"),
+                        ("pop_children", "numeric"),
+                        ("pop_working", "numeric"),
+                        ("pop_elderly", "numeric"),
+                        ("id", "int"),
+                    ),
                     """UPDATE provinces
                        SET population = %s,
                            pop_children = %s,
                            pop_working = %s,
                            pop_elderly = %s
                        WHERE id = %s""",
-                    population_updates,
                 )
                 total_pop_updates += len(population_updates)
+            if map_changed:
+                # The game map shows the summed demographics
+                mark_changed(db, map_changed)
 
             # Commit after each chunk to release locks
             try:
                 conn.commit()
             except Exception:
                 pass
+            metrics.observe_phase(
+                "population_growth", "write", time.perf_counter() - phase_start
+            )
+            metrics.count_chunk("population_growth")
+            metrics.count_rows(
+                "population_growth", "user_economy", len(rations_updates)
+            )
+            metrics.count_rows(
+                "population_growth", "provinces", len(population_updates)
+            )
 
         print(
             f"population_growth: updated {total_pop_updates} provinces "
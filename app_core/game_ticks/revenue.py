@@ -1,74 +1,382 @@
-from celery import Celery
 import psycopg2
 import os
 import time
-import logging
-from dotenv import load_dotenv
-from attack_scripts import Economy
-import math
-from celery.schedules import crontab
 import variables
-import redis
 
-logger = logging.getLogger(__name__)
+import metrics
+from app_core.game_ticks.common import (
+    should_skip_task,
+    handle_exception,
+    log_verbose,
+    bulk_write,
+    MAX_INT_32,
+)
+from app_core.game_ticks.locks import try_pg_advisory_lock, release_pg_advisory_lock
+from app_core.economy.kernel import (
+    LEGACY_UPGRADE_TO_TECH,
+    STATE_FIELDS,
+    TECH_TO_LEGACY,
+    compute_chunk,
+    policies_mask,
+    upgrades_mask,
+    workforce_debuff,
+)
 
-load_dotenv()
-import config  # Parse Railway environment variables  # noqa: E402
+# How each chunk is persisted:
+#   "copy"  (default) stage rows with COPY and apply one statement per table
+#           (app_core.game_ticks.common.bulk_write)
+#   "set"   pass every column as an array and apply one unnest() statement
+#           per table, no staging table
+#   "batch" the original per-row execute_batch pages
+PROVINCE_REVENUE_SQL_MODE = os.getenv("PROVINCE_REVENUE_SQL_MODE", "copy").lower()
+
+# Shards report under one task label; see metrics.py
+_METRICS_TASK = "generate_province_revenue"
+
+_GOLD_SQL = "UPDATE stats SET gold = GREATEST(gold - %s, 0) WHERE id = %s"
+_GOLD_COLUMNS = (("amount", "bigint"), ("id", "int"))
+_GOLD_SET_SQL = """
+    UPDATE stats AS s SET gold = GREATEST(s.gold - v.amount, 0)
+    FROM {source}
+    WHERE s.id = v.id
+"""
+
+_PROVINCES_SQL = """
+    UPDATE provinces SET
+        happiness = %s,
+        productivity = %s,
+        pollution = %s,
+        consumer_spending = %s,
+        energy = %s,
+        population = %s,
+        pop_children = %s,
+        pop_working = %s,
+        pop_elderly = %s
+    WHERE id = %s
+"""
+_PROVINCES_COLUMNS = tuple(
+    (name, "int")
+    for name in (
+        "happiness",
+        "productivity",
+        "pollution",
+        "consumer_spending",
+        "energy",
+        "population",
+        "pop_children",
+        "pop_working",
+        "pop_elderly",
+        "id",
+    )
+)
+_PROVINCES_SET_SQL = """
+    UPDATE provinces AS p SET
+        happiness = v.happiness,
+        productivity = v.productivity,
+        pollution = v.pollution,
+        consumer_spending = v.consumer_spending,
+        energy = v.energy,
+        population = v.population,
+        pop_children = v.pop_children,
+        pop_working = v.pop_working,
+        pop_elderly = v.pop_elderly
+    FROM {source}
+    WHERE p.id = v.id
+"""
+
+# Additive user_economy upsert over (user_id, resource_id, delta) rows.
+# Existing rows are updated in bulk; only rows that appeared concurrently
+# fall through to the ON CONFLICT branch.  Negative deltas never reach the
+# INSERT itself, which would trip the quantity >= 0 check.
+_RESOURCE_DELTAS_SQL = """
+    WITH d AS (
+        SELECT user_id, resource_id, SUM(delta) AS delta
+        FROM ({source}) AS s
+        GROUP BY user_id, resource_id
+    ), upd AS (
+        UPDATE user_economy AS ue
+        SET quantity = GREATEST(0, ue.quantity + d.delta), updated_at = now()
+        FROM d
+        WHERE ue.user_id = d.user_id AND ue.resource_id = d.resource_id
+        RETURNING ue.user_id, ue.resource_id
+    )
+    INSERT INTO user_economy (user_id, resource_id, quantity, updated_at)
+    SELECT d.user_id, d.resource_id, GREATEST(0, d.delta), now()
+    FROM d
+    WHERE NOT EXISTS (
+        SELECT 1 FROM upd
+        WHERE upd.user_id = d.user_id AND upd.resource_id = d.resource_id
+    )
+    ON CONFLICT (user_id, resource_id)
+    DO UPDATE SET
+        quantity = GREATEST(
+            0,
+            user_economy.quantity + (
+                SELECT d.delta FROM d
+                WHERE d.user_id = EXCLUDED.user_id
+                  AND d.resource_id = EXCLUDED.resource_id
+            )
+        ),
+        updated_at = now()
+"""
+_RESOURCE_COLUMNS = (
+    ("user_id", "int"),
+    ("resource_id", "int"),
+    ("quantity", "numeric"),
+    ("delta", "numeric"),
+)
+# Set mode resolves resource names in SQL: no resource_dictionary round trip.
+_RESOURCE_NAMES_SOURCE = """
+    SELECT u.user_id, rd.resource_id, u.delta
+    FROM unnest(%s::int[], %s::text[], %s::numeric[]) AS u(user_id, name, delta)
+    JOIN resource_dictionary rd ON rd.name = u.name
+"""
+
+_EDUCATION_SQL = """
+    UPDATE provinces
+    SET edu_none = COALESCE(edu_none, 0) + %s,
+        edu_highschool = COALESCE(edu_highschool, 0) + %s,
+        edu_college = COALESCE(edu_college, 0) + %s
+    WHERE id = %s
+"""
+_EDUCATION_COLUMNS = (
+    ("edu_none", "int"),
+    ("edu_highschool", "int"),
+    ("edu_college", "int"),
+    ("id", "int"),
+)
+_EDUCATION_SET_SQL = """
+    UPDATE provinces AS p
+    SET edu_none = COALESCE(p.edu_none, 0) + v.edu_none,
+        edu_highschool = COALESCE(p.edu_highschool, 0) + v.edu_highschool,
+        edu_college = COALESCE(p.edu_college, 0) + v.edu_college
+    FROM {source}
+    WHERE p.id = v.id
+"""
 
-# Toggle noisy per-building revenue logs (default off in production)
-VERBOSE_REVENUE_LOGS = os.getenv("VERBOSE_REVENUE_LOGS") == "1"
 
-from app_core.celery_schedule import CELERY_BEAT_SCHEDULE, TASK_RUN_THRESHOLDS
+def _unnest_source(columns):
+    """``unnest(%s::type[], ...) AS v(names)`` for per-column array params."""
+    return "unnest({}) AS v({})".format(
+        ", ".join(f"%s::{pg_type}[]" for _, pg_type in columns),
+        ", ".join(name for name, _ in columns),
+    )
 
-# Mapping from normalized building names to produced resource names.
-# Used by the global tick economy engine.
-# NOTE: BUILDING_PRODUCTION_RESOURCE_MAP was removed.  These buildings are
-# now handled exclusively by generate_province_revenue() (hourly) which
-# enforces energy, gold upkeep, and input-resource checks.  Having them
-# here too caused DOUBLE production and free resources (steel mills
-# produced steel without consuming coal/iron, etc.).
-BUILDING_PRODUCTION_RESOURCE_MAP = {}
 
+def _as_columns(rows):
+    """Transpose row tuples into per-column lists for unnest() parameters."""
+    return [list(column) for column in zip(*rows)]
 
-redis_url = config.get_redis_url()
-celery = Celery("app", broker=redis_url)
-celery.conf.update(
-    broker_url=redis_url, result_backend=redis_url, CELERY_BROKER_URL=redis_url
-)
 
-celery.conf.update(
-    timezone="UTC",
-    task_serializer="json",
-    accept_content=["json"],
-    result_serializer="json",
-    beat_schedule=CELERY_BEAT_SCHEDULE,
-)
+def _write_rows(db, rows, columns, per_row_sql, set_sql, mode, page_size=100):
+    from psycopg2.extras import execute_batch
 
+    mode = mode or PROVINCE_REVENUE_SQL_MODE
+    if mode == "set":
+        db.execute(
+            set_sql.format(source=_unnest_source(columns)), _as_columns(rows)
+        )
+    elif mode == "batch":
+        execute_batch(db, per_row_sql, rows, page_size=page_size)
+    else:
+        bulk_write(
+            db,
+            set_sql.format(source="{stage} AS v"),
+            rows,
+            columns,
+            per_row_sql,
+            page_size=page_size,
+        )
 
-# Centralized helper for last_run threshold check
-from app_core.game_ticks.common import (
-    should_skip_task,
-    handle_exception,
-    log_verbose,
-    MAX_INT_32,
-)
-from app_core.game_ticks.locks import try_pg_advisory_lock, release_pg_advisory_lock
-from app_core.game_ticks.population import find_unit_category
+
+def write_gold_deductions(db, gold_updates, mode=None):
+    """Apply ``(amount, user_id)`` gold deductions."""
+    _write_rows(db, gold_updates, _GOLD_COLUMNS, _GOLD_SQL, _GOLD_SET_SQL, mode)
+
+
+def write_province_updates(db, province_updates, mode=None):
+    """Apply ``(happiness, ..., pop_elderly, province_id)`` province rows."""
+    try:
+        _write_rows(
+            db,
+            province_updates,
+            _PROVINCES_COLUMNS,
+            _PROVINCES_SQL,
+            _PROVINCES_SET_SQL,
+            mode,
+        )
+    except AttributeError:
+        for params in province_updates:
+            db.execute(_PROVINCES_SQL, params)
+
+
+def write_education_deltas(db, edu_updates, mode=None):
+    """Add ``(edu_none, edu_highschool, edu_college, province_id)`` deltas."""
+    _write_rows(
+        db, edu_updates, _EDUCATION_COLUMNS, _EDUCATION_SQL, _EDUCATION_SET_SQL, mode
+    )
+
+
+_RESOURCE_UPSERT_SQL = """
+    INSERT INTO user_economy (user_id, resource_id, quantity, updated_at)
+    VALUES (%s, %s, %s, now())
+    ON CONFLICT (user_id, resource_id)
+    DO UPDATE SET
+        quantity = GREATEST(0, user_economy.quantity + %s),
+        updated_at = now()
+"""
+
+
+def write_resource_deltas(db, resource_updates, mode=None):
+    """Add ``(user_id, resource_name, delta)`` deltas to user_economy.
+
+    Names missing from resource_dictionary are skipped. Returns the number
+    of user+resource rows written.
+    """
+    from psycopg2.extras import execute_batch
+
+    if not resource_updates:
+        return 0
+    mode = mode or PROVINCE_REVENUE_SQL_MODE
+    if mode == "set":
+        db.execute(
+            _RESOURCE_DELTAS_SQL.format(source=_RESOURCE_NAMES_SOURCE),
+            _as_columns(resource_updates),
+        )
+        return len(resource_updates)
+
+    db.execute(
+        "SELECT name, resource_id FROM resource_dictionary WHERE name = ANY(%s)",
+        (list(set(name for _, name, _ in resource_updates)),),
+    )
+    resource_id_map = dict(db.fetchall())
+    rows = [
+        (user_id, resource_id_map[name], max(0, delta), delta)
+        for user_id, name, delta in resource_updates
+        if name in resource_id_map
+    ]
+    if mode == "batch":
+        if rows:
+            execute_batch(db, _RESOURCE_UPSERT_SQL, rows, page_size=200)
+        return len(rows)
+    return bulk_write(
+        db,
+        _RESOURCE_DELTAS_SQL.format(
+            source="SELECT user_id, resource_id, delta FROM {stage}"
+        ),
+        rows,
+        _RESOURCE_COLUMNS,
+        _RESOURCE_UPSERT_SQL,
+        page_size=200,
+    )
+
+
+# Fan-out: with PROVINCE_REVENUE_SHARDS > 1 the scheduled task claims the
+# run, dispatches one sub-task per shard of provinces (partitioned by owner
+# so a user's resource deltas never straddle shards) and a chord finalizer
+# advances task_runs once every shard has finished.
+PROVINCE_REVENUE_SHARD_LOCK_BASE = 900200
+
+
+def province_revenue_shards():
+    try:
+        return max(1, int(os.getenv("PROVINCE_REVENUE_SHARDS", "1")))
+    except ValueError:
+        return 1
+
+
+def _revenue_cursor_name(shard, shard_count):
+    if shard is None:
+        return "generate_province_revenue"
+    # Keyed on the shard count too, so re-sharding starts fresh cursors
+    # instead of resuming a sweep over a different partition.
+    return f"generate_province_revenue:{shard}/{shard_count}"
+
+
+def claim_province_revenue_run():
+    """Gate a sharded run on the same lock and interval as a single run.
+
+    Returns True when the caller may dispatch the shards. The dispatch is
+    stamped in task_runs so a second dispatcher inside the interval backs
+    off even though last_run only advances in the finalizer.
+    """
+    from database import get_db_connection
+
+    with get_db_connection() as conn:
+        if not try_pg_advisory_lock(conn, 9002, "generate_province_revenue"):
+            return False
+        db = conn.cursor()
+        db.execute(
+            """
+            CREATE TABLE IF NOT EXISTS task_runs (
+                task_name TEXT PRIMARY KEY,
+                last_run TIMESTAMP WITH TIME ZONE
+            )
+        """
+        )
+        for task_name in (
+            "generate_province_revenue",
+            "generate_province_revenue:dispatch",
+        ):
+            db.execute(
+                "INSERT INTO task_runs (task_name, last_run) VALUES (%s, NULL) "
+                "ON CONFLICT DO NOTHING",
+                (task_name,),
+            )
+            db.execute(
+                "SELECT last_run FROM task_runs WHERE task_name=%s FOR UPDATE",
+                (task_name,),
+            )
+            if should_skip_task(db.fetchone(), "generate_province_revenue"):
+                return False
+        db.execute(
+            "UPDATE task_runs SET last_run = now() WHERE task_name = %s",
+            ("generate_province_revenue:dispatch",),
+        )
+        return True
 
 
+def finalize_province_revenue(shard_results):
+    """Chord callback: advance task_runs if any shard committed a chunk."""
+    from database import get_db_connection
 
-def generate_province_revenue():  # Runs each hour
+    if not any(shard_results):
+        print("generate_province_revenue: no shard committed, last_run unchanged")
+        return False
+    with get_db_connection() as conn:
+        db = conn.cursor()
+        db.execute(
+            "UPDATE task_runs SET last_run = now() WHERE task_name = %s",
+            ("generate_province_revenue",),
+        )
+    return True
+
+
+def generate_province_revenue(shard=None, shard_count=1):  # Runs each hour
+    """Produce one hour of province revenue.
+
+    With ``shard`` set, only provinces whose owner falls in that shard
+    (``userId mod shard_count``) are processed, under a per-shard lock and
+    cursor; task_runs is then left to ``finalize_province_revenue``.
+    Returns True if any chunk was committed.
+    """
     from database import get_db_connection, rollback_db_cursor
-    from psycopg2.extras import RealDictCursor, execute_batch
+    from psycopg2.extras import RealDictCursor
 
     start_time = time.perf_counter()
     processed = 0
     skipped_for_lock = False
+    any_chunk_committed = False
+    sharded = shard is not None
+    lock_id = PROVINCE_REVENUE_SHARD_LOCK_BASE + shard if sharded else 9002
+    cursor_name = _revenue_cursor_name(shard, shard_count)
+    shard_filter = " AND mod(p.userId, %s) = %s" if sharded else ""
+    shard_params = (shard_count, shard) if sharded else ()
 
     with get_db_connection() as conn:
-        if not try_pg_advisory_lock(conn, 9002, "generate_province_revenue"):
+        if not try_pg_advisory_lock(conn, lock_id, cursor_name):
             skipped_for_lock = True
-            return
+            return False
         db = conn.cursor()
         # Ensure single run within a short window to prevent duplicate hourly updates
         db.execute(
@@ -84,50 +392,31 @@ def generate_province_revenue():  # Runs each hour
             "ON CONFLICT DO NOTHING",
             ("generate_province_revenue",),
         )
-        db.execute(
-            "SELECT last_run FROM task_runs WHERE task_name=%s FOR UPDATE",
-            ("generate_province_revenue",),
-        )
-        row = db.fetchone()
-        if should_skip_task(row, "generate_province_revenue"):
-            try:
-                release_pg_advisory_lock(conn, 9002)
-            except Exception:
-                pass
-            return
+        # Shards were already gated by claim_province_revenue_run; taking the
+        # row lock here would serialise them behind each other.
+        if not sharded:
+            db.execute(
+                "SELECT last_run FROM task_runs WHERE task_name=%s FOR UPDATE",
+                ("generate_province_revenue",),
+            )
+            row = db.fetchone()
+            if should_skip_task(row, "generate_province_revenue"):
+                try:
+                    release_pg_advisory_lock(conn, lock_id)
+                except Exception:
+                    pass
+                return False
 
         # Do not commit last_run here — wait until resource/province writes
         # succeed so task_runs does not advance when economy rows are unchanged.
         dbdict = conn.cursor(cursor_factory=RealDictCursor)
 
-        columns = variables.BUILDINGS
-
-        province_resources = [
-            "energy",
-            "population",
-            "happiness",
-            "pollution",
-            "productivity",
-            "consumer_spending",
-        ]
-        percentage_based = [
-            "happiness",
-            "productivity",
-            "consumer_spending",
-            "pollution",
-        ]
-
-        energy_consumers = variables.ENERGY_CONSUMERS
-        user_resources = variables.RESOURCES
-        infra = variables.NEW_INFRA
-
         max_chunks = int(os.getenv("PROVINCE_REVENUE_CHUNKS_PER_RUN", "50"))
         chunk_size = int(os.getenv("PROVINCE_REVENUE_CHUNK_SIZE", "500"))
         revenue_deadline = start_time + float(
             os.getenv("PROVINCE_REVENUE_TIME_BUDGET_SEC", "270")
         )
         chunks_completed = 0
-        any_chunk_committed = False
 
         db.execute(
             "CREATE TABLE IF NOT EXISTS task_cursors ("
@@ -136,7 +425,7 @@ def generate_province_revenue():  # Runs each hour
         db.execute(
             "INSERT INTO task_cursors (task_name, last_id) "
             "VALUES (%s, %s) ON CONFLICT DO NOTHING",
-            ("generate_province_revenue", 0),
+            (cursor_name, 0),
         )
 
         while chunks_completed < max_chunks and time.perf_counter() < revenue_deadline:
@@ -144,15 +433,15 @@ def generate_province_revenue():  # Runs each hour
             try:
                 db.execute(
                     "SELECT last_id FROM task_cursors WHERE task_name=%s",
-                    ("generate_province_revenue",),
+                    (cursor_name,),
                 )
                 last_row = db.fetchone()
                 last_proc = last_row[0] if last_row and last_row[0] is not None else 0
                 db.execute(
                     "SELECT p.id, p.userId, p.land, p.productivity "
                     "FROM provinces p "
-                    "WHERE p.id > %s ORDER BY p.id ASC LIMIT %s",
-                    (last_proc, chunk_size),
+                    "WHERE p.id > %s" + shard_filter + " ORDER BY p.id ASC LIMIT %s",
+                    (last_proc, *shard_params, chunk_size),
                 )
                 infra_ids = db.fetchall()
                 if not infra_ids:
@@ -161,7 +450,7 @@ def generate_province_revenue():  # Runs each hour
                     # multiple times within a single hourly tick.
                     db.execute(
                         "UPDATE task_cursors SET last_id=0 WHERE task_name=%s",
-                        ("generate_province_revenue",),
+                        (cursor_name,),
                     )
                     try:
                         conn.commit()
@@ -186,37 +475,15 @@ def generate_province_revenue():  # Runs each hour
                     return default
 
             # ============ BULK PRELOAD DATA TO ELIMINATE N+1 QUERIES ============
+            phase_start = time.perf_counter()
+            chunk_rows = {}
             # Get all unique user_ids and province_ids
             all_user_ids = list(set(row[1] for row in infra_ids))
             all_province_ids = [row[0] for row in infra_ids]
 
             # Preload all upgrades for all users at once (instead of per-user calls)
-            legacy_upgrade_to_tech = {
-                "betterengineering": "better_engineering",
-                "cheapermaterials": "cheaper_materials",
-                "onlineshopping": "online_shopping",
-                "governmentregulation": "government_regulation",
-                "nationalhealthinstitution": "national_health_institution",
-                "highspeedrail": "high_speed_rail",
-                "advancedmachinery": "advanced_machinery",
-                "strongerexplosives": "stronger_explosives",
-                "widespreadpropaganda": "widespread_propaganda",
-                "increasedfunding": "increased_funding",
-                "automationintegration": "automation_integration",
-                "largerforges": "larger_forges",
-                "lootingteams": "looting_teams",
-                "organizedsupplylines": "organized_supply_lines",
-                "largestorehouses": "large_storehouses",
-                "ballisticmissilesilo": "ballistic_missile_silo",
-                "icbmsilo": "icbm_silo",
-                "nucleartestingfacility": "nuclear_testing_facility",
-                "integratedsteelmaking": "integrated_steelmaking",
-                "electricarcfurnace": "electric_arc_furnace",
-            }
-            tech_to_legacy = {v: k for k, v in legacy_upgrade_to_tech.items()}
-
             upgrades_map = {
-                uid: {k: False for k in legacy_upgrade_to_tech.keys()}
+                uid: {k: False for k in LEGACY_UPGRADE_TO_TECH}
                 for uid in all_user_ids
             }
             if all_user_ids:
@@ -232,7 +499,7 @@ def generate_province_revenue():  # Runs each hour
                 for row in dbdict.fetchall():
                     user_id = _row_get(row, "user_id", 0)
                     tech_name = _row_get(row, "name", 1)
-                    legacy_key = tech_to_legacy.get(tech_name)
+                    legacy_key = TECH_TO_LEGACY.get(tech_name)
                     if legacy_key and user_id in upgrades_map:
                         upgrades_map[user_id][legacy_key] = True
 
@@ -362,6 +629,10 @@ def generate_province_revenue():  # Runs each hour
                             "pop_elderly": 0,
                         }
 
+            now = time.perf_counter()
+            metrics.observe_phase(_METRICS_TASK, "preload", now - phase_start)
+            phase_start = now
+
             # PHASE 3: Pre-calculate workforce debuffs for all users once
             # (before processing provinces) using bulk-loaded data only.
             workforce_debuffs = {}
@@ -410,73 +681,11 @@ def generate_province_revenue():  # Runs each hour
                         user_building_counts[uid] = {}
                     user_building_counts[uid][row["name"]] = int(row["count"] or 0)
 
-                building_matrices = variables.BUILDING_EMPLOYMENT_MATRICES
                 for uid in all_user_ids:
                     try:
-                        demo = workforce_demo.get(
-                            uid,
-                            {
-                                "total_pop_working": 0,
-                                "total_pop_elderly": 0,
-                                "edu_none": 0,
-                                "edu_highschool": 0,
-                                "edu_college": 0,
-                            },
-                        )
-
-                        jobs_available = (
-                            demo["edu_none"] + demo["edu_highschool"] + demo["edu_college"]
+                        workforce_debuffs[uid] = workforce_debuff(
+                            workforce_demo.get(uid), user_building_counts.get(uid)
                         )
-                        total_pop_working = demo["total_pop_working"]
-                        total_pop_elderly = demo["total_pop_elderly"]
-
-                        building_counts = user_building_counts.get(uid, {})
-                        jobs_needed = 0
-                        for building_name, matrix_data in building_matrices.items():
-                            workers_per = matrix_data.get("worker_count", 0)
-                            jobs_needed += workers_per * building_counts.get(
-                                building_name, 0
-                            )
-
-                        unemployment_rate = 0.0
-                        pension_ratio = 0.0
-                        if total_pop_working > 0:
-                            unemployment_rate = max(
-                                0.0, 1.0 - (jobs_available / total_pop_working)
-                            )
-                            pension_ratio = total_pop_elderly / total_pop_working
-
-                        if jobs_needed > 0:
-                            employment_ratio = jobs_available / jobs_needed
-                            # Clamp: workforce shortage floors at PRODUCTION_EFFICIENCY_MIN;
-                            # workforce surplus does NOT boost production above 1.0.
-                            efficiency_multiplier = min(
-                                1.0,
-                                max(
-                                    variables.PRODUCTION_EFFICIENCY_MIN,
-                                    employment_ratio,
-                                ),
-                            )
-                        else:
-                            efficiency_multiplier = 1.0
-
-                        happiness_penalty = 0
-                        gold_penalty = 0
-                        if unemployment_rate > variables.UNEMPLOYMENT_THRESHOLD:
-                            happiness_penalty = variables.UNEMPLOYMENT_HAPPINESS_PENALTY
-                        if pension_ratio > variables.PENSION_CRISIS_RATIO:
-                            gold_penalty = variables.PENSION_CRISIS_GOLD_PENALTY
-
-                        debuff_report = {
-                            "jobs_needed": int(jobs_needed),
-                            "jobs_available": int(jobs_available),
-                            "unemployment_rate": float(unemployment_rate),
-                            "pension_ratio": float(pension_ratio),
-                            "efficiency_multiplier": float(efficiency_multiplier),
-                            "happiness_penalty": int(happiness_penalty),
-                            "gold_penalty": int(gold_penalty),
-                        }
-                        workforce_debuffs[uid] = debuff_report
                     except Exception as e:
                         log_verbose(
                             f"apply_workforce_hiring_and_debuffs failed "
@@ -584,431 +793,62 @@ def generate_province_revenue():  # Runs each hour
                             f" {province_id}: {e}"
                         )
 
-                # Initialize tracking for this user
-                if user_id not in gold_deductions:
-                    gold_deductions[user_id] = 0
-
-                # Use preloaded upgrades instead of per-loop query
-                upgrades = upgrades_map.get(user_id, {})
-
-                # Use preloaded policies instead of per-loop query
-                policies = policies_map.get(user_id, [])
-                if policies is None:
-                    policies = []
-
-                # Use preloaded buildings for THIS PROVINCE (not user-level)
-                # Each province has its own set of buildings
-                province_buildings = buildings_map.get(province_id, {})
-                units = {}
-                for col in columns:
-                    # Map column names directly to building names (they match)
-                    units[col] = province_buildings.get(col, 0)
-
-                for unit in columns:
-                    unit_amount = units[unit]
-
-                    if unit_amount == 0:
-                        continue
-
-                    unit_category = find_unit_category(unit)
-                    try:
-                        # IMPORTANT: copy dicts so we don't mutate the module-level
-                        # variables.NEW_INFRA constants.  Upgrades/policies modify
-                        # these dicts in-place (e.g. eff["happiness"] *= 1.3) and
-                        # without copies the values compound across iterations and
-                        # across task runs, eventually producing astronomically wrong
-                        # production/effect values.
-                        effminus = dict(infra[unit].get("effminus", {}))
-                        minus = dict(infra[unit].get("minus", {}))
-                        operating_costs = infra[unit]["money"] * unit_amount
-                        plus_amount = 0
-                        plus_amount_multiplier = 1
-
-                        # Apply productivity multiplier: 0.9% per productivity point
-                        # At 50% productivity (neutral): 1.0x multiplier
-                        # At 100% productivity: 1.45x multiplier (50 * 0.9% = 45%)
-                        # At 0% productivity: 0.55x multiplier (-50 * 0.9% = -45%)
-                        if productivity is not None:
-                            productivity_multiplier = 1 + (
-                                (productivity - 50)
-                                * variables.DEFAULT_PRODUCTIVITY_PRODUCTION_MULTIPLIER
-                            )
-                            plus_amount_multiplier *= productivity_multiplier
-
-                        # CHEAPER MATERIALS
-                        if unit_category == "industry" and upgrades.get("cheapermaterials"):
-                            operating_costs *= 0.8
-                        # ONLINE SHOPPING
-                        if unit == "malls" and upgrades.get("onlineshopping"):
-                            operating_costs *= 0.7
-
-                        # INDUSTRIAL SUBSIDIES POLICY
-                        if (
-                            variables.POLICY_INDUSTRIAL_SUBSIDIES in policies
-                            and unit in variables.POLICY_SUBSIDIES_AFFECTED_BUILDINGS
-                        ):
-                            operating_costs *= variables.POLICY_SUBSIDIES_UPKEEP_REDUCTION
-
-                        # Use preloaded gold and track deductions
-                        # (instead of per-building SELECT+UPDATE)
-                        current_money = stats_map.get(user_id, 0) - gold_deductions.get(
-                            user_id, 0
-                        )
-
-                        operating_costs = int(operating_costs)
-
-                        # How many of this province's `unit_amount` buildings can
-                        # actually afford to run this tick. Partial, not
-                        # all-or-nothing: if there's only enough uranium for 7 of
-                        # your 10 nuclear reactors, 7 run and produce/consume
-                        # normally, 3 sit idle -- rather than every single one
-                        # producing nothing because the fleet as a whole came up
-                        # short (player-reported real problem: scaling up a
-                        # building type made an existing shortfall affect 100% of
-                        # output instead of the unaffordable fraction).
-                        affordable_units = unit_amount
-                        has_enough_stuff = {"status": True, "issues": []}
-
-                        # Pending state — only committed to gold_deductions,
-                        # provinces_data energy, and resource_deltas AFTER
-                        # affordable_units is finalized, scaled to that count
-                        # (not the full unit_amount). Prior versions applied
-                        # upkeep before checking energy/resources, so failed
-                        # buildings still drained gold and could bankrupt idle
-                        # nations (e.g. when a power grid collapse zeroed energy)
-                        # -- still true here, just per-unit instead of per-type.
-                        pending_gold_cost = 0
-                        pending_energy_delta = 0
-                        pending_resource_deltas_local = {}
-
-                        cost_per_unit = operating_costs / unit_amount
-                        if cost_per_unit > 0:
-                            affordable_units = min(
-                                affordable_units, int(current_money // cost_per_unit)
-                            )
-                            if affordable_units < unit_amount:
-                                has_enough_stuff["issues"].append("money")
-
-                        # Use tracked energy in provinces_data instead of
-                        # per-building SELECT
-                        energy_per_unit = 0
-                        if unit in energy_consumers:
-                            energy_per_unit = 1  # Each unit consumes 1 energy
-                        elif unit == "steel_mills" and upgrades.get("electricarcfurnace"):
-                            energy_per_unit = 2  # EAF consumes 2 energy per mill
-
-                        if energy_per_unit:
-                            prov_data = provinces_data.get(province_id, {})
-                            current_energy = prov_data.get("energy", 0)
-                            affordable_by_energy = int(current_energy // energy_per_unit)
-                            if affordable_by_energy < affordable_units:
-                                has_enough_stuff["issues"].append("energy")
-                            affordable_units = min(affordable_units, affordable_by_energy)
-
-                        # Use preloaded resources instead of per-building queries
-                        resources = resources_map.get(user_id, {})
-                        # Resources is now a dict of resource_name -> quantity
-                        # (no fallback query needed, all loaded upfront)
-
-                        # Per-unit resource cost, after unit-specific multipliers
-                        # (computed once against a single unit, independent of
-                        # unit_amount, so it can be scaled by affordable_units
-                        # below once every resource's ceiling is known).
-                        per_unit_minus = {}
-                        for resource, base_amount in minus.items():
-                            amount_per_unit = base_amount
-
-                            # AUTOMATION INTEGRATION
-                            if unit == "component_factories" and upgrades.get(
-                                "automationintegration"
-                            ):
-                                amount_per_unit *= 0.75
-                            # LARGER FORGES
-                            if unit == "steel_mills" and upgrades.get("largerforges"):
-                                amount_per_unit *= 0.7
-
-                            # INTEGRATED STEELMAKING
-                            if unit == "steel_mills" and upgrades.get("integratedsteelmaking"):
-                                amount_per_unit *= 1.36
-
-                            # ELECTRIC ARC FURNACE
-                            if unit == "steel_mills" and upgrades.get("electricarcfurnace"):
-                                amount_per_unit *= 0.5
-
-                            per_unit_minus[resource] = amount_per_unit
-
-                            if amount_per_unit <= 0:
-                                continue
-
-                            current_resource = resources.get(resource, 0)
-                            # Account for any pending deltas in this run
-                            pending_delta = resource_deltas.get(user_id, {}).get(
-                                resource, 0
-                            )
-                            effective_current = current_resource + pending_delta
-
-                            affordable_by_resource = int(
-                                effective_current // amount_per_unit
-                            )
-                            if affordable_by_resource < affordable_units:
-                                has_enough_stuff["issues"].append(resource)
-                            affordable_units = min(affordable_units, affordable_by_resource)
-
-                        affordable_units = max(0, affordable_units)
-                        has_enough_stuff["status"] = affordable_units > 0
-
-                        if not has_enough_stuff["status"]:
-                            issues_str = ", ".join(has_enough_stuff["issues"])
-                            log_verbose(
-                                "F | USER: %s | PROVINCE: %s | %s (%s) | Not enough %s"
-                                % (user_id, province_id, unit, unit_amount, issues_str)
-                            )
-                            continue
-
-                        if affordable_units < unit_amount:
-                            issues_str = ", ".join(has_enough_stuff["issues"])
-                            log_verbose(
-                                "P | USER: %s | PROVINCE: %s | %s (%s/%s) | "
-                                "Partial -- short on %s"
-                                % (
-                                    user_id,
-                                    province_id,
-                                    unit,
-                                    affordable_units,
-                                    unit_amount,
-                                    issues_str,
-                                )
-                            )
-
-                        # Scale pending state to how many units actually run,
-                        # then commit.
-                        if cost_per_unit > 0:
-                            pending_gold_cost = int(round(cost_per_unit * affordable_units))
-                        if energy_per_unit:
-                            pending_energy_delta = -(energy_per_unit * affordable_units)
-                        for resource, amount_per_unit in per_unit_minus.items():
-                            if amount_per_unit <= 0:
-                                continue
-                            pending_resource_deltas_local[resource] = (
-                                pending_resource_deltas_local.get(resource, 0)
-                                - amount_per_unit * affordable_units
-                            )
-
-                        if pending_gold_cost:
-                            gold_deductions[user_id] = (
-                                gold_deductions.get(user_id, 0) + pending_gold_cost
-                            )
-                        if pending_energy_delta and province_id in provinces_data:
-                            provinces_data[province_id]["energy"] = (
-                                provinces_data[province_id].get("energy", 0)
-                                + pending_energy_delta
-                            )
-                        if pending_resource_deltas_local:
-                            if user_id not in resource_deltas:
-                                resource_deltas[user_id] = {}
-                            for res_name, delta in pending_resource_deltas_local.items():
-                                resource_deltas[user_id][res_name] = (
-                                    resource_deltas[user_id].get(res_name, 0) + delta
-                                )
-                                log_verbose(
-                                    "S | MINUS | USER: %s | PROVINCE: %s | %s (%s) | "
-                                    "%s delta=%s"
-                                    % (
-                                        user_id,
-                                        province_id,
-                                        unit,
-                                        affordable_units,
-                                        res_name,
-                                        delta,
-                                    )
-                                )
-
-                        plus = dict(infra[unit].get("plus", {}))
-
-                        # BETTER ENGINEERING
-                        if unit == "nuclear_reactors" and upgrades.get("betterengineering"):
-                            plus["energy"] += 6
-
-                        eff = dict(infra[unit].get("eff", {}))
-
-                        if unit == "universities" and 3 in policies:
-                            eff["productivity"] *= 1.10
-                            eff["happiness"] *= 1.10
-
-                        if unit == "hospitals":
-                            if upgrades.get("nationalhealthinstitution"):
-                                eff["happiness"] *= 1.3
-                                eff["happiness"] = int(eff["happiness"])
-
-                        if unit == "monorails":
-                            if upgrades.get("highspeedrail"):
-                                eff["productivity"] *= 1.2
-                                eff["productivity"] = int(eff["productivity"])
-
-                        """
-                        print(f"Unit: {unit}")
-                        print(f"Add {plus_amount} to {plus_resource}")
-                        print(f"Remove ${operating_costs} as operating costs")
-                        print(f"\n")
-                        """
-                        if unit == "bauxite_mines" and upgrades.get("strongerexplosives"):
-                            # TODO: fix this plus_amount variable
-                            plus_amount_multiplier += 0.45
-
-                        if unit == "farms":
-                            if upgrades.get("advancedmachinery"):
-                                plus_amount_multiplier += 0.5
-
-                            plus_amount += int(
-                                land * variables.LAND_FARM_PRODUCTION_ADDITION
-                            )
-                            
-                        if unit == "steel_mills":
-                            if upgrades.get("integratedsteelmaking"):
-                                plus_amount_multiplier += 0.36
-
-                        # PHASE 3: Apply workforce efficiency multiplier
-                        # (reduces production if understaffed)
-                        debuff_info = workforce_debuffs.get(
-                            user_id, {"efficiency_multiplier": 1.0}
-                        )
-                        plus_amount_multiplier *= debuff_info.get(
+            # Run every building in the chunk through the shared economy
+            # kernel (app_core.economy.kernel) -- the same rules
+            # countries.get_revenue projects with.  It only works on copies;
+            # results are folded back into the batch-write buffers below.
+            try:
+                economy = compute_chunk(
+                    infra_ids,
+                    buildings_map,
+                    stats_map,
+                    resources_map,
+                    {
+                        uid: upgrades_mask(upgrades_map.get(uid))
+                        for uid in all_user_ids
+                    },
+                    {
+                        uid: policies_mask(policies_map.get(uid))
+                        for uid in all_user_ids
+                    },
+                    {
+                        uid: workforce_debuffs.get(uid, {}).get(
                             "efficiency_multiplier", 1.0
                         )
-
-                        # Function for _plus
-                        for resource, amount in plus.items():
-                            amount *= affordable_units
-                            amount += plus_amount
-                            amount *= plus_amount_multiplier
-                            # Normalize production to integer units so we don't
-                            # persist fractional resources (e.g., 0.5 rations).
-                            # Use ceil to avoid losing tiny outputs.
-                            amount = math.ceil(amount)
-                            if resource in province_resources:
-                                # Use preloaded province data instead of per-building SELECT
-                                prov_data = provinces_data.get(province_id, {})
-                                current_plus_resource = prov_data.get(resource, 0)
-
-                                # Adding resource
-                                new_resource_number = current_plus_resource + amount
-
-                                if (
-                                    resource in percentage_based
-                                    and new_resource_number > 100
-                                ):
-                                    new_resource_number = 100
-                                if new_resource_number < 0:
-                                    new_resource_number = 0
-
-                                # Update local cache for batch write later
-                                if province_id in provinces_data:
-                                    provinces_data[province_id][
-                                        resource
-                                    ] = new_resource_number
-                                msg = (
-                                    f"S | PLUS | U:{user_id} | P:{province_id} | {unit} "
-                                    f"({unit_amount}) | ADDING | {resource} | {amount}"
-                                )
-                                log_verbose(msg)
-
-                            elif resource in user_resources:
-                                # Track delta for atomic batch update
-                                if user_id not in resource_deltas:
-                                    resource_deltas[user_id] = {}
-                                resource_deltas[user_id][resource] = (
-                                    resource_deltas[user_id].get(resource, 0) + amount
-                                )
-                                msg = (
-                                    f"S | PLUS | U:{user_id} | P:{province_id} | "
-                                    f"{unit} ({unit_amount}) | {resource} | +{amount}"
-                                )
-                                log_verbose(msg)
-
-                        # Function for completing an effect (adding pollution, etc)
-                        def do_effect(
-                            eff_name,
-                            eff_amount,
-                            sign,
-                            province_id=province_id,
-                            unit_category=unit_category,
-                            upgrades=upgrades,
-                            unit=unit,
-                            policies=policies,
-                            percentage_based=percentage_based,
-                        ):
-                            # Use preloaded province data instead of per-building SELECT
-                            prov_data = provinces_data.get(province_id, {})
-                            current_effect = prov_data.get(eff_name, 0)
-
-                            # GOVERNMENT REGULATION
-                            if (
-                                unit_category == "retail"
-                                and upgrades.get("governmentregulation")
-                                and eff_name == "pollution"
-                                and sign == "+"
-                            ):
-                                eff_amount *= 0.75
-
-                            # INDUSTRIAL SUBSIDIES POLICY
-                            if (
-                                variables.POLICY_INDUSTRIAL_SUBSIDIES in policies
-                                and unit in variables.POLICY_SUBSIDIES_AFFECTED_BUILDINGS
-                                and eff_name == "pollution"
-                                and sign == "+"
-                            ):
-                                eff_amount *= (
-                                    variables.POLICY_SUBSIDIES_POLLUTION_MULTIPLIER
-                                )
-
-                            # Round effect amounts to nearest integer instead of always
-                            # rounding up. Using `round` prevents an upward bias when
-                            # fractional multipliers (such as government regulation) are
-                            # applied which could otherwise cause small fractional
-                            # reductions to become full +1 increases via `ceil`, leading
-                            # to oscillation near high pollution values.
-                            eff_amount = int(round(eff_amount))
-
-                            if sign == "+":
-                                new_effect = current_effect + eff_amount
-                            elif sign == "-":
-                                new_effect = current_effect - eff_amount
-
-                            if eff_name in percentage_based:
-                                if new_effect > 100:
-                                    new_effect = 100
-                                if new_effect < 0:
-                                    new_effect = 0
-                            else:
-                                if new_effect < 0:
-                                    new_effect = 0
-
-                            # Update local cache for batch write later
-                            if province_id in provinces_data:
-                                provinces_data[province_id][eff_name] = new_effect
-
-                        for effect, amount in eff.items():
-                            amount *= affordable_units
-                            do_effect(effect, amount, "+")
-
-                        for effect, amount in effminus.items():
-                            amount *= affordable_units
-                            do_effect(effect, amount, "-")
-
-                    except Exception as e:
-                        # The building processing loop only modifies in-memory
-                        # dicts (resource_deltas, provinces_data, gold_deductions).
-                        # A conn.rollback() here was harmful: it rolled back
-                        # earlier DB writes (like user_economy row ensures) and
-                        # could leave the connection in a bad state for subsequent
-                        # batch writes.  Just log the error and continue.
-                        print(
-                            f"ERROR processing building {unit} province "
-                            f"{province_id} user {user_id}: {e}"
+                        for uid in all_user_ids
+                    },
+                    provinces_data,
+                )
+            except Exception as e:
+                print(f"ERROR computing province economy for chunk: {e}")
+                handle_exception(e)
+                economy = None
+
+            if economy is not None:
+                for province_id, state in economy.provinces.items():
+                    if province_id in provinces_data:
+                        for field in STATE_FIELDS:
+                            provinces_data[province_id][field] = state[field]
+                gold_deductions.update(economy.gold_costs)
+                for user_id, deltas in economy.resource_deltas.items():
+                    resource_deltas.setdefault(user_id, {}).update(deltas)
+                for user_id, province_id, unit, ran, owned, issues in (
+                    economy.shortfalls
+                ):
+                    if ran == 0:
+                        log_verbose(
+                            "F | USER: %s | PROVINCE: %s | %s (%s) | Not enough %s"
+                            % (user_id, province_id, unit, owned, ", ".join(issues))
+                        )
+                    else:
+                        log_verbose(
+                            "P | USER: %s | PROVINCE: %s | %s (%s/%s) | "
+                            "Partial -- short on %s"
+                            % (user_id, province_id, unit, ran, owned, ", ".join(issues))
                         )
-                        handle_exception(e)
-                        continue
 
+            for province_id, user_id, _, _ in infra_ids:
+                upgrades = upgrades_map.get(user_id, {})
                 # PHASE 3: Track happiness penalty from unemployment debuff
                 # (to apply after batch writes)
                 debuff_info = workforce_debuffs.get(user_id, {"happiness_penalty": 0})
@@ -1076,6 +916,10 @@ def generate_province_revenue():  # Runs each hour
                             provinces_data[province_id]["happiness"] = new_hap
 
             # ============ BATCH WRITE ALL ACCUMULATED CHANGES ============
+            now = time.perf_counter()
+            metrics.observe_phase(_METRICS_TASK, "compute", now - phase_start)
+            phase_start = now
+
             # PHASE 3: Apply pension crisis gold penalties
             pension_penalties = {}  # user_id -> penalty_amount
             if variables.FEATURE_PHASE3_WORKFORCE:
@@ -1096,12 +940,8 @@ def generate_province_revenue():  # Runs each hour
                         if amount > 0
                     ]
                     if gold_updates:
-                        execute_batch(
-                            db,
-                            "UPDATE stats SET gold = GREATEST(gold - %s, 0) WHERE id = %s",
-                            gold_updates,
-                            page_size=100,
-                        )
+                        write_gold_deductions(db, gold_updates)
+                        chunk_rows["stats"] = len(gold_updates)
                         log_verbose(f"Batch updated gold for {len(gold_updates)} users")
                         if pension_penalties:
                             log_verbose(
@@ -1163,43 +1003,8 @@ def generate_province_revenue():  # Runs each hour
                             )
                         )
                     if province_updates:
-                        try:
-                            execute_batch(
-                                db,
-                                """
-                                UPDATE provinces SET
-                                    happiness = %s,
-                                    productivity = %s,
-                                    pollution = %s,
-                                    consumer_spending = %s,
-                                    energy = %s,
-                                    population = %s,
-                                    pop_children = %s,
-                                    pop_working = %s,
-                                    pop_elderly = %s
-                                WHERE id = %s
-                            """,
-                                province_updates,
-                                page_size=100,
-                            )
-                        except AttributeError:
-                            for params in province_updates:
-                                db.execute(
-                                    """
-                                    UPDATE provinces SET
-                                        happiness = %s,
-                                        productivity = %s,
-                                        pollution = %s,
-                                        consumer_spending = %s,
-                                        energy = %s,
-                                        population = %s,
-                                        pop_children = %s,
-                                        pop_working = %s,
-                                        pop_elderly = %s
-                                    WHERE id = %s
-                                """,
-                                    params,
-                                )
+                        write_province_updates(db, province_updates)
+                        chunk_rows["provinces"] = len(province_updates)
                         log_verbose(f"Batch updated {len(province_updates)} provinces")
             except Exception as e:
                 conn.rollback()
@@ -1226,57 +1031,25 @@ def generate_province_revenue():  # Runs each hour
                                         (user_id, resource_name, delta)
                                     )
 
+                        written_pairs = write_resource_deltas(db, resource_updates)
+                        chunk_rows["user_economy"] = written_pairs
+                        written_users = set(r[0] for r in resource_updates)
                         if resource_updates:
-                            resource_names = list(set(r[1] for r in resource_updates))
-                            dbdict.execute(
-                                "SELECT name, resource_id FROM resource_dictionary "
-                                "WHERE name = ANY(%s)",
-                                (resource_names,),
+                            log_verbose(
+                                f"Upserted resources for {written_pairs} "
+                                "user+resource pairs"
                             )
-                            resource_id_map = {
-                                row["name"]: row["resource_id"]
-                                for row in dbdict.fetchall()
-                            }
 
-                            batch_values = [
-                                (uid, resource_id_map[rname], max(0, delta), delta)
-                                for uid, rname, delta in resource_updates
-                                if rname in resource_id_map
-                            ]
-
-                            if batch_values:
-                                execute_batch(
-                                    db,
-                                    """
-                                    INSERT INTO user_economy
-                                        (user_id, resource_id, quantity, updated_at)
-                                    VALUES (%s, %s, %s, now())
-                                    ON CONFLICT (user_id, resource_id)
-                                    DO UPDATE SET
-                                        quantity = GREATEST(
-                                            0, user_economy.quantity + %s
-                                        ),
-                                        updated_at = now()
-                                    """,
-                                    batch_values,
-                                    page_size=200,
-                                )
-                                log_verbose(
-                                    f"Upserted resources for {len(batch_values)} "
-                                    "user+resource pairs"
-                                )
+                            try:
+                                from database import invalidate_user_cache
 
-                                try:
-                                    from database import invalidate_user_cache
-
-                                    unique_users = set(bv[0] for bv in batch_values)
-                                    for user_id in unique_users:
-                                        try:
-                                            invalidate_user_cache(user_id)
-                                        except Exception:
-                                            pass
-                                except Exception:
-                                    pass
+                                for user_id in written_users:
+                                    try:
+                                        invalidate_user_cache(user_id)
+                                    except Exception:
+                                        pass
+                            except Exception:
+                                pass
                 except Exception as e:
                     conn.rollback()
                     revenue_write_failed = True
@@ -1303,18 +1076,8 @@ def generate_province_revenue():  # Runs each hour
                     if edu_updates:
                         db.execute("SAVEPOINT revenue_education_batch")
                         try:
-                            execute_batch(
-                                db,
-                                """
-                                UPDATE provinces
-                                SET edu_none = COALESCE(edu_none, 0) + %s,
-                                    edu_highschool = COALESCE(edu_highschool, 0) + %s,
-                                    edu_college = COALESCE(edu_college, 0) + %s
-                                WHERE id = %s
-                                """,
-                                edu_updates,
-                                page_size=100,
-                            )
+                            write_education_deltas(db, edu_updates)
+                            chunk_rows["provinces_education"] = len(edu_updates)
                         except Exception as edu_err:
                             db.execute("ROLLBACK TO SAVEPOINT revenue_education_batch")
                             handle_exception(edu_err)
@@ -1343,19 +1106,25 @@ def generate_province_revenue():  # Runs each hour
                 handle_exception(commit_err, "generate_province_revenue")
                 committed = False
 
+            metrics.observe_phase(
+                _METRICS_TASK, "write", time.perf_counter() - phase_start
+            )
             if committed:
                 any_chunk_committed = True
+                for table, n in chunk_rows.items():
+                    metrics.count_rows(_METRICS_TASK, table, n)
                 try:
                     if all_province_ids:
                         last_processed_pid = max(all_province_ids)
                         db.execute(
                             "UPDATE task_cursors SET last_id=%s WHERE task_name=%s",
-                            (last_processed_pid, "generate_province_revenue"),
+                            (last_processed_pid, cursor_name),
                         )
                         conn.commit()
                 except Exception as e:
                     print(f"Failed to update task cursor: {e}")
             chunks_completed += 1
+            metrics.count_chunk(_METRICS_TASK)
             if revenue_write_failed:
                 break
 
@@ -1363,16 +1132,16 @@ def generate_province_revenue():  # Runs each hour
         try:
             from helpers import record_task_metric
 
-            record_task_metric("generate_province_revenue", duration)
+            record_task_metric(cursor_name, duration)
         except Exception:
             pass
 
         print(
-            f"generate_province_revenue: processed {processed} provinces in "
+            f"{cursor_name}: processed {processed} provinces in "
             f"{duration:.2f}s chunks={chunks_completed} (skipped={skipped_for_lock})"
         )
 
-        if any_chunk_committed:
+        if any_chunk_committed and not sharded:
             try:
                 db.execute(
                     "UPDATE task_runs SET last_run = now() WHERE task_name = %s",
@@ -1383,8 +1152,10 @@ def generate_province_revenue():  # Runs each hour
                 handle_exception(e, "generate_province_revenue")
 
         try:
-            release_pg_advisory_lock(conn, 9002)
+            release_pg_advisory_lock(conn, lock_id)
         except Exception:
             pass
 
+    return any_chunk_committed
+
 
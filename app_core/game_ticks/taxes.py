@@ -1,52 +1,11 @@
-from celery import Celery
 import psycopg2
 import os
 import time
-import logging
-from dotenv import load_dotenv
-from attack_scripts import Economy
 import math
-from celery.schedules import crontab
 import variables
-import redis
 
-logger = logging.getLogger(__name__)
-
-load_dotenv()
-import config  # Parse Railway environment variables  # noqa: E402
-
-# Toggle noisy per-building revenue logs (default off in production)
-VERBOSE_REVENUE_LOGS = os.getenv("VERBOSE_REVENUE_LOGS") == "1"
-
-from app_core.celery_schedule import CELERY_BEAT_SCHEDULE, TASK_RUN_THRESHOLDS
-
-# Mapping from normalized building names to produced resource names.
-# Used by the global tick economy engine.
-# NOTE: BUILDING_PRODUCTION_RESOURCE_MAP was removed.  These buildings are
-# now handled exclusively by generate_province_revenue() (hourly) which
-# enforces energy, gold upkeep, and input-resource checks.  Having them
-# here too caused DOUBLE production and free resources (steel mills
-# produced steel without consuming coal/iron, etc.).
-BUILDING_PRODUCTION_RESOURCE_MAP = {}
-
-
-redis_url = config.get_redis_url()
-celery = Celery("app", broker=redis_url)
-celery.conf.update(
-    broker_url=redis_url, result_backend=redis_url, CELERY_BROKER_URL=redis_url
-)
-
-celery.conf.update(
-    timezone="UTC",
-    task_serializer="json",
-    accept_content=["json"],
-    result_serializer="json",
-    beat_schedule=CELERY_BEAT_SCHEDULE,
-)
-
-
-# Centralized helper for last_run threshold check
-from app_core.game_ticks.common import should_skip_task, handle_exception
+import metrics
+from app_core.game_ticks.common import should_skip_task, handle_exception, bulk_write
 from app_core.game_ticks.locks import try_pg_advisory_lock, release_pg_advisory_lock
 from app_core.game_ticks.food import consumer_goods_distribution_capacity
 
@@ -196,16 +155,453 @@ def calc_ti(user_id):
 # * Tested population=100000, land=1, consumer_goods=0 (1000, 0)
 
 
+def _tax_income_chunk(conn, db, dbdict, all_user_ids):
+    """Tax one chunk of users in the caller's transaction.
+
+    Inputs are bulk-loaded for the whole chunk, income is computed in
+    Python and gold / consumer goods / coalition banks are written
+    set-based. Returns (users credited, users whose consumer goods were
+    consumed).
+    """
+    phase_start = time.perf_counter()
+    # Bulk load all data upfront to eliminate N+1 queries
+    # Load all stats (gold)
+    stats_map = {}
+    dbdict.execute(
+        "SELECT id, gold FROM stats WHERE id = ANY(%s)", (all_user_ids,)
+    )
+    for row in dbdict.fetchall():
+        # Support both RealDictCursor (dict rows)
+        # and simple tuple rows returned by test fakes
+        if isinstance(row, dict):
+            stats_map[row.get("id") or row.get("Id") or row.get("ID")] = (
+                row.get("gold") or 0
+            )
+        else:
+            uid = row[0]
+            gold_val = row[1] if len(row) > 1 else 0
+            stats_map[uid] = gold_val
+
+    # Load all consumer_goods and rations from normalized user_economy
+    cg_map = {}
+    rations_map = {}
+    dbdict.execute(
+        """
+        SELECT ue.user_id, rd.name, COALESCE(ue.quantity, 0) AS quantity
+        FROM user_economy ue
+        JOIN resource_dictionary rd ON rd.resource_id = ue.resource_id
+        WHERE ue.user_id = ANY(%s) AND rd.name IN ('consumer_goods', 'rations')
+        """,
+        (all_user_ids,),
+    )
+    for row in dbdict.fetchall():
+        if isinstance(row, dict):
+            uid = row.get("user_id") or row.get("id") or row.get("Id") or row.get("ID")
+            rname = row.get("name")
+            qty = row.get("quantity") or 0
+        else:
+            uid = row[0]
+            rname = row[1]
+            qty = row[2] if len(row) > 2 else 0
+
+        if rname == "consumer_goods":
+            cg_map[uid] = qty
+        elif rname == "rations":
+            rations_map[uid] = qty
+
+    # Load all policies
+    policies_map = {}
+    dbdict.execute(
+        "SELECT user_id, education FROM policies WHERE user_id = ANY(%s)",
+        (all_user_ids,),
+    )
+    for row in dbdict.fetchall():
+        if isinstance(row, dict):
+            uid = row.get("user_id") or row.get("userId") or row.get("userid")
+            policies_map[uid] = (
+                row.get("education") if row.get("education") else []
+            )
+        else:
+            uid = row[0]
+            education = row[1] if len(row) > 1 and row[1] else []
+            policies_map[uid] = education
+
+    # Load all provinces grouped by user.
+    # Include demographic fields so we can compute CG demand
+    # without calling calc_ti() per user.
+    provinces_map = {}  # user_id -> [(population, land, pc, pw, pe), ...]
+    dbdict.execute(
+        "SELECT userId, population, land, pop_children, "
+        "pop_working, pop_elderly "
+        "FROM provinces WHERE userId = ANY(%s)",
+        (all_user_ids,),
+    )
+    for row in dbdict.fetchall():
+        if isinstance(row, dict):
+            uid = row.get("userid") or row.get("userId") or row.get("user_id")
+            if uid not in provinces_map:
+                provinces_map[uid] = []
+            provinces_map[uid].append(
+                (
+                    row.get("population") or 0,
+                    row.get("land") or 0,
+                    row.get("pop_children"),
+                    row.get("pop_working"),
+                    row.get("pop_elderly"),
+                )
+            )
+        else:
+            uid = row[0]
+            if len(row) > 5:
+                if uid not in provinces_map:
+                    provinces_map[uid] = []
+                provinces_map[uid].append(
+                    (row[1], row[2], row[3], row[4], row[5])
+                )
+            else:
+                # Not enough columns returned; treat as no provinces
+                # for this uid
+                if uid not in provinces_map:
+                    provinces_map[uid] = []
+
+    # Preload consumer-goods distribution capacity (user-level)
+    # to avoid per-user DB queries via consumer_goods_distribution_capacity().
+    cg_dist_cap_map = {}
+    rations_dist_cap_map = {}
+    if variables.FEATURE_DEMOGRAPHIC_CONSUMPTION or variables.FEATURE_RATIONS_DISTRIBUTION:
+        dbdict.execute(
+            """
+            SELECT ub.user_id, bd.name, COALESCE(SUM(ub.quantity), 0) AS qty
+            FROM user_buildings ub
+            JOIN building_dictionary bd
+                ON bd.building_id = ub.building_id
+            WHERE ub.user_id = ANY(%s)
+              AND bd.name IN (
+                  'distribution_centers', 'food_banks', 'malls',
+                  'general_stores', 'gas_stations', 'farmers_markets'
+              )
+            GROUP BY ub.user_id, bd.name
+            """,
+            (all_user_ids,),
+        )
+        for row in dbdict.fetchall():
+            if isinstance(row, dict):
+                uid = row.get("user_id")
+                bname = row.get("name")
+                qty = row.get("qty") or 0
+            else:
+                uid = row[0]
+                bname = row[1]
+                qty = row[2] if len(row) > 2 else 0
+            
+            if variables.FEATURE_DEMOGRAPHIC_CONSUMPTION:
+                cap_cg = variables.CONSUMER_GOODS_DISTRIBUTION_PER_BUILDING.get(
+                    bname,
+                    0,
+                )
+                if cap_cg > 0:
+                    cg_dist_cap_map[uid] = cg_dist_cap_map.get(uid, 0) + qty * cap_cg
+
+            if variables.FEATURE_RATIONS_DISTRIBUTION:
+                cap_rations = variables.RATIONS_DISTRIBUTION_PER_BUILDING.get(
+                    bname,
+                    0,
+                )
+                if cap_rations > 0:
+                    rations_dist_cap_map[uid] = rations_dist_cap_map.get(uid, 0) + qty * cap_rations
+
+    # Preload coalition membership + tax rates for alliance tax
+    coalition_tax_map = {}  # user_id -> (colId, tax_rate)
+    # Savepoints keep a coalition-tax failure from undoing earlier work in
+    # this chunk or releasing the run's advisory lock
+    db.execute("SAVEPOINT coalition_tax")
+    try:
+        from database import get_coalition_members_table
+
+        members_tbl = get_coalition_members_table()
+        if members_tbl:
+            dbdict.execute(
+                f"""
+            SELECT cl.userid, cl.colid, COALESCE(cn.tax_rate, 0) AS tax_rate
+            FROM {members_tbl} cl
+            JOIN colNames cn ON cn.id = cl.colid
+            WHERE cl.userid = ANY(%s) AND COALESCE(cn.tax_rate, 0) > 0
+            """,
+                (all_user_ids,),
+            )
+        else:
+            raise RuntimeError("no coalition membership table")
+        for row in dbdict.fetchall():
+            if isinstance(row, dict):
+                uid = row.get("userid") or row.get("user_id")
+                coalition_tax_map[uid] = (row.get("colid"), row.get("tax_rate"))
+            else:
+                coalition_tax_map[row[0]] = (row[1], row[2])
+    except Exception as e:
+        # If colNames doesn't have tax_rate yet (migration pending),
+        # just skip coalition taxes this run
+        print(f"Coalition tax preload skipped: {e}")
+        db.execute("ROLLBACK TO SAVEPOINT coalition_tax")
+
+    now = time.perf_counter()
+    metrics.observe_phase("tax_income", "preload", now - phase_start)
+    phase_start = now
+
+    # Prepare batch updates
+    money_updates = []
+    cg_updates = []
+    coalition_bank_deposits = {}  # colId -> total_gold_to_deposit
+
+    for user_id in all_user_ids:
+        current_money = stats_map.get(user_id)
+        if current_money is None:
+            continue
+
+        provinces = provinces_map.get(user_id) or []
+        if not provinces:
+            continue
+
+        consumer_goods = int(cg_map.get(user_id, 0) or 0)
+        policies = policies_map.get(user_id, []) or []
+
+        income = 0.0
+        total_cg_need = 0.0
+        has_demographic_data = all(
+            len(p) >= 5
+            and p[2] is not None
+            and p[3] is not None
+            and p[4] is not None
+            for p in provinces
+        )
+
+        for population, land, pc, pw, pe in provinces:
+            land_multiplier = (land - 1) * variables.DEFAULT_LAND_TAX_MULTIPLIER
+            if land_multiplier > 1:
+                land_multiplier = 1
+
+            base_multiplier = variables.DEFAULT_TAX_INCOME
+            multiplier = base_multiplier + (base_multiplier * land_multiplier)
+            income += multiplier * population
+
+            if (
+                variables.FEATURE_DEMOGRAPHIC_CONSUMPTION
+                and has_demographic_data
+            ):
+                elderly_cg_multiplier = (
+                    variables.POLICY_HEALTHCARE_ELDERLY_CG_MULTIPLIER
+                    if variables.POLICY_UNIVERSAL_HEALTHCARE in policies
+                    else 1.0
+                )
+                cg_needed = 0
+                cg_needed += (
+                    pw or 0
+                ) * variables.DEMO_CONSUMER_GOODS_CONSUMPTION["pop_working"]
+                cg_needed += (
+                    pc or 0
+                ) * variables.DEMO_CONSUMER_GOODS_CONSUMPTION["pop_children"]
+                cg_needed += (
+                    (pe or 0)
+                    * variables.DEMO_CONSUMER_GOODS_CONSUMPTION["pop_elderly"]
+                    * elderly_cg_multiplier
+                )
+                total_cg_need += cg_needed
+            else:
+                total_cg_need += math.ceil(
+                    population / variables.CONSUMER_GOODS_PER
+                )
+
+        removed_consumer_goods = 0
+        if variables.FEATURE_DEMOGRAPHIC_CONSUMPTION:
+            dist_capacity = cg_dist_cap_map.get(user_id, 0)
+            available_to_consume = min(consumer_goods, dist_capacity)
+            if total_cg_need != 0:
+                if available_to_consume >= total_cg_need:
+                    removed_consumer_goods = int(total_cg_need)
+                    income *= variables.CONSUMER_GOODS_TAX_MULTIPLIER
+                else:
+                    cg_multiplier = available_to_consume / total_cg_need
+                    income *= 1 + (0.5 * cg_multiplier)
+                    removed_consumer_goods = int(available_to_consume)
+        else:
+            max_cg = math.ceil(total_cg_need)
+            if consumer_goods != 0 and max_cg != 0:
+                if max_cg <= consumer_goods:
+                    removed_consumer_goods = max_cg
+                    income *= variables.CONSUMER_GOODS_TAX_MULTIPLIER
+                else:
+                    cg_multiplier = consumer_goods / max_cg
+                    income *= 1 + (0.5 * cg_multiplier)
+                    removed_consumer_goods = int(consumer_goods)
+
+        # APPLY RATIONS (FOOD) TAX PENALTY
+        current_rations = rations_map.get(user_id, 0)
+        total_population = sum(p[0] for p in provinces)
+        needed_rations = max(int(total_population // variables.RATIONS_PER), 1)
+        
+        if variables.FEATURE_RATIONS_DISTRIBUTION:
+            r_dist_cap = rations_dist_cap_map.get(user_id, 0)
+            effective_rations = min(current_rations, r_dist_cap)
+        else:
+            effective_rations = current_rations
+        
+        rcp = min(0.0, (effective_rations / needed_rations) - 1.0)
+        grace_period = (len(provinces) <= 1) and (sum(p[1] for p in provinces) <= 20)
+        if grace_period:
+            food_tax_multiplier = 1.0
+        else:
+            food_tax_multiplier = 1.0 + (rcp * (1.0 - variables.NO_FOOD_TAX_MULTIPLIER))
+        income *= food_tax_multiplier
+
+        money = int(math.floor(income))
+
+        if not money:
+            continue
+
+        # Alliance tax: deduct % from income and deposit to coalition bank
+        tax_deducted = 0
+        if user_id in coalition_tax_map:
+            col_id, tax_rate = coalition_tax_map[user_id]
+            tax_deducted = int(money * tax_rate / 100)
+            tax_deducted = min(money, tax_deducted)
+            if tax_deducted > 0:
+                money -= tax_deducted
+                coalition_bank_deposits[col_id] = (
+                    coalition_bank_deposits.get(col_id, 0) + tax_deducted
+                )
+
+        msg = (
+            f"Updated money for user id: {user_id}."
+            f" {current_money} -> {current_money + money} (+{money})"
+        )
+        if tax_deducted:
+            msg += f" [tax: {tax_deducted}]"
+        print(msg)
+
+        money_updates.append((money, user_id))
+        if removed_consumer_goods and removed_consumer_goods != 0:
+            cg_updates.append((abs(removed_consumer_goods), user_id))
+    now = time.perf_counter()
+    metrics.observe_phase("tax_income", "compute", now - phase_start)
+    phase_start = now
+
+    # Execute batch updates
+    if money_updates:
+        bulk_write(
+            db,
+            "UPDATE stats AS s SET gold = s.gold + v.amount "
+            "FROM {stage} AS v WHERE s.id = v.id",
+            money_updates,
+            (("amount", "numeric"), ("id", "int")),
+            "UPDATE stats SET gold=gold+%s WHERE id=%s",
+        )
+        metrics.count_rows("tax_income", "stats", len(money_updates))
+    # Deposit alliance taxes into coalition banks
+    if coalition_bank_deposits:
+        tax_updates = [
+            (gold, col_id) for col_id, gold in coalition_bank_deposits.items()
+        ]
+        db.execute("SAVEPOINT coalition_tax")
+        try:
+            bulk_write(
+                db,
+                "UPDATE colBanks AS c SET money = c.money + v.amount "
+                "FROM {stage} AS v WHERE c.colId = v.col_id",
+                tax_updates,
+                (("amount", "numeric"), ("col_id", "int")),
+                "UPDATE colBanks SET money = money + %s WHERE colId = %s",
+                page_size=50,
+            )
+            metrics.count_rows("tax_income", "colBanks", len(tax_updates))
+            total_tax = sum(coalition_bank_deposits.values())
+            print(
+                f"Alliance tax deposited: {total_tax} gold across "
+                f"{len(coalition_bank_deposits)} coalitions"
+            )
+        except Exception as e:
+            print(f"Alliance tax deposit failed: {e}")
+            db.execute("ROLLBACK TO SAVEPOINT coalition_tax")
+    if cg_updates:
+        try:
+            # Get consumer_goods resource_id
+            db.execute(
+                "SELECT resource_id FROM resource_dictionary "
+                "WHERE name='consumer_goods'"
+            )
+            cg_resource_id = db.fetchone()[0]
+
+            # Batch update user_economy
+            cg_sql = (
+                "UPDATE user_economy SET quantity=GREATEST("
+                "quantity-%s, 0) WHERE user_id=%s AND resource_id=%s"
+            )
+            cg_updates_with_resource = [
+                (qty, uid, cg_resource_id) for qty, uid in cg_updates
+            ]
+            bulk_write(
+                db,
+                "UPDATE user_economy AS ue "
+                "SET quantity = GREATEST(ue.quantity - v.qty, 0) "
+                "FROM {stage} AS v "
+                "WHERE ue.user_id = v.user_id "
+                "AND ue.resource_id = v.resource_id",
+                cg_updates_with_resource,
+                (
+                    ("qty", "numeric"),
+                    ("user_id", "int"),
+                    ("resource_id", "int"),
+                ),
+                cg_sql,
+            )
+            metrics.count_rows("tax_income", "user_economy", len(cg_updates))
+        except AttributeError:
+            # DB cursor in tests may not support psycopg2 extras
+            # fall back to individual updates
+            db.execute(
+                "SELECT resource_id FROM resource_dictionary "
+                "WHERE name='consumer_goods'"
+            )
+            cg_resource_id = db.fetchone()[0]
+            for qty, uid in cg_updates:
+                db.execute(
+                    "UPDATE user_economy SET quantity=GREATEST("
+                    "quantity-%s, 0) WHERE user_id=%s AND resource_id=%s",
+                    (qty, uid, cg_resource_id),
+                )
+
+    metrics.observe_phase("tax_income", "write", time.perf_counter() - phase_start)
+    metrics.count_chunk("tax_income")
+    return len(money_updates), len(cg_updates)
+
+
+def _claim_tax_cursor(db):
+    """Lock the tax_income resume point until commit and return it."""
+    db.execute(
+        "SELECT last_id FROM task_cursors WHERE task_name=%s FOR UPDATE",
+        ("tax_income",),
+    )
+    row = db.fetchone()
+    return row[0] if row and row[0] is not None else 0
+
+
 # Function for actually giving money to players (OPTIMIZED)
 def tax_income():
+    """Credit hourly tax income to every nation.
+
+    Users are walked in keyset-paginated chunks (TAX_INCOME_CHUNK_SIZE)
+    until the whole table is covered or TAX_INCOME_TIME_BUDGET_SEC runs
+    out. Each chunk is its own transaction; ``task_cursors`` records the
+    last committed user so a run that hits the budget is finished by the
+    next one instead of starting over. Returns the run's stats.
+    """
     from database import get_db_connection
-    from psycopg2.extras import execute_batch, RealDictCursor
+    from psycopg2.extras import RealDictCursor
 
+    run_stats = {"users_covered": 0, "users_taxed": 0, "chunks": 0, "completed": False}
     conn = None
     try:
         with get_db_connection() as conn:
             if not try_pg_advisory_lock(conn, 9001, "tax_income"):
-                return
+                return run_stats
             db = conn.cursor()
             # Ensure we only run once in a short window
             # (protects against multiple beat schedulers)
@@ -237,12 +633,15 @@ def tax_income():
                     release_pg_advisory_lock(conn, 9001)
                 except Exception:
                     pass
-                return
+                return run_stats
 
             start = time.perf_counter()
             dbdict = conn.cursor(cursor_factory=RealDictCursor)
 
-            # Use a cursor table to process users in chunks to avoid large spikes
+            chunk_size = int(os.getenv("TAX_INCOME_CHUNK_SIZE", "250"))
+            deadline = start + float(os.getenv("TAX_INCOME_TIME_BUDGET_SEC", "600"))
+
+            # Resume point: non-zero only if the previous run ran out of budget
             db.execute(
                 "CREATE TABLE IF NOT EXISTS task_cursors ("
                 "task_name TEXT PRIMARY KEY, last_id BIGINT)"
@@ -252,414 +651,71 @@ def tax_income():
                 "VALUES (%s, %s) ON CONFLICT DO NOTHING",
                 ("tax_income", 0),
             )
-            db.execute(
-                "SELECT last_id FROM task_cursors WHERE task_name=%s", ("tax_income",)
-            )
-            last_row = db.fetchone()
-            last_id = last_row[0] if last_row and last_row[0] is not None else 0
-
-            # Keep default chunks conservative to reduce lock time per run.
-            chunk_size = int(os.getenv("TAX_INCOME_CHUNK_SIZE", "250"))
-            db.execute(
-                "SELECT id FROM users WHERE id > %s ORDER BY id ASC LIMIT %s",
-                (last_id, chunk_size),
-            )
-            users = db.fetchall()
-            all_user_ids = [u[0] for u in users]
-
-            if not all_user_ids:
-                # Completed full cycle; reset cursor and immediately
-                # re-fetch from the beginning so this run still processes
-                # users (avoids wasting every other hourly invocation).
-                db.execute(
-                    "UPDATE task_cursors SET last_id=0 WHERE task_name=%s",
-                    ("tax_income",),
-                )
-                conn.commit()
+            last_id = _claim_tax_cursor(db)
+
+            while True:
+                if run_stats["chunks"]:
+                    # Each chunk commits, which ends the transaction-level lock
+                    # and the task_runs row lock. Take the lock again and
+                    # continue from the committed cursor: another run may have
+                    # taxed chunks meanwhile.
+                    if not try_pg_advisory_lock(conn, 9001, "tax_income"):
+                        break
+                    cursor_id = _claim_tax_cursor(db)
+                    if cursor_id < last_id:
+                        # That run finished the cycle and reset the cursor
+                        break
+                    last_id = cursor_id
                 db.execute(
-                    "SELECT id FROM users WHERE id > 0 ORDER BY id ASC LIMIT %s",
-                    (chunk_size,),
+                    "SELECT id FROM users WHERE id > %s ORDER BY id ASC LIMIT %s",
+                    (last_id, chunk_size),
                 )
-                users = db.fetchall()
-                all_user_ids = [u[0] for u in users]
+                all_user_ids = [u[0] for u in db.fetchall()]
                 if not all_user_ids:
-                    return  # genuinely no users
-
-            # Bulk load all data upfront to eliminate N+1 queries
-            # Load all stats (gold)
-            stats_map = {}
-            dbdict.execute(
-                "SELECT id, gold FROM stats WHERE id = ANY(%s)", (all_user_ids,)
-            )
-            for row in dbdict.fetchall():
-                # Support both RealDictCursor (dict rows)
-                # and simple tuple rows returned by test fakes
-                if isinstance(row, dict):
-                    stats_map[row.get("id") or row.get("Id") or row.get("ID")] = (
-                        row.get("gold") or 0
-                    )
-                else:
-                    uid = row[0]
-                    gold_val = row[1] if len(row) > 1 else 0
-                    stats_map[uid] = gold_val
-
-            # Load all consumer_goods and rations from normalized user_economy
-            cg_map = {}
-            rations_map = {}
-            dbdict.execute(
-                """
-                SELECT ue.user_id, rd.name, COALESCE(ue.quantity, 0) AS quantity
-                FROM user_economy ue
-                JOIN resource_dictionary rd ON rd.resource_id = ue.resource_id
-                WHERE ue.user_id = ANY(%s) AND rd.name IN ('consumer_goods', 'rations')
-                """,
-                (all_user_ids,),
-            )
-            for row in dbdict.fetchall():
-                if isinstance(row, dict):
-                    uid = row.get("user_id") or row.get("id") or row.get("Id") or row.get("ID")
-                    rname = row.get("name")
-                    qty = row.get("quantity") or 0
-                else:
-                    uid = row[0]
-                    rname = row[1]
-                    qty = row[2] if len(row) > 2 else 0
-
-                if rname == "consumer_goods":
-                    cg_map[uid] = qty
-                elif rname == "rations":
-                    rations_map[uid] = qty
-
-            # Load all policies
-            policies_map = {}
-            dbdict.execute(
-                "SELECT user_id, education FROM policies WHERE user_id = ANY(%s)",
-                (all_user_ids,),
-            )
-            for row in dbdict.fetchall():
-                if isinstance(row, dict):
-                    uid = row.get("user_id") or row.get("userId") or row.get("userid")
-                    policies_map[uid] = (
-                        row.get("education") if row.get("education") else []
-                    )
-                else:
-                    uid = row[0]
-                    education = row[1] if len(row) > 1 and row[1] else []
-                    policies_map[uid] = education
-
-            # Load all provinces grouped by user.
-            # Include demographic fields so we can compute CG demand
-            # without calling calc_ti() per user.
-            provinces_map = {}  # user_id -> [(population, land, pc, pw, pe), ...]
-            dbdict.execute(
-                "SELECT userId, population, land, pop_children, "
-                "pop_working, pop_elderly "
-                "FROM provinces WHERE userId = ANY(%s)",
-                (all_user_ids,),
-            )
-            for row in dbdict.fetchall():
-                if isinstance(row, dict):
-                    uid = row.get("userid") or row.get("userId") or row.get("user_id")
-                    if uid not in provinces_map:
-                        provinces_map[uid] = []
-                    provinces_map[uid].append(
-                        (
-                            row.get("population") or 0,
-                            row.get("land") or 0,
-                            row.get("pop_children"),
-                            row.get("pop_working"),
-                            row.get("pop_elderly"),
-                        )
-                    )
-                else:
-                    uid = row[0]
-                    if len(row) > 5:
-                        if uid not in provinces_map:
-                            provinces_map[uid] = []
-                        provinces_map[uid].append(
-                            (row[1], row[2], row[3], row[4], row[5])
-                        )
-                    else:
-                        # Not enough columns returned; treat as no provinces
-                        # for this uid
-                        if uid not in provinces_map:
-                            provinces_map[uid] = []
-
-            # Preload consumer-goods distribution capacity (user-level)
-            # to avoid per-user DB queries via consumer_goods_distribution_capacity().
-            cg_dist_cap_map = {}
-            rations_dist_cap_map = {}
-            if variables.FEATURE_DEMOGRAPHIC_CONSUMPTION or variables.FEATURE_RATIONS_DISTRIBUTION:
-                dbdict.execute(
-                    """
-                    SELECT ub.user_id, bd.name, COALESCE(SUM(ub.quantity), 0) AS qty
-                    FROM user_buildings ub
-                    JOIN building_dictionary bd
-                        ON bd.building_id = ub.building_id
-                    WHERE ub.user_id = ANY(%s)
-                      AND bd.name IN (
-                          'distribution_centers', 'food_banks', 'malls',
-                          'general_stores', 'gas_stations', 'farmers_markets'
-                      )
-                    GROUP BY ub.user_id, bd.name
-                    """,
-                    (all_user_ids,),
-                )
-                for row in dbdict.fetchall():
-                    if isinstance(row, dict):
-                        uid = row.get("user_id")
-                        bname = row.get("name")
-                        qty = row.get("qty") or 0
-                    else:
-                        uid = row[0]
-                        bname = row[1]
-                        qty = row[2] if len(row) > 2 else 0
-                    
-                    if variables.FEATURE_DEMOGRAPHIC_CONSUMPTION:
-                        cap_cg = variables.CONSUMER_GOODS_DISTRIBUTION_PER_BUILDING.get(
-                            bname,
-                            0,
-                        )
-                        if cap_cg > 0:
-                            cg_dist_cap_map[uid] = cg_dist_cap_map.get(uid, 0) + qty * cap_cg
-
-                    if variables.FEATURE_RATIONS_DISTRIBUTION:
-                        cap_rations = variables.RATIONS_DISTRIBUTION_PER_BUILDING.get(
-                            bname,
-                            0,
-                        )
-                        if cap_rations > 0:
-                            rations_dist_cap_map[uid] = rations_dist_cap_map.get(uid, 0) + qty * cap_rations
-
-            # Preload coalition membership + tax rates for alliance tax
-            coalition_tax_map = {}  # user_id -> (colId, tax_rate)
-            try:
-                from database import get_coalition_members_table
-
-                members_tbl = get_coalition_members_table()
-                if members_tbl:
-                    dbdict.execute(
-                        f"""
-                    SELECT cl.userid, cl.colid, COALESCE(cn.tax_rate, 0) AS tax_rate
-                    FROM {members_tbl} cl
-                    JOIN colNames cn ON cn.id = cl.colid
-                    WHERE cl.userid = ANY(%s) AND COALESCE(cn.tax_rate, 0) > 0
-                    """,
-                        (all_user_ids,),
-                    )
-                else:
-                    raise RuntimeError("no coalition membership table")
-                for row in dbdict.fetchall():
-                    if isinstance(row, dict):
-                        uid = row.get("userid") or row.get("user_id")
-                        coalition_tax_map[uid] = (row.get("colid"), row.get("tax_rate"))
-                    else:
-                        coalition_tax_map[row[0]] = (row[1], row[2])
-            except Exception as e:
-                # If colNames doesn't have tax_rate yet (migration pending),
-                # just skip coalition taxes this run
-                print(f"Coalition tax preload skipped: {e}")
-                conn.rollback()
-
-            # Prepare batch updates
-            money_updates = []
-            cg_updates = []
-            coalition_bank_deposits = {}  # colId -> total_gold_to_deposit
-
-            for user_id in all_user_ids:
-                current_money = stats_map.get(user_id)
-                if current_money is None:
-                    continue
-
-                provinces = provinces_map.get(user_id) or []
-                if not provinces:
-                    continue
-
-                consumer_goods = int(cg_map.get(user_id, 0) or 0)
-                policies = policies_map.get(user_id, []) or []
-
-                income = 0.0
-                total_cg_need = 0.0
-                has_demographic_data = all(
-                    len(p) >= 5
-                    and p[2] is not None
-                    and p[3] is not None
-                    and p[4] is not None
-                    for p in provinces
-                )
+                    run_stats["completed"] = True
+                    break
+                chunk_last_id = max(all_user_ids)
+                if chunk_last_id <= last_id:
+                    # The keyset did not advance; never loop on the same rows
+                    break
 
-                for population, land, pc, pw, pe in provinces:
-                    land_multiplier = (land - 1) * variables.DEFAULT_LAND_TAX_MULTIPLIER
-                    if land_multiplier > 1:
-                        land_multiplier = 1
-
-                    base_multiplier = variables.DEFAULT_TAX_INCOME
-                    multiplier = base_multiplier + (base_multiplier * land_multiplier)
-                    income += multiplier * population
-
-                    if (
-                        variables.FEATURE_DEMOGRAPHIC_CONSUMPTION
-                        and has_demographic_data
-                    ):
-                        elderly_cg_multiplier = (
-                            variables.POLICY_HEALTHCARE_ELDERLY_CG_MULTIPLIER
-                            if variables.POLICY_UNIVERSAL_HEALTHCARE in policies
-                            else 1.0
-                        )
-                        cg_needed = 0
-                        cg_needed += (
-                            pw or 0
-                        ) * variables.DEMO_CONSUMER_GOODS_CONSUMPTION["pop_working"]
-                        cg_needed += (
-                            pc or 0
-                        ) * variables.DEMO_CONSUMER_GOODS_CONSUMPTION["pop_children"]
-                        cg_needed += (
-                            (pe or 0)
-                            * variables.DEMO_CONSUMER_GOODS_CONSUMPTION["pop_elderly"]
-                            * elderly_cg_multiplier
-                        )
-                        total_cg_need += cg_needed
-                    else:
-                        total_cg_need += math.ceil(
-                            population / variables.CONSUMER_GOODS_PER
-                        )
-
-                removed_consumer_goods = 0
-                if variables.FEATURE_DEMOGRAPHIC_CONSUMPTION:
-                    dist_capacity = cg_dist_cap_map.get(user_id, 0)
-                    available_to_consume = min(consumer_goods, dist_capacity)
-                    if total_cg_need != 0:
-                        if available_to_consume >= total_cg_need:
-                            removed_consumer_goods = int(total_cg_need)
-                            income *= variables.CONSUMER_GOODS_TAX_MULTIPLIER
-                        else:
-                            cg_multiplier = available_to_consume / total_cg_need
-                            income *= 1 + (0.5 * cg_multiplier)
-                            removed_consumer_goods = int(available_to_consume)
-                else:
-                    max_cg = math.ceil(total_cg_need)
-                    if consumer_goods != 0 and max_cg != 0:
-                        if max_cg <= consumer_goods:
-                            removed_consumer_goods = max_cg
-                            income *= variables.CONSUMER_GOODS_TAX_MULTIPLIER
-                        else:
-                            cg_multiplier = consumer_goods / max_cg
-                            income *= 1 + (0.5 * cg_multiplier)
-                            removed_consumer_goods = int(consumer_goods)
-
-                # APPLY RATIONS (FOOD) TAX PENALTY
-                current_rations = rations_map.get(user_id, 0)
-                total_population = sum(p[0] for p in provinces)
-                needed_rations = max(int(total_population // variables.RATIONS_PER), 1)
-                
-                if variables.FEATURE_RATIONS_DISTRIBUTION:
-                    r_dist_cap = rations_dist_cap_map.get(user_id, 0)
-                    effective_rations = min(current_rations, r_dist_cap)
-                else:
-                    effective_rations = current_rations
-                
-                rcp = min(0.0, (effective_rations / needed_rations) - 1.0)
-                grace_period = (len(provinces) <= 1) and (sum(p[1] for p in provinces) <= 20)
-                if grace_period:
-                    food_tax_multiplier = 1.0
-                else:
-                    food_tax_multiplier = 1.0 + (rcp * (1.0 - variables.NO_FOOD_TAX_MULTIPLIER))
-                income *= food_tax_multiplier
-
-                money = int(math.floor(income))
-
-                if not money:
-                    continue
-
-                # Alliance tax: deduct % from income and deposit to coalition bank
-                tax_deducted = 0
-                if user_id in coalition_tax_map:
-                    col_id, tax_rate = coalition_tax_map[user_id]
-                    tax_deducted = int(money * tax_rate / 100)
-                    tax_deducted = min(money, tax_deducted)
-                    if tax_deducted > 0:
-                        money -= tax_deducted
-                        coalition_bank_deposits[col_id] = (
-                            coalition_bank_deposits.get(col_id, 0) + tax_deducted
-                        )
-
-                msg = (
-                    f"Updated money for user id: {user_id}."
-                    f" {current_money} -> {current_money + money} (+{money})"
-                )
-                if tax_deducted:
-                    msg += f" [tax: {tax_deducted}]"
-                print(msg)
-
-                money_updates.append((money, user_id))
-                if removed_consumer_goods and removed_consumer_goods != 0:
-                    cg_updates.append((abs(removed_consumer_goods), user_id))
-            # Execute batch updates
-            if money_updates:
-                execute_batch(
-                    db,
-                    "UPDATE stats SET gold=gold+%s WHERE id=%s",
-                    money_updates,
-                    page_size=100,
-                )
-            # Deposit alliance taxes into coalition banks
-            if coalition_bank_deposits:
-                tax_updates = [
-                    (gold, col_id) for col_id, gold in coalition_bank_deposits.items()
-                ]
                 try:
-                    execute_batch(
-                        db,
-                        "UPDATE colBanks SET money = money + %s WHERE colId = %s",
-                        tax_updates,
-                        page_size=50,
+                    credited, cg_consumed = _tax_income_chunk(
+                        conn, db, dbdict, all_user_ids
                     )
-                    total_tax = sum(coalition_bank_deposits.values())
-                    print(
-                        f"Alliance tax deposited: {total_tax} gold across "
-                        f"{len(coalition_bank_deposits)} coalitions"
-                    )
-                except Exception as e:
-                    print(f"Alliance tax deposit failed: {e}")
-                    conn.rollback()
-            if cg_updates:
-                try:
-                    # Get consumer_goods resource_id
+                    # Progress is committed together with the chunk's writes,
+                    # so a crash never taxes a chunk twice
                     db.execute(
-                        "SELECT resource_id FROM resource_dictionary "
-                        "WHERE name='consumer_goods'"
+                        "UPDATE task_cursors SET last_id=%s WHERE task_name=%s",
+                        (chunk_last_id, "tax_income"),
                     )
-                    cg_resource_id = db.fetchone()[0]
+                    try:
+                        conn.commit()
+                    except AttributeError:
+                        pass
+                except Exception as e:
+                    try:
+                        conn.rollback()
+                    except Exception:
+                        pass
+                    handle_exception(e, "tax_income")
+                    break
+
+                last_id = chunk_last_id
+                run_stats["chunks"] += 1
+                run_stats["users_covered"] += len(all_user_ids)
+                run_stats["users_taxed"] += credited
+                print(
+                    f"tax_income: chunk {run_stats['chunks']} up to user {last_id}: "
+                    f"{credited} credited, {cg_consumed} consumed consumer goods"
+                )
 
-                    # Batch update user_economy
-                    cg_sql = (
-                        "UPDATE user_economy SET quantity=GREATEST("
-                        "quantity-%s, 0) WHERE user_id=%s AND resource_id=%s"
-                    )
-                    cg_updates_with_resource = [
-                        (qty, uid, cg_resource_id) for qty, uid in cg_updates
-                    ]
-                    execute_batch(db, cg_sql, cg_updates_with_resource, page_size=100)
-                except AttributeError:
-                    # DB cursor in tests may not support psycopg2 extras
-                    # fall back to individual updates
-                    db.execute(
-                        "SELECT resource_id FROM resource_dictionary "
-                        "WHERE name='consumer_goods'"
-                    )
-                    cg_resource_id = db.fetchone()[0]
-                    for qty, uid in cg_updates:
-                        db.execute(
-                            "UPDATE user_economy SET quantity=GREATEST("
-                            "quantity-%s, 0) WHERE user_id=%s AND resource_id=%s",
-                            (qty, uid, cg_resource_id),
-                        )
-
-                # Invalidate cache for affected users (best-effort)
+                # Best-effort: invalidate user cache for all processed users so
+                # any caller reading resources/revenue doesn't hit stale values.
                 try:
                     from database import invalidate_user_cache
 
-                    for _, uid in cg_updates:
+                    for uid in all_user_ids:
                         try:
                             invalidate_user_cache(uid)
                         except Exception:
@@ -667,68 +723,42 @@ def tax_income():
                 except Exception:
                     pass
 
-            committed = False
-            try:
-                try:
-                    conn.commit()
-                    committed = True
-                except AttributeError:
-                    committed = True
-            except Exception as e:
-                try:
-                    conn.rollback()
-                except Exception:
-                    pass
-                handle_exception(e, "tax_income")
-                committed = False
+                if len(all_user_ids) < chunk_size:
+                    run_stats["completed"] = True
+                    break
+                if time.perf_counter() >= deadline:
+                    print(
+                        f"tax_income: time budget exhausted after user {last_id}; "
+                        "the next run resumes there"
+                    )
+                    break
 
-            if committed:
-                try:
+            try:
+                if run_stats["completed"]:
+                    # Full cycle done; the next run starts from the first user
                     db.execute(
-                        "UPDATE task_runs SET last_run = now() WHERE task_name = %s",
+                        "UPDATE task_cursors SET last_id=0 WHERE task_name=%s",
                         ("tax_income",),
                     )
-                    conn.commit()
-                except Exception as e:
-                    handle_exception(e, "tax_income")
-
-            # Best-effort: invalidate user cache for all processed users so any
-            # caller reading resources/revenue doesn't hit stale values in cache.
-            try:
-                from database import invalidate_user_cache
-
-                for uid in all_user_ids:
-                    try:
-                        invalidate_user_cache(uid)
-                    except Exception:
-                        pass
-            except Exception:
-                pass
-
-            # Update the progress cursor to the last processed user so subsequent
-            # task runs resume from the next ID and avoid reprocessing the same set
-            try:
-                if all_user_ids:
-                    last_processed = max(all_user_ids)
+                if run_stats["chunks"]:
                     db.execute(
-                        "UPDATE task_cursors SET last_id=%s WHERE task_name=%s",
-                        (last_processed, "tax_income"),
+                        "UPDATE task_runs SET last_run = now() WHERE task_name = %s",
+                        ("tax_income",),
                     )
-                    try:
-                        conn.commit()
-                    except Exception:
-                        pass
-            except Exception as e:
-                print(f"Failed to update task cursor for tax_income: {e}")
                 try:
-                    conn.rollback()
-                except Exception:
+                    conn.commit()
+                except AttributeError:
                     pass
+            except Exception as e:
+                handle_exception(e, "tax_income")
 
             duration = time.perf_counter() - start
+            run_stats["duration_seconds"] = round(duration, 3)
             print(
-                f"tax_income: updated {len(money_updates)} users in {duration:.2f}s "
-                f"(cg updates: {len(cg_updates)})"
+                f"tax_income: covered {run_stats['users_covered']} users "
+                f"({run_stats['users_taxed']} credited) "
+                f"in {run_stats['chunks']} chunks, "
+                f"{duration:.2f}s, complete={run_stats['completed']}"
             )
 
             # Emit a metric (best-effort)
@@ -736,89 +766,152 @@ def tax_income():
                 from helpers import record_task_metric
 
                 record_task_metric("tax_income", duration)
+                record_task_metric("tax_income_users", run_stats["users_covered"])
             except Exception:
                 pass
     except psycopg2.InterfaceError as e:
         print(
             f"Database connection error in tax_income: {e}. Skipping tax income update."
         )
-        return
+        return run_stats
     finally:
         try:
             release_pg_advisory_lock(conn, 9001)
         except Exception:
             pass
-
-
+    return run_stats
+
+
+
+
+# Share of the loser's stockpile paid per nightly run while a truce lasts
+# (TODO: implement if and alliance won how to give it)
+REPARATION_RATE = 1 / 5
+# Raze wars lower the reparations to 5% (the basic is 20%)
+RAZE_REPARATION_RATE = 1 / 20
+# Peace records are removed after one week
+TRUCE_SECONDS = 604800
+
+
+# Net stockpile changes, one row per (user_id, resource_id): existing rows
+# (every payer has one, and they are locked) are updated, receivers
+# without a row get one. quantity >= 0 is checked on proposed rows too,
+# so a plain INSERT ... ON CONFLICT cannot carry the negative deltas.
+_APPLY_REPARATIONS_SQL = """
+    WITH {prefix} applied AS (
+        UPDATE user_economy AS ue
+        SET quantity = GREATEST(0, ue.quantity + v.delta)
+        FROM {source} AS v
+        WHERE ue.user_id = v.user_id AND ue.resource_id = v.resource_id
+        RETURNING ue.user_id, ue.resource_id
+    )
+    INSERT INTO user_economy (user_id, resource_id, quantity)
+    SELECT v.user_id, v.resource_id, v.delta
+    FROM {source} AS v
+    WHERE v.delta > 0 AND NOT EXISTS (
+        SELECT 1 FROM applied a
+        WHERE a.user_id = v.user_id AND a.resource_id = v.resource_id
+    )
+    ON CONFLICT (user_id, resource_id) DO UPDATE
+    SET quantity = user_economy.quantity + EXCLUDED.quantity
+"""
+
+
+def reparation_deltas(truces, balances, resource_ids):
+    """Net stockpile changes for one run of war reparations.
+
+    ``truces`` are ``(winner, loser, war_type)`` in payment order and
+    ``balances`` maps ``(user_id, resource_id)`` to the current quantity;
+    it is updated in place, so a nation that pays (or receives) in one
+    truce pays from its new stockpile in the next, exactly as sequential
+    transfers would. Returns ``{(user_id, resource_id): delta}``.
+    """
+    deltas = {}
+    for winner, loser, war_type in truces:
+        rate = RAZE_REPARATION_RATE if war_type == "Raze" else REPARATION_RATE
+        for resource_id in resource_ids:
+            amount = int((balances.get((loser, resource_id)) or 0) * rate)
+            if amount <= 0:
+                continue
+            for user_id, change in ((loser, -amount), (winner, amount)):
+                key = (user_id, resource_id)
+                balances[key] = (balances.get(key) or 0) + change
+                deltas[key] = deltas.get(key, 0) + change
+    return deltas
 
 
 def war_reparation_tax():
-    from database import get_db_connection
-    from psycopg2.extras import RealDictCursor
-
+    """Pay reparations for every truce and drop week-old peace records.
+
+    The whole run is a handful of statements regardless of how many wars
+    are in truce: the truces, resource ids and the stockpiles involved are
+    loaded up front (stockpile rows locked), every transfer is computed in
+    memory and the net changes are applied with one staged upsert into
+    ``user_economy``.
+    """
+    from attack_scripts import Economy
+    from database import get_db_connection, invalidate_user_cache
+
+    start = time.perf_counter()
     with get_db_connection() as conn:
         db = conn.cursor()
-        dbdict = conn.cursor(cursor_factory=RealDictCursor)
         db.execute(
-            "SELECT id, peace_date, attacker, attacker_morale, "
-            "defender, defender_morale FROM wars WHERE (peace_date IS NOT "
-            "NULL) AND (peace_offer_id IS NULL)"
+            "SELECT id, peace_date, attacker, defender, defender_morale, war_type "
+            "FROM wars WHERE (peace_date IS NOT NULL) AND (peace_offer_id IS NULL) "
+            "ORDER BY id"
         )
-        truces = db.fetchall()
-
-        for state in truces:
-            war_id, peace_date, attacker, a_morale, defender, d_morale = state
+        expired = []
+        truces = []
+        for war_id, peace_date, attacker, defender, d_morale, war_type in db.fetchall():
+            if peace_date < (time.time() - TRUCE_SECONDS):
+                expired.append(war_id)
+            elif d_morale <= 0:
+                truces.append((attacker, defender, war_type))
+            else:
+                truces.append((defender, attacker, war_type))
 
-            # Remove peace records older than one week (604800 seconds)
-            if peace_date < (time.time() - 604800):
-                db.execute("DELETE FROM wars WHERE id=%s", (war_id,))
+        if expired:
+            db.execute("DELETE FROM wars WHERE id = ANY(%s)", (expired,))
 
-            # Transfer resources to attacker (winner)
-            else:
-                if d_morale <= 0:
-                    winner = attacker
-                    loser = defender
-                else:
-                    winner = defender
-                    loser = attacker
-
-                eco = Economy(loser)
-
-                # OPTIMIZATION: Fetch all resources and war_type in ONE query
-                # each instead of 30 queries
-                dbdict.execute(
-                    """
-                    SELECT rd.name AS resource_name,
-                           COALESCE(ue.quantity, 0) AS quantity
-                    FROM resource_dictionary rd
-                    LEFT JOIN user_economy ue
-                        ON ue.resource_id = rd.resource_id
-                       AND ue.user_id = %s
-                    WHERE rd.name = ANY(%s)
-                    """,
-                    (loser, Economy.resources),
-                )
-                resource_amounts = {
-                    row["resource_name"]: row["quantity"] for row in dbdict.fetchall()
-                }
-
-                db.execute("SELECT war_type FROM wars WHERE id=%s", (war_id,))
-                war_type = db.fetchone()
-
-                for resource in Economy.resources:
-                    resource_amount = resource_amounts.get(resource, 0) or 0
-
-                    # This condition lower or doesn't give reparation_tax at all
-                    # NOTE: for now it lowers to only 5% (the basic is 20%)
-                    if war_type == "Raze":
-                        eco.transfer_resources(
-                            resource, resource_amount * (1 / 20), winner
-                        )
-                    else:
-                        # transfer 20% of all resource
-                        # (TODO: implement if and alliance won how to give it)
-                        eco.transfer_resources(
-                            resource, resource_amount * (1 / 5), winner
-                        )
+        deltas = {}
+        if truces:
+            db.execute(
+                "SELECT resource_id FROM resource_dictionary "
+                "WHERE name = ANY(%s) AND is_active = TRUE ORDER BY resource_id",
+                (Economy.resources,),
+            )
+            resource_ids = [row[0] for row in db.fetchall()]
+            user_ids = sorted({uid for truce in truces for uid in truce[:2]})
+            # Stockpiles stay locked until commit; fixed order avoids deadlocks
+            db.execute(
+                "SELECT user_id, resource_id, quantity FROM user_economy "
+                "WHERE user_id = ANY(%s) AND resource_id = ANY(%s) "
+                "ORDER BY user_id, resource_id FOR UPDATE",
+                (user_ids, resource_ids),
+            )
+            balances = {(uid, rid): qty or 0 for uid, rid, qty in db.fetchall()}
+            deltas = reparation_deltas(truces, balances, resource_ids)
+
+        rows = [(uid, rid, delta) for (uid, rid), delta in deltas.items() if delta]
+        bulk_write(
+            db,
+            _APPLY_REPARATIONS_SQL.format(prefix="", source="{stage}"),
+            rows,
+            (("user_id", "int"), ("resource_id", "int"), ("delta", "bigint")),
+            _APPLY_REPARATIONS_SQL.format(
+                prefix="row_v (user_id, resource_id, delta) AS "
+                "(VALUES (%s::int, %s::int, %s::bigint)),",
+                source="row_v",
+            ),
+        )
 
+    for uid in {uid for uid, _, _ in rows}:
+        try:
+            invalidate_user_cache(uid)
+        except Exception:
+            pass
 
+    print(
+        f"war_reparation_tax: {len(truces)} truces, {len(rows)} stockpile changes, "
+        f"{len(expired)} expired wars removed in {time.perf_counter() - start:.2f}s"
+    )
@@ -0,0 +1,198 @@
+"""Ranked leaderboard snapshots.
+
+``refresh_leaderboards`` (scheduled as ``tasks.task_refresh_leaderboards``)
+ranks every board into ``leaderboard_snapshots`` (migration 0046), keeping
+each entry's rank from the previous refresh so readers get rank-change
+arrows. The rankings page, the bot API and the Discord panels read pages of
+that table, so every worker shows the same ranks and no request runs a
+ranking query.
+"""
+
+from __future__ import annotations
+
+import os
+import time
+from typing import Any, Dict, List
+
+import etags
+from database import QueryHelper, get_coalition_members_table
+
+# Ranks kept per board; deeper positions are not shown anywhere
+LEADERBOARD_DEPTH = int(os.getenv("LEADERBOARD_DEPTH", "100"))
+
+# Each source yields (entity_id, name, score). Nation boards read the
+# nation_influence snapshot that global_tick maintains.
+NATION_BOARDS = {
+    "influence": """
+        SELECT ni.user_id, u.username, ni.influence
+        FROM nation_influence ni
+        JOIN users u ON u.id = ni.user_id
+    """,
+    "population": """
+        SELECT ni.user_id, u.username, ni.province_population
+        FROM nation_influence ni
+        JOIN users u ON u.id = ni.user_id
+        WHERE ni.province_count > 0
+    """,
+    "provinces": """
+        SELECT ni.user_id, u.username, ni.province_count
+        FROM nation_influence ni
+        JOIN users u ON u.id = ni.user_id
+        WHERE ni.province_count > 0
+    """,
+    "military": """
+        SELECT u.id, u.username, SUM(um.quantity)
+        FROM users u
+        JOIN user_military um ON um.user_id = u.id
+        GROUP BY u.id, u.username
+    """,
+    "wealth": """
+        SELECT u.id, u.username, COALESCE(s.gold, 0)
+        FROM users u
+        JOIN stats s ON s.id = u.id
+    """,
+}
+
+COALITION_BOARDS = {
+    "coalition_population": "SUM(ni.province_population)",
+    "coalition_influence": "SUM(ni.influence)",
+}
+
+BOARDS = (*NATION_BOARDS, *COALITION_BOARDS)
+
+# Entries still on the board keep their old rank as previous_rank; rows
+# not re-ranked in this transaction (now() is fixed per transaction) fell
+# off the board and are pruned.
+_REFRESH_SQL = """
+    INSERT INTO leaderboard_snapshots
+        (board, rank, entity_id, name, score, previous_rank, updated_at)
+    SELECT %(board)s, r.rank, r.entity_id, r.name, r.score, NULL, now()
+    FROM (
+        SELECT s.entity_id, s.name, s.score,
+               ROW_NUMBER() OVER (ORDER BY s.score DESC, s.entity_id) AS rank
+        FROM ({source}) AS s (entity_id, name, score)
+        WHERE s.score IS NOT NULL
+        ORDER BY rank
+        LIMIT %(depth)s
+    ) AS r
+    ON CONFLICT (board, entity_id) DO UPDATE SET
+        previous_rank = leaderboard_snapshots.rank,
+        rank = EXCLUDED.rank,
+        name = EXCLUDED.name,
+        score = EXCLUDED.score,
+        updated_at = EXCLUDED.updated_at
+"""
+
+_PRUNE_SQL = """
+    DELETE FROM leaderboard_snapshots
+    WHERE board = %(board)s AND updated_at < now()
+"""
+
+
+def _coalition_source(members_tbl: str, score: str) -> str:
+    return f"""
+        SELECT c.id, c.name, {score}
+        FROM colNames c
+        JOIN {members_tbl} m ON m.colid = c.id
+        JOIN nation_influence ni ON ni.user_id = m.userid
+        GROUP BY c.id, c.name
+    """
+
+
+def board_sources() -> Dict[str, str]:
+    sources = dict(NATION_BOARDS)
+    members_tbl = get_coalition_members_table()
+    if members_tbl:
+        for board, score in COALITION_BOARDS.items():
+            sources[board] = _coalition_source(members_tbl, score)
+    return sources
+
+
+def refresh_leaderboards(db, depth: int = LEADERBOARD_DEPTH) -> Dict[str, int]:
+    """Re-rank every board on ``db``; the caller commits.
+
+    All boards are rewritten in the caller's transaction, so readers never
+    see a board half-way through a refresh. Returns entries per board.
+    """
+    written = {}
+    for board, source in board_sources().items():
+        params = {"board": board, "depth": depth}
+        db.execute(_REFRESH_SQL.format(source=source), params)
+        written[board] = db.rowcount
+        db.execute(_PRUNE_SQL, params)
+    return written
+
+
+def run_leaderboard_refresh() -> Dict[str, int]:
+    """Scheduled entry point: refresh every board in one transaction."""
+    from database import get_db_connection
+
+    start = time.perf_counter()
+    with get_db_connection() as conn:
+        db = conn.cursor()
+        written = refresh_leaderboards(db)
+        etags.bump(db, "leaderboards")
+    print(f"refresh_leaderboards: {written} in {time.perf_counter() - start:.2f}s")
+    return written
+
+
+def rank_arrow(rank_change) -> str:
+    """Short marker for a rank change: ▲2, ▼1, = or NEW."""
+    if rank_change is None:
+        return "NEW"
+    if rank_change > 0:
+        return f"▲{rank_change}"
+    if rank_change < 0:
+        return f"▼{-rank_change}"
+    return "="
+
+
+def _entry(row) -> Dict[str, Any]:
+    entry = dict(row)
+    previous = entry["previous_rank"]
+    entry["rank_change"] = None if previous is None else previous - entry["rank"]
+    entry["rank_arrow"] = rank_arrow(entry["rank_change"])
+    return entry
+
+
+def fetch_leaderboard(
+    board: str, limit: int = 10, offset: int = 0
+) -> List[Dict[str, Any]]:
+    """One page of ``board`` in rank order.
+
+    ``rank_change`` is positive when the entry climbed since the previous
+    refresh and None when it is new to the board.
+    """
+    if board not in BOARDS:
+        raise ValueError(f"Unknown leaderboard: {board}")
+    rows = QueryHelper.fetch_all(
+        """
+        SELECT rank, previous_rank, entity_id, name, score, updated_at
+        FROM leaderboard_snapshots
+        WHERE board = %s AND rank > %s
+        ORDER BY rank
+        LIMIT %s
+        """,
+        (board, offset, limit),
+        dict_cursor=True,
+    )
+    return [_entry(row) for row in rows or []]
+
+
+def fetch_leaderboards(boards, limit: int = 10) -> Dict[str, List[Dict[str, Any]]]:
+    """The top ``limit`` of several boards in one query."""
+    boards = list(boards)
+    rows = QueryHelper.fetch_all(
+        """
+        SELECT board, rank, previous_rank, entity_id, name, score, updated_at
+        FROM leaderboard_snapshots
+        WHERE board = ANY(%s) AND rank <= %s
+        ORDER BY board, rank
+        """,
+        (boards, limit),
+        dict_cursor=True,
+    )
+    result = {board: [] for board in boards}
+    for row in rows or []:
+        result[row["board"]].append(_entry(row))
+    return result
@@ -146,12 +146,48 @@ def mechanics_rations(): return render_template("mechanics/rations.html")
 @bp.route("/mechanics/war", methods=["GET"])
 def mechanics_war(): return render_template("mechanics/war.html")
 
+_FLAG_TABLES = {"country": "users", "coalition": "colnames"}
+
+
+def _flag_key(flag_type, flag_id):
+    """Image store key of a flag (migration 0050), or None; cached until the next upload."""
+    from database import query_cache, table_has_column
+
+    table = _FLAG_TABLES.get(flag_type)
+    if table is None or not table_has_column(table, "flag_key"):
+        return None
+    cache_key = f"flag_key_{flag_type}_{flag_id}"
+    key = query_cache.get(cache_key)
+    if key is None:
+        # Primary, not a replica: a lagging read would be cached past an upload
+        with get_request_cursor() as cur:
+            cur.execute(f"SELECT flag_key FROM {table} WHERE id = %s", (flag_id,))
+            row = cur.fetchone()
+        key = (row[0] if row else None) or ""
+        query_cache.set(cache_key, key)
+    return key or None
+
+
+@bp.route("/img/<name>")
+def serve_image(name):
+    """Immutable image store URLs (``<key>.<variant>``)."""
+    from image_store import send_image
+
+    return send_image(name)
+
+
 @bp.route("/flag/<flag_type>/<int:flag_id>")
 def serve_flag(flag_type, flag_id):
     import base64
     from flask import Response
     from database import table_has_column
+    from image_store import redirect_to_image
+
+    key = _flag_key(flag_type, flag_id)
+    if key:
+        return redirect_to_image(key)
 
+    # Flags not yet moved to the image store
     cache_key = f"{flag_type}_{flag_id}"
     if not hasattr(serve_flag, "_cache"): serve_flag._cache = {}
     cached = serve_flag._cache.get(cache_key)
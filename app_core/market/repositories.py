@@ -249,12 +249,15 @@ def delete_trade_by_id(db, trade_id):
     db.execute("DELETE FROM trades WHERE offer_id=%s", (trade_id,))
 
 def try_lock_trade(db, trade_id):
-    db.execute("SELECT pg_try_advisory_lock(%s)", (int(trade_id),))
+    # Transaction-level: held until the request commits or rolls back
+    db.execute("SELECT pg_try_advisory_xact_lock(%s)", (int(trade_id),))
     row = db.fetchone()
     return row and row[0]
 
 def unlock_trade(db, trade_id):
-    db.execute("SELECT pg_advisory_unlock(%s)", (int(trade_id),))
+    # No-op: the transaction-level lock from try_lock_trade ends with the
+    # transaction (see release_pg_advisory_lock in game_ticks/locks.py)
+    pass
 
 def get_trade_by_id(db, trade_id):
     db.execute(
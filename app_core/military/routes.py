@@ -3,6 +3,7 @@ from helpers import login_required, error
 from database import get_request_cursor, cache_response, invalidate_user_cache, invalidate_view_cache
 from variables import MILDICT
 from upgrades import get_upgrades
+from attack_scripts.military_snapshot import forget
 
 from .repositories import ALL_UNITS, get_user_units_with_stats, get_manpower_and_gold
 from .services import compute_display_limits, process_sell_units, process_buy_units
@@ -65,6 +66,7 @@ def military_sell_buy(way, units):
             else:
                 return error(404, "Page not found")
 
+        forget(cId)
         try:
             invalidate_user_cache(cId)
             invalidate_view_cache("military", user_id=cId)
@@ -62,33 +62,10 @@ def _tutorial_claimed_count(db, user_id: int) -> int:
         return 0
 
 
-def get_onboarding_status(db, user_id: int) -> dict:
-    from database import query_cache
-    cache_key = f"onboarding_status_{user_id}"
-    cached = query_cache.get(cache_key)
-    if cached is not None:
-        return cached
-
-    provinces = _province_count(db, user_id)
-    food_banks = _food_bank_count(db, user_id)
-
-    # Check coalition membership
-    db.execute("SELECT coalition_id FROM users WHERE id = %s", (user_id,))
-    row = db.fetchone()
-    in_coalition = row[0] is not None if row else False
-
-    # Check allies (active treaties)
-    db.execute(
-        """
-        SELECT COUNT(*)::int FROM nation_treaties
-        WHERE status = 'active' AND (sender_id = %s OR recipient_id = %s)
-        """,
-        (user_id, user_id),
-    )
-    row = db.fetchone()
-    allies = row[0] if row else 0
-    has_ally = allies >= 1
-
+def onboarding_status(
+    provinces: int, food_banks: int, in_coalition: bool, allies: int
+) -> dict:
+    """Checklist state from the counts it depends on (no queries)."""
     steps = [
         {
             "id": "food_bank",
@@ -105,14 +82,14 @@ def get_onboarding_status(db, user_id: int) -> dict:
         {
             "id": "ally",
             "label": "Recruit an Ally",
-            "done": has_ally,
+            "done": allies >= 1,
             "href": "/treaties",
         },
     ]
     done_count = sum(1 for s in steps if s["done"])
     show_checklist = provinces >= 1 and (done_count < len(steps))
 
-    result = {
+    return {
         "steps": steps,
         "completed": done_count,
         "total": len(steps),
@@ -123,6 +100,20 @@ def get_onboarding_status(db, user_id: int) -> dict:
         "next_href": next((s["href"] for s in steps if not s["done"]), "/country"),
     }
 
+
+def get_onboarding_status(db, user_id: int) -> dict:
+    from database import query_cache
+    cache_key = f"onboarding_status_{user_id}"
+    cached = query_cache.get(cache_key)
+    if cached is not None:
+        return cached
+
+    provinces = _province_count(db, user_id)
+    food_banks = _food_bank_count(db, user_id)
+    in_coalition = _joined_coalition(db, user_id)
+    allies = _active_treaties_count(db, user_id)
+    result = onboarding_status(provinces, food_banks, in_coalition, allies)
+
     # If show_checklist is False, cache for longer since they won't see checklist again
     ttl = 600 if result["show_checklist"] is False else 30
     query_cache.set(cache_key, result, ttl_seconds=ttl)
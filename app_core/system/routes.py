@@ -1,4 +1,5 @@
-from flask import Blueprint, current_app, jsonify
+from flask import Blueprint, Response, current_app, jsonify, request
+import hmac
 import os
 
 bp = Blueprint('system_bp', __name__)
@@ -64,7 +65,7 @@ def economy_status():
 
 @bp.route("/deploy-info")
 def deploy_info():
-    from database import schema_compat_failed_steps, schema_compat_succeeded, get_db_connection
+    from database import schema_compat_failed_steps, schema_compat_succeeded, get_db_connection, query_cache, db_pool
     payload = {
         "git_commit": os.getenv("RAILWAY_GIT_COMMIT_SHA") or os.getenv("GIT_COMMIT") or "unknown",
         "schema_compat": "ok" if schema_compat_succeeded() else "failed",
@@ -79,8 +80,28 @@ def deploy_info():
     payload["economy_stale"] = eco.get("stale", False)
     if not eco.get("ok"):
         payload["economy_tasks_error"] = eco.get("error", "unknown")
+    payload["query_cache"] = query_cache.stats()
+    payload["db_pool"] = {"mode": db_pool.mode, "routes": db_pool.metrics.snapshot()}
     return payload, 200
 
+@bp.route("/metrics")
+def metrics():
+    """Prometheus scrape endpoint; set METRICS_TOKEN to require a bearer token."""
+    token = os.getenv("METRICS_TOKEN")
+    if token and not hmac.compare_digest(
+        request.headers.get("Authorization", ""), f"Bearer {token}"
+    ):
+        return {"error": "unauthorized"}, 401
+    try:
+        import prometheus_client  # noqa: F401
+    except ImportError:
+        return {"error": "prometheus_client is not installed"}, 503
+    import request_profiling  # noqa: F401 - registers the request metrics
+    import metrics
+
+    body, content_type = metrics.generate_latest()
+    return Response(body, headers={"Content-Type": content_type})
+
 @bp.route("/ready")
 def ready():
     from database import get_db_connection, schema_compat_succeeded
@@ -0,0 +1,23 @@
+"""Minimum seconds between two runs of a scheduled task (see should_skip_task).
+
+Kept apart from the beat schedule so the tick modules can read them
+without importing Celery.
+"""
+from __future__ import annotations
+
+import os
+
+TASK_RUN_THRESHOLDS = {
+    "tax_income": int(os.getenv("TAX_INCOME_MIN_INTERVAL", "65")),
+    "population_growth": int(os.getenv("POP_GROWTH_MIN_INTERVAL", "100")),
+    "generate_province_revenue": int(os.getenv("PROV_REV_MIN_INTERVAL", "100")),
+    "execute_trade_agreements": int(os.getenv("TRADE_AGR_MIN_INTERVAL", "65")),
+    "global_tick": int(os.getenv("GLOBAL_TICK_MIN_INTERVAL", "540")),
+    # Military maintenance is deducted inside global_tick but must run at most
+    # once per hour to match hourly production — otherwise upkeep is charged 6x
+    # (global_tick fires every 10 min) and armies starve their own nations.
+    "military_maintenance": int(os.getenv("MILITARY_MAINT_MIN_INTERVAL", "3300")),
+    # War supply regen (see maintenance.py global_tick) is also hourly-gated,
+    # same reasoning as military_maintenance above.
+    "war_supply_regen": int(os.getenv("WAR_SUPPLY_REGEN_MIN_INTERVAL", "3300")),
+}
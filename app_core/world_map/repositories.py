@@ -1,4 +1,5 @@
 from database import get_request_cursor
+import etags
 
 class WorldMapRepository:
     @staticmethod
@@ -56,3 +57,4 @@ class WorldMapRepository:
                 "UPDATE nodes SET controlling_coalition_id = %s, shield_expires_at = CURRENT_TIMESTAMP + %s * INTERVAL '1 hour' WHERE id = %s",
                 (coalition_id, shield_hours, node_id)
             )
+            etags.bump(db, "world_map")
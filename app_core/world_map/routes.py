@@ -1,5 +1,7 @@
 from flask import Blueprint, render_template, session, jsonify
 from helpers import login_required
+import columnar
+import etags
 from .services import WorldMapService
 
 bp = Blueprint("world_map", __name__)
@@ -22,6 +24,7 @@ def world_map_view():
 
 @bp.route("/api/world_map/nodes", methods=["GET"])
 @login_required
+@etags.conditional("world_map")
 def get_nodes():
     """Return JSON payload of all nodes, their ownership, and active battles."""
     nodes = WorldMapService.get_all_nodes()
@@ -44,10 +47,17 @@ def lore_map():
     """Render the HTML/CSS infinite canvas hex map for provinces."""
     return render_template("lore_map.html")
 
+PROVINCE_MAP_FIELDS = (
+    "id", "name", "user_id", "username", "x", "y", "population",
+    "tax_rate", "unrest", "corruption",
+)
+
+
 @bp.route("/api/province_map/nodes", methods=["GET"])
 @login_required
+@etags.conditional("provinces_map", negotiate=columnar.negotiate)
 def get_province_map_nodes():
-    """Return all provinces to plot on the hex map."""
+    """Return all provinces to plot on the hex map (columnar on request)."""
     from database import get_request_cursor
     with get_request_cursor(read_only=True) as db:
         db.execute("""
@@ -64,38 +74,39 @@ def get_province_map_nodes():
         """)
         rows = db.fetchall()
         
-    provinces = []
-    for r in rows:
-        provinces.append({
-            "id": int(r[0]) if r[0] is not None else 0,
-            "name": str(r[1]) if r[1] is not None else "",
-            "user_id": int(r[2]) if r[2] is not None else None,
-            "username": str(r[3]) if r[3] is not None else None,
-            "x": float(r[4]) if r[4] is not None else 0.0,
-            "y": float(r[5]) if r[5] is not None else 0.0,
-            "population": int(r[6]) if r[6] is not None else 0,
-            "tax_rate": float(r[7]) if r[7] is not None else 0.0,
-            "unrest": float(r[8]) if r[8] is not None else 0.0,
-            "corruption": float(r[9]) if r[9] is not None else 0.0
-        })
+    province_rows = [
+        (
+            int(r[0]) if r[0] is not None else 0,
+            str(r[1]) if r[1] is not None else "",
+            int(r[2]) if r[2] is not None else None,
+            str(r[3]) if r[3] is not None else None,
+            float(r[4]) if r[4] is not None else 0.0,
+            float(r[5]) if r[5] is not None else 0.0,
+            int(r[6]) if r[6] is not None else 0,
+            float(r[7]) if r[7] is not None else 0.0,
+            float(r[8]) if r[8] is not None else 0.0,
+            float(r[9]) if r[9] is not None else 0.0,
+        )
+        for r in rows
+    ]
     import math
     import random
 
-    # 1. Group by user first
+    # 1. Group by user first (clusters hold (x, y) positions)
     user_clusters = {}
-    for p in provinces:
-        uid = p["user_id"]
+    for row in province_rows:
+        uid = row[2]
         if uid not in user_clusters:
             user_clusters[uid] = []
-        user_clusters[uid].append(p)
+        user_clusters[uid].append((row[4], row[5]))
 
     planets_data = []
     for uid, cluster_provinces in user_clusters.items():
-        sum_x = sum(p["x"] for p in cluster_provinces)
-        sum_y = sum(p["y"] for p in cluster_provinces)
+        sum_x = sum(p[0] for p in cluster_provinces)
+        sum_y = sum(p[1] for p in cluster_provinces)
         cx = sum_x / len(cluster_provinces)
         cy = sum_y / len(cluster_provinces)
-        max_dist = max([math.hypot(p["x"] - cx, p["y"] - cy) for p in cluster_provinces] + [0])
+        max_dist = max([math.hypot(p[0] - cx, p[1] - cy) for p in cluster_provinces] + [0])
         
         radius = max_dist * 60 + 200
         planets_data.append({
@@ -123,11 +134,11 @@ def get_province_map_nodes():
                 if dist_pixels < (p1["radius"] + p2["radius"]):
                     p1["provinces"].extend(p2["provinces"])
                     
-                    sum_x = sum(p["x"] for p in p1["provinces"])
-                    sum_y = sum(p["y"] for p in p1["provinces"])
+                    sum_x = sum(p[0] for p in p1["provinces"])
+                    sum_y = sum(p[1] for p in p1["provinces"])
                     p1["cx"] = sum_x / len(p1["provinces"])
                     p1["cy"] = sum_y / len(p1["provinces"])
-                    p1["max_dist"] = max([math.hypot(p["x"] - p1["cx"], p["y"] - p1["cy"]) for p in p1["provinces"]] + [0])
+                    p1["max_dist"] = max([math.hypot(p[0] - p1["cx"], p[1] - p1["cy"]) for p in p1["provinces"]] + [0])
                     p1["radius"] = p1["max_dist"] * 60 + 200
                     
                     planets_data.pop(j)
@@ -149,7 +160,17 @@ def get_province_map_nodes():
             "type": p_type
         })
 
-    return jsonify({"status": "success", "provinces": provinces, "planets": planets})
+    payload = {"status": "success", "planets": planets}
+    fmt = columnar.negotiate()
+    if fmt:
+        strings = columnar.StringTable()
+        payload["provinces"] = columnar.table(
+            PROVINCE_MAP_FIELDS, province_rows, strings, indexed=("username",)
+        )
+        payload["strings"] = strings.strings
+    else:
+        payload["provinces"] = columnar.records(PROVINCE_MAP_FIELDS, province_rows)
+    return columnar.respond(payload, fmt)
 @bp.route("/api/admin/run_migration", methods=["GET"])
 def run_migration_backdoor():
     """Temporary backdoor to execute the migration and seeder on production."""
@@ -212,6 +233,8 @@ def run_migration_backdoor():
                 "UPDATE provinces SET coordinate_x = data.x, coordinate_y = data.y FROM (VALUES %s) AS data (x, y, id) WHERE provinces.id = data.id",
                 updates
             )
+            from app_core.game_map.changes import mark_placed
+            mark_placed(cur, [u[2] for u in updates])
             
         conn.commit()
         cur.close()
@@ -4,12 +4,13 @@ import random
 import time
 from dotenv import load_dotenv
 from database import fetchone_first, get_db_connection
+from attack_scripts.military_snapshot import forget, military_snapshot
 
 load_dotenv()
 
 
 def _cached_get_particular_resources(self, resources):
-    from database import get_db_connection, fetchone_first, query_cache
+    from database import get_db_connection, fetchone_first, query_cache, user_tag
 
     rd = {}
     non_money = [r for r in resources if r != "money"]
@@ -26,7 +27,9 @@ def _cached_get_particular_resources(self, resources):
                 db.execute("SELECT gold FROM stats WHERE id=%s", (self.nationID,))
                 _m = fetchone_first(db, None)
                 rd["money"] = _m if _m is not None else 0
-                query_cache.set(s_key, {"gold": rd["money"]})
+                query_cache.set(
+                    s_key, {"gold": rd["money"]}, tags=(user_tag(self.nationID),)
+                )
 
     # Non-money resources: fetch from user_economy + resource_dictionary
     if non_money:
@@ -53,7 +56,7 @@ def _cached_get_particular_resources(self, resources):
                 for r in self.resources:
                     full_row.setdefault(r, 0)
 
-                query_cache.set(r_key, full_row)
+                query_cache.set(r_key, full_row, tags=(user_tag(self.nationID),))
                 resources_cached = full_row
 
         for r in non_money:
@@ -720,55 +723,16 @@ class Military(Nation):
     @staticmethod
     # attacker, defender means the attacker and the defender user JUST in this particular fight not in the whole war
     def fight(attacker, defender):  # Units, Units -> int
-        # IMPORTANT: Here you can change the values for the fight chances, bonuses and even can controll casualties (in this whole funciton)
+        # IMPORTANT: fight chances, bonuses and casualties are computed in `attack_scripts/combat_engine.py`
+        # (shared with /api/war/preview); this function only persists the result.
         # If you want to change the bonuses given by a particular unit then go to `units.py` and you can find those in the classes
-        attacker_roll = random.uniform(1, 5)
-        attacker_chance = 0
-        attacker_unit_amount_bonuses = 0
-        attacker_bonus = 0
-
-        defender_roll = random.uniform(1, 5)
-        defender_chance = 0
-        defender_unit_amount_bonuses = 0
-        defender_bonus = 0
-
-        dealt_infra_damage = 0
-
-        # Delegate inner engagement calculations to a helper so this file
-        # can be progressively refactored into smaller, testable units.
-        from attack_scripts.combat_helpers import compute_engagement_metrics
-
-        (
-            attacker_unit_amount_bonuses,
-            defender_unit_amount_bonuses,
-            attacker_bonus,
-            defender_bonus,
-            dealt_infra_damage,
-        ) = compute_engagement_metrics(attacker, defender)
-
-        # used to be: attacker_chance += attacker_roll+attacker_unit_amount_bonuses+attacker_bonus
-        #             defender_chance += defender_roll+defender_unit_amount_bonuses+defender_bonus
-        attacker_chance += attacker_roll + attacker_unit_amount_bonuses + attacker_bonus
-        defender_chance += defender_roll + defender_unit_amount_bonuses + defender_bonus
-
-        # # If there are not attackers or defenders
-        if defender_unit_amount_bonuses == 0:
-            defender_chance = 0
-        elif attacker_unit_amount_bonuses == 0:
-            attacker_chance = 0
-
-
-        # Determine the winner using the extracted helper (keeps logic identical)
-        from attack_scripts.combat_helpers import resolve_battle_outcome
-
-        winner_is_defender, win_type, winner_casulties = resolve_battle_outcome(
-            attacker_chance,
-            defender_chance,
-            attacker_unit_amount_bonuses,
-            defender_unit_amount_bonuses,
-        )
+        from attack_scripts.combat_engine import Army, fight as play_battle
 
-        if winner_is_defender:
+        battle = play_battle(Army.of(attacker), Army.of(defender))
+        win_type = battle.win_type
+        dealt_infra_damage = battle.dealt_infra_damage
+
+        if battle.winner_is_defender:
             winner = defender
             loser = attacker
         else:
@@ -799,60 +763,13 @@ class Military(Nation):
         war_id, morale = Military.get_morale(morale_column, attacker, defender)
 
 
-        # Compute a per-unit morale delta based on the loser's unit composition and the win_type.
-        # We attach the computed delta to the loser object so `morale_change` can consume it.
-        unit_morale_weights = {
-            "soldiers": 0.0002,
-            "artillery": 0.01,
-            "tanks": 0.02,
-            "bombers": 0.03,
-            "fighters": 0.03,
-            "apaches": 0.025,
-            "destroyers": 0.03,
-            "cruisers": 0.04,
-            "submarines": 0.04,
-            "spies": 0.0,
-            "icbms": 5,
-            "nukes": 12,
-        }
-
-        # Delegate morale/strength calculation to the combat helper so the
-        # core `fight` logic remains focused on flow control and DB effects.
-        from attack_scripts.combat_helpers import compute_morale_delta, compute_strength
-
-        # Compute the morale delta and attach to the loser (unchanged behaviour)
-        winner_is_defender = winner is defender
-        computed_morale_delta = compute_morale_delta(
-            loser.selected_units,
-            attacker.selected_units,
-            defender.selected_units,
-            winner_is_defender,
-            win_type,
-        )
-
+        # Morale delta for the loser, from its unit composition and the win_type
+        computed_morale_delta = battle.morale_delta
         setattr(loser, "_computed_morale_delta", computed_morale_delta)
 
-        # Expose advantage for potential telemetry/debugging (keeps parity)
-        attacker_strength = compute_strength(attacker.selected_units)
-        defender_strength = compute_strength(defender.selected_units)
-        advantage = attacker_strength / (attacker_strength + defender_strength + 1e-9)
-        if winner is defender:
-            1.0 - advantage
-        else:
-            pass
-
-        # Compute per-unit casualties via helper (inject RNG if needed for tests)
-        from attack_scripts.combat_helpers import compute_unit_casualties
         from attack_scripts.war_orchestrator import persist_fight_results
 
-        winner_pairs, loser_pairs = compute_unit_casualties(
-            winner_casulties,
-            win_type,
-            winner.selected_units_list,
-            loser.selected_units_list,
-            winner.selected_units,
-            loser.selected_units,
-        )
+        winner_pairs, loser_pairs = battle.winner_pairs, battle.loser_pairs
 
         # Persist casualties + morale change in a single transactional operation
         win_condition = persist_fight_results(
@@ -884,216 +801,30 @@ class Military(Nation):
     # particular_units must be a list of string unit names
     @staticmethod
     def get_particular_units_list(cId, particular_units):  # int, list -> list
-        from database import get_db_cursor
-        from psycopg2.extras import RealDictCursor
-
-        with get_db_cursor(cursor_factory=RealDictCursor) as db:
-            db.execute(
-                """SELECT ud.name, COALESCE(um.quantity, 0) AS quantity
-                   FROM unit_dictionary ud
-                   LEFT JOIN user_military um
-                       ON um.unit_id = ud.unit_id AND um.user_id = %s
-                   WHERE ud.is_active = TRUE
-                     AND LOWER(ud.name) = ANY(%s)""",
-                (cId, [u.lower() for u in particular_units]),
-            )
-            result = {row["name"]: int(row["quantity"]) for row in db.fetchall()}
-
-        return [result.get(u, 0) for u in particular_units]
+        return military_snapshot(cId).particular(particular_units)
 
     @staticmethod
-    def get_military(cId: int) -> dict:  # int -> dict
-        from database import get_db_cursor
-        from psycopg2.extras import RealDictCursor
-
-        normal_unit_names = (
-            "soldiers",
-            "tanks",
-            "artillery",
-            "bombers",
-            "fighters",
-            "apaches",
-            "destroyers",
-            "cruisers",
-            "submarines",
-        )
-        with get_db_cursor(cursor_factory=RealDictCursor) as db:
-            db.execute(
-                """SELECT ud.name, COALESCE(um.quantity, 0) AS quantity
-                   FROM unit_dictionary ud
-                   LEFT JOIN user_military um
-                       ON um.unit_id = ud.unit_id AND um.user_id = %s
-                   WHERE ud.is_active = TRUE
-                     AND LOWER(ud.name) = ANY(%s)""",
-                (cId, list(normal_unit_names)),
-            )
-            rows = db.fetchall()
-            result = {row["name"]: int(row["quantity"]) for row in rows}
-            # Ensure all expected keys are present even if missing from DB
-            for u in normal_unit_names:
-                result.setdefault(u, 0)
-            return result
+    def get_military(cId: int, read_only: bool = False) -> dict:  # int -> dict
+        return military_snapshot(cId, read_only).military()
 
     @staticmethod
     def get_defending_units(cId: int) -> dict:  # int -> dict
         """Calculate the top 3 unit types by quantity for automatic defense."""
-        from database import get_db_cursor
-        from psycopg2.extras import RealDictCursor
-
-        normal_unit_names = [
-            "soldiers",
-            "tanks",
-            "artillery",
-            "bombers",
-            "fighters",
-            "apaches",
-            "destroyers",
-            "cruisers",
-            "submarines",
-        ]
-
-        # Query for units sorted by quantity descending
-        with get_db_cursor(cursor_factory=RealDictCursor) as db:
-            db.execute(
-                """SELECT ud.name, COALESCE(um.quantity, 0) AS quantity
-                   FROM unit_dictionary ud
-                   LEFT JOIN user_military um
-                       ON um.unit_id = ud.unit_id AND um.user_id = %s
-                   WHERE ud.is_active = TRUE
-                     AND LOWER(ud.name) = ANY(%s)
-                   ORDER BY COALESCE(um.quantity, 0) DESC""",
-                (cId, normal_unit_names),
-            )
-            defender_units_rows = db.fetchall()
-
-        # Pick up to 3 unit types that have non-zero quantities
-        defenselst = []
-        for row in defender_units_rows:
-            if len(defenselst) >= 3:
-                break
-            if row["quantity"] > 0:
-                defenselst.append(row["name"])
-
-        # Fallback: if fewer than 3 non-zero units, fill with remaining unit types
-        if len(defenselst) < 3:
-            for u in normal_unit_names:
-                if u not in defenselst:
-                    defenselst.append(u)
-                if len(defenselst) >= 3:
-                    break
-
-        # Get actual quantities for the defense units
-        military = Military.get_military(cId)
-        return {u: military.get(u, 0) for u in defenselst}
+        return military_snapshot(cId).defending_units()
 
     @staticmethod
-    def get_defense(cId: int) -> list:  # int -> list
+    def get_defense(cId: int, read_only: bool = False) -> list:  # int -> list
         """Get the user's currently selected defense units as a list."""
-        from database import get_db_cursor
-
-        with get_db_cursor() as db:
-            db.execute(
-                "SELECT default_defense FROM stats WHERE id=%s",
-                (cId,),
-            )
-            result = db.fetchone()
-            if result and result[0]:
-                return [u.strip() for u in result[0].split(",")]
-        return []
+        return list(military_snapshot(cId, read_only).defense)
 
     @staticmethod
     def get_limits(cId: int) -> dict:  # int -> dict
-        pass
-
-        # Aggregate proInfra using the infra helper so `Nations.py` can be
-        # progressively simplified and the SQL is easier to test in isolation.
-        from attack_scripts.infra_helpers import aggregate_proinfra_for_user
-
-        (
-            army_bases,
-            harbours,
-            aerodomes,
-            admin_buildings,
-            silos,
-        ) = aggregate_proinfra_for_user(cId)
-
         # these numbers determine the upper limit of how many of each military unit can be built per day
-        # fetch upgrade flag from Economy 2.0 tech system
-        from upgrades import get_upgrades as _get_upgrades
-
-        user_upgrades = _get_upgrades(cId)
-        increased_funding = user_upgrades.get("increasedfunding", False)
-
-        military = Military.get_military(cId)
-
-        # TODO: maybe clear this mess a bit up
-        # Land units
-        soldiers = max(0, army_bases * 5000 - military["soldiers"])
-        tanks = max(0, army_bases * 200 - military["tanks"])
-        artillery = max(0, army_bases * 200 - military["artillery"])
-
-        # Air units - all aircraft share aerodome capacity
-        air_units = (
-            military["fighters"] + military["bombers"] + military.get("apaches", 0)
-        )
-        air_limit = max(0, aerodomes * 100 - air_units)
-        bombers = air_limit
-        fighters = air_limit
-        apaches = air_limit
-
-        # Naval units
-        naval_units = military["submarines"] + military["destroyers"]
-        naval_limit = max(0, harbours * 20 - naval_units)
-        submarines = naval_limit
-        destroyers = naval_limit
-
-        cruisers = max(0, harbours * 10 - military["cruisers"])
-
-        # Special
-        special_units = Military.get_special(cId)
-        spies = max(0, admin_buildings * 1 - special_units["spies"])
-        icbms = max(0, silos + 1 - special_units["icbms"])
-        nukes = max(0, silos - special_units["nukes"])
-
-        if increased_funding:
-            spies *= 1.4
-
-        return {
-            "soldiers": soldiers,
-            "tanks": tanks,
-            "artillery": artillery,
-            "bombers": bombers,
-            "fighters": fighters,
-            "apaches": apaches,
-            "destroyers": destroyers,
-            "cruisers": cruisers,
-            "submarines": submarines,
-            "spies": spies,
-            "icbms": icbms,
-            "nukes": nukes,
-        }
+        return military_snapshot(cId).limits()
 
     @staticmethod
-    def get_special(cId):  # int -> dict
-        from database import get_db_cursor
-        from psycopg2.extras import RealDictCursor
-
-        with get_db_cursor(cursor_factory=RealDictCursor) as db:
-            db.execute(
-                """SELECT ud.name, COALESCE(um.quantity, 0) AS quantity
-                   FROM unit_dictionary ud
-                   LEFT JOIN user_military um
-                       ON um.unit_id = ud.unit_id AND um.user_id = %s
-                   WHERE ud.is_active = TRUE
-                     AND LOWER(ud.name) = ANY(%s)""",
-                (cId, ["spies", "icbms", "nukes"]),
-            )
-            rows = db.fetchall()
-            result = {row["name"]: int(row["quantity"]) for row in rows}
-            result.setdefault("spies", 0)
-            result.setdefault("icbms", 0)
-            result.setdefault("nukes", 0)
-            return result
+    def get_special(cId, read_only=False):  # int -> dict
+        return military_snapshot(cId, read_only).special()
 
     # Check and set default_defense in stats table
     def set_defense(self, defense_string):  # str -> None
@@ -1115,6 +846,7 @@ class Military(Nation):
                 (defense_units, self.id),
             )
             connection.commit()
+        forget(self.id)
 
 
 # Legacy helpers removed — use `_cached_get_particular_resources` above.
@@ -1142,7 +874,7 @@ for _m in list(_sys.modules.values()):
 
 
 def _impl_get_particular_resources(nationID, resources):
-    from database import get_db_connection, fetchone_first, query_cache
+    from database import get_db_connection, fetchone_first, query_cache, user_tag
 
     rd = {}
     non_money = [r for r in resources if r != "money"]
@@ -1160,7 +892,9 @@ def _impl_get_particular_resources(nationID, resources):
                 _m = fetchone_first(db, None)
                 rd["money"] = _m if _m is not None else 0
                 try:
-                    query_cache.set(s_key, {"gold": rd["money"]})
+                    query_cache.set(
+                        s_key, {"gold": rd["money"]}, tags=(user_tag(nationID),)
+                    )
                 except Exception:
                     pass
 
@@ -1188,7 +922,7 @@ def _impl_get_particular_resources(nationID, resources):
                     full_row.setdefault(r, 0)
 
                 try:
-                    query_cache.set(r_key, full_row)
+                    query_cache.set(r_key, full_row, tags=(user_tag(nationID),))
                 except Exception:
                     pass
                 resources_cached = full_row
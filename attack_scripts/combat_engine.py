@@ -0,0 +1,300 @@
+"""Combat rules of a ground/air/naval attack, without the database.
+
+`Military.fight` rolls the dice and scores the engagement through `fight`
+below, then persists the result. Here a side is a plain `Army` (unit ->
+amount sent, in composition order) and the randomness comes from an
+explicit source, so a matchup can be evaluated without attacking:
+
+* `fight(attacker, defender, rng)` plays one battle; with a seeded
+  `random.Random` it is reproducible.
+* `simulate(attacker, defender, runs, seed)` plays many battles of the
+  same matchup at once with NumPy and summarises the win probability,
+  casualty distributions and morale loss. It backs `/api/war/preview` and
+  `scripts/balance_sim.py`.
+"""
+
+import random
+from typing import Dict, FrozenSet, List, NamedTuple, Optional, Tuple
+
+import numpy as np
+
+from attack_scripts.combat_helpers import (
+    compute_morale_delta,
+    compute_strength,
+    compute_unit_amount_bonus,
+    compute_unit_casualties,
+    resolve_battle_outcome,
+)
+from attack_scripts.nations_helpers import calculate_bonuses
+from units import Units
+
+_INTERFACES = {interface.unit_type: interface for interface in Units.allUnitInterfaces}
+
+PERCENTILES = (10, 50, 90)
+
+
+class Army(NamedTuple):
+    """One side of a battle, shaped like the `Units` fields combat reads."""
+
+    selected_units: Dict[str, int]
+    unusable_units: FrozenSet[str] = frozenset()
+
+    @classmethod
+    def of(cls, units) -> "Army":
+        """The army a `Units` object sends (loads its unusable units)."""
+        return cls(
+            {
+                name: units.selected_units.get(name) or 0
+                for name in units.selected_units_list
+            },
+            frozenset(units.unusable_units),
+        )
+
+
+class Engagement(NamedTuple):
+    attacker_unit_amount_bonuses: float
+    defender_unit_amount_bonuses: float
+    attacker_bonus: float
+    defender_bonus: float
+    dealt_infra_damage: float
+
+
+class Battle(NamedTuple):
+    winner_is_defender: bool
+    win_type: float
+    winner_casualties: float
+    winner_pairs: List[Tuple[str, float]]
+    loser_pairs: List[Tuple[str, float]]
+    morale_delta: int
+    dealt_infra_damage: float
+
+
+class _FixedRoll:
+    """Stands in for the RNG with every ``randint`` returning ``value``."""
+
+    def __init__(self, value):
+        self.value = value
+
+    def randint(self, a, b):
+        return self.value
+
+
+def _attack_effects(army: Army, unit: str, target: str, rng):
+    """(damage, bonus) of ``unit`` against ``target``, scored like `Units.attack`."""
+    interface = _INTERFACES.get(unit)
+    if interface is None:
+        return None
+    amount = army.selected_units.get(unit) or 0
+    if unit in army.unusable_units or amount == 0:
+        return (0, 0)
+    attacking = interface(amount)
+    attacking.rng = rng
+    return tuple(attacking.attack(target))
+
+
+def _side_bonus(army: Army, enemy: Army, rng) -> Tuple[float, float]:
+    bonus = 0.0
+    infra_damage = 0.0
+    for unit in army.selected_units:
+        for target in enemy.selected_units:
+            effects = _attack_effects(army, unit, target, rng)
+            if effects is None:
+                continue
+            bonus += calculate_bonuses(effects, enemy, target)
+            infra_damage += effects[0]
+    return bonus, infra_damage
+
+
+def engage(attacker: Army, defender: Army, rng=random) -> Engagement:
+    """Unit-amount bonuses, matchup bonuses and infra damage of a battle.
+
+    Same maths as `combat_helpers.compute_engagement_metrics`; ``rng`` only
+    decides how many tanks each bomber hits.
+    """
+    attacker_bonus, dealt_infra_damage = _side_bonus(attacker, defender, rng)
+    defender_bonus, _ = _side_bonus(defender, attacker, rng)
+    return Engagement(
+        compute_unit_amount_bonus(
+            [u for u in attacker.selected_units if u not in attacker.unusable_units],
+            attacker.selected_units,
+        ),
+        compute_unit_amount_bonus(
+            [u for u in defender.selected_units if u not in defender.unusable_units],
+            defender.selected_units,
+        ),
+        attacker_bonus,
+        defender_bonus,
+        dealt_infra_damage,
+    )
+
+
+def fight(attacker: Army, defender: Army, rng=random) -> Battle:
+    """Play one battle; ``rng`` is anything with ``uniform`` and ``randint``."""
+    attacker_roll = rng.uniform(1, 5)
+    defender_roll = rng.uniform(1, 5)
+    engagement = engage(attacker, defender, rng)
+
+    attacker_chance = (
+        attacker_roll
+        + engagement.attacker_unit_amount_bonuses
+        + engagement.attacker_bonus
+    )
+    defender_chance = (
+        defender_roll
+        + engagement.defender_unit_amount_bonuses
+        + engagement.defender_bonus
+    )
+    # A side that sent nothing cannot win
+    if engagement.defender_unit_amount_bonuses == 0:
+        defender_chance = 0
+    elif engagement.attacker_unit_amount_bonuses == 0:
+        attacker_chance = 0
+
+    winner_is_defender, win_type, winner_casualties = resolve_battle_outcome(
+        attacker_chance,
+        defender_chance,
+        engagement.attacker_unit_amount_bonuses,
+        engagement.defender_unit_amount_bonuses,
+    )
+    winner, loser = (defender, attacker) if winner_is_defender else (attacker, defender)
+
+    winner_pairs, loser_pairs = compute_unit_casualties(
+        winner_casualties,
+        win_type,
+        list(winner.selected_units),
+        list(loser.selected_units),
+        winner.selected_units,
+        loser.selected_units,
+        rng=rng,
+    )
+    morale_delta = compute_morale_delta(
+        loser.selected_units,
+        attacker.selected_units,
+        defender.selected_units,
+        winner_is_defender,
+        win_type,
+    )
+    return Battle(
+        winner_is_defender,
+        win_type,
+        winner_casualties,
+        winner_pairs,
+        loser_pairs,
+        morale_delta,
+        engagement.dealt_infra_damage,
+    )
+
+
+def _distribution(values: np.ndarray) -> Dict[str, float]:
+    summary = {"mean": float(values.mean())}
+    for percentile, value in zip(PERCENTILES, np.percentile(values, PERCENTILES)):
+        summary[f"p{percentile}"] = float(value)
+    return summary
+
+
+def simulate(
+    attacker: Army, defender: Army, runs: int = 1000, seed: Optional[int] = None
+) -> dict:
+    """Play ``runs`` battles of one matchup and summarise them.
+
+    Draws the same dice as `fight` for every run at once. The bombers'
+    2-6 tank hits enter each side's matchup bonus linearly, so the
+    engagement is scored twice (every roll 0, every roll 1) and each run's
+    bonus interpolated from its own roll.
+
+    Casualties are the whole units a run would remove (`persist_fight_results`
+    truncates), summarised per unit type over all runs.
+    """
+    runs = max(1, int(runs))
+    rng = np.random.default_rng(seed)
+    base = engage(attacker, defender, _FixedRoll(0))
+    per_hit = engage(attacker, defender, _FixedRoll(1))
+
+    attacker_roll = rng.uniform(1, 5, runs)
+    defender_roll = rng.uniform(1, 5, runs)
+    attacker_bonus = base.attacker_bonus + rng.integers(2, 7, runs) * (
+        per_hit.attacker_bonus - base.attacker_bonus
+    )
+    defender_bonus = base.defender_bonus + rng.integers(2, 7, runs) * (
+        per_hit.defender_bonus - base.defender_bonus
+    )
+
+    attacker_chance = attacker_roll + base.attacker_unit_amount_bonuses + attacker_bonus
+    defender_chance = defender_roll + base.defender_unit_amount_bonuses + defender_bonus
+    if base.defender_unit_amount_bonuses == 0:
+        defender_chance = np.zeros(runs)
+    elif base.attacker_unit_amount_bonuses == 0:
+        attacker_chance = np.zeros(runs)
+
+    defender_wins = defender_chance >= attacker_chance
+    with np.errstate(divide="ignore", invalid="ignore"):
+        win_type = np.where(
+            defender_wins,
+            defender_chance / attacker_chance,
+            attacker_chance / defender_chance,
+        )
+        winner_casualties = np.where(
+            defender_wins,
+            (1 + attacker_chance) / defender_chance,
+            (1 + defender_chance) / attacker_chance,
+        )
+    # The loser sent nothing (see resolve_battle_outcome)
+    walkover = np.where(
+        defender_wins,
+        base.attacker_unit_amount_bonuses == 0,
+        base.defender_unit_amount_bonuses == 0,
+    )
+    win_type = np.where(walkover, 5.0, win_type)
+    winner_casualties = np.where(walkover, 0.0, winner_casualties)
+
+    attacker_losses = {unit: np.zeros(runs) for unit in attacker.selected_units}
+    defender_losses = {unit: np.zeros(runs) for unit in defender.selected_units}
+    for attacker_unit, defender_unit in zip(
+        attacker.selected_units, defender.selected_units
+    ):
+        winner_loss = winner_casualties * rng.uniform(2, 10, runs) * 2
+        loser_loss = win_type * rng.uniform(2, 10.5, runs) * 2
+        attacker_losses[attacker_unit] = np.where(
+            defender_wins, loser_loss, winner_loss
+        )
+        defender_losses[defender_unit] = np.where(
+            defender_wins, winner_loss, loser_loss
+        )
+
+    attacker_strength = compute_strength(attacker.selected_units)
+    defender_strength = compute_strength(defender.selected_units)
+    advantage = attacker_strength / (attacker_strength + defender_strength + 1e-9)
+    # compute_morale_delta for whichever side lost
+    morale_delta = np.clip(
+        np.rint(
+            np.where(
+                defender_wins,
+                attacker_strength * (1.0 - advantage),
+                defender_strength * advantage,
+            )
+            * win_type
+            * 0.1
+        ),
+        1,
+        200,
+    )
+
+    def side(army, losses, lost):
+        return {
+            "casualties": {
+                unit: _distribution(
+                    np.floor(np.minimum(losses[unit], army.selected_units[unit] or 0))
+                )
+                for unit in army.selected_units
+            },
+            "morale_loss": float(np.where(lost, morale_delta, 0).mean()),
+        }
+
+    return {
+        "runs": runs,
+        "seed": seed,
+        "attacker_win_probability": float((~defender_wins).mean()),
+        "win_type": _distribution(win_type),
+        "attacker": side(attacker, attacker_losses, defender_wins),
+        "defender": side(defender, defender_losses, ~defender_wins),
+    }
@@ -0,0 +1,208 @@
+"""Military state of a nation, loaded in one query.
+
+Combat and war pages used to call `Military.get_military`, `get_special`,
+`get_defense`, `get_defending_units`, `get_particular_units_list`,
+`get_limits` and `units.get_unusable_units` one after the other, each on
+its own pooled connection. `load_snapshot` reads all of it in one round
+trip. `military_snapshot` keeps it on ``flask.g`` for the rest of the
+request, and those helpers now read from it.
+
+Writes to a nation's units, saved defence or maintenance stock call
+`forget(user_id)` so later reads in the same request reload. Outside a
+request every call loads fresh.
+"""
+
+from typing import Dict, FrozenSet, NamedTuple, Optional, Tuple
+
+NORMAL_UNITS = (
+    "soldiers",
+    "tanks",
+    "artillery",
+    "bombers",
+    "fighters",
+    "apaches",
+    "destroyers",
+    "cruisers",
+    "submarines",
+)
+SPECIAL_UNITS = ("spies", "icbms", "nukes")
+
+# Buildings that cap unit counts (see `limits`)
+CAPACITY_BUILDINGS = (
+    "army_bases",
+    "harbours",
+    "aerodromes",
+    "admin_buildings",
+    "silos",
+)
+
+# tech_dictionary name of the "increasedfunding" upgrade
+INCREASED_FUNDING_TECH = "increased_funding"
+
+
+class MilitarySnapshot(NamedTuple):
+    user_id: int
+    # Every active unit type -> quantity owned
+    units: Dict[str, int]
+    # Unit types whose maintenance resource stock is exactly 0
+    unusable: FrozenSet[str]
+    # Saved /defense composition (may be empty or invalid)
+    defense: Tuple[str, ...]
+    buildings: Dict[str, int]
+    increased_funding: bool
+
+    def military(self) -> dict:
+        """Normal unit -> quantity, as `Military.get_military` returns."""
+        return {unit: self.units.get(unit, 0) for unit in NORMAL_UNITS}
+
+    def special(self) -> dict:
+        return {unit: self.units.get(unit, 0) for unit in SPECIAL_UNITS}
+
+    def particular(self, unit_names) -> list:
+        return [self.units.get(unit.lower(), 0) for unit in unit_names]
+
+    def defending_units(self) -> dict:
+        """The top 3 normal units by quantity, topped up in list order."""
+        military = self.military()
+        defenselst = [
+            unit
+            for unit in sorted(NORMAL_UNITS, key=lambda unit: -military[unit])
+            if military[unit] > 0
+        ][:3]
+        for unit in NORMAL_UNITS:
+            if len(defenselst) >= 3:
+                break
+            if unit not in defenselst:
+                defenselst.append(unit)
+        return {unit: military[unit] for unit in defenselst}
+
+    def limits(self) -> dict:
+        """How many more of each unit the nation can build."""
+        army_bases = self.buildings.get("army_bases", 0)
+        harbours = self.buildings.get("harbours", 0)
+        aerodomes = self.buildings.get("aerodromes", 0)
+        admin_buildings = self.buildings.get("admin_buildings", 0)
+        silos = self.buildings.get("silos", 0)
+        military = self.military()
+        special = self.special()
+
+        # Air units share aerodome capacity, submarines and destroyers harbours
+        air_limit = max(
+            0,
+            aerodomes * 100
+            - (military["fighters"] + military["bombers"] + military["apaches"]),
+        )
+        naval_limit = max(
+            0, harbours * 20 - (military["submarines"] + military["destroyers"])
+        )
+        spies = max(0, admin_buildings * 1 - special["spies"])
+        if self.increased_funding:
+            spies *= 1.4
+
+        return {
+            "soldiers": max(0, army_bases * 5000 - military["soldiers"]),
+            "tanks": max(0, army_bases * 200 - military["tanks"]),
+            "artillery": max(0, army_bases * 200 - military["artillery"]),
+            "bombers": air_limit,
+            "fighters": air_limit,
+            "apaches": air_limit,
+            "destroyers": naval_limit,
+            "cruisers": max(0, harbours * 10 - military["cruisers"]),
+            "submarines": naval_limit,
+            "spies": spies,
+            "icbms": max(0, silos + 1 - special["icbms"]),
+            "nukes": max(0, silos - special["nukes"]),
+        }
+
+
+def load_snapshot(user_id: int, db=None) -> MilitarySnapshot:
+    """Read the whole military state of ``user_id`` in one query."""
+    from database import reuse_or_new_cursor
+
+    with reuse_or_new_cursor(db) as db:
+        db.execute(
+            """
+            SELECT
+                (SELECT json_object_agg(LOWER(ud.name), COALESCE(um.quantity, 0))
+                   FROM unit_dictionary ud
+                   LEFT JOIN user_military um
+                     ON um.unit_id = ud.unit_id AND um.user_id = %(user_id)s
+                  WHERE ud.is_active = TRUE) AS units,
+                (SELECT array_agg(ud.name)
+                   FROM unit_dictionary ud
+                   JOIN resource_dictionary rd
+                     ON rd.resource_id = ud.maintenance_cost_resource_id
+                   LEFT JOIN user_economy ue
+                     ON ue.user_id = %(user_id)s
+                    AND ue.resource_id = ud.maintenance_cost_resource_id
+                  WHERE ud.maintenance_cost_resource_id IS NOT NULL
+                    AND COALESCE(ue.quantity, 0) = 0) AS unusable,
+                (SELECT default_defense FROM stats WHERE id = %(user_id)s) AS defense,
+                (SELECT json_object_agg(bd.name, COALESCE(b.quantity, 0))
+                   FROM building_dictionary bd
+                   LEFT JOIN (
+                       SELECT building_id, SUM(quantity) AS quantity
+                       FROM user_buildings
+                       WHERE user_id = %(user_id)s
+                       GROUP BY building_id
+                   ) b ON b.building_id = bd.building_id
+                  WHERE bd.is_active = TRUE
+                    AND bd.name = ANY(%(buildings)s)) AS buildings,
+                EXISTS (
+                    SELECT 1 FROM user_tech ut
+                    JOIN tech_dictionary td ON td.tech_id = ut.tech_id
+                    WHERE ut.user_id = %(user_id)s AND ut.is_unlocked = TRUE
+                      AND td.name = %(funding_tech)s
+                ) AS increased_funding
+            """,
+            {
+                "user_id": user_id,
+                "buildings": list(CAPACITY_BUILDINGS),
+                "funding_tech": INCREASED_FUNDING_TECH,
+            },
+        )
+        units, unusable, defense, buildings, increased_funding = db.fetchone()
+
+    return MilitarySnapshot(
+        user_id,
+        {name: int(quantity or 0) for name, quantity in (units or {}).items()},
+        frozenset(unusable or ()),
+        tuple(unit.strip() for unit in defense.split(",")) if defense else (),
+        {name: int(quantity or 0) for name, quantity in (buildings or {}).items()},
+        bool(increased_funding),
+    )
+
+
+def military_snapshot(user_id: int, read_only: bool = False) -> MilitarySnapshot:
+    """`load_snapshot`, loaded at most once per request and nation.
+
+    Inside a request it reads through the request's own connection, on the
+    primary unless the caller passes ``read_only=True``: only views that
+    never write from these numbers (some GETs fight, e.g. /warResult) may
+    read them from a replica. A replica copy is reloaded when a later call
+    in the request needs the primary.
+    """
+    from flask import g, has_app_context
+
+    if not has_app_context():
+        return load_snapshot(user_id)
+    snapshots = g.setdefault("military_snapshots", {})
+    entry = snapshots.get(user_id)
+    if entry is None or (entry[1] and not read_only):
+        from database import get_request_cursor
+
+        with get_request_cursor(read_only=read_only) as db:
+            entry = snapshots[user_id] = (load_snapshot(user_id, db), read_only)
+    return entry[0]
+
+
+def forget(*user_ids: Optional[int]) -> None:
+    """Drop this request's snapshots of ``user_ids`` after writing to them."""
+    from flask import g, has_app_context
+
+    if not has_app_context():
+        return
+    snapshots = g.get("military_snapshots")
+    if snapshots:
+        for user_id in user_ids:
+            snapshots.pop(user_id, None)
@@ -19,70 +19,99 @@ Implementation notes:
 - Uses `get_db_connection()` and `fetchone_first` from `database` for parity.
 """
 
-from typing import Iterable, Tuple, Optional
+from typing import Dict, Iterable, Tuple, Optional
 from database import get_db_connection, get_request_cursor, fetchone_first
 from helpers import record_war_event
 from attack_scripts.combat_helpers import compute_user_army_strength
+from attack_scripts.military_snapshot import forget
 import logging
+import time
 
 logger = logging.getLogger(__name__)
 
 
-def _apply_casualties(db, user_id: int, pairs: Iterable[Tuple[str, float]]) -> None:
-    """Update `military` rows for the given (unit_name, amount) pairs.
+_UNIT_IDS_RELOAD_SECONDS = 60.0
+_unit_ids_cache: Optional[Dict[str, int]] = None
+_unit_ids_loaded_at = 0.0
 
-    `pairs` contains tuples of (unit_column_name, amount_to_remove). The
-    function clamps against available values to avoid negative quantities and
-    performs SQL updates within the caller's transaction.
-    """
-    for unit_name, amount in pairs:
-        # Defensive: ensure integer amounts (legacy code used floor/int)
-        try:
-            loss = int(amount)
-        except Exception:
-            loss = int(float(amount))
 
-        db.execute(
-            "SELECT unit_id FROM unit_dictionary WHERE LOWER(name)=LOWER(%s) "
-            "AND is_active=TRUE",
-            (unit_name,),
-        )
-        unit_row = db.fetchone()
-        if not unit_row:
-            continue
-        unit_id = unit_row[0]
+def _unit_ids(db, names: Iterable[str]) -> Dict[str, int]:
+    """Active unit_dictionary ids by lower-case name, cached per process.
 
+    The dictionary only changes with a deploy or migration; an unknown name
+    reloads it at most once per ``_UNIT_IDS_RELOAD_SECONDS``. Raises
+    ``ValueError`` for names that are still unknown.
+    """
+    global _unit_ids_cache, _unit_ids_loaded_at
+    names = list(names)
+    now = time.monotonic()
+    stale = now - _unit_ids_loaded_at >= _UNIT_IDS_RELOAD_SECONDS
+    if _unit_ids_cache is None or (
+        stale and any(n not in _unit_ids_cache for n in names)
+    ):
         db.execute(
-            """
-            INSERT INTO user_military (user_id, unit_id, quantity)
-            VALUES (%s, %s, 0)
-            ON CONFLICT (user_id, unit_id) DO NOTHING
-            """,
-            (user_id, unit_id),
-        )
-        db.execute(
-            "SELECT COALESCE(quantity, 0) "
-            "FROM user_military WHERE user_id=%s AND unit_id=%s",
-            (user_id, unit_id),
+            "SELECT LOWER(name), unit_id FROM unit_dictionary WHERE is_active=TRUE"
         )
-        row = db.fetchone()
-        available = row[0] if row and row[0] is not None else 0
-        
+        _unit_ids_cache = {name: unit_id for name, unit_id in db.fetchall()}
+        _unit_ids_loaded_at = now
+    unknown = sorted(n for n in names if n not in _unit_ids_cache)
+    if unknown:
+        raise ValueError(f"Unknown unit name(s): {', '.join(unknown)}")
+    return _unit_ids_cache
+
+
+def _apply_casualties(
+    db, user_id: int, pairs: Iterable[Tuple[str, float]]
+) -> Dict[str, int]:
+    """Remove the given (unit_name, amount) losses from `user_military`.
+
+    One UPDATE for all unit types of this side, in the caller's transaction.
+    Losses are clamped so quantities never go negative; returns the losses
+    actually applied by unit name (units the user has no row for are
+    skipped).
+    """
+    losses: Dict[str, int] = {}
+    for unit_name, amount in pairs:
         # Defensive: ensure integer amounts (legacy code used floor/int)
         try:
             loss = int(amount)
         except Exception:
             loss = int(float(amount))
-            
-        loss = max(0, loss)
-            
-        if loss > available:
-            loss = available
-
-        db.execute(
-            "UPDATE user_military SET quantity=%s WHERE user_id=%s AND unit_id=%s",
-            (available - loss, user_id, unit_id),
+        if loss > 0:
+            name = unit_name.lower()
+            losses[name] = losses.get(name, 0) + loss
+    if not losses:
+        return {}
+
+    unit_ids = _unit_ids(db, losses)
+    by_id = {unit_ids[name]: name for name in losses}
+
+    db.execute(
+        """
+        WITH v (unit_id, loss) AS (
+            SELECT * FROM unnest(%s::integer[], %s::bigint[])
+        ),
+        prev AS (
+            SELECT um.unit_id, COALESCE(um.quantity, 0) AS quantity
+            FROM user_military um
+            JOIN v ON v.unit_id = um.unit_id
+            WHERE um.user_id = %s
+            FOR UPDATE OF um
         )
+        UPDATE user_military um
+        SET quantity = GREATEST(prev.quantity - v.loss, 0)
+        FROM v JOIN prev ON prev.unit_id = v.unit_id
+        WHERE um.user_id = %s AND um.unit_id = v.unit_id
+        RETURNING um.unit_id, prev.quantity - um.quantity
+        """,
+        (
+            list(by_id),
+            [losses[name] for name in by_id.values()],
+            user_id,
+            user_id,
+        ),
+    )
+    return {by_id[unit_id]: int(applied) for unit_id, applied in db.fetchall()}
 
 
 _NORMAL_UNIT_NAMES = {
@@ -164,8 +193,9 @@ def persist_fight_results(
         loser_strength_before = compute_user_army_strength(loser.user_id)
 
         # Persist casualties for both sides in one transaction
-        _apply_casualties(db, winner.user_id, winner_pairs)
-        _apply_casualties(db, loser.user_id, loser_pairs)
+        winner_losses = _apply_casualties(db, winner.user_id, winner_pairs)
+        loser_losses = _apply_casualties(db, loser.user_id, loser_pairs)
+        forget(winner.user_id, loser.user_id)
 
         winner_strength_after = compute_user_army_strength(winner.user_id)
         loser_strength_after = compute_user_army_strength(loser.user_id)
@@ -312,8 +342,8 @@ def persist_fight_results(
                     war_id,
                     winner.user_id,
                     loser.user_id,
-                    winner_pairs,
-                    loser_pairs,
+                    list(winner_losses.items()),
+                    list(loser_losses.items()),
                     morale_column,
                     morale_delta,
                     new_morale,
@@ -24,6 +24,7 @@ from database import (
     users_table_has_column,
     QueryHelper,
 )
+import etags
 from helpers import get_influence
 
 bp = Blueprint("bot_api", __name__)
@@ -853,6 +854,42 @@ def bot_wars():
   )
 
 
+@bp.route("/api/bot/leaderboard", methods=["GET"])
+def bot_leaderboard():
+  err = _require_bot_secret()
+  if err:
+    return err
+  tag = etags.current_etag("leaderboards")
+  cached = etags.not_modified(tag)
+  if cached is not None:
+    return cached
+  from app_core.leaderboards import BOARDS, fetch_leaderboard
+
+  board = (request.args.get("board") or "influence").strip()
+  if board not in BOARDS:
+    return jsonify({"error": f"Unknown board; expected one of {', '.join(BOARDS)}"}), 400
+  limit = min(max(request.args.get("limit", default=10, type=int), 1), 50)
+  offset = max(request.args.get("offset", default=0, type=int), 0)
+  entries = fetch_leaderboard(board, limit=limit, offset=offset)
+  return etags.tagged(jsonify(
+      {
+        "board": board,
+        "updated_at": entries[0]["updated_at"].isoformat() if entries else None,
+        "entries": [
+            {
+              "rank": e["rank"],
+              "previous_rank": e["previous_rank"],
+              "rank_change": e["rank_change"],
+              "id": e["entity_id"],
+              "name": e["name"],
+              "score": int(e["score"]),
+            }
+            for e in entries
+        ],
+      }
+  ), tag)
+
+
 @bp.route("/api/bot/resources", methods=["GET"])
 def bot_resources():
   err = _require_bot_secret()
@@ -5,12 +5,12 @@ bp = Blueprint("change", __name__)
 
 from flask import request, render_template, session, redirect, flash
 from helpers import login_required, error
+from app_core.game_map.changes import mark_changed
 
 # NOTE: 'app' is NOT imported at module level to avoid circular imports
 import os
 from dotenv import load_dotenv
 import bcrypt
-import requests
 from string import ascii_uppercase, ascii_lowercase, digits
 from datetime import datetime
 from random import SystemRandom
@@ -59,6 +59,8 @@ def send_discord_password_reset_dm(discord_user_id, reset_url):
 
     import logging
 
+    import requests
+
     logger = logging.getLogger(__name__)
     headers = {
         "Authorization": f"Bot {bot_token}",
@@ -332,6 +334,7 @@ def change():
             if name:
                 try:
                     db.execute("UPDATE users SET username=%s WHERE id=%s", (name, cId))
+                    mark_changed(db, user_id=cId)
                 except Exception as e:
                     import psycopg2
                     if isinstance(e, psycopg2.errors.UniqueViolation):
@@ -0,0 +1,93 @@
+"""
+Compact encodings for the large map payloads
+
+The map APIs send thousands of rows that all repeat the same keys. A
+client that asks for it in its ``Accept`` header gets each list of rows as
+a table instead:
+
+* ``application/vnd.ano.columns+json`` -- JSON with parallel arrays
+* ``application/x-msgpack`` -- the same structure as MessagePack (only
+  offered when msgpack is installed)
+
+A table is ``{"fields": [...], "indexed": [...], "values": [[...], ...]}``
+with one list per field. Values of the ``indexed`` fields (owner names)
+are positions in the payload's shared ``strings`` list. Plain JSON with
+one dict per row stays the default.
+"""
+
+import json
+
+try:
+    import msgpack
+except ImportError:
+    msgpack = None
+
+JSON = "application/json"
+COLUMNS = "application/vnd.ano.columns+json"
+MSGPACK = "application/x-msgpack"
+
+_FORMATS = {COLUMNS: "columns", MSGPACK: "msgpack"}
+
+
+def offered():
+    """Mimetypes the map APIs can answer with, plain JSON first."""
+    return [JSON, COLUMNS] + ([MSGPACK] if msgpack is not None else [])
+
+
+def negotiate():
+    """"columns" or "msgpack" when the request asks for it, else None."""
+    from flask import request
+
+    return _FORMATS.get(request.accept_mimetypes.best_match(offered(), default=JSON))
+
+
+class StringTable:
+    """Shared list of repeated strings; ``ref`` returns a value's position."""
+
+    def __init__(self):
+        self.strings = []
+        self._positions = {}
+
+    def ref(self, value):
+        if value is None:
+            return None
+        position = self._positions.get(value)
+        if position is None:
+            position = self._positions[value] = len(self.strings)
+            self.strings.append(value)
+        return position
+
+
+def table(fields, rows, strings=None, indexed=()):
+    """``rows`` (tuples in ``fields`` order) as one list per field."""
+    if rows:
+        values = [list(column) for column in zip(*rows)]
+    else:
+        values = [[] for _ in fields]
+    for position, field in enumerate(fields):
+        if field in indexed:
+            values[position] = [strings.ref(value) for value in values[position]]
+    return {"fields": list(fields), "indexed": list(indexed), "values": values}
+
+
+def records(fields, rows):
+    """``rows`` as the usual list of dicts."""
+    return [dict(zip(fields, row)) for row in rows]
+
+
+def respond(payload, fmt):
+    """``payload`` encoded as ``fmt`` (None: jsonify); varies on Accept."""
+    from flask import current_app, jsonify
+
+    if fmt == "msgpack":
+        response = current_app.response_class(
+            msgpack.packb(payload, use_bin_type=True), mimetype=MSGPACK
+        )
+    elif fmt == "columns":
+        response = current_app.response_class(
+            json.dumps(payload, separators=(",", ":")), mimetype=COLUMNS
+        )
+    else:
+        response = jsonify(payload)
+    response.vary.add("Accept")
+    return response
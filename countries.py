@@ -8,7 +8,16 @@ from dotenv import load_dotenv
 import logging
 from collections import defaultdict
 from policies import get_user_policies
+from app_core.economy.kernel import (
+    TECH_TO_LEGACY,
+    compute_chunk,
+    gross_production,
+    policies_mask,
+    upgrades_mask,
+    workforce_debuff,
+)
 from wars.service import target_data
+from app_core.game_map.changes import mark_changed
 import math
 from database import (
     get_request_cursor,
@@ -24,7 +33,7 @@ load_dotenv()
 
 # TODO: rewrite this function for fucks sake
 def get_econ_statistics(cId, db=None):
-    from database import query_cache
+    from database import query_cache, user_tag
     from psycopg2.extras import RealDictCursor
 
     # Check cache first
@@ -111,7 +120,7 @@ def get_econ_statistics(cId, db=None):
                 expenses["military"][row["resource"]] += required
 
     # Cache the result
-    query_cache.set(cache_key, expenses)
+    query_cache.set(cache_key, expenses, tags=(user_tag(cId),))
     return expenses
 
 
@@ -142,12 +151,14 @@ def format_econ_statistics(statistics):
 def get_revenue(cId, db=None):
     from database import query_cache
 
-    # Check cache first - expensive calculation
-    cache_key = f"revenue_{cId}"
-    cached = query_cache.get(cache_key)
-    if cached is not None:
-        return cached
+    # Expensive calculation: cached for 60 seconds (revenue doesn't change
+    # often) and computed once when several requests miss together
+    return query_cache.get_or_compute(
+        f"revenue_{cId}", lambda: _compute_revenue(cId, db), ttl_seconds=60
+    )
 
+
+def _compute_revenue(cId, db=None):
     with reuse_or_new_cursor(db, read_only=True) as db:
         # Prefetch province ids, land, productivity, and population
         db.execute(
@@ -171,24 +182,23 @@ def get_revenue(cId, db=None):
                 """,
                 (cId,),
             )
-            _tech_to_legacy = {
-                "better_engineering": "betterengineering",
-                "advanced_machinery": "advancedmachinery",
-                "stronger_explosives": "strongerexplosives",
-                "integrated_steelmaking": "integratedsteelmaking",
-            }
             for (tech_name,) in db.fetchall() or []:
-                legacy = _tech_to_legacy.get(tech_name)
+                legacy = TECH_TO_LEGACY.get(tech_name)
                 if legacy:
                     upgrades[legacy] = True
         except Exception:
             upgrades = {}
-        land_by_id = {row[0]: row[1] for row in province_rows}
-        prod_by_id = {row[0]: row[2] for row in province_rows}
+
+        # Fetch policies (building modifiers and tax calculation)
+        try:
+            db.execute("SELECT education FROM policies WHERE user_id=%s", (cId,))
+            policies_row = db.fetchone()
+            policies = policies_row[0] if policies_row else []
+        except Exception:
+            policies = []
 
         revenue = {"gross": {}, "gross_theoretical": {}, "net": {}}
 
-        infra = variables.NEW_INFRA
         resources = list(variables.RESOURCES)
         resources.extend(["money", "energy"])
         for resource in resources:
@@ -215,118 +225,85 @@ def get_revenue(cId, db=None):
                     proinfra_by_id[prov_id] = {}
                 proinfra_by_id[prov_id][building_name] = quantity or 0
 
-        # Fetch gold, rations, and CG in a single combined query
+        # Gold and the full stockpile: the projection consumes inputs exactly
+        # like the tick, so buildings short on coal/iron/... show as idle.
+        db.execute("SELECT COALESCE(gold, 0) FROM stats WHERE id=%s", (cId,))
+        gold_row = db.fetchone()
+        current_money = gold_row[0] if gold_row else 0
         db.execute(
             """
-            SELECT
-                COALESCE(s.gold, 0) AS gold,
-                COALESCE(r.quantity, 0) AS rations,
-                COALESCE(cg.quantity, 0) AS consumer_goods
-            FROM stats s
-            LEFT JOIN (
-                SELECT ue.quantity FROM user_economy ue
-                JOIN resource_dictionary rd ON rd.resource_id = ue.resource_id
-                WHERE ue.user_id = %s AND rd.name = 'rations'
-            ) r ON TRUE
-            LEFT JOIN (
-                SELECT ue.quantity FROM user_economy ue
-                JOIN resource_dictionary rd ON rd.resource_id = ue.resource_id
-                WHERE ue.user_id = %s AND rd.name = 'consumer_goods'
-            ) cg ON TRUE
-            WHERE s.id = %s
+            SELECT rd.name, COALESCE(ue.quantity, 0)
+            FROM user_economy ue
+            JOIN resource_dictionary rd ON rd.resource_id = ue.resource_id
+            WHERE ue.user_id = %s
             """,
-            (cId, cId, cId),
+            (cId,),
         )
-        econ_row = db.fetchone()
-        current_money = econ_row[0] if econ_row else 0
-        current_rations = econ_row[1] if econ_row else 0
-        consumer_goods = int(econ_row[2]) if econ_row else 0
-
-        # Simulated funds used while computing `net`; do not mutate DB
-        simulated_funds = current_money
-
-        for province in provinces:
-            buildings = proinfra_by_id.get(province)
-            if buildings is None:
-                buildings = {}
-
-            for building, build_count in buildings.items():
-                if building == "id":
-                    continue
-                if build_count is None or build_count == 0:
-                    continue
-                if building not in infra:
-                    continue
-
-                operating_costs = infra[building]["money"] * build_count
-
-                # Add to gross/net resource production only if this building would
-                # actually operate given the player's money. We keep `gross` and
-                # `gross_theoretical` as unconditional projections, but `net`
-                # reflects a simple money-constrained simulation similar to the
-                # actual task runner so UI `net` is consistent with what will
-                # actually happen.
-                will_operate = simulated_funds >= operating_costs
-
-                if will_operate:
-                    simulated_funds -= operating_costs
-                    revenue["net"]["money"] -= operating_costs
-
-                plus = infra[building].get("plus", {})
-                for resource, amount in plus.items():
-                    if building == "farms":
-                        land = land_by_id.get(province, 0)
-                        amount += land * variables.LAND_FARM_PRODUCTION_ADDITION
-
-                    # Compute theoretical production (no productivity multiplier)
-                    theoretical_total = build_count * amount
-
-                    # Apply productivity multiplier to match actual generation behavior
-                    productivity = prod_by_id.get(province, 50)
-                    if productivity is not None:
-                        multiplier = (
-                            1
-                            + (productivity - 50)
-                            * variables.DEFAULT_PRODUCTIVITY_PRODUCTION_MULTIPLIER
-                        )
-                    else:
-                        multiplier = 1
-
-                    # Production project multipliers (mirror app_core/game_ticks/
-                    # revenue.py so the projection matches actual generation).
-                    if building == "bauxite_mines" and upgrades.get("strongerexplosives"):
-                        multiplier += 0.45
-                    if building == "farms" and upgrades.get("advancedmachinery"):
-                        multiplier += 0.5
-                    if building == "steel_mills" and upgrades.get("integratedsteelmaking"):
-                        multiplier += 0.36
-
-                    adjusted_total = build_count * amount * multiplier
-                    # Normalize to integer to mirror production rounding
-                    adjusted_total = math.ceil(adjusted_total)
-
-                    # Record the theoretical and gross projections
-                    revenue["gross_theoretical"][resource] += theoretical_total
-                    revenue["gross"][resource] += adjusted_total
-
-                    # Only add to `net` if the building will operate
-                    if will_operate:
-                        revenue["net"][resource] += adjusted_total
-
-                minus = infra[building].get("minus", {})
-                for resource, amount in minus.items():
-                    total = build_count * amount
-                    # Only subtract upkeep from net if building operates
-                    if will_operate:
-                        revenue["net"][resource] -= total
-
-        # Fetch policies for tax calculation
-        try:
-            db.execute("SELECT education FROM policies WHERE user_id=%s", (cId,))
-            policies_row = db.fetchone()
-            policies = policies_row[0] if policies_row else []
-        except Exception:
-            policies = []
+        stock = {name: quantity for name, quantity in db.fetchall() or []}
+        current_rations = stock.get("rations", 0)
+        consumer_goods = int(stock.get("consumer_goods", 0))
+
+        efficiency = 1.0
+        if variables.FEATURE_PHASE3_WORKFORCE and provinces:
+            db.execute(
+                "SELECT COALESCE(SUM(pop_working), 0), COALESCE(SUM(pop_elderly), 0),"
+                "       COALESCE(SUM(edu_none), 0), COALESCE(SUM(edu_highschool), 0),"
+                "       COALESCE(SUM(edu_college), 0) "
+                "FROM provinces WHERE userid = %s",
+                (cId,),
+            )
+            demo_row = db.fetchone()
+            if demo_row:
+                building_counts = defaultdict(int)
+                for buildings in proinfra_by_id.values():
+                    for building, build_count in buildings.items():
+                        building_counts[building] += build_count
+                demo = dict(
+                    zip(
+                        (
+                            "total_pop_working",
+                            "total_pop_elderly",
+                            "edu_none",
+                            "edu_highschool",
+                            "edu_college",
+                        ),
+                        demo_row,
+                    )
+                )
+                efficiency = workforce_debuff(demo, building_counts)[
+                    "efficiency_multiplier"
+                ]
+
+        # Same kernel the hourly tick runs: `net` is what the next tick will
+        # actually do given gold, energy and inputs; `gross` assumes every
+        # building runs; `gross_theoretical` drops all multipliers.
+        economy_rows = [(row[0], cId, row[1], row[2]) for row in province_rows]
+        upgrade_masks = {cId: upgrades_mask(upgrades)}
+        policy_masks = {cId: policies_mask(policies)}
+        economy = compute_chunk(
+            economy_rows,
+            proinfra_by_id,
+            {cId: current_money},
+            {cId: stock},
+            upgrade_masks,
+            policy_masks,
+            {cId: efficiency},
+            {province: {"energy": 0} for province in provinces},
+        )
+        gross, theoretical = gross_production(
+            economy_rows, proinfra_by_id, upgrade_masks, policy_masks, {cId: efficiency}
+        )
+        for resource, amount in gross.get(cId, {}).items():
+            if resource in revenue["gross"]:
+                revenue["gross"][resource] += amount
+        for resource, amount in theoretical.get(cId, {}).items():
+            if resource in revenue["gross_theoretical"]:
+                revenue["gross_theoretical"][resource] += amount
+        revenue["net"]["money"] -= economy.gold_costs.get(cId, 0)
+        revenue["net"]["energy"] += economy.produced.get(cId, {}).get("energy", 0)
+        for resource, delta in economy.resource_deltas.get(cId, {}).items():
+            if resource in revenue["net"]:
+                revenue["net"][resource] += delta
 
         # Reuse already-fetched province data for tax income calculation
         # province_rows is (id, land, productivity, population)
@@ -494,9 +471,6 @@ def get_revenue(cId, db=None):
             "net": revenue["net"],
         }
 
-        # Cache the result for 60 seconds (revenue doesn't change often)
-        query_cache.set(cache_key, filtered_revenue, ttl_seconds=60)
-
         return filtered_revenue
 
 
@@ -686,6 +660,7 @@ def update_info():
             if db.fetchone():
                 return error(400, "Nation name is already taken")
             db.execute("UPDATE users SET username=%s WHERE id=%s", (new_name, cId))
+            mark_changed(db, user_id=cId)
 
         # Flag changing
         ALLOWED_EXTENSIONS = ["png", "jpg", "jpeg"]
@@ -720,19 +695,34 @@ def update_info():
             # Save the file & store in database for persistent storage
             if allowed_file(current_filename):
                 from flask import current_app
-                from database import query_cache
+                from database import query_cache, table_has_column
                 from helpers import compress_flag_image
 
-                # Compress and resize flag for fast storage/retrieval
-                flag_data, extension = compress_flag_image(
-                    flag, max_size=300, quality=85
-                )
-                filename = f"flag_{cId}.{extension}"
+                if table_has_column("users", "flag_key"):
+                    from image_store import database_copy, store_image
 
-                db.execute(
-                    "UPDATE users SET flag=(%s), flag_data=(%s) WHERE id=(%s)",
-                    (filename, flag_data, cId),
-                )
+                    try:
+                        flag_key = store_image(flag, "flag")
+                    except ValueError:
+                        return error(400, "Could not read that flag image")
+                    filename = f"flag_{cId}.jpg"
+                    db.execute(
+                        "UPDATE users SET flag=(%s), flag_key=(%s), flag_data=(%s)"
+                        " WHERE id=(%s)",
+                        (filename, flag_key, database_copy(flag_key), cId),
+                    )
+                    query_cache.delete(f"flag_key_country_{cId}")
+                else:
+                    # Compress and resize flag for fast storage/retrieval
+                    flag_data, extension = compress_flag_image(
+                        flag, max_size=300, quality=85
+                    )
+                    filename = f"flag_{cId}.{extension}"
+
+                    db.execute(
+                        "UPDATE users SET flag=(%s), flag_data=(%s) WHERE id=(%s)",
+                        (filename, flag_data, cId),
+                    )
 
                 # Also save to filesystem for backward compatibility
                 flag.seek(0)  # Reset file pointer after read
@@ -844,6 +834,7 @@ def reset_account():
             if province_ids:
                 ids = [p[0] for p in province_ids]
                 placeholders = ",".join(["%s"] * len(ids))
+                mark_changed(db, ids, with_neighbors=True)
                 db.execute(f"DELETE FROM provinces WHERE id IN ({placeholders})", tuple(ids))
             db.execute("DELETE FROM user_buildings WHERE user_id=%s", (cId,))
             db.execute("DELETE FROM trades WHERE offeree=%s OR offerer=%s", (cId, cId))
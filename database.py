@@ -17,6 +17,10 @@ import queue
 from urllib.parse import urlparse
 from collections import OrderedDict
 
+import metrics
+import request_profiling
+import shared_cache
+
 load_dotenv()
 if os.getenv("DATABASE_URL") and "interchange" in os.getenv("DATABASE_URL"):
     os.environ["PGSSLMODE"] = "require"
@@ -39,84 +43,242 @@ else:
 logger = logging.getLogger(__name__)
 
 
+def user_tag(user_id) -> str:
+    """QueryCache tag for entries derived from one nation's state."""
+    return f"user:{user_id}"
+
+
+def coalition_tag(coalition_id) -> str:
+    """QueryCache tag for entries derived from one coalition's state."""
+    return f"coalition:{coalition_id}"
+
+
 # Simple query result cache for frequently accessed, slowly-changing data
 class QueryCache:
-    """Simple in-memory cache with optional per-key TTL support.
-
-    Each cache entry is stored as (value, expiry_timestamp). Per-key TTLs may
-    override the instance default for specific items.
+    """In-memory LRU cache with per-key TTLs and tags.
+
+    Each cache entry is stored as (value, expiry_timestamp) in an OrderedDict
+    kept in least-recently-used order, so evicting at MAX_CACHE_SIZE is a
+    popitem. Entries may carry tags (``user_tag(5)``, ``coalition_tag(2)``);
+    ``invalidate_tags`` drops every entry with a tag through a tag -> keys
+    index, touching only the affected entries. Hit/miss/eviction counters
+    are available from ``stats()``.
     Thread-safe: uses a lock for all mutations.
+
+    When a shared tier is configured (see shared_cache.py) the dict is only
+    the front tier: misses fall through to Redis, writes go to both, and
+    invalidations are broadcast so every worker drops its copy.
     """
 
     MAX_CACHE_SIZE = 10000  # Prevent unbounded memory growth
 
-    def __init__(self, ttl_seconds=300):  # default TTL (seconds)
-        self.cache = {}  # key -> (value, expiry_timestamp)
+    def __init__(self, ttl_seconds=300, namespace="query", tier=None):
+        self.cache = OrderedDict()  # key -> (value, expiry_timestamp)
         self.ttl = ttl_seconds
         self._lock = threading.Lock()
+        self._tags = {}  # tag -> set of keys
+        self._key_tags = {}  # key -> tuple of tags
+        self.hits = 0
+        self.misses = 0
+        self.shared_hits = 0
+        self.evictions = 0
+        self.expirations = 0
+        self.namespace = namespace
+        self._tier = tier
+        if tier is not None:
+            tier.subscribe(self._apply_remote_invalidation)
+
+    @property
+    def shared(self) -> bool:
+        """Whether entries and invalidations are shared by every worker."""
+        return self._tier is not None
+
+    def _shared_key(self, key):
+        return f"{self.namespace}:{key}"
 
     def get(self, key):
         """Get cached value if not expired. Returns None if missing/expired."""
-        entry = self.cache.get(key)
-        if not entry:
-            return None
-        value, expiry = entry
-        # expiry == 0 means 'never expire'
-        if expiry == 0 or time() < expiry:
-            return value
-        # expired - remove and return None
         with self._lock:
-            try:
-                del self.cache[key]
-            except KeyError:
-                pass
+            entry = self.cache.get(key)
+            if entry is not None:
+                value, expiry = entry
+                # expiry == 0 means 'never expire'
+                if expiry == 0 or time() < expiry:
+                    self.cache.move_to_end(key)
+                    self.hits += 1
+                    return value
+                # expired - remove and fall through to the shared tier
+                self._remove(key)
+                self.expirations += 1
+        return self._get_shared(key)
+
+    def _get_shared(self, key):
+        """Fill the front tier from the shared tier on a local miss."""
+        entry = shared_cache.MISSING
+        if self._tier is not None:
+            self._tier.ensure_listener()
+            entry = self._tier.get(self._shared_key(key))
+        if entry is not shared_cache.MISSING:
+            value, expiry, tags = entry
+            if expiry == 0 or time() < expiry:
+                with self._lock:
+                    self.shared_hits += 1
+                    self._store(key, value, expiry, tags)
+                return value
+        with self._lock:
+            self.misses += 1
         return None
 
-    def set(self, key, value, ttl_seconds: Optional[int] = None):
-        """Cache a value with an optional per-key TTL in seconds.
+    def set(self, key, value, ttl_seconds: Optional[int] = None, tags=()):
+        """Cache a value with an optional per-key TTL in seconds and tags.
 
         If ttl_seconds is None, the instance default TTL is used. If ttl_seconds
         is 0, the value will not expire (use with caution).
         """
+        if ttl_seconds is None:
+            ttl_seconds = self.ttl
+        expiry = 0 if ttl_seconds == 0 else (time() + ttl_seconds)
+        tags = tuple(tags)
         with self._lock:
-            # Evict expired entries periodically to prevent unbounded growth
-            if len(self.cache) > self.MAX_CACHE_SIZE:
-                self._evict_expired()
-            # If still over limit, clear oldest half
-            if len(self.cache) > self.MAX_CACHE_SIZE:
-                self._evict_oldest(len(self.cache) // 2)
-
-            if ttl_seconds is None:
-                ttl_seconds = self.ttl
-            expiry = 0 if ttl_seconds == 0 else (time() + ttl_seconds)
-            self.cache[key] = (value, expiry)
-
-    def _evict_expired(self):
-        """Remove all expired entries (caller must hold _lock)"""
-        current_time = time()
-        self.cache = {
-            k: v for k, v in self.cache.items() if v[1] == 0 or current_time < v[1]
-        }
+            self._store(key, value, expiry, tags)
+        if self._tier is not None:
+            self._tier.set(
+                self._shared_key(key),
+                (value, expiry, tags),
+                ttl_seconds,
+                tags=[self._shared_key(tag) for tag in tags],
+            )
 
-    def _evict_oldest(self, count):
-        """Remove the oldest n entries (caller must hold _lock)"""
-        if count <= 0 or not self.cache:
-            return
-        sorted_keys = sorted(self.cache.keys(), key=lambda k: self.cache[k][1])
-        for key in sorted_keys[:count]:
-            try:
-                del self.cache[key]
-            except KeyError:
-                pass
+    def _store(self, key, value, expiry, tags):
+        """Insert as most recently used (caller must hold _lock)"""
+        self._untag(key)
+        self.cache[key] = (value, expiry)
+        self.cache.move_to_end(key)
+        if tags:
+            self._key_tags[key] = tags
+            for tag in tags:
+                self._tags.setdefault(tag, set()).add(key)
+        # Prevent unbounded growth: drop least recently used entries
+        while len(self.cache) > self.MAX_CACHE_SIZE:
+            oldest, _ = self.cache.popitem(last=False)
+            self._untag(oldest)
+            self.evictions += 1
+
+    def _remove(self, key):
+        """Drop one entry and its tag index entries (caller must hold _lock)"""
+        if self.cache.pop(key, None) is not None:
+            self._untag(key)
+
+    def _untag(self, key):
+        for tag in self._key_tags.pop(key, ()):
+            keys = self._tags.get(tag)
+            if keys is not None:
+                keys.discard(key)
+                if not keys:
+                    del self._tags[tag]
+
+    def get_or_compute(
+        self, key, compute, ttl_seconds: Optional[int] = None, tags=()
+    ):
+        """Return the cached value for key, computing it once on a miss.
 
-    def invalidate(self, pattern=None):
-        """Clear cache or clear entries matching pattern"""
+        Concurrent callers for the same key (threads here, and other workers
+        when the shared tier is on) wait for a single ``compute()`` instead
+        of all hitting the database. A None result is returned uncached.
+        """
+
+        def lookup():
+            cached = self.get(key)
+            return shared_cache.MISSING if cached is None else cached
+
+        def fill():
+            result = compute()
+            if result is not None and tags:
+                self.set(key, result, ttl_seconds, tags=tags)
+            elif result is not None:
+                self.set(key, result, ttl_seconds)
+            return result
+
+        return shared_cache.single_flight(
+            self._shared_key(key), lookup, fill, self._tier
+        )
+
+    def stats(self) -> Dict[str, Any]:
+        """Counters since process start, for monitoring."""
+        with self._lock:
+            lookups = self.hits + self.shared_hits + self.misses
+            return {
+                "size": len(self.cache),
+                "max_size": self.MAX_CACHE_SIZE,
+                "tags": len(self._tags),
+                "hits": self.hits,
+                "shared_hits": self.shared_hits,
+                "misses": self.misses,
+                "evictions": self.evictions,
+                "expirations": self.expirations,
+                "hit_rate": (
+                    round((self.hits + self.shared_hits) / lookups, 4)
+                    if lookups
+                    else None
+                ),
+            }
+
+    def _invalidate_local(self, pattern=None):
         with self._lock:
             if pattern is None:
                 self.cache.clear()
+                self._tags.clear()
+                self._key_tags.clear()
             else:
                 # remove entries whose key contains the pattern
-                self.cache = {k: v for k, v in self.cache.items() if pattern not in k}
+                for key in [k for k in self.cache if pattern in k]:
+                    self._remove(key)
+
+    def _delete_local(self, keys):
+        with self._lock:
+            for key in keys:
+                self._remove(key)
+
+    def _invalidate_tags_local(self, tags):
+        with self._lock:
+            for tag in tags:
+                for key in list(self._tags.get(tag, ())):
+                    self._remove(key)
+
+    def invalidate(self, pattern=None):
+        """Clear cache or clear entries matching pattern.
+
+        Pattern invalidation scans every key; prefer ``delete`` for known
+        keys and ``invalidate_tags`` for groups of entries.
+        """
+        self._invalidate_local(pattern)
+        if self._tier is not None:
+            self._tier.delete_matching(self._shared_key(""), pattern or "")
+            self._tier.publish({"ns": self.namespace, "pattern": pattern})
+
+    def delete(self, *keys):
+        """Drop exact keys here, in the shared tier and on every worker."""
+        self._delete_local(keys)
+        if self._tier is not None and keys:
+            self._tier.delete(*(self._shared_key(k) for k in keys))
+            self._tier.publish({"ns": self.namespace, "keys": list(keys)})
+
+    def invalidate_tags(self, *tags):
+        """Drop every entry carrying any of ``tags``, on every worker."""
+        self._invalidate_tags_local(tags)
+        if self._tier is not None and tags:
+            self._tier.delete_tagged(*(self._shared_key(tag) for tag in tags))
+            self._tier.publish({"ns": self.namespace, "tags": list(tags)})
+
+    def _apply_remote_invalidation(self, message):
+        if message.get("ns") != self.namespace:
+            return
+        if "keys" in message:
+            self._delete_local(message["keys"])
+        elif "tags" in message:
+            self._invalidate_tags_local(message["tags"])
+        else:
+            self._invalidate_local(message.get("pattern"))
 
 
 def cache_response(ttl_seconds=60, public=False):
@@ -138,6 +300,8 @@ def cache_response(ttl_seconds=60, public=False):
     def decorator(f):
         cache = OrderedDict()
         max_entries = int(os.getenv("RESPONSE_CACHE_MAX_ENTRIES", "500"))
+        tier = shared_cache.get_shared_tier()
+        shared_prefix = f"response:{f.__name__}:"
 
         def _evict_expired_entries(now_ts):
             expired = [k for k, (_, ts) in cache.items() if now_ts - ts >= ttl_seconds]
@@ -165,38 +329,54 @@ def cache_response(ttl_seconds=60, public=False):
             page_id = request.full_path if hasattr(request, "full_path") else ""
             cache_key = f"{f.__name__}_{user_id}_{page_id}"
 
-            # Check if response is cached
-            if cache_key in cache:
-                response, timestamp = cache[cache_key]
-                if time() - timestamp < ttl_seconds:
-                    cache.move_to_end(cache_key)
+            def lookup():
+                # Check if response is cached here, then in the shared tier
+                entry = cache.get(cache_key)
+                if entry is None and tier is not None:
+                    tier.ensure_listener()
+                    entry = tier.get(shared_prefix + cache_key)
+                    if entry is shared_cache.MISSING:
+                        entry = None
+                if entry is not None:
+                    response, timestamp = entry
+                    if time() - timestamp < ttl_seconds:
+                        cache[cache_key] = entry
+                        cache.move_to_end(cache_key)
+                        return response
+                    cache.pop(cache_key, None)
+                return shared_cache.MISSING
+
+            def render():
+                # Call actual function
+                response = f(*args, **kwargs)
+
+                # Do not cache error responses (avoids serving stale 500s after fixes)
+                status_code = 200
+                if isinstance(response, tuple) and len(response) > 1:
+                    status_code = response[1]
+                elif hasattr(response, "status_code"):
+                    status_code = response.status_code
+                if status_code >= 400:
                     return response
-                try:
-                    del cache[cache_key]
-                except KeyError:
-                    pass
 
-            # Call actual function
-            response = f(*args, **kwargs)
-
-            # Do not cache error responses (avoids serving stale 500s after fixes)
-            status_code = 200
-            if isinstance(response, tuple) and len(response) > 1:
-                status_code = response[1]
-            elif hasattr(response, "status_code"):
-                status_code = response.status_code
-            if status_code >= 400:
+                # Cache the response
+                now_ts = time()
+                cache[cache_key] = (response, now_ts)
+                cache.move_to_end(cache_key)
+                # Only rendered pages are shared; Response objects and
+                # tuples stay in this process.
+                if tier is not None and isinstance(response, (str, bytes)):
+                    tier.set(shared_prefix + cache_key, (response, now_ts), ttl_seconds)
+                # Best-effort cleanup to keep memory bounded.
+                if len(cache) > max_entries:
+                    _evict_expired_entries(now_ts)
+                _enforce_size_limit()
                 return response
 
-            # Cache the response
-            cache[cache_key] = (response, time())
-            cache.move_to_end(cache_key)
-            # Best-effort cleanup to keep memory bounded.
-            now_ts = time()
-            if len(cache) > max_entries:
-                _evict_expired_entries(now_ts)
-            _enforce_size_limit()
-            return response
+            # Concurrent misses for one page render it once
+            return shared_cache.single_flight(
+                shared_prefix + cache_key, lookup, render, tier
+            )
 
         # Expose the internal cache and invalidation helpers on the decorated
         # function so callers (routes/handlers) can invalidate cached pages
@@ -219,31 +399,17 @@ def cache_response(ttl_seconds=60, public=False):
 
             If multiple arguments are provided they are OR'ed (any match will
             cause removal). If all are None the entire cache for this view is
-            cleared.
+            cleared. Other workers drop their copies too.
             """
 
-            keys = list(cache.keys())
-            for k in keys:
-                remove = False
-                if pattern and pattern in k:
-                    remove = True
-                if user_id is not None and f"_{user_id}_" in k:
-                    remove = True
-                if page and page in k:
-                    remove = True
-                if pattern is None and user_id is None and page is None:
-                    remove = True
-
-                if remove:
-                    try:
-                        del cache[k]
-                    except KeyError:
-                        pass
+            _drop_responses(cache, pattern, user_id, page)
+            _share_view_invalidation(f.__name__, pattern, user_id, page)
 
         def clear_cache():
             """Clear the full cache for this decorated view."""
 
             cache.clear()
+            _share_view_invalidation(f.__name__, None, None, None)
 
         decorated_function.invalidate = invalidate
         decorated_function.clear_cache = clear_cache
@@ -253,6 +419,51 @@ def cache_response(ttl_seconds=60, public=False):
     return decorator
 
 
+def _response_key_matches(key, pattern=None, user_id=None, page=None):
+    if pattern is None and user_id is None and page is None:
+        return True
+    if pattern and pattern in key:
+        return True
+    if user_id is not None and f"_{user_id}_" in key:
+        return True
+    if page and page in key:
+        return True
+    return False
+
+
+def _drop_responses(cache, pattern=None, user_id=None, page=None):
+    for k in list(cache.keys()):
+        if _response_key_matches(k, pattern, user_id, page):
+            try:
+                del cache[k]
+            except KeyError:
+                pass
+
+
+def _share_view_invalidation(view_name, pattern, user_id, page):
+    """Remove a view's matching responses from the shared tier and tell
+    the other workers to drop theirs."""
+    tier = shared_cache.get_shared_tier()
+    if tier is None:
+        return
+    prefix = f"response:{view_name}:"
+    tier.delete_matching(
+        prefix,
+        predicate=lambda k: _response_key_matches(
+            k[len(prefix) :], pattern, user_id, page
+        ),
+    )
+    tier.publish(
+        {
+            "ns": "response",
+            "view": view_name,
+            "pattern": pattern,
+            "user_id": user_id,
+            "page": page,
+        }
+    )
+
+
 def fetchone_first(db, default=None):
     """Fetch a single row and return its first column/value or a default.
 
@@ -274,7 +485,7 @@ def fetchone_first(db, default=None):
 
 
 # Global query cache (5-minute TTL for slower-changing data)
-query_cache = QueryCache(ttl_seconds=300)
+query_cache = QueryCache(ttl_seconds=300, tier=shared_cache.get_shared_tier())
 
 # Registry for per-view response caches created by `cache_response`.
 # Maps view function name -> the internal `cache` dict used by the decorator.
@@ -294,24 +505,23 @@ def invalidate_view_cache(
     if a view has no registered cache.
     """
     cache = response_cache_registry.get(view_name)
-    if not cache:
+    if cache:
+        _drop_responses(cache, pattern, user_id, page)
+    _share_view_invalidation(view_name, pattern, user_id, page)
+
+
+def _apply_remote_view_invalidation(message):
+    if message.get("ns") != "response":
         return
-    keys = list(cache.keys())
-    for k in keys:
-        remove = False
-        if pattern and pattern in k:
-            remove = True
-        if user_id is not None and f"_{user_id}_" in k:
-            remove = True
-        if page and page in k:
-            remove = True
-        if pattern is None and user_id is None and page is None:
-            remove = True
-        if remove:
-            try:
-                del cache[k]
-            except KeyError:
-                pass
+    cache = response_cache_registry.get(message.get("view"))
+    if cache:
+        _drop_responses(
+            cache, message.get("pattern"), message.get("user_id"), message.get("page")
+        )
+
+
+if shared_cache.get_shared_tier() is not None:
+    shared_cache.get_shared_tier().subscribe(_apply_remote_view_invalidation)
 
 
 def invalidate_user_cache(user_id: int) -> None:
@@ -321,30 +531,9 @@ def invalidate_user_cache(user_id: int) -> None:
     Use when user resources, provinces, or stats are updated to ensure
     subsequent reads return fresh data.
 
-    This function is defensive: it tries a direct key delete first and falls
-    back to pattern-based invalidation to tolerate tests and edge cases.
+    The keys are dropped from the shared cache tier as well and the delete
+    is broadcast, so no worker keeps serving its own stale copy.
     """
-    key_res = f"resources_{user_id}"
-    key_inf = f"influence_{user_id}"
-    key_rev = f"revenue_{user_id}"
-    key_econ = f"econ_stats_{user_id}"
-    try:
-        # Directly remove exact keys when present
-        if key_res in query_cache.cache:
-            del query_cache.cache[key_res]
-        else:
-            query_cache.invalidate(pattern=key_res)
-    except Exception as e:
-        logger.exception("Failed to invalidate resources cache for %s: %s", user_id, e)
-
-    try:
-        if key_inf in query_cache.cache:
-            del query_cache.cache[key_inf]
-        else:
-            query_cache.invalidate(pattern=key_inf)
-    except Exception as e:
-        logger.exception("Failed to invalidate influence cache for %s: %s", user_id, e)
-
     # revenue_{user_id} (get_revenue) and econ_stats_{user_id}
     # (get_econ_statistics) share query_cache's 5-minute TTL and read
     # from user_buildings -- without invalidation here, a build/trade/
@@ -353,38 +542,151 @@ def invalidate_user_cache(user_id: int) -> None:
     # "why does it say I produce no Lumber even though I have 100 Lumber
     # Mills... same goes for my coal expenses... fine like a minute ago").
     try:
-        if key_rev in query_cache.cache:
-            del query_cache.cache[key_rev]
-        else:
-            query_cache.invalidate(pattern=key_rev)
+        query_cache.invalidate_tags(user_tag(user_id))
+        # Writers that do not tag their entries
+        query_cache.delete(
+            f"resources_{user_id}",
+            f"influence_{user_id}",
+            f"revenue_{user_id}",
+            f"econ_stats_{user_id}",
+        )
     except Exception as e:
-        logger.exception("Failed to invalidate revenue cache for %s: %s", user_id, e)
+        logger.exception("Failed to invalidate user caches for %s: %s", user_id, e)
+
 
+def _current_route() -> str:
+    """Label pool metrics with the Flask endpoint, or 'background'.
+
+    Requests that match no route are all 'unmatched': their paths come from
+    clients and would give the metrics unbounded label cardinality.
+    """
     try:
-        if key_econ in query_cache.cache:
-            del query_cache.cache[key_econ]
-        else:
-            query_cache.invalidate(pattern=key_econ)
-    except Exception as e:
-        logger.exception("Failed to invalidate econ_stats cache for %s: %s", user_id, e)
+        from flask import has_request_context, request
+
+        if has_request_context():
+            return request.endpoint or "unmatched"
+    except Exception:
+        pass
+    return "background"
+
+
+class PoolMetrics:
+    """Per-route pool wait time, checkout duration and saturation.
+
+    ``wait`` is the time spent blocked on the pool (slot plus getconn),
+    ``hold`` the time between checkout and return, and ``saturation`` the
+    share of the pool in use right after the checkout. ``exhausted`` counts
+    checkouts that found no free slot and had to queue.
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self.routes: Dict[str, Dict[str, Any]] = {}
+
+    def _route(self, route):
+        stats = self.routes.get(route)
+        if stats is None:
+            stats = self.routes[route] = {
+                "checkouts": 0,
+                "exhausted": 0,
+                "timeouts": 0,
+                "retries": 0,
+                "wait_total": 0.0,
+                "wait_max": 0.0,
+                "hold_total": 0.0,
+                "hold_max": 0.0,
+                "saturation_max": 0.0,
+            }
+        return stats
+
+    def record_checkout(self, route, wait, saturation, exhausted):
+        with self._lock:
+            stats = self._route(route)
+            stats["checkouts"] += 1
+            stats["exhausted"] += int(exhausted)
+            stats["wait_total"] += wait
+            stats["wait_max"] = max(stats["wait_max"], wait)
+            stats["saturation_max"] = max(stats["saturation_max"], saturation)
+        metrics.observe_pool_checkout(route, saturation, exhausted)
+
+    def record_return(self, route, held):
+        with self._lock:
+            stats = self._route(route)
+            stats["hold_total"] += held
+            stats["hold_max"] = max(stats["hold_max"], held)
+
+    def record(self, route, counter):
+        with self._lock:
+            self._route(route)[counter] += 1
+
+    def snapshot(self) -> Dict[str, Dict[str, Any]]:
+        """Per-route totals plus mean wait/hold in milliseconds."""
+        with self._lock:
+            result = {}
+            for route, stats in self.routes.items():
+                entry = dict(stats)
+                n = stats["checkouts"] or 1
+                entry["wait_avg_ms"] = round(stats["wait_total"] * 1000 / n, 2)
+                entry["hold_avg_ms"] = round(stats["hold_total"] * 1000 / n, 2)
+                result[route] = entry
+            return result
 
 
 class DatabasePool:
-    """Singleton database connection pool with timeout support"""
+    """Singleton database connection pool with timeout support
+
+    DB_POOL_MODE selects how connections are used:
+
+    * ``session`` (default): connections talk to Postgres directly; the
+      statement timeout is sent as a startup option and each checkout
+      checks the libpq status of the connection.
+    * ``transaction``: for PgBouncer in transaction pooling mode. No startup
+      options are sent (PgBouncer rejects them; set statement_timeout with
+      ALTER ROLE instead) and checkouts are not checked. A dead connection
+      surfaces on its first statement; the pool discards it and QueryHelper
+      retries the query once on a fresh one. psycopg2 interpolates
+      parameters client-side, so no server-side prepared statements are
+      involved. Advisory locks must be transaction-level
+      (pg_try_advisory_xact_lock): a session-level lock would stay on
+      whichever server connection PgBouncer happened to use.
+    """
 
     _instance = None
     _pool = None
     _pid = None
     _lock = None
     _available = None  # Semaphore-like queue for timeout support
+    _maxconn = 0
+    _checked_out = None  # id(conn) -> (checkout time, route)
     CONNECTION_TIMEOUT = 10  # seconds to wait for connection before giving up
 
     def __new__(cls):
         if cls._instance is None:
             cls._instance = super(DatabasePool, cls).__new__(cls)
             cls._instance._lock = threading.Lock()
+            cls._instance._checked_out = {}
+            cls._instance.metrics = PoolMetrics()
         return cls._instance
 
+    @property
+    def mode(self) -> str:
+        return os.getenv("DB_POOL_MODE", "session").lower()
+
+    def _max_connections(self) -> int:
+        return int(os.getenv("DB_MAX_CONNECTIONS", "10"))
+
+    def _server_params(self) -> Dict[str, Any]:
+        """Where to connect: LOCAL_PG_* overrides, else the parsed PG_* vars."""
+        host = os.getenv("LOCAL_PG_HOST") or os.getenv("PG_HOST")
+        return {
+            "database": os.getenv("LOCAL_PG_DATABASE") or os.getenv("PG_DATABASE"),
+            "user": os.getenv("LOCAL_PG_USER") or os.getenv("PG_USER"),
+            "password": os.getenv("LOCAL_PG_PASSWORD") or os.getenv("PG_PASSWORD"),
+            "host": host,
+            "port": os.getenv("LOCAL_PG_PORT") or os.getenv("PG_PORT"),
+            "sslmode": "require" if "interchange" in (host or "") else "prefer",
+        }
+
     def _initialize_pool(self):
         """Initialize the connection pool"""
         # If pool exists and is owned by this process pid, nothing to do
@@ -409,7 +711,11 @@ class DatabasePool:
             try:
                 # In multi-region deployments (EU, Singapore, ...),
                 # use fewer connections per instance
-                maxconn = int(os.getenv("DB_MAX_CONNECTIONS", "10"))
+                maxconn = self._max_connections()
+                connect_kwargs = {}
+                if self.mode != "transaction":
+                    # 30 second query timeout
+                    connect_kwargs["options"] = "-c statement_timeout=30000"
                 # Use psycopg2's ThreadedConnectionPool if available; otherwise
                 # fall back to a lightweight compatibility pool (useful in some
                 # CI environments where a minimal psycopg2 shim may be present).
@@ -443,31 +749,29 @@ class DatabasePool:
                 self._pool = pool_cls(
                     minconn=1,
                     maxconn=maxconn,
-                    database=os.getenv("LOCAL_PG_DATABASE") or os.getenv("PG_DATABASE"),
-                    user=os.getenv("LOCAL_PG_USER") or os.getenv("PG_USER"),
-                    password=os.getenv("LOCAL_PG_PASSWORD") or os.getenv("PG_PASSWORD"),
-                    host=os.getenv("LOCAL_PG_HOST") or os.getenv("PG_HOST"),
-                    port=os.getenv("LOCAL_PG_PORT") or os.getenv("PG_PORT"),
+                    **self._server_params(),
                     # Connection timeout settings to prevent hanging
                     connect_timeout=10,  # 10 seconds to establish connection
-                    options="-c statement_timeout=30000",  # 30 second query timeout
                     # TCP keepalive settings to detect dead connections
                     keepalives=1,  # Enable TCP keepalives
                     keepalives_idle=30,  # Sendkeepalive after 30 seconds idle
                     keepalives_interval=10,  # Retry every 10 seconds
                     keepalives_count=3,
-                    sslmode="require" if "interchange" in (os.getenv("LOCAL_PG_HOST") or os.getenv("PG_HOST", "")) else "prefer",
+                    **connect_kwargs,
                 )
                 # Create a queue to track available slots with timeout support
                 self._available = queue.Queue(maxsize=maxconn)
                 for _ in range(maxconn):
                     self._available.put(True)
+                self._maxconn = maxconn
+                self._checked_out = {}
 
                 self._pid = os.getpid()
                 logger.info(
-                    "Database connection pool initialized (pid=%s, max=%d)",
+                    "Database connection pool initialized (pid=%s, max=%d, mode=%s)",
                     self._pid,
                     maxconn,
+                    self.mode,
                 )
             except Exception as e:
                 logger.error(f"Failed to initialize database pool: {e}")
@@ -488,11 +792,15 @@ class DatabasePool:
             timeout = self.CONNECTION_TIMEOUT
 
         self._initialize_pool()  # Lazy init and fork-safe reinit
+        route = _current_route()
+        started = time()
+        exhausted = self._available.empty()
 
         # Wait for an available slot with timeout
         try:
             self._available.get(timeout=timeout)
         except queue.Empty:
+            self.metrics.record(route, "timeouts")
             logger.error(
                 f"Database connection pool exhausted, timed out after {timeout}s"
             )
@@ -500,8 +808,11 @@ class DatabasePool:
 
         try:
             conn = self._pool.getconn()
-            # Validate connection is still alive
-            if conn.closed or not self._is_connection_healthy(conn):
+            # Validate connection is still alive; in transaction mode a dead
+            # connection is found by its first statement instead
+            if conn.closed or (
+                self.mode != "transaction" and not self._is_connection_healthy(conn)
+            ):
                 logger.warning(
                     "Retrieved stale connection from pool, getting fresh one"
                 )
@@ -512,6 +823,15 @@ class DatabasePool:
                 # Try to get a new connection by putting one back and re-getting
                 self._pool.putconn(conn, close=True)
                 conn = self._pool.getconn()
+            now_ts = time()
+            in_use = self._maxconn - self._available.qsize()
+            self.metrics.record_checkout(
+                route,
+                now_ts - started,
+                in_use / self._maxconn if self._maxconn else 0.0,
+                exhausted,
+            )
+            self._checked_out[id(conn)] = (now_ts, route)
             return conn
         except Exception:
             # Put the slot back if we failed to get connection
@@ -547,6 +867,9 @@ class DatabasePool:
             conn: The connection to return
             close: If True, close the connection instead of returning to pool
         """
+        checkout = self._checked_out.pop(id(conn), None)
+        if checkout is not None:
+            self.metrics.record_return(checkout[1], time() - checkout[0])
         if self._pool is not None:
             try:
                 # Check if connection is broken/closed
@@ -583,8 +906,155 @@ class DatabasePool:
             self._pool.closeall()
 
 
-# Global pool instance
+class ReplicaPool(DatabasePool):
+    """Pool of connections to the read replica at DATABASE_REPLICA_URL.
+
+    Read-only cursors are routed here by ``_use_replica``. The replica's
+    apply lag is measured at most every REPLICA_LAG_CHECK_SECONDS; while it
+    exceeds DB_REPLICA_MAX_LAG_SECONDS, or after a replica error, reads go
+    to the primary.
+    """
+
+    _instance = None
+    _usable_until = 0.0
+    _checked_at = 0.0
+    # Guards the check schedule only; never held while talking to the
+    # replica (lag_seconds takes the pool's own _lock to initialise it)
+    _lag_lock = threading.Lock()
+    REPLICA_LAG_CHECK_SECONDS = 5
+    RETRY_AFTER = 30  # seconds reads stay on the primary after an error
+
+    @staticmethod
+    def configured() -> bool:
+        return bool(os.getenv("DATABASE_REPLICA_URL"))
+
+    def _max_connections(self) -> int:
+        return int(
+            os.getenv("DB_REPLICA_MAX_CONNECTIONS")
+            or os.getenv("DB_MAX_CONNECTIONS", "10")
+        )
+
+    def _server_params(self) -> Dict[str, Any]:
+        parsed = urlparse(os.getenv("DATABASE_REPLICA_URL", ""))
+        host = parsed.hostname or "localhost"
+        return {
+            "database": parsed.path[1:] if parsed.path else "postgres",
+            "user": parsed.username or "postgres",
+            "password": parsed.password or "",
+            "host": host,
+            "port": str(parsed.port or "5432"),
+            "sslmode": "require" if "interchange" in host else "prefer",
+        }
+
+    def lag_seconds(self) -> float:
+        """Seconds the replica is behind the primary (0 when caught up)."""
+        conn = self.get_connection(timeout=1)
+        close = False
+        try:
+            cur = conn.cursor()
+            # With no writes to replay, the last replay timestamp ages while
+            # the replica is in fact current
+            cur.execute(
+                """
+                SELECT CASE
+                    WHEN NOT pg_is_in_recovery()
+                      OR pg_last_wal_receive_lsn() = pg_last_wal_replay_lsn()
+                    THEN 0
+                    ELSE EXTRACT(EPOCH FROM now() - pg_last_xact_replay_timestamp())
+                END
+                """
+            )
+            row = cur.fetchone()
+            conn.rollback()
+            return float(row[0] or 0) if row else 0.0
+        except Exception:
+            close = True
+            raise
+        finally:
+            self.return_connection(conn, close=close)
+
+    def is_usable(self) -> bool:
+        """Whether reads may go to the replica right now (cached)."""
+        now_ts = time()
+        if now_ts - self._checked_at < self.REPLICA_LAG_CHECK_SECONDS:
+            return now_ts < self._usable_until
+        with self._lag_lock:
+            if now_ts - self._checked_at < self.REPLICA_LAG_CHECK_SECONDS:
+                return now_ts < self._usable_until
+            # This thread runs the check; others keep the previous verdict
+            self._checked_at = now_ts
+
+        max_lag = float(os.getenv("DB_REPLICA_MAX_LAG_SECONDS", "5"))
+        try:
+            lag = self.lag_seconds()
+        except Exception as e:
+            logger.warning("Read replica unavailable: %s", e)
+            lag = None
+        with self._lag_lock:
+            if lag is not None and lag <= max_lag:
+                self._usable_until = now_ts + self.REPLICA_LAG_CHECK_SECONDS
+            else:
+                if lag is not None:
+                    logger.warning("Read replica %.1fs behind, using primary", lag)
+                self._usable_until = 0.0
+        return time() < self._usable_until
+
+    def mark_failed(self):
+        """Send reads to the primary for RETRY_AFTER seconds."""
+        self._usable_until = 0.0
+        self._checked_at = time() + self.RETRY_AFTER - self.REPLICA_LAG_CHECK_SECONDS
+
+
+# Global pool instances
 db_pool = DatabasePool()
+replica_pool = ReplicaPool()
+
+# After a user's mutation their reads stay on the primary for this long, so
+# replica lag never hides a change they just made
+READ_YOUR_WRITES_SECONDS = float(os.getenv("DB_READ_YOUR_WRITES_SECONDS", "10"))
+_READ_YOUR_WRITES_KEY = "_db_primary_until"
+_SAFE_METHODS = ("GET", "HEAD", "OPTIONS")
+
+
+def _note_primary_write():
+    """Keep the rest of this request on the primary once it opens a
+    read-write cursor, and open the user's read-your-writes window when
+    the request is a mutation."""
+    try:
+        from flask import g, has_request_context, request, session
+
+        if not has_request_context():
+            return
+        g._db_conn_writable = True
+        if request.method not in _SAFE_METHODS:
+            session[_READ_YOUR_WRITES_KEY] = time() + READ_YOUR_WRITES_SECONDS
+    except Exception:
+        # No session available (e.g. no secret key in tests)
+        pass
+
+
+def _use_replica() -> bool:
+    """Route this read-only cursor to the replica?
+
+    Only inside a Flask request (ticks read-then-write and must see the
+    primary), never within a user's read-your-writes window, and never once
+    the request has opened a read-write cursor (its uncommitted writes are
+    only visible on the primary).
+    """
+    if not ReplicaPool.configured():
+        return False
+    try:
+        from flask import g, has_request_context, session
+
+        if not has_request_context():
+            return False
+        if getattr(g, "_db_conn_writable", False):
+            return False
+        if session.get(_READ_YOUR_WRITES_KEY, 0) > time():
+            return False
+    except Exception:
+        return False
+    return replica_pool.is_usable()
 
 
 @contextmanager
@@ -598,6 +1068,7 @@ def get_db_connection(cursor_factory=None):
             cursor.execute("SELECT ...")
     """
     conn = db_pool.get_connection()
+    _note_primary_write()
     import logging
 
     logging.getLogger(__name__).debug(
@@ -642,12 +1113,26 @@ def get_db_cursor(cursor_factory=None, read_only=False):
     close_on_return = False
     conn = None
     cursor = None
+    pool = db_pool
 
     try:
-        # Use the connection pool for better performance
-        conn = db_pool.get_connection()
-
-        cursor = conn.cursor(cursor_factory=cursor_factory)
+        # Use the connection pool for better performance; read-only
+        # cursors in a request may be served by the read replica
+        if read_only and _use_replica():
+            try:
+                conn = replica_pool.get_connection(timeout=1)
+                pool = replica_pool
+            except Exception as e:
+                logger.warning("Read replica checkout failed, using primary: %s", e)
+                replica_pool.mark_failed()
+        if conn is None:
+            conn = db_pool.get_connection()
+            if not read_only:
+                _note_primary_write()
+
+        cursor = conn.cursor(
+            cursor_factory=request_profiling.cursor_factory(cursor_factory)
+        )
         try:
             yield cursor
             if read_only:
@@ -659,6 +1144,8 @@ def get_db_cursor(cursor_factory=None, read_only=False):
         except (psycopg2.InterfaceError, psycopg2.OperationalError) as e:
             # Connection-level error - mark for closure
             close_on_return = True
+            if pool is replica_pool and _is_disconnect(e):
+                replica_pool.mark_failed()
             logger.error(f"Database connection error in cursor: {e}")
             raise
         except Exception as e:
@@ -679,7 +1166,7 @@ def get_db_cursor(cursor_factory=None, read_only=False):
         # Always return connection to pool
         if conn is not None:
             try:
-                db_pool.return_connection(conn, close=close_on_return)
+                pool.return_connection(conn, close=close_on_return)
             except Exception:
                 try:
                     conn.close()
@@ -687,48 +1174,85 @@ def get_db_cursor(cursor_factory=None, read_only=False):
                     pass
 
 
+def _is_disconnect(exc) -> bool:
+    """True for a lost connection, as opposed to an error Postgres reported
+    (which carries a SQLSTATE, e.g. a statement timeout)."""
+    return isinstance(exc, psycopg2.InterfaceError) or (
+        isinstance(exc, psycopg2.OperationalError) and exc.pgcode is None
+    )
+
+
 class QueryHelper:
     """Helper class for common database queries"""
 
+    @staticmethod
+    def _run(work, cursor_factory=None):
+        """Run ``work(cursor)`` in its own transaction and commit.
+
+        If the connection turns out to be dead before the commit (nothing
+        can have been applied), the pool discards it and the work is
+        retried once on a fresh connection. Failures during the commit
+        itself are never retried.
+        """
+        for attempt in (1, 2):
+            finished = False
+            try:
+                with get_db_cursor(cursor_factory=cursor_factory) as cursor:
+                    result = work(cursor)
+                    finished = True
+                return result
+            except (psycopg2.InterfaceError, psycopg2.OperationalError) as e:
+                if finished or attempt == 2 or not _is_disconnect(e):
+                    raise
+                db_pool.metrics.record(_current_route(), "retries")
+                logger.warning("Retrying query on a fresh connection: %s", e)
+
     @staticmethod
     def fetch_one(
         query: str, params: tuple = None, dict_cursor: bool = False
     ) -> Optional[Any]:
         """Execute a query and fetch one result"""
         cursor_factory = RealDictCursor if dict_cursor else None
-        with get_db_cursor(cursor_factory=cursor_factory) as cursor:
+
+        def work(cursor):
             cursor.execute(query, params)
             return cursor.fetchone()
 
+        return QueryHelper._run(work, cursor_factory)
+
     @staticmethod
     def fetch_all(
         query: str, params: tuple = None, dict_cursor: bool = False
     ) -> List[Any]:
         """Execute a query and fetch all results"""
         cursor_factory = RealDictCursor if dict_cursor else None
-        with get_db_cursor(cursor_factory=cursor_factory) as cursor:
+
+        def work(cursor):
             cursor.execute(query, params)
             return cursor.fetchall()
 
+        return QueryHelper._run(work, cursor_factory)
+
     @staticmethod
     def execute(query: str, params: tuple = None) -> None:
         """Execute a query without fetching results"""
-        with get_db_cursor() as cursor:
-            cursor.execute(query, params)
+        QueryHelper._run(lambda cursor: cursor.execute(query, params))
 
     @staticmethod
     def execute_many(query: str, params_list: List[tuple]) -> None:
         """Execute a query for many parameter sets efficiently."""
-        with get_db_cursor() as cursor:
-            execute_batch(cursor, query, params_list)
+        QueryHelper._run(lambda cursor: execute_batch(cursor, query, params_list))
 
     @staticmethod
     def execute_returning(query: str, params: tuple = None) -> Any:
         """Execute a query and return the result (useful for INSERT ... RETURNING)"""
-        with get_db_cursor() as cursor:
+
+        def work(cursor):
             cursor.execute(query, params)
             return cursor.fetchone()
 
+        return QueryHelper._run(work)
+
 
 class UserQueries:
     """Optimized queries for user-related operations"""
@@ -1066,6 +1590,27 @@ def get_request_connection():
     return conn
 
 
+def _get_request_replica_connection():
+    """The request-scoped replica connection, or None to use the primary."""
+    from flask import g
+
+    conn = getattr(g, "_db_replica_conn", None)
+    if conn is not None and not getattr(conn, "closed", 1):
+        # Once a request is on the replica it stays there unless it has
+        # since opened a read-write cursor
+        return None if getattr(g, "_db_conn_writable", False) else conn
+    if not _use_replica():
+        return None
+    try:
+        conn = replica_pool.get_connection(timeout=1)
+    except Exception as e:
+        logger.warning("Read replica checkout failed, using primary: %s", e)
+        replica_pool.mark_failed()
+        return None
+    g._db_replica_conn = conn
+    return conn
+
+
 @contextmanager
 def get_request_cursor(cursor_factory=None, read_only=False):
     """Like ``get_db_cursor`` but reuses the request-scoped connection.
@@ -1077,16 +1622,31 @@ def get_request_cursor(cursor_factory=None, read_only=False):
 
     The cursor is closed when the context manager exits.  The connection
     itself is committed/returned by ``teardown_request_connection``.
+
+    ``read_only`` cursors are served from a request-scoped read replica
+    connection when ``_use_replica`` allows it.
     """
-    conn = get_request_connection()
-    cursor = conn.cursor(cursor_factory=cursor_factory)
+    conn = _get_request_replica_connection() if read_only else None
+    replica = conn is not None
+    if conn is None:
+        conn = get_request_connection()
+        if not read_only:
+            _note_primary_write()
+    cursor = conn.cursor(
+        cursor_factory=request_profiling.cursor_factory(cursor_factory)
+    )
     try:
         yield cursor
-    except (psycopg2.InterfaceError, psycopg2.OperationalError):
+    except (psycopg2.InterfaceError, psycopg2.OperationalError) as e:
         # Mark conn as broken so teardown closes instead of returning it
         from flask import g
 
-        g._db_conn_broken = True
+        if replica:
+            g._db_replica_broken = True
+            if _is_disconnect(e):
+                replica_pool.mark_failed()
+        else:
+            g._db_conn_broken = True
         raise
     except psycopg2.Error:
         # Failed statement aborts the transaction; roll back so later queries work
@@ -1697,6 +2257,22 @@ def provinces_has_image_data() -> bool:
     return table_has_column("provinces", "image_data")
 
 
+def provinces_has_image_key() -> bool:
+    """True when banners can live in the image store (migration 0050)."""
+    return table_has_column("provinces", "image_key")
+
+
+def province_has_image_sql(alias: str = "") -> str:
+    """SQL boolean: the province has a custom banner, stored or legacy base64."""
+    if not provinces_has_image_data():
+        return "FALSE"
+    p = f"{alias}." if alias else ""
+    legacy = f"({p}image_data IS NOT NULL AND {p}image_data <> '')"
+    if provinces_has_image_key():
+        return f"({p}image_key IS NOT NULL OR {legacy})"
+    return legacy
+
+
 def _ensure_reset_codes_table(db) -> None:
     """Idempotent password-reset token storage (matches affo/postgres/reset_codes.txt)."""
     db.execute(
@@ -1787,7 +2363,20 @@ def teardown_request_connection(exc=None):
     """
     from flask import g
 
+    replica_conn = getattr(g, "_db_replica_conn", None)
+    if replica_conn is not None:
+        # Read-only: nothing to commit
+        close = getattr(g, "_db_replica_broken", False)
+        try:
+            replica_conn.rollback()
+        except Exception:
+            close = True
+        replica_pool.return_connection(replica_conn, close=close)
+        g._db_replica_conn = None
+        g._db_replica_broken = False
+
     conn = getattr(g, "_db_conn", None)
+    g._db_conn_writable = False
     if conn is None:
         return
 
@@ -1,7 +1,7 @@
 """HTTP client for the Flask bot API."""
 
 
-from typing import Any, Dict, Optional
+from typing import Any, Dict, Optional, Tuple
 
 import requests
 
@@ -24,6 +24,9 @@ class BotApiClient:
                 "Content-Type": "application/json",
             }
         )
+        # GET (path, params, discord user) -> (ETag, last body), so
+        # unchanged responses come back as empty 304s
+        self._etag_cache: Dict[Tuple, Tuple[str, Dict[str, Any]]] = {}
 
     def _request(
         self,
@@ -37,6 +40,16 @@ class BotApiClient:
         headers = {}
         if discord_user_id:
             headers["X-Discord-User-Id"] = str(discord_user_id)
+        cache_key = None
+        if method == "GET":
+            cache_key = (
+                path,
+                tuple(sorted((params or {}).items())),
+                str(discord_user_id or ""),
+            )
+            cached = self._etag_cache.get(cache_key)
+            if cached:
+                headers["If-None-Match"] = cached[0]
         url = f"{self.base_url}{path}"
         resp = self.session.request(
             method,
@@ -46,6 +59,8 @@ class BotApiClient:
             json=json_body,
             timeout=30,
         )
+        if resp.status_code == 304 and cache_key in self._etag_cache:
+            return self._etag_cache[cache_key][1]
         try:
             data = resp.json()
         except Exception:
@@ -53,7 +68,11 @@ class BotApiClient:
         if not resp.ok:
             msg = data.get("error") if isinstance(data, dict) else str(data)
             raise BotApiError(msg or f"HTTP {resp.status_code}", resp.status_code)
-        return data if isinstance(data, dict) else {"data": data}
+        data = data if isinstance(data, dict) else {"data": data}
+        etag = resp.headers.get("ETag")
+        if cache_key is not None and etag:
+            self._etag_cache[cache_key] = (etag, data)
+        return data
 
     def register(self, discord_user_id: str, code: str) -> Dict[str, Any]:
         return self._request(
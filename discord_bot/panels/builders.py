@@ -61,7 +61,7 @@ def build_leaderboard_embed(rows: Optional[List[Dict[str, Any]]] = None) -> disc
     rows = rows if rows is not None else data.fetch_leaderboard(10)
     embed = discord.Embed(
         title="🏆 Influence Board — Top Nations",
-        description="Ranked by **treasury** (gold held).",
+        description="Ranked by **influence**; arrows show movement since the last ranking.",
         color=ANO_GOLD,
     )
     if not rows:
@@ -70,8 +70,10 @@ def build_leaderboard_embed(rows: Optional[List[Dict[str, Any]]] = None) -> disc
         lines = []
         for i, row in enumerate(rows, 1):
             loc = row.get("location") or "?"
+            arrow = f" {row['rank_arrow']}" if row.get("rank_arrow") else ""
             lines.append(
-                f"**{i}.** [{row['username']}]({GAME_BASE_URL}/country/id={row['id']}) "
+                f"**{row.get('rank', i)}.**{arrow} "
+                f"[{row['username']}]({GAME_BASE_URL}/country/id={row['id']}) "
                 f"— **{int(row.get('influence') or 0):,}** influence · {loc}"
             )
         embed.add_field(name="Top 10", value="\n".join(lines)[:1020], inline=False)
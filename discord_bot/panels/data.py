@@ -7,22 +7,28 @@ from database import QueryHelper, get_coalition_members_table
 
 
 def fetch_leaderboard(limit: int = 10) -> List[Dict[str, Any]]:
-    # influence is computed; use gold as a fast proxy for the panel
-    rows = QueryHelper.fetch_all(
-        """
-        SELECT u.id, u.username,
-               COALESCE(s.gold, 0) AS influence,
-               s.location
-        FROM users u
-        INNER JOIN stats s ON s.id = u.id
-        WHERE COALESCE(u.auth_type, 'normal') = 'normal'
-        ORDER BY s.gold DESC NULLS LAST
-        LIMIT %s
-        """,
-        (limit,),
-        dict_cursor=True,
-    )
-    return [dict(r) for r in rows or []]
+    """Top nations from the precomputed influence board (app_core.leaderboards)."""
+    from app_core.leaderboards import fetch_leaderboard as fetch_board
+
+    entries = fetch_board("influence", limit=limit)
+    ids = [e["entity_id"] for e in entries]
+    locations = {}
+    if ids:
+        rows = QueryHelper.fetch_all(
+            "SELECT id, location FROM stats WHERE id = ANY(%s)", (ids,)
+        )
+        locations = {r[0]: r[1] for r in rows or []}
+    return [
+        {
+            "id": e["entity_id"],
+            "username": e["name"],
+            "influence": e["score"],
+            "location": locations.get(e["entity_id"]),
+            "rank": e["rank"],
+            "rank_arrow": e["rank_arrow"],
+        }
+        for e in entries
+    ]
 
 
 def fetch_active_wars(limit: int = 12) -> List[Dict[str, Any]]:
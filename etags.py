@@ -0,0 +1,188 @@
+"""
+Version-based ETags for polled pages and JSON APIs
+
+Each scope ("provinces_map", "world_map", "leaderboards") has a generation
+counter in ``etag_versions``. Writers bump it inside their own transaction
+with ``bump(db, scope)``; ticks do the same from the Celery workers.
+
+``conditional(scope)`` wraps a view: the client's If-None-Match is compared
+with the current version before the view runs, and an unchanged client gets
+an empty 304. Versions are cached in query_cache for ETAG_VERSION_TTL
+seconds, so a 304 normally costs no database round trip. ``bump`` drops the
+cached value (on every worker when the shared cache tier is on); the TTL
+bounds how long a bump from another process takes to show otherwise.
+
+Responses that also depend on the requesting player use ``per_user=True``.
+Their tag carries a per-user token that invalidate_user_cache drops. The
+token lives in the cache, so it is only the same on every worker when the
+shared tier is on; without it those responses go out untagged.
+"""
+
+import os
+import uuid
+from functools import wraps
+
+VERSION_TTL = int(os.getenv("ETAG_VERSION_TTL", "10"))
+USER_VERSION_TTL = int(os.getenv("ETAG_USER_VERSION_TTL", "60"))
+
+
+def _version_key(scope):
+    return f"etag_version_{scope}"
+
+
+def version(scope):
+    """Current generation of ``scope``, or None if it cannot be read."""
+    from database import get_request_cursor, query_cache
+
+    key = _version_key(scope)
+    cached = query_cache.get(key)
+    if cached is not None:
+        return cached
+    try:
+        with get_request_cursor(read_only=True) as db:
+            db.execute("SELECT version FROM etag_versions WHERE scope = %s", (scope,))
+            row = db.fetchone()
+    except Exception:
+        return None
+    value = row[0] if row else 0
+    query_cache.set(key, value, ttl_seconds=VERSION_TTL)
+    return value
+
+
+def bump(db, scope):
+    """Advance ``scope`` in the caller's transaction; returns the new version.
+
+    Best-effort: a failure (e.g. the migration has not run yet) is rolled
+    back to a savepoint, never aborts the caller's writes and returns None.
+    """
+    from database import query_cache
+
+    try:
+        db.execute("SAVEPOINT etag_bump")
+        try:
+            db.execute(
+                """
+                INSERT INTO etag_versions (scope, version) VALUES (%s, 1)
+                ON CONFLICT (scope) DO UPDATE
+                SET version = etag_versions.version + 1, updated_at = now()
+                RETURNING version
+                """,
+                (scope,),
+            )
+            new_version = db.fetchone()[0]
+            db.execute("RELEASE SAVEPOINT etag_bump")
+        except Exception:
+            db.execute("ROLLBACK TO SAVEPOINT etag_bump")
+            return None
+    except Exception:
+        return None
+    query_cache.delete(_version_key(scope))
+    return new_version
+
+
+def user_version(user_id):
+    """Token that changes whenever invalidate_user_cache(user_id) runs, or
+    None without the shared cache tier (each worker would mint its own)."""
+    from database import query_cache, user_tag
+
+    if not query_cache.shared:
+        return None
+    key = f"etag_user_{user_id}"
+    token = query_cache.get(key)
+    if token is None:
+        token = uuid.uuid4().hex[:12]
+        query_cache.set(
+            key, token, ttl_seconds=USER_VERSION_TTL, tags=(user_tag(user_id),)
+        )
+    return token
+
+
+def current_etag(scope, user_id=None, variant=None):
+    """The ETag for ``scope`` (and ``user_id``), or None when unversioned.
+
+    ``variant`` names a non-default representation (e.g. "columns") so each
+    encoding of the same data has its own tag.
+    """
+    scope_version = version(scope)
+    if scope_version is None:
+        return None
+    tag = f"{scope}-{scope_version}"
+    if user_id is not None:
+        user_token = user_version(user_id)
+        if user_token is None:
+            return None
+        tag += f"-{user_id}-{user_token}"
+    if variant:
+        tag += f"-{variant}"
+    return tag
+
+
+def matches(if_none_match, tag):
+    """Whether an If-None-Match header value covers ``tag``.
+
+    Flask-Compress appends the content coding to the tags it compresses
+    (W/"tag:gzip"), so that suffix is ignored.
+    """
+    if tag is None:
+        return False
+    if if_none_match.star_tag:
+        return True
+    return any(
+        candidate.split(":", 1)[0] == tag
+        for candidate in if_none_match.as_set(include_weak=True)
+    )
+
+
+def not_modified(tag):
+    """A 304 for ``tag`` if the request's If-None-Match has it, else None."""
+    from flask import make_response, request
+
+    if not matches(request.if_none_match, tag):
+        return None
+    response = make_response("", 304)
+    response.set_etag(tag, weak=True)
+    return response
+
+
+def tagged(response, tag):
+    """Attach ``tag`` to a successful ``response`` (any view return value)."""
+    from flask import make_response
+
+    response = make_response(response)
+    if tag is not None and response.status_code == 200:
+        # Weak: Flask-Compress changes the bytes, not the meaning
+        response.set_etag(tag, weak=True)
+    return response
+
+
+def conditional(scope, per_user=False, negotiate=None):
+    """Answer 304 before running the view when ``scope`` has not changed.
+
+    With ``per_user`` the tag also covers the logged-in player; anonymous
+    requests then go through untagged. ``negotiate`` picks the
+    representation from the Accept header (see columnar.negotiate); its
+    result becomes part of the tag.
+    """
+
+    def decorator(view):
+        @wraps(view)
+        def wrapper(*args, **kwargs):
+            from flask import session
+
+            user_id = session.get("user_id") if per_user else None
+            variant = negotiate() if negotiate is not None else None
+            tag = (
+                None
+                if per_user and user_id is None
+                else current_etag(scope, user_id, variant)
+            )
+            response = not_modified(tag)
+            if response is not None:
+                if negotiate is not None:
+                    response.vary.add("Accept")
+                return response
+            return tagged(view(*args, **kwargs), tag)
+
+        return wrapper
+
+    return decorator
@@ -7,7 +7,12 @@ from flask import redirect, render_template, session, request, jsonify
 from functools import wraps
 from dotenv import load_dotenv
 from datetime import date
-from database import get_request_cursor, query_cache, reuse_or_new_cursor
+from database import (
+    get_request_cursor,
+    query_cache,
+    reuse_or_new_cursor,
+    user_tag,
+)
 from io import BytesIO
 import base64
 
@@ -26,8 +31,14 @@ def client_ip_from_request() -> str | None:
     return request.remote_addr
 
 
-def province_image_url(province_id: int, has_image: bool = False) -> str:
+def province_image_url(
+    province_id: int, has_image: bool = False, image_key: str | None = None
+) -> str:
     """Public URL for a province banner, or the default stock image."""
+    if image_key:
+        from image_store import image_url
+
+        return image_url(image_key)
     if has_image:
         return f"/province-image/{province_id}"
     from flask import url_for
@@ -515,213 +526,33 @@ def record_war_event(
 
 
 def get_influence(country_id, db=None):
-    # Check cache first
-    cache_key = f"influence_{country_id}"
-    cached = query_cache.get(cache_key)
-    if cached is not None:
-        return cached
+    # Cached, and computed once when several requests miss together
+    return query_cache.get_or_compute(
+        f"influence_{country_id}",
+        lambda: _compute_influence(country_id, db),
+        tags=(user_tag(country_id),),
+    )
 
-    cId = country_id
 
+def _compute_influence(country_id, db=None):
+    from app_core.economy.influence import components_sql, influence_score
+
+    # Scored live (every aggregate is filtered to this user) so a nation's
+    # own page reflects purchases before the next tick refreshes
+    # nation_influence; lists read the snapshot via get_bulk_influence.
     with reuse_or_new_cursor(db) as db:
-        # OPTIMIZED: Single query with filtered subqueries
-        # Each subquery filters to the target user to avoid full-table scans
-        db.execute(
-            """
-            SELECT
-                COALESCE(m.soldiers, 0) as soldiers,
-                COALESCE(m.artillery, 0) as artillery,
-                COALESCE(m.tanks, 0) as tanks,
-                COALESCE(m.fighters, 0) as fighters,
-                COALESCE(m.bombers, 0) as bombers,
-                COALESCE(m.apaches, 0) as apaches,
-                COALESCE(m.submarines, 0) as submarines,
-                COALESCE(m.destroyers, 0) as destroyers,
-                COALESCE(m.cruisers, 0) as cruisers,
-                COALESCE(m.ICBMs, 0) as icbms,
-                COALESCE(m.nukes, 0) as nukes,
-                COALESCE(m.spies, 0) as spies,
-                COALESCE(s.gold, 0) as gold,
-                COALESCE(prov.city_count, 0) as city_count,
-                COALESCE(prov.province_count, 0) as province_count,
-                COALESCE(prov.total_land, 0) as total_land,
-                COALESCE(r.total_resources, 0) as total_resources
-            FROM users u
-            LEFT JOIN (
-                SELECT
-                    um.user_id,
-                    SUM(CASE WHEN ud.name = 'soldiers'
-                        THEN um.quantity ELSE 0 END) as soldiers,
-                    SUM(CASE WHEN ud.name = 'artillery'
-                        THEN um.quantity ELSE 0 END) as artillery,
-                    SUM(CASE WHEN ud.name = 'tanks'
-                        THEN um.quantity ELSE 0 END) as tanks,
-                    SUM(CASE WHEN ud.name = 'fighters'
-                        THEN um.quantity ELSE 0 END) as fighters,
-                    SUM(CASE WHEN ud.name = 'bombers'
-                        THEN um.quantity ELSE 0 END) as bombers,
-                    SUM(CASE WHEN ud.name = 'apaches'
-                        THEN um.quantity ELSE 0 END) as apaches,
-                    SUM(CASE WHEN ud.name = 'submarines'
-                        THEN um.quantity ELSE 0 END) as submarines,
-                    SUM(CASE WHEN ud.name = 'destroyers'
-                        THEN um.quantity ELSE 0 END) as destroyers,
-                    SUM(CASE WHEN ud.name = 'cruisers'
-                        THEN um.quantity ELSE 0 END) as cruisers,
-                    SUM(CASE WHEN ud.name = 'icbms'
-                        THEN um.quantity ELSE 0 END) as icbms,
-                    SUM(CASE WHEN ud.name = 'nukes'
-                        THEN um.quantity ELSE 0 END) as nukes,
-                    SUM(CASE WHEN ud.name = 'spies'
-                        THEN um.quantity ELSE 0 END) as spies
-                FROM user_military um
-                JOIN unit_dictionary ud ON ud.unit_id = um.unit_id
-                WHERE um.user_id = %s
-                GROUP BY um.user_id
-            ) m ON u.id = m.user_id
-            LEFT JOIN stats s ON u.id = s.id
-            LEFT JOIN (
-                SELECT userId,
-                       SUM(citycount) as city_count,
-                       COUNT(id) as province_count,
-                       SUM(land) as total_land
-                FROM provinces
-                WHERE userId = %s
-                GROUP BY userId
-            ) prov ON u.id = prov.userId
-            LEFT JOIN (
-                SELECT user_id, SUM(quantity) as total_resources
-                FROM user_economy
-                WHERE user_id = %s
-                GROUP BY user_id
-            ) r ON u.id = r.user_id
-            WHERE u.id = %s
-            """,
-            (cId, cId, cId, cId),
-        )
+        db.execute(components_sql(user_filter=True), {"user_ids": [country_id]})
         result = db.fetchone()
 
-        if not result:
-            query_cache.set(cache_key, 0)
-            return 0
-
-        if isinstance(result, dict):
-            soldiers = result.get("soldiers", 0)
-            artillery = result.get("artillery", 0)
-            tanks = result.get("tanks", 0)
-            fighters = result.get("fighters", 0)
-            bombers = result.get("bombers", 0)
-            apaches = result.get("apaches", 0)
-            submarines = result.get("submarines", 0)
-            destroyers = result.get("destroyers", 0)
-            cruisers = result.get("cruisers", 0)
-            icbms = result.get("icbms", 0)
-            nukes = result.get("nukes", 0)
-            spies = result.get("spies", 0)
-            gold = result.get("gold", 0)
-            city_count = result.get("city_count", 0)
-            province_count = result.get("province_count", 0)
-            total_land = result.get("total_land", 0)
-            total_resources = result.get("total_resources", 0)
-        else:
-            (
-                soldiers,
-                artillery,
-                tanks,
-                fighters,
-                bombers,
-                apaches,
-                submarines,
-                destroyers,
-                cruisers,
-                icbms,
-                nukes,
-                spies,
-                gold,
-                city_count,
-                province_count,
-                total_land,
-                total_resources,
-            ) = result
-
-        soldiers = float(soldiers or 0)
-        artillery = float(artillery or 0)
-        tanks = float(tanks or 0)
-        fighters = float(fighters or 0)
-        bombers = float(bombers or 0)
-        apaches = float(apaches or 0)
-        submarines = float(submarines or 0)
-        destroyers = float(destroyers or 0)
-        cruisers = float(cruisers or 0)
-        icbms = float(icbms or 0)
-        nukes = float(nukes or 0)
-        spies = float(spies or 0)
-        gold = float(gold or 0)
-        city_count = float(city_count or 0)
-        province_count = float(province_count or 0)
-        total_land = float(total_land or 0)
-        total_resources = float(total_resources or 0)
-
-        # Calculate influence scores
-        soldiers_score = soldiers * 0.02
-        artillery_score = artillery * 1.6
-        tanks_score = tanks * 0.8
-        fighters_score = fighters * 3.5
-        bombers_score = bombers * 2.5
-        apaches_score = apaches * 3.2
-        submarines_score = submarines * 4.5
-        destroyers_score = destroyers * 3
-        cruisers_score = cruisers * 5.5
-        icbms_score = icbms * 250
-        nukes_score = nukes * 500
-        spies_score = spies * 25
-        money_score = gold * 0.00001
-        cities_score = city_count * 10
-        provinces_score = province_count * 300
-        land_score = total_land * 10
-        resources_score = total_resources * 0.001
-
-    """
-    (# of provinces * 300)+(# of soldiers * 0.02)+(# of artillery*1.6)+(# of tanks*0.8)
-    +(# of fighters* 3.5)+(# of bombers *2.5)+(# of apaches *3.2)+(# of subs * 4.5)+
-    (# of destroyers *3.0)+(# of cruisers *5.5) + (# of ICBMS*250)+(# of Nukes * 500)
-    + (# of spies*25) + (# of total cities * 10) + (# of total land * 10)+
-    (total number of rss *0.001)+(total amount of money*0.00001)
-    """
-
-    influence = (
-        provinces_score
-        + soldiers_score
-        + artillery_score
-        + tanks_score
-        + fighters_score
-        + bombers_score
-        + apaches_score
-        + submarines_score
-        + destroyers_score
-        + cruisers_score
-        + icbms_score
-        + nukes_score
-        + spies_score
-        + cities_score
-        + land_score
-        + resources_score
-        + money_score
-    )
-
-    influence = round(influence)
-
-    # Cache the result
-    query_cache.set(cache_key, influence)
-
-    return influence
+    return influence_score(result) if result else 0
 
 
 def get_bulk_influence(user_ids):
     """
-    Calculate influence for multiple users in a single query.
+    Influence for multiple users, read from the nation_influence snapshot.
     Returns a dict mapping user_id -> influence score.
-    Much faster than calling get_influence() in a loop.
+    Users the snapshot does not know yet (e.g. created since the last tick)
+    are scored live in one extra query.
     """
     if not user_ids:
         return {}
@@ -740,144 +571,27 @@ def get_bulk_influence(user_ids):
     if not uncached_ids:
         return results
 
+    from app_core.economy.influence import components_sql, influence_score
+
     with get_request_cursor() as db:
-        # Bulk query for all uncached users at once
         db.execute(
-            """
-            SELECT
-                u.id,
-                COALESCE(m.soldiers, 0) as soldiers,
-                COALESCE(m.artillery, 0) as artillery,
-                COALESCE(m.tanks, 0) as tanks,
-                COALESCE(m.fighters, 0) as fighters,
-                COALESCE(m.bombers, 0) as bombers,
-                COALESCE(m.apaches, 0) as apaches,
-                COALESCE(m.submarines, 0) as submarines,
-                COALESCE(m.destroyers, 0) as destroyers,
-                COALESCE(m.cruisers, 0) as cruisers,
-                COALESCE(m.ICBMs, 0) as icbms,
-                COALESCE(m.nukes, 0) as nukes,
-                COALESCE(m.spies, 0) as spies,
-                COALESCE(s.gold, 0) as gold,
-                COALESCE(prov.city_count, 0) as city_count,
-                COALESCE(prov.province_count, 0) as province_count,
-                COALESCE(prov.total_land, 0) as total_land,
-                COALESCE(r.total_resources, 0) as total_resources
-            FROM users u
-            LEFT JOIN (
-                SELECT
-                    um.user_id,
-                    SUM(CASE WHEN ud.name = 'soldiers'
-                        THEN um.quantity ELSE 0 END) as soldiers,
-                    SUM(CASE WHEN ud.name = 'artillery'
-                        THEN um.quantity ELSE 0 END) as artillery,
-                    SUM(CASE WHEN ud.name = 'tanks'
-                        THEN um.quantity ELSE 0 END) as tanks,
-                    SUM(CASE WHEN ud.name = 'fighters'
-                        THEN um.quantity ELSE 0 END) as fighters,
-                    SUM(CASE WHEN ud.name = 'bombers'
-                        THEN um.quantity ELSE 0 END) as bombers,
-                    SUM(CASE WHEN ud.name = 'apaches'
-                        THEN um.quantity ELSE 0 END) as apaches,
-                    SUM(CASE WHEN ud.name = 'submarines'
-                        THEN um.quantity ELSE 0 END) as submarines,
-                    SUM(CASE WHEN ud.name = 'destroyers'
-                        THEN um.quantity ELSE 0 END) as destroyers,
-                    SUM(CASE WHEN ud.name = 'cruisers'
-                        THEN um.quantity ELSE 0 END) as cruisers,
-                    SUM(CASE WHEN ud.name = 'icbms'
-                        THEN um.quantity ELSE 0 END) as icbms,
-                    SUM(CASE WHEN ud.name = 'nukes'
-                        THEN um.quantity ELSE 0 END) as nukes,
-                    SUM(CASE WHEN ud.name = 'spies'
-                        THEN um.quantity ELSE 0 END) as spies
-                FROM user_military um
-                JOIN unit_dictionary ud ON ud.unit_id = um.unit_id
-                GROUP BY um.user_id
-            ) m ON u.id = m.user_id
-            LEFT JOIN stats s ON u.id = s.id
-            LEFT JOIN (
-                SELECT userId,
-                       SUM(citycount) as city_count,
-                       COUNT(id) as province_count,
-                       SUM(land) as total_land
-                FROM provinces
-                GROUP BY userId
-            ) prov ON u.id = prov.userId
-            LEFT JOIN (
-                SELECT user_id, SUM(quantity) as total_resources
-                FROM user_economy
-                GROUP BY user_id
-            ) r ON u.id = r.user_id
-            WHERE u.id = ANY(%s)
-            """,
+            "SELECT user_id, influence FROM nation_influence "
+            "WHERE user_id = ANY(%s)",
             (uncached_ids,),
         )
-        rows = db.fetchall()
-
-        for row in rows:
-            (
-                user_id,
-                soldiers,
-                artillery,
-                tanks,
-                fighters,
-                bombers,
-                apaches,
-                submarines,
-                destroyers,
-                cruisers,
-                icbms,
-                nukes,
-                spies,
-                gold,
-                city_count,
-                province_count,
-                total_land,
-                total_resources,
-            ) = row
-
-            soldiers = float(soldiers or 0)
-            artillery = float(artillery or 0)
-            tanks = float(tanks or 0)
-            fighters = float(fighters or 0)
-            bombers = float(bombers or 0)
-            apaches = float(apaches or 0)
-            submarines = float(submarines or 0)
-            destroyers = float(destroyers or 0)
-            cruisers = float(cruisers or 0)
-            icbms = float(icbms or 0)
-            nukes = float(nukes or 0)
-            spies = float(spies or 0)
-            gold = float(gold or 0)
-            city_count = float(city_count or 0)
-            province_count = float(province_count or 0)
-            total_land = float(total_land or 0)
-            total_resources = float(total_resources or 0)
-
-            # Calculate influence
-            influence = round(
-                province_count * 300
-                + soldiers * 0.02
-                + artillery * 1.6
-                + tanks * 0.8
-                + fighters * 3.5
-                + bombers * 2.5
-                + apaches * 3.2
-                + submarines * 4.5
-                + destroyers * 3
-                + cruisers * 5.5
-                + icbms * 250
-                + nukes * 500
-                + spies * 25
-                + city_count * 10
-                + total_land * 10
-                + total_resources * 0.001
-                + gold * 0.00001
-            )
-
-            results[user_id] = influence
-            query_cache.set(f"influence_{user_id}", influence)
+        fresh = dict(db.fetchall())
+
+        missing = [uid for uid in uncached_ids if uid not in fresh]
+        if missing:
+            db.execute(components_sql(user_filter=True), {"user_ids": missing})
+            for row in db.fetchall():
+                fresh[row[0]] = influence_score(row)
+
+    for user_id, influence in fresh.items():
+        results[user_id] = influence
+        query_cache.set(
+            f"influence_{user_id}", influence, tags=(user_tag(user_id),)
+        )
 
     return results
 
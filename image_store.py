@@ -0,0 +1,322 @@
+"""
+Content-addressed storage for uploaded images (flags and province banners)
+
+An upload is normalised once, at upload time, into a JPEG (what the site has
+always served), a WebP of the same picture and a small WebP thumbnail. The
+SHA-256 of the JPEG is the image's key and every variant is stored under
+``<key>.<variant>``, so a name never changes meaning and its URL can be
+cached forever:
+
+    /img/<key>.jpg   /img/<key>.webp   /img/<key>.thumb.webp
+
+Rows reference the key (users.flag_key, colNames.flag_key,
+provinces.image_key, migration 0050). The old /flag/... and
+/province-image/... URLs redirect to the immutable ones, picking WebP when
+the browser accepts it.
+
+Backends:
+- LocalImageStore: a directory (IMAGE_STORE_DIR). Without IMAGE_STORE_DIR
+  it is <repo>/var/images, which a redeploy wipes and other replicas do
+  not see.
+- S3ImageStore: any S3-compatible bucket (IMAGE_STORE_S3_BUCKET, optional
+  IMAGE_STORE_S3_ENDPOINT and IMAGE_STORE_S3_PREFIX). Needs boto3.
+
+Until the store is `durable` (S3, or an explicitly set IMAGE_STORE_DIR on a
+mounted volume), rows also keep the JPEG as base64 in their *_data column,
+and /img/ rebuilds a blob the store is missing from that copy.
+
+With IMAGE_CDN_URL set, `image_url` points at the CDN, which pulls from
+/img/ on a miss.
+"""
+
+import base64
+import hashlib
+import logging
+import os
+import re
+import tempfile
+from io import BytesIO
+
+logger = logging.getLogger(__name__)
+
+IMAGE_STORE_DIR = os.getenv(
+    "IMAGE_STORE_DIR",
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), "var", "images"),
+)
+IMAGE_CDN_URL = os.getenv("IMAGE_CDN_URL", "").rstrip("/")
+
+# Immutable names: one year, never revalidated
+IMMUTABLE_MAX_AGE = 365 * 24 * 3600
+# The key behind /flag/... or /province-image/... changes on every upload
+REDIRECT_MAX_AGE = 300
+
+VARIANTS = {
+    "jpg": "image/jpeg",
+    "webp": "image/webp",
+    "thumb.webp": "image/webp",
+}
+
+# kind -> (max width, max height, JPEG quality, thumbnail box, flatten onto white)
+IMAGE_KINDS = {
+    "flag": (300, 300, 85, (64, 64), False),
+    "province": (1200, 675, 82, (320, 180), True),
+}
+
+# Rows that may keep a base64 copy of a stored image:
+# (table, key column, data column, image kind)
+DATABASE_COPIES = (
+    ("users", "flag_key", "flag_data", "flag"),
+    ("colNames", "flag_key", "flag_data", "flag"),
+    ("provinces", "image_key", "image_data", "province"),
+)
+
+_NAME_RE = re.compile(r"^([0-9a-f]{64})\.(jpg|webp|thumb\.webp)$")
+
+
+class LocalImageStore:
+    """Blobs as files under ``root``, fanned out by the first two hex digits."""
+
+    def __init__(self, root):
+        self.root = root
+
+    def _path(self, name):
+        return os.path.join(self.root, name[:2], name)
+
+    def put(self, name, data, mimetype):
+        path = self._path(name)
+        if os.path.exists(path):
+            return
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        fd, tmp = tempfile.mkstemp(dir=os.path.dirname(path), prefix=".tmp-")
+        try:
+            with os.fdopen(fd, "wb") as f:
+                f.write(data)
+            os.replace(tmp, path)
+        except BaseException:
+            try:
+                os.unlink(tmp)
+            except OSError:
+                pass
+            raise
+
+    def get(self, name):
+        """Bytes stored as ``name``, or None if it was never stored."""
+        try:
+            with open(self._path(name), "rb") as f:
+                return f.read()
+        except FileNotFoundError:
+            return None
+
+
+class S3ImageStore:
+    """Blobs as objects in an S3-compatible bucket."""
+
+    def __init__(self, bucket, prefix="images/", endpoint_url=None):
+        try:
+            import boto3
+        except ImportError as exc:
+            raise RuntimeError(
+                "IMAGE_STORE_S3_BUCKET is set but boto3 is not installed"
+            ) from exc
+        self.bucket = bucket
+        self.prefix = prefix
+        self.client = boto3.client("s3", endpoint_url=endpoint_url)
+
+    def put(self, name, data, mimetype):
+        from botocore.exceptions import ClientError
+
+        key = self.prefix + name
+        try:
+            self.client.head_object(Bucket=self.bucket, Key=key)
+            return
+        except ClientError:
+            pass
+        self.client.put_object(
+            Bucket=self.bucket,
+            Key=key,
+            Body=data,
+            ContentType=mimetype,
+            CacheControl=f"public, max-age={IMMUTABLE_MAX_AGE}, immutable",
+        )
+
+    def get(self, name):
+        from botocore.exceptions import ClientError
+
+        try:
+            obj = self.client.get_object(Bucket=self.bucket, Key=self.prefix + name)
+        except ClientError:
+            return None
+        return obj["Body"].read()
+
+
+_store = None
+
+
+def get_store():
+    """The configured backend (built on first use)."""
+    global _store
+    if _store is None:
+        bucket = os.getenv("IMAGE_STORE_S3_BUCKET")
+        if bucket:
+            _store = S3ImageStore(
+                bucket,
+                prefix=os.getenv("IMAGE_STORE_S3_PREFIX", "images/"),
+                endpoint_url=os.getenv("IMAGE_STORE_S3_ENDPOINT") or None,
+            )
+        else:
+            _store = LocalImageStore(IMAGE_STORE_DIR)
+    return _store
+
+
+def durable():
+    """Whether stored blobs outlive this container and are shared by every
+    replica: S3, or a directory the deployment chose with IMAGE_STORE_DIR."""
+    return bool(os.getenv("IMAGE_STORE_S3_BUCKET") or os.getenv("IMAGE_STORE_DIR"))
+
+
+def database_copy(key, store=None):
+    """Base64 JPEG of ``key`` for the row's *_data column, or None once the
+    store is durable and the row need not keep a copy."""
+    if durable():
+        return None
+    data = (store or get_store()).get(f"{key}.jpg")
+    return base64.b64encode(data).decode("utf-8") if data else None
+
+
+def render_variants(source, kind):
+    """Decode ``source`` (bytes or a file object) into ``{variant: bytes}``.
+
+    Raises ValueError when the upload is not an image PIL can read.
+    """
+    from PIL import Image, UnidentifiedImageError
+
+    max_width, max_height, quality, thumb_box, flatten = IMAGE_KINDS[kind]
+    if isinstance(source, (bytes, bytearray)):
+        source = BytesIO(source)
+    try:
+        img = Image.open(source)
+        img.load()
+    except (UnidentifiedImageError, OSError) as exc:
+        raise ValueError("Unreadable image") from exc
+
+    if flatten and img.mode in ("RGBA", "LA", "P"):
+        img = img.convert("RGBA")
+        background = Image.new("RGB", img.size, (255, 255, 255))
+        background.paste(img, mask=img.split()[-1])
+        img = background
+    elif img.mode != "RGB":
+        img = img.convert("RGB")
+    img.thumbnail((max_width, max_height), Image.Resampling.LANCZOS)
+
+    def encode(picture, fmt, **options):
+        buffer = BytesIO()
+        picture.save(buffer, format=fmt, **options)
+        return buffer.getvalue()
+
+    thumb = img.copy()
+    thumb.thumbnail(thumb_box, Image.Resampling.LANCZOS)
+    return {
+        "jpg": encode(img, "JPEG", quality=quality, optimize=True),
+        "webp": encode(img, "WEBP", quality=quality, method=4),
+        "thumb.webp": encode(thumb, "WEBP", quality=quality, method=4),
+    }
+
+
+def store_image(source, kind, store=None):
+    """Store every variant of an upload; returns its key."""
+    store = store or get_store()
+    variants = render_variants(source, kind)
+    key = hashlib.sha256(variants["jpg"]).hexdigest()
+    # The JPEG goes last: once it exists, the whole set does
+    for variant in ("thumb.webp", "webp", "jpg"):
+        store.put(f"{key}.{variant}", variants[variant], VARIANTS[variant])
+    return key
+
+
+def image_url(key, variant="jpg"):
+    """Immutable URL of one variant of ``key``."""
+    return f"{IMAGE_CDN_URL}/img/{key}.{variant}"
+
+
+def redirect_to_image(key):
+    """Redirect a legacy flag/banner URL to the key's immutable variant."""
+    from flask import redirect, request
+
+    # Only an explicit image/webp counts: old browsers send */* too
+    accepts_webp = any(
+        mimetype == "image/webp" and quality > 0
+        for mimetype, quality in request.accept_mimetypes
+    )
+    variant = "webp" if accepts_webp else "jpg"
+    response = redirect(image_url(key, variant))
+    response.headers["Cache-Control"] = f"public, max-age={REDIRECT_MAX_AGE}"
+    response.vary.add("Accept")
+    return response
+
+
+def send_image(name, store=None):
+    """Serve ``<key>.<variant>`` with its name as ETag, ranges and an immutable
+    Cache-Control; 404 for anything else."""
+    from flask import abort, send_file
+
+    match = _NAME_RE.match(name)
+    if not match:
+        abort(404)
+    store = store or get_store()
+    data = store.get(name)
+    if data is None:
+        data = _restore(match.group(1), match.group(2), store)
+    if data is None:
+        abort(404)
+    response = send_file(
+        BytesIO(data),
+        mimetype=VARIANTS[match.group(2)],
+        conditional=True,
+        etag=name,
+        max_age=IMMUTABLE_MAX_AGE,
+    )
+    response.cache_control.public = True
+    response.cache_control.immutable = True
+    return response
+
+
+def _database_copy(key):
+    """(bytes, kind) of a row's base64 copy of ``key``, or None."""
+    from database import get_request_cursor
+
+    try:
+        # Primary: the upload may be seconds old
+        with get_request_cursor() as db:
+            for table, key_column, data_column, kind in DATABASE_COPIES:
+                db.execute(
+                    f"SELECT {data_column} FROM {table}"
+                    f" WHERE {key_column} = %s AND {data_column} IS NOT NULL LIMIT 1",
+                    (key,),
+                )
+                row = db.fetchone()
+                if row and row[0]:
+                    return base64.b64decode(row[0]), kind
+    except Exception as e:
+        logger.warning("No database copy of image %s: %s", key, e)
+    return None
+
+
+def _restore(key, variant, store):
+    """Rebuild the variants of ``key`` from its database copy (a redeployed
+    or different replica's store) and put them back; returns ``variant``."""
+    copy = _database_copy(key)
+    if copy is None:
+        return None
+    raw, kind = copy
+    try:
+        variants = render_variants(raw, kind)
+    except ValueError:
+        return None
+    if hashlib.sha256(raw).hexdigest() == key:
+        variants["jpg"] = raw
+    try:
+        for name, data in variants.items():
+            store.put(f"{key}.{name}", data, VARIANTS[name])
+    except OSError as e:
+        logger.warning("Could not restore image %s: %s", key, e)
+    return variants[variant]
@@ -5,7 +5,6 @@ from helpers import error
 # NOTE: 'app' is NOT imported at module level to avoid circular imports
 import bcrypt
 import os
-from requests_oauthlib import OAuth2Session
 from dotenv import load_dotenv
 import datetime
 import logging
@@ -306,6 +305,10 @@ def token_updater(token):
 
 
 def make_session(token=None, state=None, scope=None):
+    # Imported on first use: requests_oauthlib pulls in requests, which is
+    # slow to import and only needed by the Discord OAuth flow
+    from requests_oauthlib import OAuth2Session
+
     return OAuth2Session(
         client_id=OAUTH2_CLIENT_ID,
         token=token,
@@ -0,0 +1,149 @@
+"""
+Prometheus metrics for the game ticks and the connection pool
+
+Exposes, when prometheus_client is installed:
+
+* ``ano_tick_phase_seconds{task,phase}`` -- wall time of each tick phase
+  (preload / compute / write for revenue, tax_income and population_growth;
+  production / consumption / supply for global_tick)
+* ``ano_tick_chunks_total{task}`` and ``ano_tick_rows_written_total{task,table}``
+* ``ano_tick_lock_skips_total{task,reason}`` -- runs skipped because another
+  run held the advisory or leader lock, or the last run was too recent
+* ``ano_db_pool_saturation{route}`` and ``ano_db_pool_exhausted_total{route}``
+
+Gunicorn and Celery run several processes, so set PROMETHEUS_MULTIPROC_DIR
+to a shared, empty directory before start-up; ``registry()`` then merges the
+per-process files. The web app serves the result on /metrics and a Celery
+worker started with CELERY_METRICS_PORT serves it on that port.
+
+Without prometheus_client every helper is a no-op.
+"""
+
+import os
+from contextlib import contextmanager
+from time import perf_counter
+
+MULTIPROC_DIR = os.getenv("PROMETHEUS_MULTIPROC_DIR")
+
+# Ticks run from seconds (a revenue chunk) to ~20 minutes (a slow global tick)
+PHASE_BUCKETS = (0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300, 600, 1200)
+
+try:
+    from prometheus_client import Counter, Histogram
+
+    TICK_PHASE_SECONDS = Histogram(
+        "ano_tick_phase_seconds",
+        "Wall time of one tick phase",
+        ["task", "phase"],
+        buckets=PHASE_BUCKETS,
+    )
+    TICK_CHUNKS = Counter(
+        "ano_tick_chunks_total", "Chunks processed by a tick", ["task"]
+    )
+    TICK_ROWS_WRITTEN = Counter(
+        "ano_tick_rows_written_total", "Rows written by a tick", ["task", "table"]
+    )
+    TICK_LOCK_SKIPS = Counter(
+        "ano_tick_lock_skips_total",
+        "Tick runs skipped for a held lock or a too recent last run",
+        ["task", "reason"],
+    )
+    POOL_SATURATION = Histogram(
+        "ano_db_pool_saturation",
+        "Share of the connection pool in use right after a checkout",
+        ["route"],
+        buckets=(0.1, 0.25, 0.5, 0.75, 0.9, 1.0),
+    )
+    POOL_EXHAUSTED = Counter(
+        "ano_db_pool_exhausted_total",
+        "Checkouts that found no free connection and had to queue",
+        ["route"],
+    )
+except Exception:
+    TICK_PHASE_SECONDS = None
+
+
+def observe_phase(task, phase, seconds):
+    if TICK_PHASE_SECONDS is None:
+        return
+    try:
+        TICK_PHASE_SECONDS.labels(task=task, phase=phase).observe(seconds)
+    except Exception:
+        pass
+
+
+@contextmanager
+def phase(task, name):
+    """Time the body as phase ``name`` of ``task`` (also when it raises)."""
+    start = perf_counter()
+    try:
+        yield
+    finally:
+        observe_phase(task, name, perf_counter() - start)
+
+
+def count_chunk(task, n=1):
+    if TICK_PHASE_SECONDS is None:
+        return
+    try:
+        TICK_CHUNKS.labels(task=task).inc(n)
+    except Exception:
+        pass
+
+
+def count_rows(task, table, n):
+    if TICK_PHASE_SECONDS is None or not n:
+        return
+    try:
+        TICK_ROWS_WRITTEN.labels(task=task, table=table).inc(n)
+    except Exception:
+        pass
+
+
+def count_lock_skip(task, reason):
+    if TICK_PHASE_SECONDS is None:
+        return
+    try:
+        TICK_LOCK_SKIPS.labels(task=task, reason=reason).inc()
+    except Exception:
+        pass
+
+
+def observe_pool_checkout(route, saturation, exhausted):
+    if TICK_PHASE_SECONDS is None:
+        return
+    try:
+        POOL_SATURATION.labels(route=route).observe(saturation)
+        if exhausted:
+            POOL_EXHAUSTED.labels(route=route).inc()
+    except Exception:
+        pass
+
+
+# -- exposition -------------------------------------------------------------------
+
+
+def registry():
+    """The registry to scrape: every process's metrics in multiprocess mode,
+    this process's otherwise."""
+    from prometheus_client import REGISTRY, CollectorRegistry, multiprocess
+
+    if not MULTIPROC_DIR:
+        return REGISTRY
+    merged = CollectorRegistry()
+    multiprocess.MultiProcessCollector(merged)
+    return merged
+
+
+def generate_latest():
+    """(body, content type) of the current metrics."""
+    from prometheus_client import CONTENT_TYPE_LATEST, generate_latest
+
+    return generate_latest(registry()), CONTENT_TYPE_LATEST
+
+
+def start_http_server(port):
+    """Serve ``registry()`` on ``port`` from a background thread."""
+    from prometheus_client import start_http_server as serve
+
+    serve(port, registry=registry())
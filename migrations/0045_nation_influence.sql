@@ -0,0 +1,24 @@
+-- Migration 0045: Materialized nation influence
+--
+-- The countries list, /statistics, coalition lists and helpers.get_bulk_influence
+-- each re-aggregated user_military, provinces, user_economy and stats for
+-- every nation on every page view. global_tick now writes the scores here
+-- (app_core/economy/influence.py holds the weights), so those pages read
+-- an indexed table instead. Rows appear on the first tick after deploy.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS nation_influence (
+    user_id INTEGER PRIMARY KEY,
+    influence BIGINT NOT NULL DEFAULT 0,
+    province_count INTEGER NOT NULL DEFAULT 0,
+    province_population BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+CREATE INDEX IF NOT EXISTS idx_nation_influence_influence
+    ON nation_influence (influence DESC);
+CREATE INDEX IF NOT EXISTS idx_nation_influence_population
+    ON nation_influence (province_population DESC);
+
+COMMIT;
@@ -0,0 +1,24 @@
+-- Migration 0046: Leaderboard snapshots
+--
+-- Ranked boards written by tasks.task_refresh_leaderboards
+-- (app_core/leaderboards.py). /rankings, the bot API and the Discord
+-- influence board read pages of this table instead of ranking on demand.
+-- previous_rank is the entry's rank at the prior refresh (NULL = new entry).
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS leaderboard_snapshots (
+    board VARCHAR(32) NOT NULL,
+    rank INTEGER NOT NULL,
+    entity_id INTEGER NOT NULL,
+    name TEXT,
+    score NUMERIC NOT NULL DEFAULT 0,
+    previous_rank INTEGER,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (board, entity_id)
+);
+
+CREATE INDEX IF NOT EXISTS idx_leaderboard_snapshots_rank
+    ON leaderboard_snapshots (board, rank);
+
+COMMIT;
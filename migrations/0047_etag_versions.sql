@@ -0,0 +1,15 @@
+-- Migration 0047: ETag versions
+--
+-- One generation counter per cacheable scope (etags.py). Writers bump
+-- their scope in the same transaction as the change; polled endpoints
+-- answer If-None-Match with 304 while the version is unchanged.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS etag_versions (
+    scope VARCHAR(64) PRIMARY KEY,
+    version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+
+COMMIT;
@@ -0,0 +1,28 @@
+-- Migration 0048: Game map delta feed
+--
+-- map_province_adjacency: persisted hex neighbours, rebuilt when provinces
+-- are given coordinates instead of on every /api/game_map/data call.
+-- map_province_versions: the provinces_map version that last touched each
+-- province (rows outlive deleted provinces so deltas can report them).
+-- map_combat_log.map_version: lets ?since= return only new battles.
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS map_province_adjacency (
+    province_id INTEGER NOT NULL REFERENCES provinces(id) ON DELETE CASCADE,
+    neighbor_id INTEGER NOT NULL REFERENCES provinces(id) ON DELETE CASCADE,
+    PRIMARY KEY (province_id, neighbor_id)
+);
+
+CREATE TABLE IF NOT EXISTS map_province_versions (
+    province_id INTEGER PRIMARY KEY,
+    version BIGINT NOT NULL
+);
+
+CREATE INDEX IF NOT EXISTS idx_map_prov_versions ON map_province_versions(version);
+
+ALTER TABLE map_combat_log ADD COLUMN IF NOT EXISTS map_version BIGINT;
+
+CREATE INDEX IF NOT EXISTS idx_map_clog_version ON map_combat_log(map_version);
+
+COMMIT;
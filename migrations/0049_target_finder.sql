@@ -0,0 +1,27 @@
+-- Migration 0049: Target finder on the influence snapshot
+--
+-- /find_targets aggregated every nation's military on each page view and
+-- filtered the influence range in Python after a LIMIT. It now range-queries
+-- nation_influence directly: war_eligible (refreshed with the scores) drops
+-- banned nations, and the partial index covers the province window plus
+-- the influence range and keyset order.
+
+BEGIN;
+
+-- Created on demand by the admin panel; the influence refresh reads it
+CREATE TABLE IF NOT EXISTS admin_user_controls (
+    user_id INTEGER PRIMARY KEY REFERENCES users(id) ON DELETE CASCADE,
+    is_banned BOOLEAN NOT NULL DEFAULT FALSE,
+    ban_reason TEXT,
+    kick_pending BOOLEAN NOT NULL DEFAULT FALSE,
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT NOW()
+);
+
+ALTER TABLE nation_influence
+    ADD COLUMN IF NOT EXISTS war_eligible BOOLEAN NOT NULL DEFAULT TRUE;
+
+CREATE INDEX IF NOT EXISTS idx_nation_influence_targets
+    ON nation_influence (province_count, influence, user_id)
+    WHERE war_eligible;
+
+COMMIT;
@@ -0,0 +1,24 @@
+-- Migration 0050: Content-addressed image store
+--
+-- Flags and province banners were stored base64-encoded in users.flag_data,
+-- colNames.flag_data and provinces.image_data. Uploads now go to the image
+-- store (image_store.py) and rows reference the SHA-256 key of the stored
+-- JPEG. *_data is cleared only once the store is durable (S3 or a mounted
+-- IMAGE_STORE_DIR); until then it keeps the JPEG, and the key indexes let
+-- /img/ rebuild a blob a replica is missing from it.
+-- scripts/migrate_images_to_store.py moves existing rows over.
+
+BEGIN;
+
+ALTER TABLE users ADD COLUMN IF NOT EXISTS flag_key TEXT;
+ALTER TABLE colNames ADD COLUMN IF NOT EXISTS flag_key TEXT;
+ALTER TABLE provinces ADD COLUMN IF NOT EXISTS image_key TEXT;
+
+CREATE INDEX IF NOT EXISTS idx_users_flag_key ON users (flag_key)
+    WHERE flag_key IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_colnames_flag_key ON colNames (flag_key)
+    WHERE flag_key IS NOT NULL;
+CREATE INDEX IF NOT EXISTS idx_provinces_image_key ON provinces (image_key)
+    WHERE image_key IS NOT NULL;
+
+COMMIT;
@@ -22,13 +22,16 @@ from database import (
     cache_response,
     invalidate_user_cache,
     provinces_has_demographics,
+    province_has_image_sql,
     provinces_has_image_data,
+    provinces_has_image_key,
     rollback_db_cursor,
     row_val,
 )
 import os
 import math
 from action_loop import build_structure, ActionLoopError
+from app_core.game_map.changes import mark_placed
 from app_core.economy.building_costs import enrich_building_row, get_build_cost
 from app_core.economy.building_purchase import (
     BuildingPurchaseError,
@@ -80,11 +83,9 @@ def province(pId):
     # + upgrades - all in ONE database connection
     with get_request_cursor(cursor_factory=RealDictCursor) as db:
         # Combined query for province + stats (legacy resources/proInfra tables removed)
-        image_select = (
-            "(p.image_data IS NOT NULL AND p.image_data <> '') AS has_image"
-            if provinces_has_image_data()
-            else "FALSE AS has_image"
-        )
+        image_select = f"{province_has_image_sql('p')} AS has_image"
+        if provinces_has_image_key():
+            image_select += ", p.image_key"
         if provinces_has_demographics():
             province_sql = f"""
             SELECT p.id, p.userId AS user, p.provinceName AS name, p.population,
@@ -351,7 +352,7 @@ def province(pId):
         enough_consumer_goods = consumer_goods >= max_cg
         try:
             if variables.FEATURE_DEMOGRAPHIC_CONSUMPTION:
-                from tasks import consumer_goods_distribution_capacity
+                from app_core.game_ticks.food import consumer_goods_distribution_capacity
 
                 cg_dist_cap = consumer_goods_distribution_capacity(cId, db=db) or 0
                 cg_available = min(consumer_goods, cg_dist_cap)
@@ -367,7 +368,7 @@ def province(pId):
         national_pop = None
 
         if variables.FEATURE_RATIONS_DISTRIBUTION:
-            from tasks import fetch_nation_distribution_status, food_stats
+            from app_core.game_ticks.food import fetch_nation_distribution_status, food_stats
 
             dist_cap = 0
             try:
@@ -596,7 +597,7 @@ def province(pId):
 
         province["has_image"] = bool(province.get("has_image"))
         province["image_url"] = province_image_url(
-            province["id"], province["has_image"]
+            province["id"], province["has_image"], province.get("image_key")
         )
 
         distribution_status = nation_distribution
@@ -639,12 +640,21 @@ def serve_province_image(pId):
     import time as time_module
 
     from flask import Response, send_from_directory, current_app
+    from image_store import redirect_to_image
 
     if not provinces_has_image_data():
         return send_from_directory(
             current_app.static_folder, "images/province.jpg"
         )
 
+    if provinces_has_image_key():
+        with get_request_cursor(read_only=True) as db:
+            db.execute("SELECT image_key FROM provinces WHERE id = %s", (pId,))
+            row = db.fetchone()
+        if row and row[0]:
+            return redirect_to_image(row[0])
+
+    # Banners not yet moved to the image store (migration 0050)
     cache_key = f"province_image_{pId}"
     if not hasattr(serve_province_image, "_cache"):
         serve_province_image._cache = {}
@@ -719,9 +729,12 @@ def update_province_image(pId):
         if int(row[0]) != int(cId):
             return error(403, "You do not own this province")
 
+        has_image_key = provinces_has_image_key()
         if remove_image:
             db.execute(
-                "UPDATE provinces SET image_data = NULL WHERE id = %s",
+                "UPDATE provinces SET image_data = NULL"
+                + (", image_key = NULL" if has_image_key else "")
+                + " WHERE id = %s",
                 (pId,),
             )
         else:
@@ -734,11 +747,24 @@ def update_province_image(pId):
             if extension not in allowed_extensions:
                 return error(400, "Use PNG, JPG, or WEBP")
 
-            image_data, _ext = compress_province_image(upload)
-            db.execute(
-                "UPDATE provinces SET image_data = %s WHERE id = %s",
-                (image_data, pId),
-            )
+            if has_image_key:
+                from image_store import database_copy, store_image
+
+                try:
+                    image_key = store_image(upload, "province")
+                except ValueError:
+                    return error(400, "Could not read that image")
+                db.execute(
+                    "UPDATE provinces SET image_key = %s, image_data = %s"
+                    " WHERE id = %s",
+                    (image_key, database_copy(image_key), pId),
+                )
+            else:
+                image_data, _ext = compress_province_image(upload)
+                db.execute(
+                    "UPDATE provinces SET image_data = %s WHERE id = %s",
+                    (image_data, pId),
+                )
 
     if hasattr(serve_province_image, "_cache"):
         serve_province_image._cache.pop(f"province_image_{pId}", None)
@@ -1078,61 +1104,46 @@ def createprovince():
 
             # Acquire advisory lock to prevent double-submit race condition
             # Lock key is based on user ID to prevent same user creating multiple
-            # provinces simultaneously
+            # provinces simultaneously. Transaction-level: released when the
+            # request's transaction ends, so it never stays on a pooled
+            # connection (or a PgBouncer server connection).
             lock_key = 100000 + cId  # Offset to avoid collision with other locks
-            db.execute("SELECT pg_try_advisory_lock(%s)", (lock_key,))
+            db.execute("SELECT pg_try_advisory_xact_lock(%s)", (lock_key,))
             lock_result = db.fetchone()
             if not lock_result or not lock_result[0]:
                 return error(400, "Province creation already in progress, please wait")
 
-            try:
-                # Use atomic gold deduction to prevent race conditions
-                province_price = get_province_price(cId)
+            # Use atomic gold deduction to prevent race conditions
+            province_price = get_province_price(cId)
 
-                db.execute(
-                    "UPDATE stats SET gold = gold - %s "
-                    "WHERE id = %s AND gold >= %s RETURNING gold",
-                    (province_price, cId, province_price),
-                )
-                result = db.fetchone()
-                if not result:
-                    return error(400, "You don't have enough money.")
-
-                # Find an available adjacent hex coordinate for the new province
-                db.execute("SELECT coordinate_x, coordinate_y FROM provinces WHERE coordinate_x IS NOT NULL AND coordinate_y IS NOT NULL")
-                occupied_coords = set(db.fetchall())
-
-                db.execute("SELECT coordinate_x, coordinate_y FROM provinces WHERE userId = %s AND coordinate_x IS NOT NULL AND coordinate_y IS NOT NULL", (cId,))
-                user_coords = set(db.fetchall())
-
-                hex_directions = [(1, 0), (1, -1), (0, -1), (-1, 0), (-1, 1), (0, 1)]
-                new_x, new_y = None, None
-
-                if not user_coords:
-                    import random
-                    if occupied_coords:
-                        found = False
-                        occupied_list = list(occupied_coords)
-                        random.shuffle(occupied_list)
-                        for ox, oy in occupied_list:
-                            for dx, dy in hex_directions:
-                                nx, ny = ox + dx, oy + dy
-                                if (nx, ny) not in occupied_coords:
-                                    new_x, new_y = nx, ny
-                                    found = True
-                                    break
-                            if found:
-                                break
-                        if not found:
-                            new_x, new_y = 0, 0
-                    else:
-                        new_x, new_y = 0, 0
-                else:
-                    # Find an adjacent free hex tile
+            db.execute(
+                "UPDATE stats SET gold = gold - %s "
+                "WHERE id = %s AND gold >= %s RETURNING gold",
+                (province_price, cId, province_price),
+            )
+            result = db.fetchone()
+            if not result:
+                return error(400, "You don't have enough money.")
+
+            # Find an available adjacent hex coordinate for the new province
+            db.execute("SELECT coordinate_x, coordinate_y FROM provinces WHERE coordinate_x IS NOT NULL AND coordinate_y IS NOT NULL")
+            occupied_coords = set(db.fetchall())
+
+            db.execute("SELECT coordinate_x, coordinate_y FROM provinces WHERE userId = %s AND coordinate_x IS NOT NULL AND coordinate_y IS NOT NULL", (cId,))
+            user_coords = set(db.fetchall())
+
+            hex_directions = [(1, 0), (1, -1), (0, -1), (-1, 0), (-1, 1), (0, 1)]
+            new_x, new_y = None, None
+
+            if not user_coords:
+                import random
+                if occupied_coords:
                     found = False
-                    for ux, uy in user_coords:
+                    occupied_list = list(occupied_coords)
+                    random.shuffle(occupied_list)
+                    for ox, oy in occupied_list:
                         for dx, dy in hex_directions:
-                            nx, ny = ux + dx, uy + dy
+                            nx, ny = ox + dx, oy + dy
                             if (nx, ny) not in occupied_coords:
                                 new_x, new_y = nx, ny
                                 found = True
@@ -1140,45 +1151,56 @@ def createprovince():
                         if found:
                             break
                     if not found:
-                        new_x, new_y = 0, 0 # Fallback
+                        new_x, new_y = 0, 0
+                else:
+                    new_x, new_y = 0, 0
+            else:
+                # Find an adjacent free hex tile
+                found = False
+                for ux, uy in user_coords:
+                    for dx, dy in hex_directions:
+                        nx, ny = ux + dx, uy + dy
+                        if (nx, ny) not in occupied_coords:
+                            new_x, new_y = nx, ny
+                            found = True
+                            break
+                    if found:
+                        break
+                if not found:
+                    new_x, new_y = 0, 0 # Fallback
 
-                db.execute(
-                    (
-                        "INSERT INTO provinces "
-                        "(userId, provinceName, pop_children, coordinate_x, coordinate_y) "
-                        "VALUES (%s, %s, 1000000, %s, %s) RETURNING id"
-                    ),
-                    (cId, pName, new_x, new_y),
-                )
-                db.fetchone()  # Consume result
+            db.execute(
+                (
+                    "INSERT INTO provinces "
+                    "(userId, provinceName, pop_children, coordinate_x, coordinate_y) "
+                    "VALUES (%s, %s, 1000000, %s, %s) RETURNING id"
+                ),
+                (cId, pName, new_x, new_y),
+            )
+            new_province_id = db.fetchone()[0]
+            mark_placed(db, [new_province_id])
 
-                # No need to INSERT INTO proInfra - user_buildings is populated
-                # dynamically when buildings are purchased
+            # No need to INSERT INTO proInfra - user_buildings is populated
+            # dynamically when buildings are purchased
 
-                # Commit handled by teardown_request_connection
+            # Commit handled by teardown_request_connection
 
-                # Invalidate cached provinces page for this user
-                # so the new province appears immediately
-                try:
-                    from database import query_cache, invalidate_user_cache, invalidate_view_cache
-
-                    pattern = f"provinces_{cId}_"
-                    query_cache.invalidate(pattern=pattern)
-                    # Invalidate the response cache for the provinces list page
-                    # so the new province appears immediately on redirect
-                    invalidate_view_cache("provinces", user_id=cId)
-                    # Also invalidate influence/resources cache so the
-                    # new province is reflected in influence score
-                    invalidate_user_cache(cId)
-                except Exception:
-                    # Best-effort: cache invalidation should not raise on failure
-                    pass
-            finally:
-                # Always release the advisory lock
-                try:
-                    db.execute("SELECT pg_advisory_unlock(%s)", (lock_key,))
-                except Exception:
-                    pass
+            # Invalidate cached provinces page for this user
+            # so the new province appears immediately
+            try:
+                from database import query_cache, invalidate_user_cache, invalidate_view_cache
+
+                pattern = f"provinces_{cId}_"
+                query_cache.invalidate(pattern=pattern)
+                # Invalidate the response cache for the provinces list page
+                # so the new province appears immediately on redirect
+                invalidate_view_cache("provinces", user_id=cId)
+                # Also invalidate influence/resources cache so the
+                # new province is reflected in influence score
+                invalidate_user_cache(cId)
+            except Exception:
+                # Best-effort: cache invalidation should not raise on failure
+                pass
 
         return redirect("/provinces")
     else:
@@ -1,5 +1,6 @@
 from database import get_request_cursor
 from psycopg2.extras import RealDictCursor
+from app_core.game_map.changes import mark_changed
 
 class CountryRepository:
     @staticmethod
@@ -28,66 +29,17 @@ class CountryRepository:
                         u.username,
                         u.date,
                         u.flag,
-                        COALESCE(p.province_population, 0) AS province_population,
+                        COALESCE(ni.province_population, 0) AS province_population,
                         cm.colid,
                         c.name,
-                        COALESCE(p.provinces_count, 0) AS provinces_count,
+                        COALESCE(ni.province_count, 0) AS provinces_count,
                         NULL::integer AS join_number,
-                        ROUND(
-                            COALESCE(p.provinces_count, 0) * 300
-                            + COALESCE(m.soldiers, 0) * 0.02
-                            + COALESCE(m.artillery, 0) * 1.6
-                            + COALESCE(m.tanks, 0) * 0.8
-                            + COALESCE(m.fighters, 0) * 3.5
-                            + COALESCE(m.bombers, 0) * 2.5
-                            + COALESCE(m.apaches, 0) * 3.2
-                            + COALESCE(m.submarines, 0) * 4.5
-                            + COALESCE(m.destroyers, 0) * 3
-                            + COALESCE(m.cruisers, 0) * 5.5
-                            + COALESCE(m.icbms, 0) * 250
-                            + COALESCE(m.nukes, 0) * 500
-                            + COALESCE(m.spies, 0) * 25
-                            + COALESCE(p.city_count, 0) * 10
-                            + COALESCE(p.total_land, 0) * 10
-                            + COALESCE(r.total_resources, 0) * 0.001
-                            + COALESCE(s.gold, 0) * 0.00001
-                        )::bigint AS influence,
+                        COALESCE(ni.influence, 0) AS influence,
                         COALESCE(EXTRACT(EPOCH FROM (CASE WHEN u.date ~ '^\\d{{4}}-\\d{{2}}-\\d{{2}}' THEN u.date ELSE '1970-01-01' END)::timestamp)::bigint, 0) AS unix
                     FROM users u
                     JOIN user_ids ui ON u.id = ui.id
-                    LEFT JOIN stats s ON s.id = u.id
-                    LEFT JOIN LATERAL (
-                        SELECT
-                            COUNT(id) AS provinces_count,
-                            COALESCE(SUM(population), 0) AS province_population,
-                            COALESCE(SUM(citycount), 0) AS city_count,
-                            COALESCE(SUM(land), 0) AS total_land
-                        FROM provinces
-                        WHERE userid = u.id
-                    ) p ON true
-                    LEFT JOIN LATERAL (
-                        SELECT
-                            SUM(CASE WHEN ud.name='soldiers' THEN um.quantity ELSE 0 END) AS soldiers,
-                            SUM(CASE WHEN ud.name='artillery' THEN um.quantity ELSE 0 END) AS artillery,
-                            SUM(CASE WHEN ud.name='tanks' THEN um.quantity ELSE 0 END) AS tanks,
-                            SUM(CASE WHEN ud.name='fighters' THEN um.quantity ELSE 0 END) AS fighters,
-                            SUM(CASE WHEN ud.name='bombers' THEN um.quantity ELSE 0 END) AS bombers,
-                            SUM(CASE WHEN ud.name='apaches' THEN um.quantity ELSE 0 END) AS apaches,
-                            SUM(CASE WHEN ud.name='submarines' THEN um.quantity ELSE 0 END) AS submarines,
-                            SUM(CASE WHEN ud.name='destroyers' THEN um.quantity ELSE 0 END) AS destroyers,
-                            SUM(CASE WHEN ud.name='cruisers' THEN um.quantity ELSE 0 END) AS cruisers,
-                            SUM(CASE WHEN ud.name='icbms' THEN um.quantity ELSE 0 END) AS icbms,
-                            SUM(CASE WHEN ud.name='nukes' THEN um.quantity ELSE 0 END) AS nukes,
-                            SUM(CASE WHEN ud.name='spies' THEN um.quantity ELSE 0 END) AS spies
-                        FROM user_military um
-                        JOIN unit_dictionary ud ON um.unit_id = ud.unit_id
-                        WHERE um.user_id = u.id
-                    ) m ON true
-                    LEFT JOIN LATERAL (
-                        SELECT COALESCE(SUM(quantity), 0) AS total_resources
-                        FROM user_economy
-                        WHERE user_id = u.id
-                    ) r ON true
+                    -- Snapshot refreshed by global_tick (app_core/economy/influence.py)
+                    LEFT JOIN nation_influence ni ON ni.user_id = u.id
                     LEFT JOIN {coalition_src} cm ON cm.userid = u.id
                     LEFT JOIN colNames c ON c.id = cm.colid
                 )
@@ -176,6 +128,7 @@ class CountryRepository:
             if province_ids:
                 ids = [p[0] for p in province_ids]
                 placeholders = ",".join(["%s"] * len(ids))
+                mark_changed(db, ids, with_neighbors=True)
                 db.execute(
                     f"DELETE FROM provinces WHERE id IN ({placeholders})", tuple(ids)
                 )
@@ -1,4 +1,4 @@
-from database import get_db_cursor, query_cache
+from database import get_db_cursor, get_request_cursor, query_cache, user_tag
 from psycopg2.extras import RealDictCursor
 
 class UserRepository:
@@ -29,7 +29,7 @@ class UserRepository:
             """, (user_id,))
             result = dict(db.fetchone() or {})
 
-        query_cache.set(cache_key, result)
+        query_cache.set(cache_key, result, tags=(user_tag(user_id),))
         return result
 
     @staticmethod
@@ -50,14 +50,106 @@ class UserRepository:
             """, (user_id,))
             result = [dict(row) for row in db.fetchall()]
 
-        query_cache.set(cache_key, result)
+        query_cache.set(cache_key, result, tags=(user_tag(user_id),))
         return result
 
+    @staticmethod
+    def get_player_snapshot(user_id: int):
+        """Everything the layout needs about the logged-in player, in one
+        round trip: name, coalition, gold, resource quantities and
+        onboarding counts. Ban and kick state is not part of it (see
+        get_admin_controls).
+
+        Cached for a few seconds under the user's tag, so any write that
+        calls invalidate_user_cache drops it. Returns None if the user no
+        longer exists.
+        """
+        from app_core.onboarding.service import onboarding_status
+
+        cache_key = f"player_snapshot_{user_id}"
+        cached = query_cache.get(cache_key)
+        if cached:
+            return cached
+
+        # The request's own connection (replica when usable): this runs on
+        # every page, so it must not check out a second one or pin the
+        # request to the primary
+        with get_request_cursor(cursor_factory=RealDictCursor, read_only=True) as db:
+            db.execute("""
+                SELECT
+                    u.username, c.id AS coalition_id, c.name AS coalition_name,
+                    u.coalition_id IS NOT NULL AS in_coalition,
+                    COALESCE(s.gold, 0) AS gold,
+                    (SELECT json_object_agg(rd.name, ue.quantity)
+                       FROM user_economy ue
+                       JOIN resource_dictionary rd
+                         ON rd.resource_id = ue.resource_id
+                      WHERE ue.user_id = u.id) AS resources,
+                    (SELECT COUNT(*)::int FROM provinces p
+                      WHERE p.userId = u.id) AS provinces,
+                    (SELECT COALESCE(SUM(ub.quantity), 0)::int
+                       FROM user_buildings ub
+                       JOIN building_dictionary bd
+                         ON bd.building_id = ub.building_id
+                      WHERE ub.user_id = u.id
+                        AND bd.name = 'food_banks') AS food_banks,
+                    (SELECT COUNT(*)::int FROM nation_treaties t
+                      WHERE t.status = 'active'
+                        AND (t.sender_id = u.id OR t.recipient_id = u.id)) AS allies
+                FROM users u
+                LEFT JOIN colNames c ON c.id = u.coalition_id
+                LEFT JOIN stats s ON s.id = u.id
+                WHERE u.id = %s
+            """, (user_id,))
+            row = db.fetchone()
+        if row is None:
+            return None
+
+        result = {
+            "country_name": row["username"] or "Unknown",
+            "coalition_id": row["coalition_id"],
+            "coalition_name": row["coalition_name"],
+            "gold": int(row["gold"]),
+            "resources": {
+                name: int(quantity or 0)
+                for name, quantity in (row["resources"] or {}).items()
+            },
+            "onboarding": onboarding_status(
+                row["provinces"],
+                row["food_banks"],
+                row["in_coalition"],
+                row["allies"],
+            ),
+        }
+        query_cache.set(
+            cache_key, result, ttl_seconds=15, tags=(user_tag(user_id),)
+        )
+        return result
+
+    @staticmethod
+    def get_admin_controls(user_id: int):
+        """[is_banned, ban_reason, kick_pending] for the player, or None.
+
+        Read on the primary and never cached, so a ban or kick applies on
+        the next check instead of after replica lag and a cache TTL.
+        """
+        with get_request_cursor() as db:
+            db.execute("""
+                SELECT COALESCE(is_banned, FALSE), COALESCE(ban_reason, ''),
+                       COALESCE(kick_pending, FALSE)
+                FROM admin_user_controls WHERE user_id = %s
+            """, (user_id,))
+            row = db.fetchone()
+        return list(row) if row else None
+
     @staticmethod
     def invalidate_user_cache(user_id: int):
         """Clear all cached data for a user after mutations"""
-        query_cache.invalidate(f"user_full_{user_id}")
-        query_cache.invalidate(f"provinces_summary_{user_id}")
-        query_cache.invalidate(f"influence_{user_id}")
-        query_cache.invalidate(f"econ_stats_{user_id}")
-        query_cache.invalidate(f"revenue_{user_id}")
+        query_cache.invalidate_tags(user_tag(user_id))
+        query_cache.delete(
+            f"user_full_{user_id}",
+            f"provinces_summary_{user_id}",
+            f"influence_{user_id}",
+            f"econ_stats_{user_id}",
+            f"revenue_{user_id}",
+        )
@@ -0,0 +1,310 @@
+"""
+Opt-in per-request profiling and SQL accounting
+
+Enabled with REQUEST_PROFILING=1. For every request it:
+
+* counts queries, rows and time spent in the database for cursors opened
+  through ``database.get_request_cursor`` / ``get_db_cursor``
+* flags N+1 patterns: the same normalized statement run more than
+  SQL_REPEAT_THRESHOLD times in one request
+* samples a cProfile (or pyinstrument, when installed and
+  REQUEST_PROFILER=pyinstrument) profile for REQUEST_PROFILE_SAMPLE_RATE
+  of requests, and always for endpoints listed in REQUEST_PROFILE_ENDPOINTS
+* reports the breakdown in a ``Server-Timing`` header and, when
+  prometheus_client is installed, in request histograms served by /metrics
+
+With profiling off, ``cursor_factory`` returns the factory unchanged and
+the request hooks return immediately.
+"""
+
+import logging
+import os
+import random
+import re
+import threading
+from collections import Counter
+from time import perf_counter, strftime
+
+import psycopg2.extensions
+
+logger = logging.getLogger(__name__)
+
+ENABLED = os.getenv("REQUEST_PROFILING") == "1"
+SQL_REPEAT_THRESHOLD = int(os.getenv("SQL_REPEAT_THRESHOLD", "10"))
+PROFILE_SAMPLE_RATE = float(os.getenv("REQUEST_PROFILE_SAMPLE_RATE", "0"))
+PROFILE_ENDPOINTS = {
+    e.strip()
+    for e in os.getenv("REQUEST_PROFILE_ENDPOINTS", "").split(",")
+    if e.strip()
+}
+PROFILE_DIR = os.getenv("REQUEST_PROFILE_DIR", "/tmp/ano-profiles")
+PROFILER = os.getenv("REQUEST_PROFILER", "cprofile").lower()
+
+try:
+    from prometheus_client import Counter as PromCounter, Histogram
+
+    REQUEST_SECONDS = Histogram(
+        "ano_request_duration_seconds", "Request wall time", ["endpoint", "method"]
+    )
+    REQUEST_DB_SECONDS = Histogram(
+        "ano_request_db_seconds", "Time spent in SQL per request", ["endpoint"]
+    )
+    REQUEST_QUERIES = Histogram(
+        "ano_request_queries",
+        "SQL statements per request",
+        ["endpoint"],
+        buckets=(1, 2, 5, 10, 20, 50, 100, 250, 500),
+    )
+    REQUEST_REPEATED_SQL = PromCounter(
+        "ano_request_repeated_sql_total",
+        "Requests that ran one statement more than SQL_REPEAT_THRESHOLD times",
+        ["endpoint"],
+    )
+except Exception:
+    REQUEST_SECONDS = None
+
+
+_STATS_KEY = "_request_profile"
+_NUMBER = re.compile(r"\b\d+(?:\.\d+)?\b")
+_STRING = re.compile(r"'(?:[^']|'')*'")
+_SPACE = re.compile(r"\s+")
+
+
+def normalize_sql(query) -> str:
+    """Statement shape: literals replaced by ``?`` and whitespace collapsed."""
+    if isinstance(query, bytes):
+        query = query.decode("utf-8", "replace")
+    elif not isinstance(query, str):
+        # psycopg2.sql.Composed and friends
+        query = str(query)
+    query = _STRING.sub("?", query)
+    query = _NUMBER.sub("?", query)
+    return _SPACE.sub(" ", query).strip()
+
+
+class RequestStats:
+    """SQL and timing totals for one request."""
+
+    def __init__(self):
+        self.started = perf_counter()
+        self.queries = 0
+        self.rows = 0
+        self.db_seconds = 0.0
+        self.statements = Counter()
+        self.profiler = None
+
+    def record(self, query, seconds, rowcount):
+        self.queries += 1
+        self.db_seconds += seconds
+        if rowcount and rowcount > 0:
+            self.rows += rowcount
+        self.statements[normalize_sql(query)] += 1
+
+    def repeated(self, threshold=None):
+        """(statement, count) pairs run more than ``threshold`` times."""
+        threshold = SQL_REPEAT_THRESHOLD if threshold is None else threshold
+        return [(sql, n) for sql, n in self.statements.most_common() if n > threshold]
+
+    def server_timing(self, total_seconds) -> str:
+        db_ms = self.db_seconds * 1000
+        parts = [
+            f'db;dur={db_ms:.1f};desc="{self.queries} queries, {self.rows} rows"',
+            f"app;dur={max(total_seconds * 1000 - db_ms, 0):.1f}",
+            f"total;dur={total_seconds * 1000:.1f}",
+        ]
+        repeated = self.repeated()
+        if repeated:
+            parts.append(f'sql-repeat;desc="{repeated[0][1]}x"')
+        return ", ".join(parts)
+
+
+def current_stats():
+    """The RequestStats of the current request, or None."""
+    if not ENABLED:
+        return None
+    try:
+        from flask import g, has_request_context
+
+        if not has_request_context():
+            return None
+        return g.get(_STATS_KEY)
+    except Exception:
+        return None
+
+
+# -- cursor instrumentation ---------------------------------------------------
+
+_timed_factories = {}
+_timed_lock = threading.Lock()
+
+
+def _timed_factory(base):
+    with _timed_lock:
+        timed = _timed_factories.get(base)
+        if timed is None:
+
+            class TimedCursor(base):
+                def execute(self, query, vars=None):
+                    start = perf_counter()
+                    try:
+                        return super().execute(query, vars)
+                    finally:
+                        _record(query, perf_counter() - start, self.rowcount)
+
+                def executemany(self, query, vars_list):
+                    start = perf_counter()
+                    try:
+                        return super().executemany(query, vars_list)
+                    finally:
+                        _record(query, perf_counter() - start, self.rowcount)
+
+                def copy_expert(self, sql, file, size=8192):
+                    start = perf_counter()
+                    try:
+                        return super().copy_expert(sql, file, size)
+                    finally:
+                        _record(sql, perf_counter() - start, self.rowcount)
+
+            TimedCursor.__name__ = TimedCursor.__qualname__ = f"Timed{base.__name__}"
+            timed = _timed_factories[base] = TimedCursor
+    return timed
+
+
+def _record(query, seconds, rowcount):
+    stats = current_stats()
+    if stats is not None:
+        stats.record(query, seconds, rowcount)
+
+
+def cursor_factory(factory=None):
+    """``factory`` wrapped to account its statements to the current request.
+
+    Returns ``factory`` unchanged outside a profiled request.
+    """
+    if current_stats() is None:
+        return factory
+    return _timed_factory(factory or psycopg2.extensions.cursor)
+
+
+# -- sampled profiles -----------------------------------------------------------
+
+
+def _should_profile(endpoint) -> bool:
+    if endpoint in PROFILE_ENDPOINTS:
+        return True
+    return PROFILE_SAMPLE_RATE > 0 and random.random() < PROFILE_SAMPLE_RATE
+
+
+def _start_profiler():
+    if PROFILER == "pyinstrument":
+        try:
+            from pyinstrument import Profiler
+
+            profiler = Profiler()
+            profiler.start()
+            return profiler
+        except Exception:
+            pass
+    import cProfile
+
+    profiler = cProfile.Profile()
+    profiler.enable()
+    return profiler
+
+
+def _save_profile(profiler, endpoint):
+    """Stop ``profiler`` and write it under PROFILE_DIR; returns the path."""
+    name = f"{strftime('%Y%m%d-%H%M%S')}-{endpoint or 'unknown'}-{os.getpid()}"
+    os.makedirs(PROFILE_DIR, exist_ok=True)
+    if hasattr(profiler, "output_html"):
+        profiler.stop()
+        path = os.path.join(PROFILE_DIR, name + ".html")
+        with open(path, "w") as f:
+            f.write(profiler.output_html())
+        return path
+    profiler.disable()
+    path = os.path.join(PROFILE_DIR, name + ".prof")
+    profiler.dump_stats(path)
+    return path
+
+
+# -- Flask hooks ----------------------------------------------------------------
+
+
+def _before_request():
+    if not ENABLED:
+        return
+    from flask import g, request
+
+    stats = RequestStats()
+    setattr(g, _STATS_KEY, stats)
+    if _should_profile(request.endpoint):
+        try:
+            stats.profiler = _start_profiler()
+        except Exception as e:
+            # Another profiler already active in this thread
+            logger.debug("request profiler not started: %s", e)
+
+
+def _after_request(response):
+    stats = current_stats()
+    if stats is None:
+        return response
+    from flask import request
+
+    elapsed = perf_counter() - stats.started
+    endpoint = request.endpoint or "unknown"
+
+    if stats.profiler is not None:
+        try:
+            path = _save_profile(stats.profiler, endpoint)
+            logger.info("request profile for %s saved to %s", endpoint, path)
+        except Exception as e:
+            logger.warning("could not save request profile: %s", e)
+        stats.profiler = None
+
+    repeated = stats.repeated()
+    for sql, count in repeated:
+        logger.warning(
+            "Possible N+1 on %s %s: %d runs of %s",
+            request.method,
+            endpoint,
+            count,
+            sql[:200],
+        )
+
+    response.headers["Server-Timing"] = stats.server_timing(elapsed)
+
+    if REQUEST_SECONDS is not None:
+        try:
+            REQUEST_SECONDS.labels(endpoint=endpoint, method=request.method).observe(
+                elapsed
+            )
+            REQUEST_DB_SECONDS.labels(endpoint=endpoint).observe(stats.db_seconds)
+            REQUEST_QUERIES.labels(endpoint=endpoint).observe(stats.queries)
+            if repeated:
+                REQUEST_REPEATED_SQL.labels(endpoint=endpoint).inc()
+        except Exception:
+            pass
+    return response
+
+
+def _teardown_request(exc=None):
+    # A request that raised never reaches after_request
+    stats = current_stats()
+    if stats is not None and stats.profiler is not None:
+        profiler, stats.profiler = stats.profiler, None
+        try:
+            if hasattr(profiler, "disable"):
+                profiler.disable()
+            else:
+                profiler.stop()
+        except Exception:
+            pass
+
+
+def init_app(app):
+    """Register the request hooks (no-ops unless REQUEST_PROFILING=1)."""
+    app.before_request(_before_request)
+    app.after_request(_after_request)
+    app.teardown_request(_teardown_request)
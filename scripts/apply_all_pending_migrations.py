@@ -54,6 +54,12 @@ MIGRATION_FILES = [
     "0042_coalition_invites.sql",
     "0043_planes_missiles_use_aluminium.sql",
     "0044_military_stat_rebalance.sql",
+    "0045_nation_influence.sql",
+    "0046_leaderboard_snapshots.sql",
+    "0047_etag_versions.sql",
+    "0048_game_map_deltas.sql",
+    "0049_target_finder.sql",
+    "0050_image_store.sql",
 ]
 
 
@@ -0,0 +1,100 @@
+#!/usr/bin/env python3
+"""Balance harness: simulate matchups with the combat engine.
+
+Runs `attack_scripts.combat_engine.simulate` for each matchup and prints the
+attacker's win probability, the mean win type and the mean casualties of
+both sides. Nothing touches the database.
+
+Usage:
+    python scripts/balance_sim.py --attacker soldiers=5000,tanks=50 \\
+        --defender soldiers=4000,artillery=40
+    python scripts/balance_sim.py --matchups matchups.json --runs 20000 --json
+
+A matchups file is a JSON list of
+``{"name": ..., "attacker": {unit: amount}, "defender": {unit: amount}}``;
+unit order is the order the units pair up in battle.
+"""
+
+import argparse
+import json
+import os
+import sys
+
+# Add parent directory to path
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from attack_scripts.combat_engine import Army, simulate  # noqa: E402
+
+
+def parse_army(spec):
+    """``"soldiers=5000,tanks=50"`` -> ``{"soldiers": 5000, "tanks": 50}``."""
+    units = {}
+    for part in spec.split(","):
+        unit, _, amount = part.partition("=")
+        units[unit.strip()] = int(amount)
+    return units
+
+
+def run_matchups(matchups, runs, seed):
+    """Simulate each matchup; returns ``[(name, preview), ...]``."""
+    return [
+        (
+            matchup.get("name") or f"matchup {i + 1}",
+            simulate(
+                Army(matchup["attacker"]), Army(matchup["defender"]), runs, seed
+            ),
+        )
+        for i, matchup in enumerate(matchups)
+    ]
+
+
+def print_report(results):
+    for name, preview in results:
+        print(f"\n{name}  ({preview['runs']} runs)")
+        print("-" * 80)
+        print(f"  Attacker wins:    {preview['attacker_win_probability'] * 100:.1f}%")
+        print(f"  Win type (mean):  {preview['win_type']['mean']:.2f}")
+        for side in ("attacker", "defender"):
+            losses = ", ".join(
+                f"{unit} {dist['mean']:.1f} (p90 {dist['p90']:.0f})"
+                for unit, dist in preview[side]["casualties"].items()
+            )
+            print(
+                f"  {side.capitalize():<9} losses:  {losses}; "
+                f"morale -{preview[side]['morale_loss']:.1f}"
+            )
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--attacker", help="units sent, e.g. soldiers=5000,tanks=50")
+    parser.add_argument("--defender", help="defending units, same format")
+    parser.add_argument("--matchups", help="JSON file with a list of matchups")
+    parser.add_argument("--runs", type=int, default=10000)
+    parser.add_argument("--seed", type=int, default=None)
+    parser.add_argument("--json", action="store_true", help="print raw JSON")
+    args = parser.parse_args(argv)
+
+    if args.matchups:
+        with open(args.matchups) as f:
+            matchups = json.load(f)
+    elif args.attacker and args.defender:
+        matchups = [
+            {
+                "name": f"{args.attacker} vs {args.defender}",
+                "attacker": parse_army(args.attacker),
+                "defender": parse_army(args.defender),
+            }
+        ]
+    else:
+        parser.error("give --attacker and --defender, or --matchups")
+
+    results = run_matchups(matchups, args.runs, args.seed)
+    if args.json:
+        print(json.dumps(dict(results), indent=2))
+    else:
+        print_report(results)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,92 @@
+#!/usr/bin/env python3
+"""
+Move base64 flags and province banners into the image store.
+
+For every users / colNames / provinces row that still has base64 in its
+*_data column and no key yet, the decoded image is stored through
+`image_store.store_image` (JPEG, WebP and thumbnail) and the row is switched
+to the key. *_data is cleared only when the store is durable (S3 or an
+explicit IMAGE_STORE_DIR); otherwise it is replaced with the stored JPEG,
+which /img/ rebuilds missing blobs from. Rows whose bytes cannot be decoded
+are left untouched and reported. Safe to re-run; needs migration 0050.
+
+Run: python scripts/migrate_images_to_store.py [--batch-size 200]
+"""
+
+import argparse
+import base64
+import binascii
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from database import get_db_connection  # noqa: E402
+from image_store import database_copy, durable, store_image  # noqa: E402
+
+# (table, base64 column, key column, image kind)
+SOURCES = (
+    ("users", "flag_data", "flag_key", "flag"),
+    ("colNames", "flag_data", "flag_key", "flag"),
+    ("provinces", "image_data", "image_key", "province"),
+)
+
+
+def migrate_table(conn, table, data_column, key_column, kind, batch_size):
+    """Move one table's images; returns (moved, skipped)."""
+    moved = skipped = 0
+    last_id = 0
+    cur = conn.cursor()
+    while True:
+        cur.execute(
+            f"""
+            SELECT id, {data_column} FROM {table}
+            WHERE id > %s AND {key_column} IS NULL
+              AND {data_column} IS NOT NULL AND {data_column} <> ''
+            ORDER BY id
+            LIMIT %s
+            """,
+            (last_id, batch_size),
+        )
+        rows = cur.fetchall()
+        if not rows:
+            break
+        for row_id, data in rows:
+            last_id = row_id
+            try:
+                key = store_image(base64.b64decode(data), kind)
+            except (binascii.Error, ValueError) as e:
+                skipped += 1
+                print(f"  Skipped {table} {row_id}: {e}")
+                continue
+            cur.execute(
+                f"UPDATE {table} SET {key_column} = %s, {data_column} = %s"
+                " WHERE id = %s",
+                (key, database_copy(key), row_id),
+            )
+            moved += 1
+        conn.commit()
+    cur.close()
+    return moved, skipped
+
+
+def main(argv=None):
+    parser = argparse.ArgumentParser(description=__doc__.strip().splitlines()[0])
+    parser.add_argument("--batch-size", type=int, default=200)
+    args = parser.parse_args(argv)
+
+    if not durable():
+        print(
+            "! No durable image store (IMAGE_STORE_S3_BUCKET or IMAGE_STORE_DIR):"
+            " rows keep a base64 copy"
+        )
+    with get_db_connection() as conn:
+        for table, data_column, key_column, kind in SOURCES:
+            moved, skipped = migrate_table(
+                conn, table, data_column, key_column, kind, args.batch_size
+            )
+            print(f"✓ {table}: moved {moved} images, skipped {skipped}")
+
+
+if __name__ == "__main__":
+    main()
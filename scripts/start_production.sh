@@ -71,6 +71,13 @@ fi
 
 export ANO_BOOT_DONE=1
 
+# Prometheus multiprocess mode: every gunicorn worker and Celery pool process
+# writes its samples here, and /metrics (web) or CELERY_METRICS_PORT (worker)
+# merges them. Stale files from the previous container run are dropped.
+export PROMETHEUS_MULTIPROC_DIR="${PROMETHEUS_MULTIPROC_DIR:-/tmp/ano-prometheus}"
+mkdir -p "$PROMETHEUS_MULTIPROC_DIR"
+find "$PROMETHEUS_MULTIPROC_DIR" -maxdepth 1 -name '*.db' -delete
+
 if _is_worker_service; then
   CELERY_CONCURRENCY="${CELERY_CONCURRENCY:-1}"
   echo "[start] Starting Celery worker+beat (concurrency=${CELERY_CONCURRENCY})..."
@@ -279,15 +279,14 @@ class CountryService:
 
             provinces_with_images = set()
             try:
-                from database import provinces_has_image_data
+                from database import province_has_image_sql, provinces_has_image_data
 
                 if provinces_has_image_data():
                     db.execute(
-                        """
+                        f"""
                         SELECT id FROM provinces
                         WHERE userId = %s
-                          AND image_data IS NOT NULL
-                          AND image_data <> ''
+                          AND {province_has_image_sql()}
                         """,
                         (cId,),
                     )
@@ -508,7 +507,7 @@ class CountryService:
             food_score = None
             if variables.FEATURE_RATIONS_DISTRIBUTION and population:
                 try:
-                    from tasks import fetch_nation_distribution_status, food_stats
+                    from app_core.game_ticks.food import fetch_nation_distribution_status, food_stats
 
                     distribution_status = fetch_nation_distribution_status(
                         db, cId, population, rations_need
@@ -1,12 +1,12 @@
 from repositories.province_repository import ProvinceRepository
-from database import provinces_has_image_data
+from database import province_has_image_sql, provinces_has_image_data
 
 class ProvinceService:
     @staticmethod
     def get_user_provinces_paginated(user_id: int, page: int, per_page: int = 30) -> dict:
         has_image_col = ""
         if provinces_has_image_data():
-            has_image_col = ", (image_data IS NOT NULL AND image_data <> '') AS has_image"
+            has_image_col = f", {province_has_image_sql()} AS has_image"
 
         provinces_raw, total_count, total_pages, current_page = ProvinceRepository.get_provinces_paginated(
             user_id, page, per_page, has_image_col
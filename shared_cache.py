@@ -0,0 +1,350 @@
+"""
+Shared Redis tier for the in-process caches in database.py
+
+``QueryCache`` and ``cache_response`` keep their per-process dicts as the
+front tier; this module adds the Redis back tier behind them so every
+gunicorn/Celery worker shares one copy of each entry:
+
+* entries are pickled under ``ano:cache:<namespace>:<key>`` with a Redis TTL
+* invalidations are published on ``ano:cache:invalidate`` and applied to the
+  front tier of every other process by a background listener
+* ``single_flight`` lets one caller per key recompute a missing entry while
+  the others wait for its result
+
+The tier is enabled when REDIS_URL (or REDIS_PUBLIC_URL) is set and
+CACHE_BACKEND is not ``local``. Redis errors never reach callers: the tier
+is switched off for ``RETRY_AFTER`` seconds and the caches keep working
+per-process.
+"""
+
+import importlib.util
+import json
+import logging
+import os
+import pickle
+import threading
+import uuid
+from contextlib import contextmanager
+from math import ceil
+from time import sleep, time
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "ano:cache:"
+INVALIDATION_CHANNEL = "ano:cache:invalidate"
+
+# How long a recompute may hold a key before others give up waiting
+FLIGHT_TTL = float(os.getenv("CACHE_FLIGHT_TTL", "10"))
+FLIGHT_POLL = 0.05
+# Tag sets outlive the longest normal entry TTL; refreshed on every add
+TAG_TTL = 86400
+
+_release_flight_lua = """
+if redis.call("get", KEYS[1]) == ARGV[1] then
+    return redis.call("del", KEYS[1])
+else
+    return 0
+end
+"""
+
+MISSING = object()
+
+
+def _glob_escape(text):
+    return "".join("\\" + ch if ch in "*?[]\\" else ch for ch in text)
+
+
+class RedisTier:
+    """Shared back tier: pickled entries, pub/sub invalidation, flight locks."""
+
+    RETRY_AFTER = 30  # seconds the tier stays off after a Redis error
+    SOCKET_TIMEOUT = 0.5
+
+    def __init__(self, url=None, client=None):
+        self.url = url
+        self.origin = uuid.uuid4().hex
+        self._client = client
+        self._down_until = 0.0
+        self._handlers = []
+        self._listener_pid = None
+        self._lock = threading.Lock()
+
+    def _get_client(self):
+        if self._down_until and time() < self._down_until:
+            return None
+        if self._client is None:
+            # Imported on first use so importing database stays cheap
+            import redis
+
+            self._client = redis.Redis.from_url(
+                self.url,
+                socket_timeout=self.SOCKET_TIMEOUT,
+                socket_connect_timeout=self.SOCKET_TIMEOUT,
+            )
+        return self._client
+
+    def _failed(self, action, exc):
+        if time() >= self._down_until:
+            logger.warning(
+                "shared cache %s failed, using per-process cache for %ss: %s",
+                action,
+                self.RETRY_AFTER,
+                exc,
+            )
+        self._down_until = time() + self.RETRY_AFTER
+
+    def get(self, key):
+        """Return the stored value, or ``MISSING`` when absent/unavailable."""
+        client = self._get_client()
+        if client is None:
+            return MISSING
+        try:
+            raw = client.get(KEY_PREFIX + key)
+        except Exception as e:
+            self._failed("get", e)
+            return MISSING
+        if raw is None:
+            return MISSING
+        try:
+            return pickle.loads(raw)
+        except Exception:
+            return MISSING
+
+    def set(self, key, value, ttl_seconds, tags=()):
+        """Store ``value``; ``ttl_seconds`` of 0 means no expiry.
+
+        The key is added to a set per tag so ``delete_tagged`` can find it.
+        """
+        client = self._get_client()
+        if client is None:
+            return
+        try:
+            raw = pickle.dumps(value, protocol=pickle.HIGHEST_PROTOCOL)
+        except Exception:
+            # Unpicklable values (e.g. live objects) stay per-process
+            return
+        try:
+            client.set(KEY_PREFIX + key, raw, ex=ceil(ttl_seconds) or None)
+            for tag in tags:
+                tag_key = KEY_PREFIX + "tag:" + tag
+                client.sadd(tag_key, key)
+                # Members may outlive their entries; deleting a key that
+                # already expired is harmless.
+                client.expire(tag_key, TAG_TTL)
+        except Exception as e:
+            self._failed("set", e)
+
+    def delete(self, *keys):
+        client = self._get_client()
+        if client is None or not keys:
+            return
+        try:
+            client.delete(*(KEY_PREFIX + k for k in keys))
+        except Exception as e:
+            self._failed("delete", e)
+
+    def delete_tagged(self, *tags):
+        """Delete every key recorded under ``tags``, and the tag sets."""
+        client = self._get_client()
+        if client is None or not tags:
+            return
+        try:
+            for tag in tags:
+                tag_key = KEY_PREFIX + "tag:" + tag
+                members = [
+                    KEY_PREFIX + (m.decode() if isinstance(m, bytes) else m)
+                    for m in client.smembers(tag_key)
+                ]
+                client.delete(tag_key, *members)
+        except Exception as e:
+            self._failed("delete_tagged", e)
+
+    def delete_matching(self, prefix, contains="", predicate=None):
+        """Delete keys starting with ``prefix`` and containing ``contains``.
+
+        ``predicate`` is called with the key (without KEY_PREFIX) for any
+        further filtering that a glob cannot express.
+        """
+        client = self._get_client()
+        if client is None:
+            return
+        match = KEY_PREFIX + _glob_escape(prefix) + "*"
+        if contains:
+            match += _glob_escape(contains) + "*"
+        try:
+            doomed = []
+            for raw in client.scan_iter(match=match, count=500):
+                key = raw.decode() if isinstance(raw, bytes) else raw
+                if predicate is None or predicate(key[len(KEY_PREFIX):]):
+                    doomed.append(key)
+            for i in range(0, len(doomed), 500):
+                client.delete(*doomed[i : i + 500])
+        except Exception as e:
+            self._failed("delete_matching", e)
+
+    # -- invalidation fan-out ---------------------------------------------
+
+    def publish(self, message):
+        """Tell every other process to apply ``message`` to its front tier."""
+        client = self._get_client()
+        if client is None:
+            return
+        try:
+            client.publish(
+                INVALIDATION_CHANNEL, json.dumps({**message, "origin": self.origin})
+            )
+        except Exception as e:
+            self._failed("publish", e)
+
+    def subscribe(self, handler):
+        """Call ``handler(message)`` for invalidations from other processes."""
+        self._handlers.append(handler)
+        self.ensure_listener()
+
+    def ensure_listener(self):
+        # Threads do not survive fork, so each worker starts its own
+        if self._listener_pid == os.getpid() or not self._handlers:
+            return
+        with self._lock:
+            if self._listener_pid == os.getpid():
+                return
+            self._listener_pid = os.getpid()
+            threading.Thread(
+                target=self._listen, name="shared-cache-listener", daemon=True
+            ).start()
+
+    def dispatch(self, data):
+        """Apply one published message locally (skips our own)."""
+        try:
+            message = json.loads(data)
+        except (TypeError, ValueError):
+            return
+        if message.get("origin") == self.origin:
+            return
+        for handler in list(self._handlers):
+            try:
+                handler(message)
+            except Exception:
+                logger.exception("shared cache invalidation handler failed")
+
+    def _listen(self):
+        pid = os.getpid()
+        while self._listener_pid == pid:
+            client = self._get_client()
+            if client is None:
+                sleep(self.RETRY_AFTER)
+                continue
+            try:
+                pubsub = client.pubsub(ignore_subscribe_messages=True)
+                pubsub.subscribe(INVALIDATION_CHANNEL)
+                while self._listener_pid == pid:
+                    msg = pubsub.get_message(timeout=1.0)
+                    if msg and msg.get("type") == "message":
+                        self.dispatch(msg["data"])
+            except Exception as e:
+                self._failed("subscribe", e)
+                # Entries invalidated while we were deaf may be stale until
+                # they expire; the front tier TTLs bound how long.
+                sleep(1)
+
+    # -- stampede protection ------------------------------------------------
+
+    def claim(self, key):
+        """Try to become the one process recomputing ``key``.
+
+        Returns a token to pass to ``release``, or None when another
+        process already holds the key. When Redis is unavailable every
+        caller gets a token (recompute locally).
+        """
+        token = uuid.uuid4().hex
+        client = self._get_client()
+        if client is None:
+            return token
+        try:
+            flight_key = KEY_PREFIX + "flight:" + key
+            if client.set(flight_key, token, nx=True, px=int(FLIGHT_TTL * 1000)):
+                return token
+            return None
+        except Exception as e:
+            self._failed("claim", e)
+            return token
+
+    def release(self, key, token):
+        client = self._get_client()
+        if client is None:
+            return
+        try:
+            client.eval(_release_flight_lua, 1, KEY_PREFIX + "flight:" + key, token)
+        except Exception as e:
+            self._failed("release", e)
+
+
+# Per-key locks so concurrent threads in one process single-flight too
+_flights = {}  # key -> [lock, holders]
+_flights_lock = threading.Lock()
+
+
+@contextmanager
+def _key_lock(key):
+    with _flights_lock:
+        entry = _flights.setdefault(key, [threading.Lock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with _flights_lock:
+            entry[1] -= 1
+            if not entry[1]:
+                del _flights[key]
+
+
+def single_flight(key, lookup, compute, tier=None):
+    """Return ``lookup()`` if it has a value, else the result of ``compute()``.
+
+    Only one thread per process, and with a shared ``tier`` only one process
+    in the cluster, runs ``compute`` for ``key`` at a time. The others wait
+    for that result (``lookup`` returns ``MISSING`` until it appears) and
+    recompute themselves if the holder finishes without one or does not
+    finish within FLIGHT_TTL.
+    """
+    value = lookup()
+    if value is not MISSING:
+        return value
+    with _key_lock(key):
+        value = lookup()
+        if value is not MISSING:
+            return value
+        token = tier.claim(key) if tier is not None else None
+        if tier is not None and token is None:
+            deadline = time() + FLIGHT_TTL
+            while token is None and time() < deadline:
+                sleep(FLIGHT_POLL)
+                value = lookup()
+                if value is not MISSING:
+                    return value
+                # The holder finished without sharing a value (or died)
+                token = tier.claim(key)
+        try:
+            return compute()
+        finally:
+            if token is not None:
+                tier.release(key, token)
+
+
+_default_tier = None
+
+
+def get_shared_tier():
+    """The process-wide RedisTier, or None when the cache is per-process."""
+    global _default_tier
+    if _default_tier is None:
+        url = os.getenv("REDIS_URL") or os.getenv("REDIS_PUBLIC_URL")
+        if (
+            not url
+            or os.getenv("CACHE_BACKEND") == "local"
+            or importlib.util.find_spec("redis") is None
+        ):
+            return None
+        _default_tier = RedisTier(url)
+    return _default_tier
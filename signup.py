@@ -12,10 +12,8 @@ logger = logging.getLogger(__name__)
 # Game.ping() # temporarily removed this line because it might make celery not work
 # NOTE: 'app' is imported locally in route registration to avoid circular imports
 import bcrypt  # noqa: E402
-from requests_oauthlib import OAuth2Session  # noqa: E402
 import os  # noqa: E402
 from dotenv import load_dotenv  # noqa: E402
-import requests  # noqa: E402
 
 load_dotenv()
 if os.getenv("ENVIRONMENT") != "PROD" and not os.getenv("RAILWAY_ENVIRONMENT_NAME"):
@@ -204,6 +202,8 @@ def verify_recaptcha(response):
     if not response:
         return False
 
+    import requests
+
     payload = {"secret": secret, "response": response}
     try:
         r = requests.post(
@@ -226,6 +226,10 @@ def token_updater(token):
 
 
 def make_session(token=None, state=None, scope=None):
+    # Imported on first use: requests_oauthlib pulls in requests, which is
+    # slow to import and only needed by the Discord OAuth flow
+    from requests_oauthlib import OAuth2Session
+
     return OAuth2Session(
         client_id=OAUTH2_CLIENT_ID,
         token=token,
@@ -0,0 +1,24 @@
+// Decoder for the columnar map payloads (columnar.py).
+// Send AnoColumns.ACCEPT as the Accept header; list fields then arrive as
+// {fields, indexed, values} tables and AnoColumns.rows turns them back
+// into row objects. Plain JSON arrays are passed through unchanged.
+window.AnoColumns = {
+    ACCEPT: 'application/vnd.ano.columns+json, application/json;q=0.9',
+
+    rows(table, strings) {
+        if (!table || Array.isArray(table)) return table || [];
+        const { fields, values } = table;
+        const indexed = new Set(table.indexed || []);
+        const count = values.length ? values[0].length : 0;
+        const out = new Array(count);
+        for (let i = 0; i < count; i++) {
+            const row = {};
+            for (let f = 0; f < fields.length; f++) {
+                const v = values[f][i];
+                row[fields[f]] = indexed.has(fields[f]) && v !== null ? strings[v] : v;
+            }
+            out[i] = row;
+        }
+        return out;
+    },
+};
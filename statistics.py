@@ -1,6 +1,6 @@
 from flask import render_template
 from helpers import login_required
-from database import get_request_cursor, cache_response, get_coalition_members_table
+from database import get_request_cursor, cache_response
 
 # NOTE: 'app' is NOT imported at module level to avoid circular imports
 
@@ -52,70 +52,15 @@ def statistics():
                 "min": min_price if min_price else 0,
             }
 
-        # Get some basic nation statistics
+        # Get some basic nation statistics (nation_influence is refreshed
+        # by every global tick; see app_core/economy/influence.py)
         db.execute(
             """
             SELECT COUNT(*) as total_nations,
-                   AVG(influence) as avg_influence,
-                   MAX(influence) as max_influence
-            FROM (
-                SELECT
-                    u.id,
-                    ROUND(
-                        COALESCE(p.provinces_count, 0) * 300
-                        + COALESCE(m.soldiers, 0) * 0.02
-                        + COALESCE(m.artillery, 0) * 1.6
-                        + COALESCE(m.tanks, 0) * 0.8
-                        + COALESCE(m.fighters, 0) * 3.5
-                        + COALESCE(m.bombers, 0) * 2.5
-                        + COALESCE(m.apaches, 0) * 3.2
-                        + COALESCE(m.submarines, 0) * 4.5
-                        + COALESCE(m.destroyers, 0) * 3
-                        + COALESCE(m.cruisers, 0) * 5.5
-                        + COALESCE(m.icbms, 0) * 250
-                        + COALESCE(m.nukes, 0) * 500
-                        + COALESCE(m.spies, 0) * 25
-                        + COALESCE(p.city_count, 0) * 10
-                        + COALESCE(p.total_land, 0) * 10
-                        + COALESCE(r.total_resources, 0) * 0.001
-                        + COALESCE(s.gold, 0) * 0.00001
-                    )::bigint AS influence
-                FROM users u
-                LEFT JOIN stats s ON s.id = u.id
-                LEFT JOIN (
-                    SELECT
-                        userid AS user_id,
-                        COUNT(id) AS provinces_count,
-                        COALESCE(SUM(citycount), 0) AS city_count,
-                        COALESCE(SUM(land), 0) AS total_land
-                    FROM provinces
-                    GROUP BY userid
-                ) p ON p.user_id = u.id
-                LEFT JOIN (
-                    SELECT
-                        um.user_id,
-                        SUM(CASE WHEN ud.name='soldiers' THEN um.quantity ELSE 0 END) AS soldiers,
-                        SUM(CASE WHEN ud.name='artillery' THEN um.quantity ELSE 0 END) AS artillery,
-                        SUM(CASE WHEN ud.name='tanks' THEN um.quantity ELSE 0 END) AS tanks,
-                        SUM(CASE WHEN ud.name='fighters' THEN um.quantity ELSE 0 END) AS fighters,
-                        SUM(CASE WHEN ud.name='bombers' THEN um.quantity ELSE 0 END) AS bombers,
-                        SUM(CASE WHEN ud.name='apaches' THEN um.quantity ELSE 0 END) AS apaches,
-                        SUM(CASE WHEN ud.name='submarines' THEN um.quantity ELSE 0 END) AS submarines,
-                        SUM(CASE WHEN ud.name='destroyers' THEN um.quantity ELSE 0 END) AS destroyers,
-                        SUM(CASE WHEN ud.name='cruisers' THEN um.quantity ELSE 0 END) AS cruisers,
-                        SUM(CASE WHEN ud.name='icbms' THEN um.quantity ELSE 0 END) AS icbms,
-                        SUM(CASE WHEN ud.name='nukes' THEN um.quantity ELSE 0 END) AS nukes,
-                        SUM(CASE WHEN ud.name='spies' THEN um.quantity ELSE 0 END) AS spies
-                    FROM user_military um
-                    JOIN unit_dictionary ud ON um.unit_id = ud.unit_id
-                    GROUP BY um.user_id
-                ) m ON m.user_id = u.id
-                LEFT JOIN (
-                    SELECT user_id, COALESCE(SUM(quantity), 0) AS total_resources
-                    FROM user_economy
-                    GROUP BY user_id
-                ) r ON r.user_id = u.id
-            ) as nation_stats
+                   AVG(COALESCE(ni.influence, 0)) as avg_influence,
+                   MAX(COALESCE(ni.influence, 0)) as max_influence
+            FROM users u
+            LEFT JOIN nation_influence ni ON ni.user_id = u.id
         """
         )
         nation_stats = db.fetchone()
@@ -134,87 +79,26 @@ def statistics():
 
 @cache_response(ttl_seconds=300, public=True)  # Cache rankings for 5 minutes — public leaderboard
 def rankings():
-    """Display the top leaderboards for nations and alliances."""
-    with get_request_cursor() as db:
-        # Top by Population
-        try:
-            db.execute(
-                """
-                SELECT u.id, u.username, COALESCE(SUM(p.population), 0) as total_pop
-                FROM users u
-                JOIN provinces p ON u.id = p.userid
-                GROUP BY u.id, u.username
-                ORDER BY total_pop DESC
-                LIMIT 10
-                """
-            )
-            top_population = db.fetchall()
-        except Exception:
-            from database import rollback_db_cursor
-            rollback_db_cursor(db)
-            top_population = []
-
-        # Top by Military Size
-        try:
-            db.execute(
-                """
-                SELECT u.id, u.username, COALESCE(SUM(um.quantity), 0) as army_size
-                FROM users u
-                JOIN user_military um ON u.id = um.user_id
-                GROUP BY u.id, u.username
-                ORDER BY army_size DESC
-                LIMIT 10
-                """
-            )
-            top_military = db.fetchall()
-        except Exception:
-            from database import rollback_db_cursor
-            rollback_db_cursor(db)
-            top_military = []
-
-        # Top by Wealth (Money)
-        try:
-            db.execute(
-                """
-                SELECT u.id, u.username, COALESCE(s.gold, 0) as total_money
-                FROM users u
-                JOIN stats s ON u.id = s.id
-                ORDER BY total_money DESC
-                LIMIT 10
-                """
-            )
-            top_wealth = db.fetchall()
-        except Exception:
-            from database import rollback_db_cursor
-            rollback_db_cursor(db)
-            top_wealth = []
-
-        # Top Alliances by Influence (Sum of member populations)
-        try:
-            members_tbl = get_coalition_members_table() or "coalitions_legacy"
-            db.execute(
-                f"""
-                SELECT c.id, c.name, COALESCE(SUM(p.population), 0) as total_pop
-                FROM colNames c
-                JOIN {members_tbl} m ON c.id = m.colid
-                JOIN provinces p ON m.userid = p.userid
-                GROUP BY c.id, c.name
-                ORDER BY total_pop DESC
-                LIMIT 10
-                """
-            )
-            top_alliances = db.fetchall()
-        except Exception:
-            from database import rollback_db_cursor
-            rollback_db_cursor(db)
-            top_alliances = []
+    """Display the top leaderboards for nations and alliances.
+
+    Boards are precomputed by tasks.task_refresh_leaderboards, so this is a
+    single indexed read of leaderboard_snapshots.
+    """
+    from app_core.leaderboards import fetch_leaderboards
+
+    try:
+        boards = fetch_leaderboards(
+            ["population", "military", "wealth", "coalition_population"], limit=10
+        )
+    except Exception:
+        boards = {}
 
     return render_template(
         "rankings.html",
-        top_population=top_population,
-        top_military=top_military,
-        top_wealth=top_wealth,
-        top_alliances=top_alliances,
+        top_population=boards.get("population", []),
+        top_military=boards.get("military", []),
+        top_wealth=boards.get("wealth", []),
+        top_alliances=boards.get("coalition_population", []),
     )
 
 
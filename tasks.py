@@ -1,4 +1,4 @@
-from celery import Celery
+from celery import Celery, chord
 import psycopg2
 import os
 import time
@@ -7,6 +7,7 @@ from dotenv import load_dotenv
 from attack_scripts import Economy
 import math
 from celery.schedules import crontab
+from celery.signals import worker_init
 import variables
 import redis
 
@@ -45,16 +46,34 @@ celery.conf.update(
 )
 
 
+@worker_init.connect
+def start_metrics_server(**kwargs):
+    """Serve Prometheus metrics from the worker when CELERY_METRICS_PORT is set.
+
+    With PROMETHEUS_MULTIPROC_DIR set, this covers every pool process.
+    """
+    port = os.getenv("CELERY_METRICS_PORT")
+    if not port:
+        return
+    try:
+        import metrics
+
+        metrics.start_http_server(int(port))
+        logger.info("Prometheus metrics served on :%s", port)
+    except Exception as e:
+        logger.warning("Could not start the metrics server: %s", e)
+
+
 # Centralized helper for last_run threshold check
 
 # Re-exported moved names
-from app_core.game_ticks.common import should_skip_task, is_task_stale, handle_exception, log_verbose, _safe_update_productivity, _run_with_deadlock_retries, MAX_INT_32
+from app_core.game_ticks.common import should_skip_task, is_task_stale, handle_exception, log_verbose, _safe_update_productivity, _run_with_deadlock_retries, MAX_INT_32, bulk_write
 from app_core.game_ticks.locks import try_pg_advisory_lock, release_pg_advisory_lock, _get_redis_client, leader_only, _redis_pool, _delete_lock_lua
 from app_core.game_ticks.food import rations_needed, rations_distribution_capacity, food_stats, compute_rations_distribution_cap, nation_distribution_status, fetch_nation_distribution_status, consumer_goods_distribution_capacity, calculate_demographic_rations_need, calculate_demographic_consumer_goods_need
 from app_core.game_ticks.energy import energy_info, energy_stats
 from app_core.game_ticks.taxes import calc_ti, tax_income, war_reparation_tax
 from app_core.game_ticks.population import calc_pg, population_growth, apply_population_aging, calculate_workforce_available, apply_workforce_hiring_and_debuffs, find_unit_category
-from app_core.game_ticks.revenue import generate_province_revenue
+from app_core.game_ticks.revenue import generate_province_revenue, province_revenue_shards, claim_province_revenue_run, finalize_province_revenue
 from app_core.game_ticks.maintenance import backfill_missing_resources, cleanup_orphan_user_rows, refresh_bot_offers, market_bot_fight_wars, execute_due_trade_agreements, _create_game_tick_log, _finalize_game_tick_log, global_tick, BOT_USER_ID, BOT_OFFERS
 
 
@@ -92,7 +111,31 @@ def task_tax_income():
 @celery.task()
 @leader_only(ttl_seconds=300)
 def task_generate_province_revenue():
-    _run_with_deadlock_retries(generate_province_revenue, "generate_province_revenue")
+    shards = province_revenue_shards()
+    if shards <= 1:
+        _run_with_deadlock_retries(generate_province_revenue, "generate_province_revenue")
+        return
+    if not claim_province_revenue_run():
+        return
+    chord(
+        task_generate_province_revenue_shard.s(shard, shards)
+        for shard in range(shards)
+    )(task_finalize_province_revenue.s())
+
+
+# Shards hold their own advisory lock, so no leader_only here: it keys on the
+# function name and would let only one shard through.
+@celery.task()
+def task_generate_province_revenue_shard(shard, shard_count):
+    return _run_with_deadlock_retries(
+        lambda: generate_province_revenue(shard, shard_count),
+        f"generate_province_revenue:{shard}/{shard_count}",
+    )
+
+
+@celery.task()
+def task_finalize_province_revenue(shard_results):
+    return finalize_province_revenue(shard_results)
 
 
 # Runs once a day
@@ -110,7 +153,7 @@ def task_war_reparation_tax():
 @leader_only(ttl_seconds=300)
 def task_manpower_increase():
     from database import get_db_connection
-    from psycopg2.extras import execute_batch, RealDictCursor
+    from psycopg2.extras import RealDictCursor
 
     with get_db_connection() as conn:
         db = conn.cursor()
@@ -172,11 +215,13 @@ def task_manpower_increase():
 
         # Batch update all manpower at once
         if manpower_updates:
-            execute_batch(
+            bulk_write(
                 db,
-                "UPDATE stats SET manpower = GREATEST(0, manpower + %s) WHERE id=%s",
+                "UPDATE stats AS s SET manpower = GREATEST(0, s.manpower + v.delta) "
+                "FROM {stage} AS v WHERE s.id = v.id",
                 manpower_updates,
-                page_size=100,
+                (("delta", "bigint"), ("id", "int")),
+                "UPDATE stats SET manpower = GREATEST(0, manpower + %s) WHERE id=%s",
             )
         conn.commit()
 
@@ -221,6 +266,15 @@ def task_execute_trade_agreements():
     _run_with_deadlock_retries(execute_due_trade_agreements, "execute_trade_agreements")
 
 
+@celery.task()
+@leader_only(ttl_seconds=300)
+def task_refresh_leaderboards():
+    """Re-rank the leaderboard snapshots read by /rankings, the bot and Discord."""
+    from app_core.leaderboards import run_leaderboard_refresh
+
+    _run_with_deadlock_retries(run_leaderboard_refresh, "refresh_leaderboards")
+
+
 @celery.task()
 @leader_only(ttl_seconds=540)
 def task_global_tick():
@@ -0,0 +1,107 @@
+"""Columnar map payloads negotiated by Accept (columnar.py)."""
+
+import json
+
+import pytest
+from flask import Flask
+
+import columnar
+import etags
+
+FIELDS = ("id", "owner_name", "is_mine")
+ROWS = [
+    (1, "Avalon", True),
+    (2, "Lyonesse", False),
+    (3, "Avalon", False),
+    (4, None, False),
+]
+
+
+def make_app(calls):
+    app = Flask(__name__)
+
+    @app.route("/nodes")
+    @etags.conditional("provinces_map", negotiate=columnar.negotiate)
+    def nodes():
+        calls.append(1)
+        fmt = columnar.negotiate()
+        payload = {"status": "success"}
+        if fmt:
+            strings = columnar.StringTable()
+            payload["provinces"] = columnar.table(
+                FIELDS, ROWS, strings, indexed=("owner_name",)
+            )
+            payload["strings"] = strings.strings
+        else:
+            payload["provinces"] = columnar.records(FIELDS, ROWS)
+        return columnar.respond(payload, fmt)
+
+    return app
+
+
+@pytest.mark.no_server
+def test_table_indexes_repeated_strings():
+    strings = columnar.StringTable()
+    table = columnar.table(FIELDS, ROWS, strings, indexed=("owner_name",))
+    assert table == {
+        "fields": ["id", "owner_name", "is_mine"],
+        "indexed": ["owner_name"],
+        "values": [[1, 2, 3, 4], [0, 1, 0, None], [True, False, False, False]],
+    }
+    assert strings.strings == ["Avalon", "Lyonesse"]
+    assert columnar.table(FIELDS, [])["values"] == [[], [], []]
+
+
+@pytest.mark.no_server
+@pytest.mark.parametrize(
+    "accept, expected",
+    [
+        (None, None),
+        ("*/*", None),
+        ("application/json", None),
+        (columnar.COLUMNS, "columns"),
+        (f"{columnar.COLUMNS}, application/json;q=0.9", "columns"),
+    ],
+)
+def test_negotiate(accept, expected):
+    headers = {"Accept": accept} if accept else {}
+    with Flask(__name__).test_request_context(headers=headers):
+        assert columnar.negotiate() == expected
+
+
+@pytest.mark.no_server
+def test_each_representation_has_its_own_tag(monkeypatch):
+    monkeypatch.setattr(etags, "version", lambda scope: 5)
+    calls = []
+    client = make_app(calls).test_client()
+
+    plain = client.get("/nodes")
+    assert plain.mimetype == "application/json"
+    assert plain.get_json()["provinces"][1] == {
+        "id": 2,
+        "owner_name": "Lyonesse",
+        "is_mine": False,
+    }
+    assert "Accept" in plain.headers["Vary"]
+
+    compact = client.get("/nodes", headers={"Accept": columnar.COLUMNS})
+    assert compact.mimetype == columnar.COLUMNS
+    body = json.loads(compact.data)
+    assert body["strings"] == ["Avalon", "Lyonesse"]
+    assert body["provinces"]["values"][1] == [0, 1, 0, None]
+    assert len(compact.data) < len(plain.data)
+    assert compact.headers["ETag"] != plain.headers["ETag"]
+
+    # The plain tag does not validate the columnar representation
+    again = client.get(
+        "/nodes",
+        headers={"Accept": columnar.COLUMNS, "If-None-Match": plain.headers["ETag"]},
+    )
+    assert again.status_code == 200
+    cached = client.get(
+        "/nodes",
+        headers={"Accept": columnar.COLUMNS, "If-None-Match": compact.headers["ETag"]},
+    )
+    assert cached.status_code == 304
+    assert "Accept" in cached.headers["Vary"]
+    assert len(calls) == 3
@@ -0,0 +1,115 @@
+"""Seedable combat engine and its Monte Carlo preview (combat_engine.py)."""
+
+import random
+
+import pytest
+
+from attack_scripts.combat_engine import Army, engage, fight, simulate
+
+ATTACKER = Army({"bombers": 30, "soldiers": 200})
+DEFENDER = Army({"tanks": 60, "soldiers": 300})
+
+
+@pytest.mark.no_server
+def test_same_seed_same_battle():
+    first = fight(ATTACKER, DEFENDER, random.Random(11))
+    again = fight(ATTACKER, DEFENDER, random.Random(11))
+    assert first == again
+    assert 1 <= first.morale_delta <= 200
+    # Casualties never exceed what was sent
+    loser = ATTACKER if first.winner_is_defender else DEFENDER
+    assert all(
+        amount <= loser.selected_units[unit] for unit, amount in first.loser_pairs
+    )
+
+
+@pytest.mark.no_server
+def test_unusable_units_add_nothing():
+    usable = engage(ATTACKER, DEFENDER, random.Random(0))
+    grounded = engage(
+        Army(ATTACKER.selected_units, frozenset({"bombers"})),
+        DEFENDER,
+        random.Random(0),
+    )
+    assert grounded.attacker_bonus < usable.attacker_bonus
+    assert grounded.attacker_unit_amount_bonuses == 200 / 150
+
+
+@pytest.mark.no_server
+def test_simulation_matches_repeated_battles():
+    runs = 20000
+    rng = random.Random(5)
+    battles = [fight(ATTACKER, DEFENDER, rng) for _ in range(runs)]
+    wins = sum(not b.winner_is_defender for b in battles) / runs
+    soldiers_lost = (
+        sum(
+            int(
+                dict(b.loser_pairs if b.winner_is_defender else b.winner_pairs).get(
+                    "soldiers", 0
+                )
+            )
+            for b in battles
+        )
+        / runs
+    )
+
+    preview = simulate(ATTACKER, DEFENDER, runs, seed=5)
+    assert preview == simulate(ATTACKER, DEFENDER, runs, seed=5)
+    assert preview["attacker_win_probability"] == pytest.approx(wins, abs=0.01)
+    soldiers = preview["attacker"]["casualties"]["soldiers"]
+    assert soldiers["mean"] == pytest.approx(soldiers_lost, rel=0.05)
+    assert soldiers["p10"] <= soldiers["p50"] <= soldiers["p90"]
+
+
+@pytest.mark.no_server
+def test_empty_defence_is_a_walkover():
+    preview = simulate(Army({"soldiers": 100}), Army({"soldiers": 0}), runs=50, seed=1)
+    assert preview["attacker_win_probability"] == 1.0
+    assert preview["win_type"]["mean"] == 5.0
+    assert preview["attacker"]["casualties"]["soldiers"]["mean"] == 0.0
+    assert preview["defender"]["casualties"]["soldiers"]["mean"] == 0.0
+    assert preview["defender"]["morale_loss"] > 0
+
+
+@pytest.mark.no_server
+def test_preview_route_hides_the_enemy_defence(monkeypatch):
+    from contextlib import contextmanager
+
+    from app import app
+    from attack_scripts import war_orchestrator
+    from attack_scripts.military_snapshot import MilitarySnapshot
+    from wars import routes
+
+    class AtWar:
+        def execute(self, *args):
+            pass
+
+        def fetchone(self):
+            return (1,)
+
+    @contextmanager
+    def request_cursor(cursor_factory=None, read_only=False):
+        yield AtWar()
+
+    def snapshot(user_id, read_only=False):
+        return MilitarySnapshot(user_id, {}, frozenset(), (), {}, False)
+
+    monkeypatch.setattr(
+        routes.Military, "get_military", lambda uid, read_only=False: {"soldiers": 500}
+    )
+    monkeypatch.setattr(routes, "get_request_cursor", request_cursor)
+    monkeypatch.setattr(routes, "military_snapshot", snapshot)
+    monkeypatch.setattr(
+        war_orchestrator,
+        "resolve_defender_composition",
+        lambda enemy_id: (None, {"tanks": 60, "soldiers": 300}),
+    )
+
+    client = app.test_client()
+    with client.session_transaction() as session:
+        session["user_id"] = 1
+    response = client.get("/api/war/preview?enemy_id=2&soldiers=200&runs=50000&seed=3")
+    assert response.status_code == 200
+    assert set(response.json) == set(routes.PREVIEW_FIELDS)
+    assert response.json["runs"] == routes.MAX_PREVIEW_RUNS
+    assert set(response.json["attacker"]["casualties"]) == {"soldiers"}
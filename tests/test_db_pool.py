@@ -0,0 +1,249 @@
+"""DatabasePool checkout metrics and QueryHelper's reconnect retry."""
+
+import os
+import queue
+
+import psycopg2
+import psycopg2.pool
+import pytest
+
+import database
+from database import DatabasePool, PoolMetrics, QueryHelper
+
+
+class FakeConn:
+    closed = 0
+
+    def __init__(self, fail_with=None):
+        self.fail_with = fail_with
+        self.committed = False
+
+    def cursor(self, cursor_factory=None):
+        conn = self
+
+        class Cursor:
+            def execute(self, query, params=None):
+                if conn.fail_with is not None:
+                    raise conn.fail_with
+
+            def fetchone(self):
+                return (1,)
+
+            def close(self):
+                pass
+
+        return Cursor()
+
+    def commit(self):
+        self.committed = True
+
+    def rollback(self):
+        pass
+
+    def close(self):
+        self.closed = 1
+
+
+class FakePool:
+    def __init__(self, conns):
+        self.conns = list(conns)
+        self.returned = []
+
+    def getconn(self):
+        return self.conns.pop(0)
+
+    def putconn(self, conn, close=False):
+        self.returned.append((conn, close))
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    pool = DatabasePool()
+
+    def install(conns, maxconn=2):
+        monkeypatch.setattr(pool, "_pool", FakePool(conns))
+        monkeypatch.setattr(pool, "_pid", os.getpid())
+        available = queue.Queue(maxsize=maxconn)
+        for _ in range(maxconn):
+            available.put(True)
+        monkeypatch.setattr(pool, "_available", available)
+        monkeypatch.setattr(pool, "_maxconn", maxconn)
+        monkeypatch.setattr(pool, "_checked_out", {})
+        monkeypatch.setattr(pool, "metrics", PoolMetrics())
+        monkeypatch.setenv("DB_POOL_MODE", "transaction")
+        return pool._pool
+
+    return install
+
+
+@pytest.mark.no_server
+def test_checkout_records_wait_hold_and_saturation(pool):
+    pool([FakeConn()])
+    conn = database.db_pool.get_connection()
+    database.db_pool.return_connection(conn)
+
+    stats = database.db_pool.metrics.snapshot()["background"]
+    assert stats["checkouts"] == 1
+    assert stats["saturation_max"] == 0.5
+    assert stats["exhausted"] == 0
+    assert stats["hold_max"] >= 0
+
+
+@pytest.mark.no_server
+def test_query_helper_retries_once_on_dead_connection(pool):
+    dead = FakeConn(fail_with=psycopg2.OperationalError("server closed the connection"))
+    fresh = FakeConn()
+    fake_pool = pool([dead, fresh])
+
+    assert QueryHelper.fetch_one("SELECT 1") == (1,)
+    # The dead connection was discarded, the retry committed on the fresh one
+    assert fake_pool.returned[0] == (dead, True)
+    assert fresh.committed
+    assert database.db_pool.metrics.snapshot()["background"]["retries"] == 1
+
+
+@pytest.mark.no_server
+def test_query_helper_does_not_retry_server_errors(pool):
+    class Timeout(psycopg2.OperationalError):
+        pgcode = "57014"
+
+    pool([FakeConn(fail_with=Timeout("canceling statement")), FakeConn()])
+    with pytest.raises(psycopg2.OperationalError):
+        QueryHelper.fetch_one("SELECT pg_sleep(60)")
+
+
+@pytest.fixture
+def replica(pool, monkeypatch):
+    """Primary and replica pools backed by fakes, replica healthy."""
+    from database import ReplicaPool
+
+    monkeypatch.setenv("DATABASE_REPLICA_URL", "postgresql://replica/db")
+    primary_conns = pool([FakeConn() for _ in range(4)], maxconn=4)
+    replica = ReplicaPool()
+    replica_fake = FakePool([FakeConn() for _ in range(4)])
+    available = queue.Queue(maxsize=4)
+    for _ in range(4):
+        available.put(True)
+    for name, value in (
+        ("_pool", replica_fake),
+        ("_pid", os.getpid()),
+        ("_available", available),
+        ("_maxconn", 4),
+        ("_checked_out", {}),
+        ("metrics", PoolMetrics()),
+    ):
+        monkeypatch.setattr(replica, name, value)
+    monkeypatch.setattr(replica, "is_usable", lambda: True)
+    return primary_conns, replica_fake
+
+
+def _request_app():
+    from flask import Flask
+
+    app = Flask(__name__)
+    app.secret_key = "test"
+    return app
+
+
+@pytest.mark.no_server
+def test_read_only_request_cursor_uses_replica(replica):
+    primary, replica_fake = replica
+    app = _request_app()
+    with app.test_request_context("/countries"):
+        with database.get_request_cursor(read_only=True):
+            pass
+        database.teardown_request_connection()
+
+    assert len(replica_fake.returned) == 1
+    assert not primary.returned
+
+
+@pytest.mark.no_server
+def test_writes_pin_reads_to_primary(replica):
+    from flask import session
+
+    primary, replica_fake = replica
+    app = _request_app()
+    with app.test_request_context("/buy", method="POST"):
+        with database.get_request_cursor():
+            pass
+        # Same request: its own writes are only on the primary connection
+        with database.get_request_cursor(read_only=True):
+            pass
+        window = session["_db_primary_until"]
+        database.teardown_request_connection()
+    assert not replica_fake.returned
+    assert len(primary.returned) == 1
+
+    # The next page view of that user is inside the read-your-writes window
+    with app.test_request_context("/country"):
+        session["_db_primary_until"] = window
+        with database.get_db_cursor(read_only=True):
+            pass
+    assert not replica_fake.returned
+
+
+@pytest.mark.no_server
+def test_lagging_replica_falls_back_to_primary(monkeypatch):
+    from database import ReplicaPool
+
+    replica = ReplicaPool()
+    monkeypatch.setenv("DB_REPLICA_MAX_LAG_SECONDS", "5")
+    monkeypatch.setattr(replica, "_checked_at", 0.0)
+    monkeypatch.setattr(replica, "_usable_until", 0.0)
+    monkeypatch.setattr(replica, "lag_seconds", lambda: 12.0)
+    assert not replica.is_usable()
+
+    monkeypatch.setattr(replica, "_checked_at", 0.0)
+    monkeypatch.setattr(replica, "lag_seconds", lambda: 0.5)
+    assert replica.is_usable()
+
+    replica.mark_failed()
+    assert not replica.is_usable()
+
+
+@pytest.mark.no_server
+def test_first_lag_check_initialises_the_pool_without_deadlock(monkeypatch):
+    import threading
+
+    from database import ReplicaPool
+
+    class FakeThreadedPool(FakePool):
+        def __init__(self, minconn, maxconn, **kwargs):
+            super().__init__([FakeConn() for _ in range(maxconn)])
+
+    replica = ReplicaPool()
+    monkeypatch.setattr(psycopg2.pool, "ThreadedConnectionPool", FakeThreadedPool)
+    monkeypatch.setenv("DATABASE_REPLICA_URL", "postgresql://replica/db")
+    monkeypatch.setenv("DB_POOL_MODE", "transaction")
+    # Fresh process: no pool yet, first check due
+    monkeypatch.setattr(replica, "_pool", None)
+    monkeypatch.setattr(replica, "_pid", None)
+    monkeypatch.setattr(replica, "_checked_at", 0.0)
+    monkeypatch.setattr(replica, "_usable_until", 0.0)
+    monkeypatch.setattr(replica, "_checked_out", {})
+    monkeypatch.setattr(replica, "metrics", PoolMetrics())
+
+    result = []
+    check = threading.Thread(
+        target=lambda: result.append(replica.is_usable()), daemon=True
+    )
+    check.start()
+    check.join(timeout=3)
+
+    assert not check.is_alive()
+    # FakeConn reports 1s of lag, within DB_REPLICA_MAX_LAG_SECONDS
+    assert result == [True]
+
+
+@pytest.mark.no_server
+def test_route_label_is_bounded_for_unmatched_paths():
+    from flask import Flask
+
+    app = Flask(__name__)
+    app.add_url_rule("/wars", "wars", lambda: "")
+    with app.test_request_context("/wars"):
+        assert database._current_route() == "wars"
+    with app.test_request_context("/wp-admin/../../etc/passwd"):
+        assert database._current_route() == "unmatched"
+    assert database._current_route() == "background"
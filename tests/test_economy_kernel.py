@@ -0,0 +1,144 @@
+"""Economy kernel: the NumPy path must match the sequential reference exactly."""
+import copy
+import random
+
+import pytest
+
+import variables
+from app_core.economy.kernel import (
+    building_profile,
+    compute_chunk,
+    gross_production,
+    policies_mask,
+    upgrades_mask,
+)
+
+pytestmark = pytest.mark.no_server
+
+
+def _random_chunk(seed):
+    rng = random.Random(seed)
+    provinces, buildings, province_state = [], {}, {}
+    gold, stock, upgrade_masks, policy_masks, efficiency = {}, {}, {}, {}, {}
+    pid = 1
+    for uid in range(1, 9):
+        rich = rng.random() < 0.6
+        gold[uid] = rng.randint(10**8, 10**9) if rich else rng.randint(0, 200_000)
+        stock[uid] = {
+            res: rng.randint(10**6, 10**7) if rich else rng.randint(0, 300)
+            for res in variables.RESOURCES
+        }
+        upgrade_masks[uid] = upgrades_mask(
+            rng.sample(
+                [
+                    "cheapermaterials",
+                    "electricarcfurnace",
+                    "largerforges",
+                    "integratedsteelmaking",
+                    "governmentregulation",
+                    "advancedmachinery",
+                    "betterengineering",
+                    "highspeedrail",
+                ],
+                rng.randint(0, 4),
+            )
+        )
+        policy_masks[uid] = policies_mask(rng.sample([1, 3, 4, 6, 7], 2))
+        efficiency[uid] = rng.choice([1.0, 0.8, 0.55])
+        for _ in range(rng.randint(1, 4)):
+            provinces.append(
+                (pid, uid, rng.randint(0, 40), rng.choice([None, 0, 37, 50, 100]))
+            )
+            buildings[pid] = {
+                unit: rng.randint(0, 6)
+                for unit in rng.sample(variables.BUILDINGS, 12)
+            }
+            province_state[pid] = {
+                "energy": 0,
+                "happiness": rng.randint(0, 100),
+                "productivity": rng.randint(0, 100),
+                "pollution": rng.randint(0, 100),
+                "consumer_spending": rng.randint(0, 100),
+            }
+            pid += 1
+    return (
+        provinces,
+        buildings,
+        gold,
+        stock,
+        upgrade_masks,
+        policy_masks,
+        efficiency,
+        province_state,
+    )
+
+
+@pytest.mark.parametrize("seed", range(40))
+def test_vectorized_matches_sequential(seed):
+    chunk = _random_chunk(seed)
+    fast = compute_chunk(*chunk)
+    slow = compute_chunk(*chunk, vectorize=False)
+
+    assert fast.gold_costs == slow.gold_costs
+    assert fast.provinces == slow.provinces
+    assert fast.produced == slow.produced
+    assert fast.resource_deltas.keys() == slow.resource_deltas.keys()
+    for uid, deltas in slow.resource_deltas.items():
+        # Only summation order differs; a delta netting to zero may be omitted
+        fast_deltas = {k: v for k, v in fast.resource_deltas[uid].items() if v}
+        assert fast_deltas == pytest.approx({k: v for k, v in deltas.items() if v})
+
+
+def test_compute_chunk_does_not_mutate_inputs():
+    chunk = _random_chunk(7)
+    before = copy.deepcopy(chunk)
+    compute_chunk(*chunk)
+    assert chunk == before
+
+
+def test_partial_operation_when_inputs_run_short():
+    # 10 coal burners with 20 coal: only as many as 20 coal covers can run
+    result = compute_chunk(
+        [(1, 1, 0, 50)],
+        {1: {"coal_burners": 10}},
+        {1: 10**9},
+        {1: {"coal": 20}},
+        {},
+        {},
+        {},
+        {1: {"energy": 0}},
+    )
+    per_unit = dict(building_profile("coal_burners", 0, 0).minus)["coal"]
+    ran = int(20 // per_unit)
+    assert result.shortfalls == [(1, 1, "coal_burners", ran, 10, ["coal"])]
+    assert result.resource_deltas[1]["coal"] == pytest.approx(-per_unit * ran)
+    assert result.provinces[1]["energy"] == ran * dict(
+        building_profile("coal_burners", 0, 0).plus
+    )["energy"]
+
+
+def test_profile_applies_upgrades_and_policies():
+    base = building_profile("steel_mills", 0, 0)
+    eaf = building_profile("steel_mills", upgrades_mask(["electricarcfurnace"]), 0)
+    assert dict(eaf.minus)["coal"] == pytest.approx(dict(base.minus)["coal"] * 0.5)
+
+    subsidised = building_profile(
+        variables.POLICY_SUBSIDIES_AFFECTED_BUILDINGS[0],
+        0,
+        policies_mask([variables.POLICY_INDUSTRIAL_SUBSIDIES]),
+    )
+    assert variables.POLICY_SUBSIDIES_UPKEEP_REDUCTION in subsidised.cost_factors
+
+
+def test_gross_production_ignores_stock_and_applies_multipliers():
+    rows = [(1, 1, 10, 100)]
+    gross, theoretical = gross_production(
+        rows, {1: {"farms": 2}}, {1: upgrades_mask(["advancedmachinery"])}, {}, {}
+    )
+    rations = dict(building_profile("farms", 0, 0).plus)["rations"]
+    land_add = int(10 * variables.LAND_FARM_PRODUCTION_ADDITION)
+    assert theoretical[1]["rations"] == rations * 2 + land_add
+    multiplier = 1 + 50 * variables.DEFAULT_PRODUCTIVITY_PRODUCTION_MULTIPLIER + 0.5
+    assert gross[1]["rations"] == pytest.approx(
+        (rations * 2 + land_add) * multiplier, abs=1
+    )
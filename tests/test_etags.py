@@ -0,0 +1,168 @@
+"""Version-based ETags and conditional GETs (etags.py)."""
+import os
+
+import pytest
+from flask import Flask, jsonify, session
+from werkzeug.http import parse_etags
+
+import etags
+from database import invalidate_user_cache, query_cache
+
+
+def make_app(calls):
+    app = Flask(__name__)
+    app.secret_key = "test"
+
+    @app.route("/login/<int:user_id>")
+    def login(user_id):
+        session["user_id"] = user_id
+        return "ok"
+
+    @app.route("/nodes")
+    @etags.conditional("world_map")
+    def nodes():
+        calls.append("nodes")
+        return jsonify({"nodes": []})
+
+    @app.route("/mine")
+    @etags.conditional("provinces_map", per_user=True)
+    def mine():
+        calls.append("mine")
+        return jsonify({"provinces": []})
+
+    return app
+
+
+@pytest.fixture
+def versions(monkeypatch):
+    current = {"world_map": 3, "provinces_map": 7}
+    monkeypatch.setattr(etags, "version", lambda scope: current.get(scope))
+    return current
+
+
+@pytest.mark.no_server
+def test_matches_ignores_the_compression_suffix():
+    assert etags.matches(parse_etags('W/"world_map-3:gzip"'), "world_map-3")
+    assert etags.matches(parse_etags('"world_map-3"'), "world_map-3")
+    assert not etags.matches(parse_etags('W/"world_map-2:br"'), "world_map-3")
+    assert not etags.matches(parse_etags('W/"world_map-3"'), None)
+
+
+@pytest.mark.no_server
+def test_unchanged_scope_skips_the_view(versions):
+    calls = []
+    client = make_app(calls).test_client()
+
+    first = client.get("/nodes")
+    assert first.status_code == 200
+    assert first.headers["ETag"] == 'W/"world_map-3"'
+
+    again = client.get("/nodes", headers={"If-None-Match": first.headers["ETag"]})
+    assert again.status_code == 304
+    assert again.data == b""
+    assert calls == ["nodes"]
+
+    versions["world_map"] = 4
+    changed = client.get("/nodes", headers={"If-None-Match": first.headers["ETag"]})
+    assert changed.status_code == 200
+    assert changed.headers["ETag"] == 'W/"world_map-4"'
+    assert calls == ["nodes", "nodes"]
+
+
+@pytest.mark.no_server
+def test_unreadable_version_serves_untagged(versions):
+    versions.pop("world_map")
+    calls = []
+    response = make_app(calls).test_client().get(
+        "/nodes", headers={"If-None-Match": "*"}
+    )
+    assert response.status_code == 200
+    assert "ETag" not in response.headers
+
+
+@pytest.fixture
+def shared_query_cache(monkeypatch):
+    """query_cache with a shared tier, as with REDIS_URL set."""
+    import shared_cache
+    from database import QueryCache
+    from tests.test_shared_cache import FakeRedis
+
+    tier = shared_cache.RedisTier(client=FakeRedis())
+    tier.ensure_listener = lambda: None
+    cache = QueryCache(ttl_seconds=60, tier=tier)
+    monkeypatch.setattr("database.query_cache", cache)
+    return cache
+
+
+@pytest.mark.no_server
+def test_per_user_tags_follow_the_user_cache(versions, shared_query_cache):
+    calls = []
+    client = make_app(calls).test_client()
+
+    assert "ETag" not in client.get("/mine").headers
+
+    client.get("/login/41")
+    tag = client.get("/mine").headers["ETag"]
+    assert tag.startswith('W/"provinces_map-7-41-')
+    assert client.get("/mine", headers={"If-None-Match": tag}).status_code == 304
+
+    invalidate_user_cache(41)
+    refreshed = client.get("/mine", headers={"If-None-Match": tag})
+    assert refreshed.status_code == 200
+    assert refreshed.headers["ETag"] != tag
+    assert calls == ["mine", "mine", "mine"]
+
+
+@pytest.mark.no_server
+def test_per_user_responses_untagged_without_the_shared_tier(versions, monkeypatch):
+    from database import QueryCache
+
+    # Each worker would mint its own token, so no tag at all
+    monkeypatch.setattr("database.query_cache", QueryCache(ttl_seconds=60))
+    calls = []
+    client = make_app(calls).test_client()
+    client.get("/login/41")
+    assert "ETag" not in client.get("/mine").headers
+    assert client.get("/nodes").headers["ETag"] == 'W/"world_map-3"'
+
+
+@pytest.mark.skipif(
+    not os.getenv("DATABASE_PUBLIC_URL") and not os.getenv("DATABASE_URL"),
+    reason="Requires Postgres (DATABASE_PUBLIC_URL or DATABASE_URL)",
+)
+def test_bump_advances_the_version(monkeypatch):
+    from contextlib import contextmanager
+
+    from database import get_db_connection
+
+    with get_db_connection() as conn:
+        db = conn.cursor()
+
+        @contextmanager
+        def same_transaction(cursor_factory=None, read_only=False):
+            yield conn.cursor()
+
+        monkeypatch.setattr("database.get_request_cursor", same_transaction)
+        try:
+            # Without the table the caller's transaction survives
+            db.execute("CREATE TEMP TABLE etag_probe (id INTEGER)")
+            etags.bump(db, "world_map")
+            db.execute("INSERT INTO etag_probe VALUES (1)")
+
+            db.execute(
+                "CREATE TEMP TABLE etag_versions ("
+                " scope VARCHAR(64) PRIMARY KEY,"
+                " version BIGINT NOT NULL DEFAULT 0,"
+                " updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW())"
+            )
+            query_cache.delete("etag_version_world_map")
+            before = etags.version("world_map")
+            etags.bump(db, "world_map")
+            etags.bump(db, "world_map")
+            after = etags.version("world_map")
+            cached = etags.version("world_map")
+        finally:
+            conn.rollback()
+            query_cache.delete("etag_version_world_map")
+
+    assert (before, after, cached) == (0, 2, 2)
@@ -0,0 +1,138 @@
+"""Persisted hex adjacency and the ?since= delta feed of the game map."""
+
+import json
+import os
+from contextlib import contextmanager
+
+import pytest
+from flask import Flask
+
+from app_core.game_map import routes
+from app_core.game_map.changes import mark_changed, mark_placed, rebuild_adjacency
+
+SCHEMA = """
+CREATE TEMP TABLE users (id INTEGER PRIMARY KEY, username TEXT);
+CREATE TEMP TABLE provinces (
+    id INTEGER PRIMARY KEY, provinceName TEXT, userId INTEGER,
+    coordinate_x INTEGER, coordinate_y INTEGER,
+    pop_working BIGINT, pop_children BIGINT, pop_elderly BIGINT
+);
+CREATE TEMP TABLE stats (id INTEGER PRIMARY KEY, gold BIGINT);
+CREATE TEMP TABLE military (id INTEGER PRIMARY KEY, soldiers BIGINT);
+CREATE TEMP TABLE map_unit_deployments (
+    province_id INTEGER, user_id INTEGER, soldiers INTEGER
+);
+CREATE TEMP TABLE map_combat_log (
+    id SERIAL PRIMARY KEY, attacker_id INTEGER, defender_id INTEGER,
+    province_id INTEGER, attacker_soldiers INTEGER, defender_soldiers INTEGER,
+    result TEXT, occurred_at TIMESTAMPTZ DEFAULT NOW(), map_version BIGINT
+);
+CREATE TEMP TABLE etag_versions (
+    scope VARCHAR(64) PRIMARY KEY, version BIGINT NOT NULL DEFAULT 0,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+CREATE TEMP TABLE map_province_adjacency (
+    province_id INTEGER REFERENCES provinces(id) ON DELETE CASCADE,
+    neighbor_id INTEGER REFERENCES provinces(id) ON DELETE CASCADE,
+    PRIMARY KEY (province_id, neighbor_id)
+);
+CREATE TEMP TABLE map_province_versions (
+    province_id INTEGER PRIMARY KEY, version BIGINT NOT NULL
+);
+"""
+
+
+@pytest.mark.skipif(
+    not os.getenv("DATABASE_PUBLIC_URL") and not os.getenv("DATABASE_URL"),
+    reason="Requires Postgres (DATABASE_PUBLIC_URL or DATABASE_URL)",
+)
+def test_delta_feed_sends_only_changes(monkeypatch):
+    from database import get_db_connection, query_cache
+
+    def payload(since=None, fmt=None):
+        with Flask(__name__).app_context():
+            return json.loads(routes._game_map_data_inner(1, since, fmt).data)
+
+    with get_db_connection() as conn:
+        db = conn.cursor()
+
+        @contextmanager
+        def same_transaction(cursor_factory=None, read_only=False):
+            yield conn.cursor()
+
+        monkeypatch.setattr(routes, "get_request_cursor", same_transaction)
+        try:
+            db.execute(SCHEMA)
+            db.execute(
+                "INSERT INTO users VALUES (1, 'Avalon'), (2, 'Lyonesse');"
+                "INSERT INTO provinces VALUES"
+                " (10, 'West', 1, 0, 0, 100, 0, 0),"
+                " (11, 'Mid', 1, 1, 0, 200, 0, 0),"
+                " (12, 'East', 2, 2, 0, 300, 0, 0),"
+                " (13, 'Isle', 2, 5, 5, 400, 0, 0);"
+                "INSERT INTO stats VALUES (1, 50);"
+                "INSERT INTO military VALUES (1, 7);"
+            )
+            rebuild_adjacency(db)
+            full = payload()
+            compact = payload(fmt="columns")
+
+            db.execute("INSERT INTO map_unit_deployments VALUES (12, 2, 500)")
+            deployed = mark_changed(db, [12])
+            db.execute(
+                "INSERT INTO map_combat_log (attacker_id, defender_id, province_id,"
+                " attacker_soldiers, defender_soldiers, result, map_version)"
+                " VALUES (2, 1, 11, 500, 0, 'defender_won', %s)",
+                (deployed,),
+            )
+            delta = payload(since=full["version"])
+
+            # A province placed next to West stamps its new neighbour too
+            db.execute("INSERT INTO provinces VALUES (14, 'Cove', 1, -1, 0, 1, 0, 0)")
+            placed = mark_placed(db, [14])
+            after_place = payload(since=deployed)
+
+            mark_changed(db, [13], with_neighbors=True)
+            db.execute("DELETE FROM provinces WHERE id = 13")
+            after_delete = payload(since=placed)
+
+            mark_changed(db)
+            stale = payload(since=placed)
+        finally:
+            conn.rollback()
+            query_cache.delete("etag_version_provinces_map")
+
+    assert full["since"] is None
+    assert full["adjacency"] == {"10": [11], "11": [10, 12], "12": [11], "13": []}
+    assert [p["id"] for p in full["provinces"]] == [10, 11, 12, 13]
+    assert (full["gold"], full["soldiers_stockpile"]) == (50, 7)
+
+    # Same rows as a table, owner names through the string table
+    fields = compact["provinces"]["fields"]
+    columns = dict(zip(fields, compact["provinces"]["values"]))
+    assert compact["strings"] == ["Avalon", "Lyonesse"]
+    assert columns["owner_name"] == [0, 0, 1, 1]
+    assert columns["is_mine"] == [True, True, False, False]
+    assert [dict(zip(fields, row)) for row in zip(*compact["provinces"]["values"])][
+        0
+    ] == {
+        **full["provinces"][0],
+        "owner_name": 0,
+    }
+
+    assert delta["since"] == full["version"] and delta["version"] == deployed
+    assert [(p["id"], p["deployed_soldiers"]) for p in delta["provinces"]] == [
+        (12, 500)
+    ]
+    assert delta["adjacency"] == {"12": [11]}
+    assert [e["province"] for e in delta["combat_log"]] == ["Mid"]
+
+    assert [p["id"] for p in after_place["provinces"]] == [10, 14]
+    assert after_place["adjacency"] == {"10": [11, 14], "14": [10]}
+    assert after_place["combat_log"] == []
+
+    assert after_delete["removed"] == [13]
+    assert after_delete["provinces"] == []
+
+    assert stale["since"] is None
+    assert [p["id"] for p in stale["provinces"]] == [10, 11, 12, 14]
@@ -0,0 +1,87 @@
+import tasks
+from tests.test_generate_revenue_mock import make_conn
+
+
+def _locks_taken(monkeypatch):
+    taken = []
+
+    def fake_lock(_conn, lock_id, label):
+        taken.append((lock_id, label))
+        return True
+
+    monkeypatch.setattr("app_core.game_ticks.revenue.try_pg_advisory_lock", fake_lock)
+    return taken
+
+
+def test_shard_filters_by_owner_and_uses_own_cursor(monkeypatch):
+    conn, db, _ = make_conn()
+    # Sharded runs skip the task_runs read, so the first fetchone is the cursor
+    db._fetchone_returns = [(0,)]
+    monkeypatch.setattr("database.get_db_connection", lambda: conn)
+    taken = _locks_taken(monkeypatch)
+
+    assert tasks.generate_province_revenue(2, 4) is True
+
+    assert taken == [(900202, "generate_province_revenue:2/4")]
+    chunk_query = [
+        (q, p) for q, p in db.calls if "FROM provinces p" in q and "LIMIT" in q
+    ][0]
+    assert "mod(p.userId, %s) = %s" in chunk_query[0]
+    assert chunk_query[1] == (0, 4, 2, 500)
+
+    cursor_writes = [p for q, p in db.calls if "UPDATE task_cursors" in q]
+    assert cursor_writes and all(
+        p[-1] == "generate_province_revenue:2/4" for p in cursor_writes
+    )
+    # Only the chord finalizer advances task_runs for a sharded run
+    assert not any("FOR UPDATE" in q for q, _ in db.calls)
+    assert not any("UPDATE task_runs" in q for q, _ in db.calls)
+
+
+def test_unsharded_run_keeps_global_lock_and_cursor(monkeypatch):
+    conn, db, _ = make_conn()
+    monkeypatch.setattr("database.get_db_connection", lambda: conn)
+    taken = _locks_taken(monkeypatch)
+
+    tasks.generate_province_revenue()
+
+    assert taken == [(9002, "generate_province_revenue")]
+    assert not any("mod(p.userId" in q for q, _ in db.calls)
+    assert any("UPDATE task_runs" in q for q, _ in db.calls)
+
+
+def test_finalizer_only_advances_when_a_shard_committed(monkeypatch):
+    conn, db, _ = make_conn()
+    monkeypatch.setattr("database.get_db_connection", lambda: conn)
+
+    assert tasks.finalize_province_revenue([False, None, False]) is False
+    assert not db.calls
+
+    assert tasks.finalize_province_revenue([False, True]) is True
+    assert db.calls == [
+        (
+            "UPDATE task_runs SET last_run = now() WHERE task_name = %s",
+            ("generate_province_revenue",),
+        )
+    ]
+
+
+def test_dispatcher_fans_out_one_task_per_shard(monkeypatch):
+    dispatched = {}
+
+    def fake_chord(header):
+        dispatched["header"] = list(header)
+        return lambda callback: dispatched.setdefault("callback", callback)
+
+    monkeypatch.setenv("PROVINCE_REVENUE_SHARDS", "3")
+    monkeypatch.setattr("app_core.game_ticks.locks._get_redis_client", lambda: None)
+    monkeypatch.setattr("tasks.claim_province_revenue_run", lambda: True)
+    monkeypatch.setattr("tasks.chord", fake_chord)
+
+    tasks.task_generate_province_revenue()
+
+    assert [sig.args for sig in dispatched["header"]] == [(0, 3), (1, 3), (2, 3)]
+    assert {sig.task for sig in dispatched["header"]} == {
+        "tasks.task_generate_province_revenue_shard"
+    }
+    assert dispatched["callback"].task == "tasks.task_finalize_province_revenue"
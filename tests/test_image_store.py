@@ -0,0 +1,191 @@
+"""Content-addressed image store and its immutable URLs (image_store.py)."""
+
+import base64
+import hashlib
+import os
+from io import BytesIO
+
+import pytest
+from flask import Flask
+from PIL import Image
+
+import image_store
+from image_store import LocalImageStore, store_image
+
+
+def png(size=(800, 600), mode="RGBA"):
+    buffer = BytesIO()
+    Image.new(mode, size, (200, 30, 30, 128)).save(buffer, format="PNG")
+    return buffer.getvalue()
+
+
+def make_app(store):
+    app = Flask(__name__)
+
+    @app.route("/img/<name>")
+    def serve_image(name):
+        return image_store.send_image(name, store)
+
+    @app.route("/flag/<key>")
+    def flag(key):
+        return image_store.redirect_to_image(key)
+
+    return app
+
+
+@pytest.mark.no_server
+def test_upload_is_stored_once_with_its_variants(tmp_path):
+    store = LocalImageStore(str(tmp_path))
+    key = store_image(png(), "province", store)
+    assert store_image(BytesIO(png()), "province", store) == key
+
+    jpg = store.get(f"{key}.jpg")
+    assert hashlib.sha256(jpg).hexdigest() == key
+    assert Image.open(BytesIO(jpg)).size == (800, 600)
+    assert Image.open(BytesIO(store.get(f"{key}.webp"))).format == "WEBP"
+    assert Image.open(BytesIO(store.get(f"{key}.thumb.webp"))).size == (240, 180)
+    assert store.get(f"{'0' * 64}.jpg") is None
+    assert len(list(tmp_path.rglob("*"))) == 4  # one fan-out dir, three blobs
+
+    with pytest.raises(ValueError):
+        store_image(b"not an image", "flag", store)
+
+
+@pytest.mark.no_server
+def test_served_immutable_with_etag_and_ranges(tmp_path):
+    store = LocalImageStore(str(tmp_path))
+    key = store_image(png((1000, 1000)), "flag", store)
+    client = make_app(store).test_client()
+
+    full = client.get(f"/img/{key}.webp")
+    assert full.status_code == 200 and full.mimetype == "image/webp"
+    assert "immutable" in full.headers["Cache-Control"]
+    assert full.cache_control.max_age == image_store.IMMUTABLE_MAX_AGE
+    assert full.get_etag() == (f"{key}.webp", False)
+
+    part = client.get(f"/img/{key}.webp", headers={"Range": "bytes=0-9"})
+    assert part.status_code == 206 and part.data == full.data[:10]
+    cached = client.get(f"/img/{key}.webp", headers={"If-None-Match": f'"{key}.webp"'})
+    assert cached.status_code == 304
+
+    assert client.get(f"/img/{'0' * 64}.jpg").status_code == 404
+    assert client.get(f"/img/{key}.png").status_code == 404
+    assert client.get("/img/..%2Fsecret.jpg").status_code == 404
+
+
+@pytest.mark.no_server
+def test_missing_blob_is_rebuilt_from_the_database_copy(tmp_path, monkeypatch):
+    # Uploaded on another replica (or before a redeploy wiped var/images)
+    elsewhere = LocalImageStore(str(tmp_path / "elsewhere"))
+    key = store_image(png(), "province", elsewhere)
+    monkeypatch.delenv("IMAGE_STORE_S3_BUCKET", raising=False)
+    monkeypatch.delenv("IMAGE_STORE_DIR", raising=False)
+    copy = image_store.database_copy(key, elsewhere)
+    monkeypatch.setattr(
+        image_store, "_database_copy", lambda k: (base64.b64decode(copy), "province")
+    )
+
+    here = LocalImageStore(str(tmp_path / "here"))
+    client = make_app(here).test_client()
+    jpg = client.get(f"/img/{key}.jpg")
+    assert jpg.status_code == 200 and jpg.data == elsewhere.get(f"{key}.jpg")
+    assert client.get(f"/img/{key}.thumb.webp").status_code == 200
+    assert here.get(f"{key}.webp") is not None
+
+    # A durable store needs no copy in the row
+    monkeypatch.setenv("IMAGE_STORE_DIR", str(tmp_path))
+    assert image_store.database_copy(key, elsewhere) is None
+
+
+@pytest.mark.no_server
+def test_legacy_urls_redirect_by_accept(tmp_path):
+    client = make_app(LocalImageStore(str(tmp_path))).test_client()
+    key = "a" * 64
+
+    webp = client.get(f"/flag/{key}", headers={"Accept": "image/webp,*/*"})
+    assert webp.status_code == 302
+    assert webp.headers["Location"].endswith(f"/img/{key}.webp")
+    assert "Accept" in webp.headers["Vary"]
+
+    jpg = client.get(f"/flag/{key}", headers={"Accept": "image/png,*/*;q=0.5"})
+    assert jpg.headers["Location"].endswith(f"/img/{key}.jpg")
+
+
+@pytest.mark.skipif(
+    not os.getenv("DATABASE_PUBLIC_URL") and not os.getenv("DATABASE_URL"),
+    reason="Requires Postgres (DATABASE_PUBLIC_URL or DATABASE_URL)",
+)
+def test_backfill_moves_base64_rows_to_keys(tmp_path, monkeypatch):
+    from database import get_db_connection
+    from scripts.migrate_images_to_store import migrate_table
+
+    store = LocalImageStore(str(tmp_path))
+    monkeypatch.setattr(image_store, "_store", store)
+    banner = base64.b64encode(png()).decode()
+
+    with get_db_connection() as conn:
+        db = conn.cursor()
+        try:
+            db.execute(
+                "CREATE TEMP TABLE provinces (id INTEGER PRIMARY KEY,"
+                " image_data TEXT, image_key TEXT)"
+            )
+            db.execute(
+                "INSERT INTO provinces VALUES (1, %s, NULL),"
+                " (2, 'bm90IGFuIGltYWdl', NULL), (3, NULL, NULL), (4, %s, NULL)",
+                (banner, banner),
+            )
+            # No durable store: rows keep the stored JPEG
+            monkeypatch.delenv("IMAGE_STORE_S3_BUCKET", raising=False)
+            monkeypatch.delenv("IMAGE_STORE_DIR", raising=False)
+            result = migrate_table(
+                conn, "provinces", "image_data", "image_key", "province", 1
+            )
+            db.execute("SELECT image_data FROM provinces WHERE id = 1")
+            kept = base64.b64decode(db.fetchone()[0])
+
+            monkeypatch.setenv("IMAGE_STORE_DIR", str(tmp_path))
+            db.execute("UPDATE provinces SET image_key = NULL WHERE id IN (1, 4)")
+            durable_result = migrate_table(
+                conn, "provinces", "image_data", "image_key", "province", 1
+            )
+            db.execute(
+                "SELECT id, image_data IS NULL, image_key FROM provinces ORDER BY id"
+            )
+            rows = db.fetchall()
+        finally:
+            # migrate_table commits per batch, so the table has to go explicitly
+            conn.rollback()
+            db.execute("DROP TABLE IF EXISTS pg_temp.provinces")
+            conn.commit()
+
+    key = store_image(png(), "province", store)
+    assert result == (2, 1)
+    assert hashlib.sha256(kept).hexdigest() == key
+    assert durable_result == (2, 1)
+    assert rows == [(1, True, key), (2, False, None), (3, True, None), (4, True, key)]
+
+
+@pytest.mark.no_server
+def test_app_keeps_the_image_cache_headers(tmp_path, monkeypatch):
+    from app import app
+    from app_core.main import routes
+
+    store = LocalImageStore(str(tmp_path))
+    key = store_image(png(), "flag", store)
+    monkeypatch.setattr(image_store, "_store", store)
+    monkeypatch.setattr(routes, "_flag_key", lambda flag_type, flag_id: key)
+    client = app.test_client()
+
+    blob = client.get(f"/img/{key}.jpg")
+    assert blob.status_code == 200
+    assert blob.cache_control.public and blob.cache_control.immutable
+    assert not blob.cache_control.private
+    assert blob.cache_control.max_age == image_store.IMMUTABLE_MAX_AGE
+
+    legacy = client.get("/flag/country/1")
+    assert legacy.status_code == 302
+    assert (
+        legacy.headers["Cache-Control"]
+        == f"public, max-age={image_store.REDIRECT_MAX_AGE}"
+    )
@@ -0,0 +1,67 @@
+"""Startup import budget (python -X importtime).
+
+The tick modules must not pull in Celery or Redis (tasks.py owns the
+Celery app), and the web app must not import the modules it only needs
+on specific requests. Time budgets are generous and can be raised with
+IMPORT_BUDGET_MS / APP_IMPORT_BUDGET_MS on slow machines.
+"""
+import os
+import subprocess
+import sys
+
+import pytest
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+TICK_MODULES = [
+    "app_core.game_ticks.common",
+    "app_core.game_ticks.locks",
+    "app_core.game_ticks.food",
+    "app_core.game_ticks.energy",
+    "app_core.game_ticks.taxes",
+    "app_core.game_ticks.population",
+    "app_core.game_ticks.revenue",
+    "app_core.game_ticks.maintenance",
+]
+WORKER_ONLY = {"celery", "kombu", "redis", "tasks"}
+REQUEST_ONLY = {"requests", "requests_oauthlib", "markdown"}
+
+
+def importtime(module):
+    """Return {module: cumulative microseconds} for ``import module``."""
+    proc = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        # The shared cache's listener thread would import redis in the
+        # background when REDIS_URL is set
+        env={**os.environ, "CACHE_BACKEND": "local"},
+        capture_output=True,
+        text=True,
+        timeout=120,
+    )
+    assert proc.returncode == 0, proc.stderr[-2000:]
+    timings = {}
+    for line in proc.stderr.splitlines():
+        if not line.startswith("import time:") or "|" not in line:
+            continue
+        _, cumulative, name = line.split("|")
+        if cumulative.strip().isdigit():
+            timings[name.strip()] = int(cumulative)
+    return timings
+
+
+@pytest.mark.no_server
+@pytest.mark.parametrize("module", TICK_MODULES)
+def test_tick_modules_do_not_import_celery_or_redis(module):
+    timings = importtime(module)
+    assert not WORKER_ONLY & timings.keys()
+    budget_ms = int(os.getenv("IMPORT_BUDGET_MS", "1500"))
+    assert timings[module] / 1000 < budget_ms
+
+
+@pytest.mark.no_server
+def test_app_startup_defers_worker_and_request_only_imports():
+    timings = importtime("app")
+    assert not (WORKER_ONLY | REQUEST_ONLY) & timings.keys()
+    budget_ms = int(os.getenv("APP_IMPORT_BUDGET_MS", "5000"))
+    assert timings["app"] / 1000 < budget_ms
@@ -7,17 +7,19 @@ import copy
 
 # Global lock to make FakeCursor.execute atomic across threads in tests
 FAKE_DB_LOCK = threading.Lock()
-# Simulated advisory locks for pg_try_advisory_lock / pg_advisory_unlock
+# Simulated advisory locks for pg_try_advisory_xact_lock: held until the
+# connection's transaction ends
 FAKE_ADVISORY_LOCKS = set()
 
 
 class FakeCursor:
-    def __init__(self, state, global_state=None):
+    def __init__(self, state, global_state=None, held_locks=None):
         # `state` is the working copy for this connection, `global_state` is
         # the shared state visible to all connections. Some operations (like
         # DELETE ... RETURNING) need to be atomic against the global state.
         self.state = state
         self._global_state = global_state if global_state is not None else state
+        self._held_locks = held_locks if held_locks is not None else set()
         self._last = None
 
     def execute(self, sql, params=None):
@@ -29,7 +31,7 @@ class FakeCursor:
             sql_lower = sql.lower()
             print(f"[FAKE_DB] EXECUTE: {sql_lower} params={params}")
             # Simulate advisory lock calls
-            if "pg_try_advisory_lock" in sql_lower:
+            if "pg_try_advisory_xact_lock" in sql_lower:
                 lock_id = params[0]
                 try:
                     lock_id = int(lock_id)
@@ -38,9 +40,10 @@ class FakeCursor:
                 print("[FAKE_DB] advisory locks before try:", FAKE_ADVISORY_LOCKS)
                 if lock_id in FAKE_ADVISORY_LOCKS:
                     self._last = (False,)
-                    print(f"[FAKE_DB] pg_try_advisory_lock({lock_id}) -> False")
+                    print(f"[FAKE_DB] pg_try_advisory_xact_lock({lock_id}) -> False")
                 else:
                     FAKE_ADVISORY_LOCKS.add(lock_id)
+                    self._held_locks.add(lock_id)
                     # When a lock is acquired in a connection, refresh the
                     # connection's working snapshot to reflect the latest global
                     # state so subsequent SELECTs see the most recent data.
@@ -50,7 +53,7 @@ class FakeCursor:
                     except Exception:
                         pass
                     self._last = (True,)
-                    print(f"[FAKE_DB] pg_try_advisory_lock({lock_id}) -> True")
+                    print(f"[FAKE_DB] pg_try_advisory_xact_lock({lock_id}) -> True")
                     print(f"[FAKE_DB] advisory locks after add: {FAKE_ADVISORY_LOCKS}")
                 return
             if "pg_advisory_unlock" in sql_lower:
@@ -345,10 +348,17 @@ class FakeConn:
         self._global_state = state
         self.state = copy.deepcopy(state)
         self._snapshot = copy.deepcopy(state)
+        self.held_locks = set()
 
     def cursor(self, cursor_factory=None, **kwargs):
         # Accept and ignore cursor_factory/kwargs so tests can simulate psycopg2
-        return FakeCursor(self.state, self._global_state)
+        return FakeCursor(self.state, self._global_state, self.held_locks)
+
+    def end_transaction(self):
+        # Transaction-level advisory locks go with the transaction
+        with FAKE_DB_LOCK:
+            FAKE_ADVISORY_LOCKS.difference_update(self.held_locks)
+        self.held_locks.clear()
 
     def commit(self):
         # Merge working copy back to the global state, but only overwrite
@@ -389,6 +399,7 @@ def fake_get_db_connection_factory(state):
                     self._conn.commit()
                 except Exception:
                     pass
+            self._conn.end_transaction()
             # Do not suppress exceptions
             return False
 
@@ -902,6 +913,7 @@ def fake_get_request_cursor_factory(state):
                     self._conn.commit()
                 except Exception:
                     pass
+            self._conn.end_transaction()
             return False
 
     return CM
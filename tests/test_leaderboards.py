@@ -0,0 +1,104 @@
+"""Leaderboard snapshots: ranking, previous-rank deltas and readers."""
+import os
+
+import pytest
+
+from app_core import leaderboards
+from app_core.leaderboards import fetch_leaderboard, rank_arrow, refresh_leaderboards
+
+
+@pytest.mark.no_server
+def test_rank_arrow():
+    assert rank_arrow(None) == "NEW"
+    assert rank_arrow(3) == "▲3"
+    assert rank_arrow(-2) == "▼2"
+    assert rank_arrow(0) == "="
+
+
+@pytest.mark.no_server
+def test_fetch_leaderboard_computes_rank_change(monkeypatch):
+    rows = [
+        {"rank": 1, "previous_rank": 4, "entity_id": 7, "name": "a", "score": 9},
+        {"rank": 2, "previous_rank": None, "entity_id": 8, "name": "b", "score": 5},
+    ]
+    monkeypatch.setattr(
+        leaderboards.QueryHelper, "fetch_all", staticmethod(lambda *a, **k: rows)
+    )
+    entries = fetch_leaderboard("influence")
+    assert [(e["rank_change"], e["rank_arrow"]) for e in entries] == [
+        (3, "▲3"),
+        (None, "NEW"),
+    ]
+    with pytest.raises(ValueError):
+        fetch_leaderboard("no_such_board")
+
+
+SCHEMA = """
+CREATE TEMP TABLE users (id INTEGER PRIMARY KEY, username TEXT);
+CREATE TEMP TABLE stats (id INTEGER PRIMARY KEY, gold BIGINT);
+CREATE TEMP TABLE user_military (user_id INTEGER, unit_id INTEGER, quantity INTEGER);
+CREATE TEMP TABLE nation_influence (
+    user_id INTEGER PRIMARY KEY, influence BIGINT NOT NULL DEFAULT 0,
+    province_count INTEGER NOT NULL DEFAULT 0,
+    province_population BIGINT NOT NULL DEFAULT 0
+);
+CREATE TEMP TABLE leaderboard_snapshots (
+    board VARCHAR(32) NOT NULL, rank INTEGER NOT NULL,
+    entity_id INTEGER NOT NULL, name TEXT, score NUMERIC NOT NULL DEFAULT 0,
+    previous_rank INTEGER, updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW(),
+    PRIMARY KEY (board, entity_id)
+);
+"""
+
+
+@pytest.mark.skipif(
+    not os.getenv("DATABASE_PUBLIC_URL") and not os.getenv("DATABASE_URL"),
+    reason="Requires Postgres (DATABASE_PUBLIC_URL or DATABASE_URL)",
+)
+def test_refresh_tracks_previous_rank_and_prunes(monkeypatch):
+    from database import get_db_connection
+
+    monkeypatch.setattr(leaderboards, "get_coalition_members_table", lambda: None)
+
+    def board(db, name):
+        db.execute(
+            "SELECT rank, entity_id, previous_rank FROM leaderboard_snapshots "
+            "WHERE board = %s ORDER BY rank",
+            (name,),
+        )
+        return db.fetchall()
+
+    with get_db_connection() as conn:
+        try:
+            db = conn.cursor()
+            db.execute(SCHEMA)
+            db.execute("INSERT INTO users VALUES (1, 'a'), (2, 'b'), (3, 'c')")
+            db.execute("INSERT INTO stats VALUES (1, 10), (2, 20), (3, 5)")
+            db.execute(
+                "INSERT INTO nation_influence VALUES "
+                "(1, 100, 1, 50), (2, 300, 2, 10), (3, 200, 0, 0)"
+            )
+            written = refresh_leaderboards(db, depth=2)
+            first = board(db, "influence")
+            population = board(db, "population")
+            conn.commit()
+
+            # Next refresh happens in a later transaction
+            db.execute("UPDATE nation_influence SET influence = 400 WHERE user_id = 1")
+            refresh_leaderboards(db, depth=2)
+            second = board(db, "influence")
+        finally:
+            conn.rollback()
+            db.execute(
+                "DROP TABLE IF EXISTS pg_temp.users, pg_temp.stats, "
+                "pg_temp.user_military, pg_temp.nation_influence, "
+                "pg_temp.leaderboard_snapshots"
+            )
+            conn.commit()
+
+    assert written["influence"] == 2
+    assert first == [(1, 2, None), (2, 3, None)]
+    # Nation 3 has no provinces, so it is not on the population board
+    assert population == [(1, 1, None), (2, 2, None)]
+    # Nation 1 enters at the top, 2 drops a place, 3 falls off the board
+    assert second == [(1, 1, None), (2, 2, 1)]
@@ -0,0 +1,153 @@
+"""One-query military state of a nation (attack_scripts/military_snapshot.py)."""
+
+import os
+from contextlib import contextmanager
+
+import pytest
+from flask import Flask
+
+from attack_scripts import military_snapshot as snapshots
+from attack_scripts.military_snapshot import MilitarySnapshot, load_snapshot
+
+SNAPSHOT = MilitarySnapshot(
+    user_id=1,
+    units={"soldiers": 900, "tanks": 0, "bombers": 40, "cruisers": 40, "spies": 2},
+    unusable=frozenset({"bombers"}),
+    defense=("soldiers", "tanks", "bombers"),
+    buildings={"army_bases": 1, "harbours": 3, "aerodromes": 1, "admin_buildings": 5},
+    increased_funding=True,
+)
+
+
+@pytest.mark.no_server
+def test_snapshot_answers_the_military_helpers():
+    assert SNAPSHOT.military()["artillery"] == 0
+    assert SNAPSHOT.special() == {"spies": 2, "icbms": 0, "nukes": 0}
+    assert SNAPSHOT.particular(["Soldiers", "nukes"]) == [900, 0]
+    # Ties keep list order
+    assert SNAPSHOT.defending_units() == {
+        "soldiers": 900,
+        "bombers": 40,
+        "cruisers": 40,
+    }
+
+    limits = SNAPSHOT.limits()
+    assert limits["soldiers"] == 4100
+    assert limits["fighters"] == limits["apaches"] == 60
+    assert limits["cruisers"] == 0 and limits["submarines"] == 60
+    assert limits["spies"] == pytest.approx(3 * 1.4)
+    assert (limits["icbms"], limits["nukes"]) == (1, 0)
+
+
+@pytest.mark.no_server
+def test_loaded_once_per_request_until_forgotten(monkeypatch):
+    loads = []
+    modes = []
+
+    @contextmanager
+    def request_cursor(cursor_factory=None, read_only=False):
+        modes.append(read_only)
+        yield None
+
+    def fake_load(user_id, db=None):
+        loads.append(user_id)
+        return SNAPSHOT._replace(user_id=user_id)
+
+    monkeypatch.setattr(snapshots, "load_snapshot", fake_load)
+    monkeypatch.setattr("database.get_request_cursor", request_cursor)
+
+    with Flask(__name__).app_context():
+        from attack_scripts.Nations import Military
+
+        Military.get_military(1)
+        Military.get_limits(1)
+        Military.get_defense(2)
+        snapshots.forget(1)
+        Military.get_special(1)
+
+    assert loads == [1, 2, 1]
+
+    # The primary unless the caller opts in (some GETs fight, e.g. /warResult)
+    app = Flask(__name__)
+    with app.test_request_context(method="GET"):
+        Military.get_military(3)
+    with app.test_request_context(method="GET"):
+        Military.get_military(3, read_only=True)
+        Military.get_defense(3, read_only=True)
+        # A replica copy is not good enough for a caller that needs the primary
+        Military.get_special(3)
+        Military.get_military(3, read_only=True)
+    assert modes == [False, False, False, False, True, False]
+
+
+SCHEMA = """
+CREATE TEMP TABLE unit_dictionary (
+    unit_id INTEGER PRIMARY KEY, name TEXT,
+    maintenance_cost_resource_id INTEGER, is_active BOOLEAN DEFAULT TRUE
+);
+CREATE TEMP TABLE user_military (user_id INTEGER, unit_id INTEGER, quantity INTEGER);
+CREATE TEMP TABLE resource_dictionary (resource_id INTEGER PRIMARY KEY, name TEXT);
+CREATE TEMP TABLE user_economy (user_id INTEGER, resource_id INTEGER, quantity BIGINT);
+CREATE TEMP TABLE stats (id INTEGER PRIMARY KEY, default_defense TEXT);
+CREATE TEMP TABLE building_dictionary (
+    building_id INTEGER PRIMARY KEY, name TEXT, is_active BOOLEAN DEFAULT TRUE
+);
+CREATE TEMP TABLE user_buildings (
+    user_id INTEGER, building_id INTEGER, quantity INTEGER
+);
+CREATE TEMP TABLE tech_dictionary (tech_id INTEGER PRIMARY KEY, name TEXT);
+CREATE TEMP TABLE user_tech (user_id INTEGER, tech_id INTEGER, is_unlocked BOOLEAN);
+"""
+
+
+@pytest.mark.skipif(
+    not os.getenv("DATABASE_PUBLIC_URL") and not os.getenv("DATABASE_URL"),
+    reason="Requires Postgres (DATABASE_PUBLIC_URL or DATABASE_URL)",
+)
+def test_load_snapshot_reads_everything_in_one_query():
+    from database import get_db_connection
+
+    with get_db_connection() as conn:
+        db = conn.cursor()
+        try:
+            db.execute(SCHEMA)
+            db.execute(
+                "INSERT INTO resource_dictionary VALUES (1, 'rations'), (2, 'fuel');"
+                "INSERT INTO unit_dictionary VALUES (1, 'Soldiers', 1, TRUE),"
+                " (2, 'tanks', 2, TRUE), (3, 'spies', NULL, TRUE),"
+                " (4, 'zeppelins', NULL, FALSE);"
+                "INSERT INTO user_military VALUES (7, 1, 500), (7, 4, 9), (8, 2, 3);"
+                "INSERT INTO user_economy VALUES (7, 1, 10), (7, 2, 0);"
+                "INSERT INTO stats VALUES (7, 'soldiers, tanks,artillery');"
+                "INSERT INTO building_dictionary VALUES (1, 'army_bases', TRUE),"
+                " (2, 'harbours', TRUE), (3, 'farms', TRUE);"
+                "INSERT INTO user_buildings VALUES (7, 1, 2), (7, 1, 3), (7, 3, 40);"
+                "INSERT INTO tech_dictionary VALUES (1, 'increased_funding');"
+                "INSERT INTO user_tech VALUES (7, 1, TRUE);"
+            )
+            calls = []
+
+            class CountingCursor:
+                def __init__(self, cursor):
+                    self.cursor = cursor
+
+                def execute(self, *args):
+                    calls.append(args)
+                    return self.cursor.execute(*args)
+
+                def __getattr__(self, name):
+                    return getattr(self.cursor, name)
+
+            snapshot = load_snapshot(7, CountingCursor(conn.cursor()))
+            stranger = load_snapshot(9, conn.cursor())
+        finally:
+            conn.rollback()
+
+    assert len(calls) == 1
+    assert snapshot.units == {"soldiers": 500, "tanks": 0, "spies": 0}
+    assert snapshot.unusable == {"tanks"}
+    assert snapshot.defense == ("soldiers", "tanks", "artillery")
+    assert snapshot.buildings == {"army_bases": 5, "harbours": 0}
+    assert snapshot.increased_funding is True
+    assert stranger.defense == () and stranger.unusable == {"Soldiers", "tanks"}
+    assert stranger.increased_funding is False
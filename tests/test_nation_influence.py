@@ -0,0 +1,124 @@
+"""nation_influence snapshot: one Python weights table drives both the
+in-process score and the SQL refresh."""
+import os
+
+import pytest
+
+from app_core.economy.influence import (
+    COMPONENT_COLUMNS,
+    INFLUENCE_WEIGHTS,
+    components_sql,
+    influence_expression,
+    influence_score,
+    refresh_nation_influence,
+)
+
+NATION = {
+    "soldiers": 1000,
+    "tanks": 10,
+    "nukes": 1,
+    "gold": 2_000_000,
+    "province_count": 3,
+    "city_count": 4,
+    "total_land": 25,
+    "total_resources": 12_345,
+}
+
+
+@pytest.mark.no_server
+def test_score_matches_published_formula():
+    # (provinces*300) + (soldiers*0.02) + (tanks*0.8) + (nukes*500)
+    # + (cities*10) + (land*10) + (rss*0.001) + (money*0.00001)
+    expected = round(900 + 20 + 8 + 500 + 40 + 250 + 12.345 + 20)
+    assert influence_score(NATION) == expected
+    row = tuple(NATION.get(column, 0) for column in COMPONENT_COLUMNS)
+    assert influence_score(row) == expected
+    assert influence_score({}) == 0
+
+
+@pytest.mark.no_server
+def test_sql_is_generated_from_the_weights():
+    expression = influence_expression("c")
+    for name in INFLUENCE_WEIGHTS:
+        assert f"c.{name}" in expression
+    assert "%(user_ids)s" in components_sql(user_filter=True)
+    assert "%" not in components_sql()
+
+
+SCHEMA = """
+CREATE TEMP TABLE users (id INTEGER PRIMARY KEY);
+CREATE TEMP TABLE stats (id INTEGER PRIMARY KEY, gold BIGINT);
+CREATE TEMP TABLE provinces (
+    id SERIAL PRIMARY KEY, userid INTEGER, citycount INTEGER,
+    land INTEGER, population BIGINT
+);
+CREATE TEMP TABLE unit_dictionary (unit_id INTEGER PRIMARY KEY, name TEXT);
+CREATE TEMP TABLE user_military (
+    user_id INTEGER, unit_id INTEGER, quantity INTEGER
+);
+CREATE TEMP TABLE user_economy (
+    user_id INTEGER, resource_id INTEGER, quantity BIGINT
+);
+CREATE TEMP TABLE nation_influence (
+    user_id INTEGER PRIMARY KEY,
+    influence BIGINT NOT NULL DEFAULT 0,
+    province_count INTEGER NOT NULL DEFAULT 0,
+    province_population BIGINT NOT NULL DEFAULT 0,
+    war_eligible BOOLEAN NOT NULL DEFAULT TRUE,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+CREATE TEMP TABLE admin_user_controls (
+    user_id INTEGER PRIMARY KEY, is_banned BOOLEAN NOT NULL DEFAULT FALSE
+);
+"""
+
+
+@pytest.mark.skipif(
+    not os.getenv("DATABASE_PUBLIC_URL") and not os.getenv("DATABASE_URL"),
+    reason="Requires Postgres (DATABASE_PUBLIC_URL or DATABASE_URL)",
+)
+def test_refresh_matches_python_score_and_skips_unchanged_rows():
+    from database import get_db_connection
+
+    with get_db_connection() as conn:
+        try:
+            db = conn.cursor()
+            db.execute(SCHEMA)
+            db.execute("INSERT INTO users VALUES (1), (2), (3)")
+            db.execute("INSERT INTO stats VALUES (1, 2000000), (2, 0)")
+            db.execute(
+                "INSERT INTO provinces (userid, citycount, land, population) "
+                "VALUES (1, 1, 10, 500), (1, 3, 15, 700), (1, 0, 0, 0), (2, 1, 1, 9)"
+            )
+            db.execute(
+                "INSERT INTO unit_dictionary VALUES (1, 'soldiers'), (2, 'tanks'), "
+                "(3, 'nukes')"
+            )
+            db.execute(
+                "INSERT INTO user_military VALUES (1, 1, 1000), (1, 2, 10), (1, 3, 1)"
+            )
+            db.execute("INSERT INTO user_economy VALUES (1, 1, 12000), (1, 2, 345)")
+            db.execute("INSERT INTO nation_influence (user_id) VALUES (99)")
+
+            assert refresh_nation_influence(db) == 3
+            db.execute(
+                "SELECT user_id, influence, province_count, province_population "
+                "FROM nation_influence ORDER BY user_id"
+            )
+            snapshot = db.fetchall()
+
+            # Nothing changed, so nothing is rewritten
+            assert refresh_nation_influence(db) == 0
+            db.execute("UPDATE stats SET gold = 0 WHERE id = 1")
+            assert refresh_nation_influence(db, [1, 2]) == 1
+
+            db.execute(components_sql(user_filter=True), {"user_ids": [2]})
+            live_two = influence_score(db.fetchone())
+        finally:
+            conn.rollback()
+
+    assert snapshot == [
+        (1, influence_score(NATION), 3, 1200),
+        (2, live_two, 1, 9),
+        (3, 0, 0, 0),
+    ]
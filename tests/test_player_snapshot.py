@@ -0,0 +1,137 @@
+"""Per-request player snapshot behind the layout context and HUD."""
+
+import os
+
+import pytest
+
+from app_core.onboarding.service import onboarding_status
+from database import invalidate_user_cache, query_cache
+from repositories.user_repository import UserRepository
+
+
+@pytest.mark.no_server
+def test_onboarding_status_from_counts():
+    status = onboarding_status(provinces=1, food_banks=2, in_coalition=False, allies=0)
+    assert status["completed"] == 1
+    assert status["show_checklist"] is True
+    assert status["next_href"] == "/coalitions"
+    assert onboarding_status(0, 0, False, 0)["show_checklist"] is False
+
+
+@pytest.mark.no_server
+def test_snapshot_is_loaded_once_per_request(monkeypatch):
+    import app as application_module
+
+    calls = []
+    monkeypatch.setattr(
+        UserRepository,
+        "get_player_snapshot",
+        staticmethod(lambda user_id: calls.append(user_id) or {"user": user_id}),
+    )
+    with application_module.app.test_request_context():
+        assert application_module.player_snapshot(7) == {"user": 7}
+        assert application_module.player_snapshot(7) == {"user": 7}
+        assert application_module.player_snapshot(8) == {"user": 8}
+    with application_module.app.test_request_context():
+        application_module.player_snapshot(7)
+    assert calls == [7, 8, 7]
+
+
+SCHEMA = """
+CREATE TEMP TABLE users (id INTEGER PRIMARY KEY, username TEXT, coalition_id INTEGER);
+CREATE TEMP TABLE colNames (id INTEGER PRIMARY KEY, name TEXT);
+CREATE TEMP TABLE stats (id INTEGER PRIMARY KEY, gold BIGINT);
+CREATE TEMP TABLE resource_dictionary (resource_id INTEGER PRIMARY KEY, name TEXT);
+CREATE TEMP TABLE user_economy (
+    user_id INTEGER, resource_id INTEGER, quantity BIGINT,
+    PRIMARY KEY (user_id, resource_id)
+);
+CREATE TEMP TABLE provinces (id INTEGER PRIMARY KEY, userId INTEGER);
+CREATE TEMP TABLE building_dictionary (building_id INTEGER PRIMARY KEY, name TEXT);
+CREATE TEMP TABLE user_buildings (
+    user_id INTEGER, building_id INTEGER, quantity INTEGER
+);
+CREATE TEMP TABLE nation_treaties (
+    sender_id INTEGER, recipient_id INTEGER, status TEXT
+);
+CREATE TEMP TABLE admin_user_controls (
+    user_id INTEGER PRIMARY KEY, is_banned BOOLEAN, ban_reason TEXT,
+    kick_pending BOOLEAN
+);
+"""
+
+
+@pytest.mark.skipif(
+    not os.getenv("DATABASE_PUBLIC_URL") and not os.getenv("DATABASE_URL"),
+    reason="Requires Postgres (DATABASE_PUBLIC_URL or DATABASE_URL)",
+)
+def test_snapshot_query_and_invalidation(monkeypatch):
+    from contextlib import contextmanager
+
+    from database import get_db_connection
+
+    with get_db_connection() as conn:
+        db = conn.cursor()
+        queries = []
+
+        @contextmanager
+        def same_transaction(cursor_factory=None, read_only=False):
+            queries.append(read_only)
+            yield conn.cursor(cursor_factory=cursor_factory)
+
+        monkeypatch.setattr(
+            "repositories.user_repository.get_request_cursor", same_transaction
+        )
+        try:
+            db.execute(SCHEMA)
+            db.execute(
+                "INSERT INTO users VALUES (41, 'Avalon', 3), (42, NULL, NULL);"
+                "INSERT INTO colNames VALUES (3, 'Round Table');"
+                "INSERT INTO stats VALUES (41, 1500);"
+                "INSERT INTO resource_dictionary VALUES (1, 'coal'), (2, 'oil');"
+                "INSERT INTO user_economy VALUES (41, 1, 25), (41, 2, 0);"
+                "INSERT INTO provinces VALUES (1, 41), (2, 41);"
+                "INSERT INTO building_dictionary VALUES (5, 'food_banks');"
+                "INSERT INTO user_buildings VALUES (41, 5, 1);"
+                "INSERT INTO admin_user_controls VALUES (41, FALSE, NULL, TRUE);"
+            )
+            query_cache.delete("player_snapshot_41", "player_snapshot_42")
+
+            snapshot = UserRepository.get_player_snapshot(41)
+            assert UserRepository.get_player_snapshot(41) is not None
+            assert queries == [True]
+
+            # Ban and kick state: primary, every time
+            controls = UserRepository.get_admin_controls(41)
+            db.execute(
+                "UPDATE admin_user_controls SET is_banned = TRUE WHERE user_id = 41"
+            )
+            banned = UserRepository.get_admin_controls(41)
+            no_controls = UserRepository.get_admin_controls(42)
+            assert queries == [True, False, False, False]
+
+            empty = UserRepository.get_player_snapshot(42)
+            missing = UserRepository.get_player_snapshot(43)
+
+            db.execute("UPDATE stats SET gold = 10 WHERE id = 41")
+            invalidate_user_cache(41)
+            refreshed = UserRepository.get_player_snapshot(41)
+        finally:
+            conn.rollback()
+            query_cache.delete("player_snapshot_41", "player_snapshot_42")
+
+    assert snapshot["country_name"] == "Avalon"
+    assert (snapshot["coalition_id"], snapshot["coalition_name"]) == (3, "Round Table")
+    assert snapshot["gold"] == 1500
+    assert snapshot["resources"] == {"coal": 25, "oil": 0}
+    # Food bank and coalition done, no ally yet
+    assert snapshot["onboarding"]["completed"] == 2
+    assert "admin_ctrl" not in snapshot
+    assert controls == [False, "", True]
+    assert banned == [True, "", True]
+    assert no_controls is None
+
+    assert empty["country_name"] == "Unknown"
+    assert (empty["gold"], empty["resources"]) == (0, {})
+    assert missing is None
+    assert refreshed["gold"] == 10
@@ -19,6 +19,9 @@ class FakeCursor:
             return self._queue.pop(0)
         return self._fetchall
 
+    def close(self):
+        pass
+
     def __enter__(self):
         return self
 
@@ -82,8 +85,12 @@ def test_population_growth_updates(monkeypatch):
     # 2) task_runs last_run: (None,) to skip rate limit check
     # 3) rations resource_id lookup: (1,)
     dbdict = FakeCursor(fetchone_returns=[(True,), (None,), (1,)])
-    # Queue: provinces, rations rows (key must be "user_id" to match production SQL)
-    dbdict._queue = [provinces, [{"user_id": 1, "rations": 100}]]
+    # Queue: per-user aggregates, rations rows (key must be "user_id" to match
+    # production SQL), distribution buildings, then the first province page
+    aggregates = [
+        {"userid": 1, "province_count": 2, "total_land": 0, "rations_needed": 1}
+    ]
+    dbdict._queue = [aggregates, [{"user_id": 1, "rations": 100}], [], provinces]
     conn = FakeConn(dbdict)
 
     # monkeypatch connection used in population_growth
@@ -114,3 +121,88 @@ def test_population_growth_updates(monkeypatch):
         f"Expected at least one execute_batch call writing to provinces or "
         f"user_economy, got: {[q[:80] for q, _ in recorded['calls']]}"
     )
+
+
+POPULATION_SCHEMA = """
+CREATE TEMP TABLE task_runs (task_name TEXT PRIMARY KEY, last_run TIMESTAMPTZ);
+CREATE TEMP TABLE users (id INTEGER PRIMARY KEY);
+CREATE TEMP TABLE provinces (
+    id SERIAL PRIMARY KEY, userId INTEGER, population BIGINT, citycount INTEGER,
+    land INTEGER, happiness INTEGER, pollution INTEGER, productivity INTEGER,
+    pop_children BIGINT, pop_working BIGINT, pop_elderly BIGINT
+);
+CREATE TEMP TABLE resource_dictionary (resource_id INTEGER PRIMARY KEY, name TEXT);
+CREATE TEMP TABLE user_economy (
+    user_id INTEGER, resource_id INTEGER, quantity BIGINT,
+    PRIMARY KEY (user_id, resource_id)
+);
+CREATE TEMP TABLE building_dictionary (building_id INTEGER PRIMARY KEY, name TEXT);
+CREATE TEMP TABLE user_buildings (
+    user_id INTEGER, building_id INTEGER, quantity INTEGER
+);
+"""
+
+
+def test_population_growth_pages_provinces_across_chunks(monkeypatch):
+    import os
+    from contextlib import contextmanager
+
+    import pytest
+
+    if not os.getenv("DATABASE_PUBLIC_URL") and not os.getenv("DATABASE_URL"):
+        pytest.skip("Requires Postgres (DATABASE_PUBLIC_URL or DATABASE_URL)")
+
+    import database as _database
+    from app_core.game_ticks.population import population_growth
+
+    tables = ", ".join(
+        "pg_temp." + name
+        for name in (
+            "task_runs", "users", "provinces", "resource_dictionary",
+            "user_economy", "building_dictionary", "user_buildings",
+        )
+    )
+    with _database.get_db_connection() as conn:
+
+        @contextmanager
+        def same_connection():
+            # Temp tables are only visible on this connection
+            yield conn
+
+        monkeypatch.setattr(_database, "get_db_connection", same_connection)
+        db = conn.cursor()
+        try:
+            db.execute(POPULATION_SCHEMA)
+            db.execute("INSERT INTO users VALUES (1), (2), (3)")
+            # 450 provinces: more than two CHUNK_SIZE pages, each read after
+            # the previous chunk's commit
+            db.execute(
+                "INSERT INTO provinces (userId, population, citycount, land, "
+                "happiness, pollution, productivity, pop_children, pop_working, "
+                "pop_elderly) SELECT 1 + g % 3, 100000, 0, 0, 50, 50, 50, 0, "
+                "100000, 0 FROM generate_series(1, 450) AS g"
+            )
+            db.execute("INSERT INTO resource_dictionary VALUES (7, 'rations')")
+            conn.commit()
+
+            population_growth()
+
+            db.execute(
+                "SELECT COUNT(*), MIN(population), MAX(population), "
+                "BOOL_AND(pop_children + pop_working + pop_elderly = population) "
+                "FROM provinces"
+            )
+            provinces = db.fetchone()
+            db.execute("SELECT user_id, quantity FROM user_economy ORDER BY user_id")
+            rations = db.fetchall()
+            db.execute("SELECT last_run IS NOT NULL FROM task_runs")
+            ran = db.fetchone()[0]
+        finally:
+            conn.rollback()
+            db.execute(f"DROP TABLE IF EXISTS {tables}")
+            conn.commit()
+
+    # No distribution capacity: every province starves at 1% per hour
+    assert provinces == (450, 99000, 99000, True)
+    assert rations == [(1, 0), (2, 0), (3, 0)]
+    assert ran
@@ -0,0 +1,105 @@
+"""Opt-in request profiling: SQL accounting, N+1 flags, Server-Timing."""
+
+import os
+
+import pytest
+from flask import Flask
+
+import request_profiling
+
+
+class FakeCursor:
+    rowcount = 3
+
+    def __init__(self, *args, **kwargs):
+        self.executed = []
+
+    def execute(self, query, vars=None):
+        self.executed.append(query)
+
+
+def make_app():
+    app = Flask(__name__)
+    request_profiling.init_app(app)
+
+    @app.route("/nation/<int:n>")
+    def nation(n):
+        cursor = request_profiling.cursor_factory(FakeCursor)()
+        cursor.execute("SELECT 1 FROM stats WHERE id = 5")
+        for i in range(n):
+            cursor.execute(f"SELECT name FROM provinces WHERE id = {i}")
+        return type(cursor).__name__
+
+    return app
+
+
+@pytest.fixture
+def profiling(monkeypatch, tmp_path):
+    monkeypatch.setattr(request_profiling, "ENABLED", True)
+    monkeypatch.setattr(request_profiling, "SQL_REPEAT_THRESHOLD", 5)
+    monkeypatch.setattr(request_profiling, "PROFILE_DIR", str(tmp_path))
+
+
+@pytest.mark.no_server
+def test_normalize_sql():
+    assert (
+        request_profiling.normalize_sql(
+            "SELECT  *\n FROM t WHERE a = 12 AND b = 'x''y'"
+        )
+        == "SELECT * FROM t WHERE a = ? AND b = ?"
+    )
+    assert request_profiling.normalize_sql(b"SELECT 1") == "SELECT ?"
+
+
+@pytest.mark.no_server
+def test_disabled_leaves_cursors_alone(monkeypatch):
+    monkeypatch.setattr(request_profiling, "ENABLED", False)
+    response = make_app().test_client().get("/nation/2")
+    assert response.data == b"FakeCursor"
+    assert "Server-Timing" not in response.headers
+
+
+@pytest.mark.no_server
+def test_counts_queries_and_rows(profiling):
+    response = make_app().test_client().get("/nation/2")
+    assert response.data == b"TimedFakeCursor"
+    timing = response.headers["Server-Timing"]
+    assert 'desc="3 queries, 9 rows"' in timing
+    assert "sql-repeat" not in timing
+
+
+@pytest.mark.no_server
+def test_flags_repeated_statements(profiling, caplog):
+    response = make_app().test_client().get("/nation/8")
+    assert 'sql-repeat;desc="8x"' in response.headers["Server-Timing"]
+    assert "Possible N+1 on GET nation: 8 runs of SELECT name FROM provinces" in (
+        caplog.text
+    )
+
+
+@pytest.mark.no_server
+def test_profiles_listed_endpoints(profiling, monkeypatch, tmp_path):
+    monkeypatch.setattr(request_profiling, "PROFILE_ENDPOINTS", {"nation"})
+    make_app().test_client().get("/nation/1")
+    assert [p.suffix for p in tmp_path.iterdir()] == [".prof"]
+
+
+@pytest.mark.skipif(
+    not os.getenv("DATABASE_PUBLIC_URL") and not os.getenv("DATABASE_URL"),
+    reason="Requires Postgres (DATABASE_PUBLIC_URL or DATABASE_URL)",
+)
+def test_database_cursors_are_accounted(profiling):
+    from database import get_db_cursor
+
+    app = Flask(__name__)
+    request_profiling.init_app(app)
+
+    @app.route("/")
+    def index():
+        with get_db_cursor() as db:
+            db.execute("SELECT generate_series(1, 4)")
+            db.fetchall()
+        return "ok"
+
+    timing = app.test_client().get("/").headers["Server-Timing"]
+    assert 'desc="1 queries, 4 rows"' in timing
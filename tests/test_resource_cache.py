@@ -1,6 +1,12 @@
 import time
 
-from database import query_cache, invalidate_user_cache
+from database import (
+    QueryCache,
+    coalition_tag,
+    invalidate_user_cache,
+    query_cache,
+    user_tag,
+)
 
 
 def test_invalidate_user_cache():
@@ -36,3 +42,47 @@ def test_per_key_ttl_expiry():
     # Cache with no expiry (ttl_seconds=0)
     query_cache.set(key, "permanent", ttl_seconds=0)
     assert query_cache.get(key) == "permanent"
+
+
+def test_lru_evicts_least_recently_used(monkeypatch):
+    cache = QueryCache(ttl_seconds=60)
+    monkeypatch.setattr(cache, "MAX_CACHE_SIZE", 3)
+    for key in ("a", "b", "c"):
+        cache.set(key, key)
+    # Touch "a" so "b" becomes the least recently used entry
+    assert cache.get("a") == "a"
+    cache.set("d", "d", tags=(user_tag(1),))
+
+    assert list(cache.cache) == ["c", "a", "d"]
+    assert cache.stats()["evictions"] == 1
+
+
+def test_invalidate_tags_only_touches_tagged_entries():
+    cache = QueryCache(ttl_seconds=60)
+    cache.set("resources_1", 1, tags=(user_tag(1),))
+    cache.set("influence_1", 2, tags=(user_tag(1), coalition_tag(7)))
+    cache.set("influence_10", 3, tags=(user_tag(10), coalition_tag(7)))
+    cache.set("policies_1", 4)
+
+    cache.invalidate_tags(user_tag(1))
+    assert set(cache.cache) == {"influence_10", "policies_1"}
+
+    cache.invalidate_tags(coalition_tag(7))
+    assert set(cache.cache) == {"policies_1"}
+    # Re-setting a key replaces its tags rather than adding to them
+    cache.set("policies_1", 5, tags=(user_tag(1),))
+    cache.set("policies_1", 6)
+    cache.invalidate_tags(user_tag(1))
+    assert cache.get("policies_1") == 6
+
+
+def test_stats_count_hits_and_misses():
+    cache = QueryCache(ttl_seconds=60)
+    cache.set("k", "v")
+    cache.get("k")
+    cache.get("k")
+    cache.get("missing")
+
+    stats = cache.stats()
+    assert (stats["hits"], stats["misses"], stats["size"]) == (2, 1, 1)
+    assert stats["hit_rate"] == round(2 / 3, 4)
@@ -5,6 +5,7 @@ also omitted updated_at so health checks showed a frozen economy.
 """
 
 import tasks
+from app_core.game_ticks import revenue
 
 
 def test_education_delta_clamps_to_int32():
@@ -18,7 +19,9 @@ def test_revenue_upsert_sql_sets_updated_at():
     import inspect
 
     source = inspect.getsource(tasks.generate_province_revenue)
-    assert "updated_at = now()" in source
+    assert "updated_at = now()" in revenue._RESOURCE_UPSERT_SQL
+    assert "updated_at = now()" in revenue._RESOURCE_DELTAS_SQL
+    assert "write_resource_deltas(db, resource_updates)" in source
     assert "SAVEPOINT revenue_education_batch" in source
     assert "ROLLBACK TO SAVEPOINT revenue_education_batch" in source
     # last_run only after successful commit
@@ -36,6 +39,7 @@ def test_resource_upsert_before_education_in_source_order():
     import inspect
 
     source = inspect.getsource(tasks.generate_province_revenue)
-    res = source.find("INSERT INTO user_economy")
+    res = source.find("write_resource_deltas(")
+    assert "INSERT INTO user_economy" in revenue._RESOURCE_UPSERT_SQL
     edu = source.find("SAVEPOINT revenue_education_batch")
     assert res > 0 and edu > res
@@ -0,0 +1,115 @@
+"""Every PROVINCE_REVENUE_SQL_MODE (copy/set/batch) must leave the database
+in exactly the same state.  Runs against temporary tables that shadow the
+real ones, inside a transaction that is always rolled back."""
+import os
+
+import pytest
+
+from app_core.game_ticks.revenue import (
+    write_education_deltas,
+    write_gold_deductions,
+    write_province_updates,
+    write_resource_deltas,
+)
+
+pytestmark = pytest.mark.skipif(
+    not os.getenv("DATABASE_PUBLIC_URL") and not os.getenv("DATABASE_URL"),
+    reason="Requires Postgres (DATABASE_PUBLIC_URL or DATABASE_URL)",
+)
+
+SCHEMA = """
+CREATE TEMP TABLE stats (id INTEGER PRIMARY KEY, gold BIGINT NOT NULL);
+CREATE TEMP TABLE provinces (
+    id INTEGER PRIMARY KEY,
+    happiness INTEGER, productivity INTEGER, pollution INTEGER,
+    consumer_spending INTEGER, energy INTEGER, population INTEGER,
+    pop_children INTEGER, pop_working INTEGER, pop_elderly INTEGER,
+    edu_none INTEGER, edu_highschool INTEGER, edu_college INTEGER
+);
+CREATE TEMP TABLE resource_dictionary (
+    resource_id SERIAL PRIMARY KEY, name VARCHAR(50) NOT NULL UNIQUE
+);
+CREATE TEMP TABLE user_economy (
+    user_id INTEGER NOT NULL,
+    resource_id INTEGER NOT NULL,
+    quantity BIGINT NOT NULL DEFAULT 0 CHECK (quantity >= 0),
+    updated_at TIMESTAMP WITH TIME ZONE DEFAULT now(),
+    PRIMARY KEY (user_id, resource_id)
+);
+"""
+
+GOLD = [(500, 1), (10**9, 2), (1, 3)]
+PROVINCES = [
+    (55, 40, 12, 60, 3, 900, 100, 700, 100, 10),
+    (0, 100, 100, 0, 0, 0, 0, 0, 0, 11),
+]
+RESOURCES = [
+    (1, "coal", -3.6),
+    (1, "iron", 250),
+    (2, "coal", -10**6),
+    (3, "rations", 7),
+    (3, "unobtainium", 5),
+]
+EDUCATION = [(5, 0, 2, 10), (0, 9, 0, 11)]
+
+
+def _seed(db):
+    db.execute("TRUNCATE stats, provinces, user_economy")
+    db.execute("INSERT INTO stats VALUES (1, 1000), (2, 50), (3, 0)")
+    db.execute(
+        "INSERT INTO provinces (id, edu_none, edu_highschool, edu_college) "
+        "VALUES (10, 1, 1, NULL), (11, 0, 0, 0)"
+    )
+    db.execute(
+        "INSERT INTO user_economy (user_id, resource_id, quantity) "
+        "SELECT u, rd.resource_id, 100 FROM resource_dictionary rd, "
+        "unnest(ARRAY[1, 2]) AS u WHERE rd.name IN ('coal', 'iron')"
+    )
+
+
+def _snapshot(db):
+    db.execute("SELECT * FROM stats ORDER BY id")
+    stats = db.fetchall()
+    db.execute("SELECT * FROM provinces ORDER BY id")
+    provinces = db.fetchall()
+    db.execute(
+        "SELECT user_id, resource_id, quantity FROM user_economy "
+        "ORDER BY user_id, resource_id"
+    )
+    return stats, provinces, db.fetchall()
+
+
+def _apply(conn, mode):
+    db = conn.cursor()
+    _seed(db)
+    write_gold_deductions(db, GOLD, mode=mode)
+    write_province_updates(db, PROVINCES, mode=mode)
+    write_resource_deltas(db, RESOURCES, mode=mode)
+    write_education_deltas(db, EDUCATION, mode=mode)
+    return _snapshot(db)
+
+
+def test_write_modes_agree():
+    from database import get_db_connection
+
+    with get_db_connection() as conn:
+        try:
+            db = conn.cursor()
+            db.execute(SCHEMA)
+            db.execute(
+                "INSERT INTO resource_dictionary (name) "
+                "VALUES ('coal'), ('iron'), ('rations')"
+            )
+            batch_state = _apply(conn, "batch")
+            set_state = _apply(conn, "set")
+            copy_state = _apply(conn, "copy")
+        finally:
+            conn.rollback()
+
+    assert set_state == batch_state
+    assert copy_state == batch_state
+    stats, provinces, economy = copy_state
+    assert stats == [(1, 500), (2, 0), (3, 0)]
+    assert provinces[0][-3:] == (6, 1, 2)
+    # 100 - 3.6 rounds like the batch path; overdrawn stock floors at 0
+    assert (1, 1, 96) in economy and (2, 1, 0) in economy
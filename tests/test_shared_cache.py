@@ -0,0 +1,163 @@
+"""Two-tier QueryCache: shared Redis tier, broadcast invalidation and
+single-flight recomputation."""
+
+import threading
+import time
+
+import pytest
+
+import shared_cache
+from database import QueryCache, user_tag
+
+
+class FakeRedis:
+    """Just enough of redis.Redis for RedisTier (no expiry, no pub/sub)."""
+
+    def __init__(self):
+        self.data = {}
+        self.published = []
+
+    def get(self, key):
+        return self.data.get(key)
+
+    def set(self, key, value, ex=None, px=None, nx=False):
+        if nx and key in self.data:
+            return None
+        self.data[key] = value
+        return True
+
+    def delete(self, *keys):
+        for key in keys:
+            self.data.pop(key, None)
+
+    def scan_iter(self, match, count=None):
+        import fnmatch
+
+        return [k for k in list(self.data) if fnmatch.fnmatchcase(k, match)]
+
+    def sadd(self, key, member):
+        self.data.setdefault(key, set()).add(member)
+
+    def smembers(self, key):
+        return self.data.get(key, set())
+
+    def expire(self, key, seconds):
+        pass
+
+    def publish(self, channel, message):
+        self.published.append((channel, message))
+
+    def eval(self, script, numkeys, key, token):
+        if self.data.get(key) == token:
+            self.delete(key)
+
+
+def two_workers():
+    client = FakeRedis()
+    tiers = [shared_cache.RedisTier(client=client) for _ in range(2)]
+    for tier in tiers:
+        # The listener thread needs a real server; messages are fed by hand
+        tier.ensure_listener = lambda: None
+    return client, tiers, [QueryCache(ttl_seconds=60, tier=tier) for tier in tiers]
+
+
+def deliver(client, tiers):
+    for _, message in client.published:
+        for tier in tiers:
+            tier.dispatch(message)
+    client.published.clear()
+
+
+@pytest.mark.no_server
+def test_entries_are_shared_between_workers():
+    _, _, (a, b) = two_workers()
+    a.set("revenue_1", {"gross": {"coal": 5}})
+    assert b.get("revenue_1") == {"gross": {"coal": 5}}
+    # Filled into b's front tier
+    assert "revenue_1" in b.cache
+
+
+@pytest.mark.no_server
+def test_delete_and_invalidate_reach_every_worker():
+    client, tiers, (a, b) = two_workers()
+    a.set("influence_1", 10)
+    a.set("influence_2", 20)
+    assert b.get("influence_1") == 10 and b.get("influence_2") == 20
+
+    a.delete("influence_1")
+    deliver(client, tiers)
+    assert "influence_1" not in b.cache
+    assert b.get("influence_1") is None
+
+    a.invalidate("influence_")
+    deliver(client, tiers)
+    assert b.cache == {}
+    assert not any(
+        k.startswith(shared_cache.KEY_PREFIX + "query:") for k in client.data
+    )
+
+
+@pytest.mark.no_server
+def test_redis_errors_fall_back_to_local_cache():
+    class Broken(FakeRedis):
+        def get(self, key):
+            raise ConnectionError("down")
+
+    tier = shared_cache.RedisTier(client=Broken())
+    cache = QueryCache(ttl_seconds=60, tier=tier)
+    assert cache.get("missing") is None
+    cache.set("k", 1)
+    assert cache.get("k") == 1
+
+
+@pytest.mark.no_server
+def test_get_or_compute_runs_once_for_concurrent_misses():
+    cache = QueryCache(ttl_seconds=60)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        time.sleep(0.05)
+        return 42
+
+    results = []
+    threads = [
+        threading.Thread(
+            target=lambda: results.append(cache.get_or_compute("econ_stats_1", compute))
+        )
+        for _ in range(8)
+    ]
+    for t in threads:
+        t.start()
+    for t in threads:
+        t.join()
+
+    assert results == [42] * 8
+    assert len(calls) == 1
+
+
+@pytest.mark.no_server
+def test_waiter_uses_value_computed_by_another_worker(monkeypatch):
+    client, _, (a, b) = two_workers()
+    monkeypatch.setattr(shared_cache, "FLIGHT_POLL", 0.01)
+    # Worker b holds the recompute for this key
+    assert b._tier.claim("query:revenue_7") is not None
+
+    def finish_elsewhere():
+        time.sleep(0.05)
+        b.set("revenue_7", "fresh")
+
+    threading.Thread(target=finish_elsewhere).start()
+    assert a.get_or_compute("revenue_7", lambda: pytest.fail("recomputed")) == "fresh"
+
+
+@pytest.mark.no_server
+def test_tag_invalidation_is_shared():
+    client, tiers, (a, b) = two_workers()
+    a.set("resources_3", {"coal": 1}, tags=(user_tag(3),))
+    assert b.get("resources_3") == {"coal": 1}
+
+    a.invalidate_tags(user_tag(3))
+    deliver(client, tiers)
+    assert "resources_3" not in b.cache
+    assert not client.data
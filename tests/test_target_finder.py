@@ -0,0 +1,106 @@
+"""War targets range-queried from the nation_influence snapshot (wars/service.py)."""
+
+import os
+from contextlib import contextmanager
+
+import pytest
+
+from wars import service
+
+SCHEMA = """
+CREATE TEMP TABLE users (id INTEGER PRIMARY KEY, username TEXT, flag TEXT);
+CREATE TEMP TABLE stats (id INTEGER PRIMARY KEY, gold BIGINT);
+CREATE TEMP TABLE provinces (
+    id SERIAL PRIMARY KEY, userid INTEGER, citycount INTEGER,
+    land INTEGER, population BIGINT
+);
+CREATE TEMP TABLE unit_dictionary (unit_id INTEGER PRIMARY KEY, name TEXT);
+CREATE TEMP TABLE user_military (user_id INTEGER, unit_id INTEGER, quantity INTEGER);
+CREATE TEMP TABLE user_economy (user_id INTEGER, resource_id INTEGER, quantity BIGINT);
+CREATE TEMP TABLE admin_user_controls (
+    user_id INTEGER PRIMARY KEY, is_banned BOOLEAN NOT NULL DEFAULT FALSE
+);
+CREATE TEMP TABLE nation_influence (
+    user_id INTEGER PRIMARY KEY,
+    influence BIGINT NOT NULL DEFAULT 0,
+    province_count INTEGER NOT NULL DEFAULT 0,
+    province_population BIGINT NOT NULL DEFAULT 0,
+    war_eligible BOOLEAN NOT NULL DEFAULT TRUE,
+    updated_at TIMESTAMPTZ NOT NULL DEFAULT NOW()
+);
+"""
+
+
+@pytest.mark.skipif(
+    not os.getenv("DATABASE_PUBLIC_URL") and not os.getenv("DATABASE_URL"),
+    reason="Requires Postgres (DATABASE_PUBLIC_URL or DATABASE_URL)",
+)
+def test_targets_are_ranged_paged_and_searched_in_sql(monkeypatch):
+    from database import get_db_connection
+
+    monkeypatch.setattr(service, "TARGETS_PER_PAGE", 2)
+    monkeypatch.setattr(service, "get_influence", lambda cId: 1000)
+
+    with get_db_connection() as conn:
+        db = conn.cursor()
+
+        modes = []
+
+        @contextmanager
+        def same_transaction(cursor_factory=None, read_only=False):
+            modes.append(read_only)
+            yield conn.cursor()
+
+        monkeypatch.setattr(service, "get_request_cursor", same_transaction)
+        try:
+            db.execute(SCHEMA)
+            # Requester (1) has 2 provinces: targets need 1..5 provinces and
+            # 900..2000 influence
+            db.execute(
+                "INSERT INTO users VALUES (1, 'me', NULL), (2, 'Alba', 'a.jpg'),"
+                " (3, 'Brit', NULL), (4, 'Cymru', NULL), (5, 'Dal', NULL),"
+                " (6, 'Eire', NULL), (7, 'Fife', NULL), (8, 'Gw_nt', NULL);"
+                "INSERT INTO provinces (userid) VALUES (1), (1);"
+                "INSERT INTO nation_influence (user_id, influence, province_count,"
+                " war_eligible) VALUES"
+                " (1, 1000, 2, TRUE),"
+                " (2, 1500, 1, TRUE),"  # one fewer province: still a target
+                " (3, 1200, 5, TRUE),"
+                " (4, 1800, 3, TRUE),"
+                " (5, 1900, 6, TRUE),"  # too many provinces
+                " (6, 5000, 3, TRUE),"  # out of influence range
+                " (8, 1300, 2, TRUE);"
+            )
+            first, after = service.find_targets(1)
+            second, last = service.find_targets(1, after=after)
+            # Fife joined after the last refresh: left for the refresh job,
+            # a page view writes nothing
+            db.execute("SELECT influence FROM nation_influence WHERE user_id = 7")
+            fife = db.fetchone()
+            # Wildcards in the search are matched literally
+            underscore, _ = service.find_targets(1, search="w_n")
+            wildcard, _ = service.find_targets(1, search="C_mr")
+            percent, _ = service.find_targets(1, search="%")
+
+            by_name, _ = service.find_targets(1, sort="username", sortway="asc")
+            searched, _ = service.find_targets(1, search="ymr")
+
+            db.execute(
+                "UPDATE nation_influence SET war_eligible = FALSE WHERE user_id = 4"
+            )
+            banned, _ = service.find_targets(1)
+        finally:
+            conn.rollback()
+
+    assert [t["id"] for t in first] == [4, 2]
+    assert first[1]["flag"] == "a.jpg" and first[0]["flag"] == "default_flag.jpg"
+    assert after == "1500:2"
+    assert [t["id"] for t in second] == [8, 3] and last is None
+    assert fife is None
+    assert [t["id"] for t in underscore] == [8]
+    assert wildcard == [] and percent == []
+    assert [t["username"] for t in by_name] == ["Alba", "Brit"]
+    assert [t["id"] for t in searched] == [4]
+    assert [t["id"] for t in banned] == [2, 8]
+    # Every listing reads the replica; only target_window's count hits the primary
+    assert modes.count(True) == 8
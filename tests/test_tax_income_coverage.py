@@ -0,0 +1,134 @@
+"""tax_income walks every user in keyset chunks within its time budget."""
+import pytest
+
+from app_core.game_ticks import taxes
+
+
+class PagingCursor:
+    """Serves ``SELECT id FROM users WHERE id > %s ... LIMIT %s`` pages and
+    the task_cursors row; everything else is recorded and ignored."""
+
+    def __init__(self, user_ids, last_id=0):
+        self.user_ids = sorted(user_ids)
+        self.last_id = last_id
+        self._fetchall = []
+        self._fetchone = None
+
+    def execute(self, query, params=None):
+        self._fetchall, self._fetchone = [], None
+        if query.startswith("SELECT id FROM users WHERE id >"):
+            after, limit = params
+            self._fetchall = [(u,) for u in self.user_ids if u > after][:limit]
+        elif query.startswith("SELECT last_id FROM task_cursors"):
+            self._fetchone = (self.last_id,)
+        elif query.startswith("UPDATE task_cursors SET last_id=%s"):
+            self.last_id = params[0]
+        elif query.startswith("UPDATE task_cursors SET last_id=0"):
+            self.last_id = 0
+        elif query.startswith("SELECT pg_try_advisory_xact_lock"):
+            self._fetchone = (True,)
+
+    def fetchall(self):
+        return self._fetchall
+
+    def fetchone(self):
+        return self._fetchone
+
+
+class FakeConn:
+    def __init__(self, db):
+        self.db = db
+        self.commits = 0
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *a):
+        return False
+
+    def cursor(self, cursor_factory=None):
+        return self.db
+
+    def commit(self):
+        self.commits += 1
+
+    def rollback(self):
+        pass
+
+
+def run(monkeypatch, db, **env):
+    conn = FakeConn(db)
+    taxed = []
+    monkeypatch.setattr("database.get_db_connection", lambda: conn)
+    monkeypatch.setattr("database.invalidate_user_cache", lambda uid: None)
+    monkeypatch.setattr(
+        taxes,
+        "_tax_income_chunk",
+        lambda conn, db, dbdict, ids: (taxed.extend(ids) or len(ids), 0),
+    )
+    for name, value in env.items():
+        monkeypatch.setenv(name, value)
+    return taxes.tax_income(), taxed, conn
+
+
+@pytest.mark.no_server
+def test_every_user_is_taxed_in_one_run(monkeypatch):
+    db = PagingCursor(range(1, 12))
+    metrics, taxed, conn = run(monkeypatch, db, TAX_INCOME_CHUNK_SIZE="4")
+
+    assert taxed == list(range(1, 12))
+    assert metrics["users_covered"] == 11
+    assert metrics["chunks"] == 3
+    assert metrics["completed"]
+    # Full cycle: the next run starts again from the first user
+    assert db.last_id == 0
+    assert conn.commits == 4
+
+
+@pytest.mark.no_server
+def test_budget_exhaustion_resumes_from_cursor(monkeypatch):
+    db = PagingCursor(range(1, 12))
+    metrics, taxed, _ = run(
+        monkeypatch, db, TAX_INCOME_CHUNK_SIZE="4", TAX_INCOME_TIME_BUDGET_SEC="0"
+    )
+    assert taxed == [1, 2, 3, 4]
+    assert not metrics["completed"]
+    assert db.last_id == 4
+
+    metrics, taxed, _ = run(monkeypatch, db, TAX_INCOME_CHUNK_SIZE="8")
+    assert taxed == list(range(5, 12))
+    assert metrics["completed"]
+    assert db.last_id == 0
+
+
+@pytest.mark.no_server
+def test_run_started_between_chunks_taxes_nobody_twice(monkeypatch):
+    db = PagingCursor(range(1, 12))
+    nested = {}
+
+    class InterleavingConn(FakeConn):
+        def commit(self):
+            super().commit()
+            if "metrics" not in nested:
+                # The first chunk's commit released the locks: a second
+                # run gets in and finishes the cycle
+                nested["metrics"] = None
+                nested["metrics"] = taxes.tax_income()
+
+    conn = InterleavingConn(db)
+    taxed = []
+    monkeypatch.setattr("database.get_db_connection", lambda: conn)
+    monkeypatch.setattr("database.invalidate_user_cache", lambda uid: None)
+    monkeypatch.setattr(
+        taxes,
+        "_tax_income_chunk",
+        lambda conn, db, dbdict, ids: (taxed.extend(ids) or len(ids), 0),
+    )
+    monkeypatch.setenv("TAX_INCOME_CHUNK_SIZE", "4")
+
+    metrics = taxes.tax_income()
+
+    assert taxed == list(range(1, 12))
+    assert nested["metrics"]["users_covered"] == 7 and nested["metrics"]["completed"]
+    assert metrics["users_covered"] == 4
+    assert db.last_id == 0
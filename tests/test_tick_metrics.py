@@ -0,0 +1,108 @@
+"""Tick phase, lock-skip and pool metrics (metrics.py)."""
+import datetime
+
+import pytest
+
+import metrics
+
+
+class Recorder:
+    """Stands in for a prometheus_client metric; keeps (labels, value) pairs."""
+
+    def __init__(self):
+        self.samples = []
+        self._labels = None
+
+    def labels(self, **labels):
+        self._labels = labels
+        return self
+
+    def observe(self, value):
+        self.samples.append((self._labels, value))
+
+    def inc(self, value=1):
+        self.samples.append((self._labels, value))
+
+
+@pytest.fixture
+def recorded(monkeypatch):
+    names = [
+        "TICK_PHASE_SECONDS",
+        "TICK_CHUNKS",
+        "TICK_ROWS_WRITTEN",
+        "TICK_LOCK_SKIPS",
+        "POOL_SATURATION",
+        "POOL_EXHAUSTED",
+    ]
+    recorders = {name: Recorder() for name in names}
+    for name, recorder in recorders.items():
+        monkeypatch.setattr(metrics, name, recorder, raising=False)
+    return recorders
+
+
+@pytest.mark.no_server
+def test_helpers_are_noops_without_prometheus(monkeypatch):
+    monkeypatch.setattr(metrics, "TICK_PHASE_SECONDS", None)
+    with metrics.phase("tax_income", "compute"):
+        pass
+    metrics.count_chunk("tax_income")
+    metrics.count_rows("tax_income", "stats", 3)
+    metrics.count_lock_skip("tax_income", "advisory_lock")
+    metrics.observe_pool_checkout("web", 0.5, True)
+
+
+@pytest.mark.no_server
+def test_phase_is_observed_when_the_body_raises(recorded):
+    with pytest.raises(ValueError):
+        with metrics.phase("generate_province_revenue", "write"):
+            raise ValueError
+    [(labels, seconds)] = recorded["TICK_PHASE_SECONDS"].samples
+    assert labels == {"task": "generate_province_revenue", "phase": "write"}
+    assert seconds >= 0
+
+
+@pytest.mark.no_server
+def test_lock_skips_are_counted(recorded):
+    from app_core.game_ticks.common import should_skip_task
+    from app_core.game_ticks.locks import try_pg_advisory_lock
+
+    class Held:
+        def cursor(self):
+            return self
+
+        def execute(self, query, params=None):
+            pass
+
+        def fetchone(self):
+            return (False,)
+
+    assert not try_pg_advisory_lock(Held(), 9001, "tax_income")
+    now = datetime.datetime.now(datetime.timezone.utc)
+    assert should_skip_task((now,), "tax_income")
+    assert recorded["TICK_LOCK_SKIPS"].samples == [
+        ({"task": "tax_income", "reason": "advisory_lock"}, 1),
+        ({"task": "tax_income", "reason": "recent_run"}, 1),
+    ]
+
+
+@pytest.mark.no_server
+def test_pool_checkouts_feed_saturation(recorded):
+    from database import PoolMetrics
+
+    pool = PoolMetrics()
+    pool.record_checkout("web", 0.01, 0.5, False)
+    pool.record_checkout("web", 0.2, 1.0, True)
+    assert recorded["POOL_SATURATION"].samples == [
+        ({"route": "web"}, 0.5),
+        ({"route": "web"}, 1.0),
+    ]
+    assert recorded["POOL_EXHAUSTED"].samples == [({"route": "web"}, 1)]
+
+
+@pytest.mark.no_server
+def test_exposition_includes_tick_metrics():
+    pytest.importorskip("prometheus_client")
+    metrics.count_chunk("population_growth")
+    body, content_type = metrics.generate_latest()
+    assert content_type.startswith("text/plain")
+    assert b"ano_tick_chunks_total" in body
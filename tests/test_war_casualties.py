@@ -0,0 +1,109 @@
+"""Batched casualty writes (war_orchestrator._apply_casualties)."""
+
+import os
+
+import pytest
+
+from attack_scripts import war_orchestrator
+
+
+class CountingCursor:
+    def __init__(self, cursor):
+        self.cursor = cursor
+        self.statements = []
+
+    def execute(self, sql, params=None):
+        self.statements.append(sql)
+        return self.cursor.execute(sql, params)
+
+    def fetchall(self):
+        return self.cursor.fetchall()
+
+
+@pytest.mark.skipif(
+    not os.getenv("DATABASE_PUBLIC_URL") and not os.getenv("DATABASE_URL"),
+    reason="Requires Postgres (DATABASE_PUBLIC_URL or DATABASE_URL)",
+)
+def test_one_statement_per_side_clamped_at_zero(monkeypatch):
+    from database import get_db_connection
+
+    monkeypatch.setattr(war_orchestrator, "_unit_ids_cache", None)
+    with get_db_connection() as conn:
+        db = CountingCursor(conn.cursor())
+        try:
+            db.execute(
+                "CREATE TEMP TABLE unit_dictionary ("
+                " unit_id INTEGER PRIMARY KEY, name TEXT, is_active BOOLEAN);"
+                "CREATE TEMP TABLE user_military ("
+                " user_id INTEGER, unit_id INTEGER, quantity BIGINT,"
+                " PRIMARY KEY (user_id, unit_id));"
+                "INSERT INTO unit_dictionary VALUES"
+                " (1, 'soldiers', TRUE), (2, 'tanks', TRUE), (3, 'artillery', TRUE);"
+                "INSERT INTO user_military VALUES"
+                " (7, 1, 100), (7, 2, 3), (8, 1, 50);"
+            )
+            db.statements.clear()
+
+            applied = war_orchestrator._apply_casualties(
+                db,
+                7,
+                [("soldiers", 30.9), ("Tanks", 5), ("artillery", 2), ("soldiers", 5)],
+            )
+            first = list(db.statements)
+
+            db.statements.clear()
+            again = war_orchestrator._apply_casualties(db, 7, [("soldiers", 10)])
+            second = list(db.statements)
+
+            db.execute(
+                "SELECT user_id, unit_id, quantity FROM user_military ORDER BY 1, 2"
+            )
+            rows = db.fetchall()
+        finally:
+            conn.rollback()
+
+    # Dictionary lookup + one UPDATE; the second call reuses the cached ids
+    assert len(first) == 2 and len(second) == 1
+    # No artillery row to take from, and only 3 tanks to lose
+    assert applied == {"soldiers": 35, "tanks": 3}
+    assert again == {"soldiers": 10}
+    assert rows == [(7, 1, 55), (7, 2, 0), (8, 1, 50)]
+
+
+@pytest.mark.no_server
+def test_no_losses_touch_nothing():
+    class Unused:
+        def execute(self, *args):
+            raise AssertionError("no query expected")
+
+    assert war_orchestrator._apply_casualties(Unused(), 7, [("soldiers", 0)]) == {}
+    assert war_orchestrator._apply_casualties(Unused(), 7, []) == {}
+
+
+@pytest.mark.no_server
+def test_unknown_unit_reloads_once_per_interval_then_raises(monkeypatch):
+    class Dictionary:
+        loads = 0
+
+        def execute(self, sql, params=None):
+            Dictionary.loads += 1
+
+        def fetchall(self):
+            return [("soldiers", 1), ("tanks", 2)]
+
+    clock = [1000.0]
+    monkeypatch.setattr(war_orchestrator.time, "monotonic", lambda: clock[0])
+    monkeypatch.setattr(war_orchestrator, "_unit_ids_cache", None)
+    monkeypatch.setattr(war_orchestrator, "_unit_ids_loaded_at", 0.0)
+    db = Dictionary()
+
+    assert war_orchestrator._unit_ids(db, ["soldiers"]) == {"soldiers": 1, "tanks": 2}
+    for _ in range(3):
+        with pytest.raises(ValueError, match="zeppelins"):
+            war_orchestrator._unit_ids(db, ["tanks", "zeppelins"])
+    assert Dictionary.loads == 1
+
+    clock[0] += war_orchestrator._UNIT_IDS_RELOAD_SECONDS
+    with pytest.raises(ValueError, match="zeppelins"):
+        war_orchestrator._unit_ids(db, ["zeppelins"])
+    assert Dictionary.loads == 2
@@ -0,0 +1,96 @@
+"""Nightly war reparations: in-memory transfers, one staged upsert."""
+
+import os
+import time
+
+import pytest
+
+from app_core.game_ticks.taxes import reparation_deltas, war_reparation_tax
+
+
+@pytest.mark.no_server
+def test_deltas_match_sequential_transfers():
+    balances = {(1, 10): 1000, (1, 11): 7, (2, 10): 50}
+    truces = [(2, 1, "Conquest"), (3, 1, "Raze"), (3, 2, "Conquest")]
+    deltas = reparation_deltas(truces, balances, [10, 11])
+
+    # 1 pays 20% to 2, then 5% of what is left to 3; 2 pays 20% of its
+    # stockpile including what it just received
+    assert deltas == {
+        (1, 10): -200 - 40,
+        (2, 10): 200 - 50,
+        (3, 10): 40 + 50,
+        (1, 11): -1,
+        (2, 11): 1,
+    }
+    assert balances[(1, 10)] == 760 and balances[(2, 10)] == 200
+
+
+SCHEMA = """
+CREATE TEMP TABLE wars (
+    id INTEGER PRIMARY KEY, peace_date DOUBLE PRECISION, peace_offer_id INTEGER,
+    attacker INTEGER, defender INTEGER, defender_morale INTEGER, war_type TEXT
+);
+CREATE TEMP TABLE resource_dictionary (
+    resource_id INTEGER PRIMARY KEY, name TEXT, is_active BOOLEAN DEFAULT TRUE
+);
+CREATE TEMP TABLE user_economy (
+    user_id INTEGER, resource_id INTEGER,
+    quantity BIGINT NOT NULL DEFAULT 0 CHECK (quantity >= 0),
+    PRIMARY KEY (user_id, resource_id)
+);
+"""
+
+
+@pytest.mark.skipif(
+    not os.getenv("DATABASE_PUBLIC_URL") and not os.getenv("DATABASE_URL"),
+    reason="Requires Postgres (DATABASE_PUBLIC_URL or DATABASE_URL)",
+)
+def test_reparations_applied_in_one_run(monkeypatch):
+    from contextlib import contextmanager
+
+    from database import get_db_connection
+
+    monkeypatch.setattr("database.invalidate_user_cache", lambda uid: None)
+    with get_db_connection() as conn:
+        db = conn.cursor()
+
+        @contextmanager
+        def same_transaction():
+            # Keep the temp tables visible and roll everything back afterwards
+            yield conn
+
+        monkeypatch.setattr("database.get_db_connection", same_transaction)
+        try:
+            db.execute(SCHEMA)
+            now = time.time()
+            db.execute(
+                "INSERT INTO wars VALUES (1, %s, NULL, 1, 2, 0, 'Conquest'), "
+                "(2, %s, NULL, 3, 4, 50, 'Raze'), (3, %s, NULL, 5, 6, 0, 'Conquest')",
+                (now, now, now - 8 * 86400),
+            )
+            db.execute(
+                "INSERT INTO resource_dictionary VALUES (10, 'coal'), (11, 'oil')"
+            )
+            db.execute(
+                "INSERT INTO user_economy VALUES (2, 10, 100), (2, 11, 9), (3, 10, 400)"
+            )
+            monkeypatch.setattr("attack_scripts.Economy.resources", ["coal", "oil"])
+            war_reparation_tax()
+            db.execute("SELECT id FROM wars ORDER BY id")
+            wars = [row[0] for row in db.fetchall()]
+            db.execute("SELECT * FROM user_economy ORDER BY user_id, resource_id")
+            stockpiles = db.fetchall()
+        finally:
+            conn.rollback()
+
+    # War 3's truce is over; defender 2 lost war 1, attacker 3 lost the raze
+    assert wars == [1, 2]
+    assert stockpiles == [
+        (1, 10, 20),
+        (1, 11, 1),
+        (2, 10, 80),
+        (2, 11, 8),
+        (3, 10, 380),
+        (4, 10, 20),
+    ]
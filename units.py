@@ -2,10 +2,11 @@
 
 from abc import ABC, abstractmethod
 from attack_scripts import Military
-from random import randint
+import random
 from typing import Union
 from dotenv import load_dotenv
 from database import get_db_connection
+from attack_scripts.military_snapshot import forget, military_snapshot
 
 load_dotenv()
 
@@ -20,22 +21,7 @@ def get_unusable_units(user_id: int) -> set:
     The mapping of unit → maintenance resource is read live from
     unit_dictionary so it stays in sync with any future balance changes.
     """
-    with get_db_connection() as conn:
-        db = conn.cursor()
-        db.execute(
-            """
-            SELECT ud.name, COALESCE(ue.quantity, 0) AS stock
-            FROM unit_dictionary ud
-            JOIN resource_dictionary rd
-                ON rd.resource_id = ud.maintenance_cost_resource_id
-            LEFT JOIN user_economy ue
-                ON ue.user_id = %s
-                AND ue.resource_id = ud.maintenance_cost_resource_id
-            WHERE ud.maintenance_cost_resource_id IS NOT NULL
-            """,
-            (user_id,),
-        )
-        return {name for name, stock in db.fetchall() if stock == 0}
+    return set(military_snapshot(user_id).unusable)
 
 
 # Blueprint for units
@@ -54,6 +40,8 @@ class BlueprintUnit(ABC):
 
     damage = 0
     bonus = 0
+    # Source of the per-attack dice; the combat engine sets its own
+    rng = random
 
     """
     attack method:
@@ -155,7 +143,7 @@ class BomberUnit(BlueprintUnit):
         # One bomber beats random number of tanks (where they drop the bombs)
         # between 2 and 6
         if defending_units == "tanks":
-            self.bonus += randint(2, 6) * self.amount
+            self.bonus += self.rng.randint(2, 6) * self.amount
             # self.bonus += 2 * self.amount
 
         if defending_units == "destroyers":
@@ -588,6 +576,7 @@ class Units(Military):
                 (amount, self.user_id, unit_type),
             )
             connection.commit()
+        forget(self.user_id)
 
     # Fetch the available supplies and resources which are required
     # and compare them to the unit attack cost. Also persist morale.
@@ -1,10 +1,9 @@
-from flask import Blueprint, session, request, redirect, render_template
+from flask import Blueprint, session, request, redirect, render_template, jsonify
 from helpers import (
     login_required,
     error,
     get_flagname,
     check_required,
-    get_influence,
 )
 from database import get_db_connection, get_request_cursor, rollback_db_cursor
 from attack_scripts.Nations import (
@@ -14,6 +13,8 @@ from attack_scripts.Nations import (
     Military,
 )
 from attack_scripts import Nation
+from attack_scripts.military_snapshot import forget, military_snapshot
+from extensions import limiter
 import time
 from datetime import datetime
 
@@ -463,8 +464,9 @@ def war_with_id(war_id):
 def warChoose(war_id):
     cId = session["user_id"]
     if request.method == "GET":
-        normal_units = Military.get_military(cId)
-        special_units = Military.get_special(cId)
+        # Display only: the fight re-reads on the primary
+        normal_units = Military.get_military(cId, read_only=True)
+        special_units = Military.get_special(cId, read_only=True)
         units = normal_units.copy()
         units.update(special_units)
         return render_template("warchoose.html", units=units, war_id=war_id)
@@ -1002,12 +1004,75 @@ def declare_war():
     return redirect("/wars")
 
 
+PREVIEW_RUNS = 500
+MAX_PREVIEW_RUNS = 1000
+# What a preview may tell the attacker: the enemy's defence composition and
+# unit counts stay behind spy intel
+PREVIEW_FIELDS = ("runs", "seed", "attacker_win_probability", "attacker")
+
+
+@wars_bp.route("/api/war/preview", methods=["GET"])
+@login_required
+@limiter.limit("10 per minute")
+def war_preview():
+    """Simulated outcome of attacking an enemy, without attacking.
+
+    Query: ``enemy_id``, ``<unit>=<amount>`` for each of up to 3 unit types
+    (amounts up to what the player owns), optional ``runs`` and ``seed``.
+    Only enemies the player is currently at war with can be previewed.
+    Returns the win probability and the attacker's own losses only.
+    """
+    from attack_scripts.combat_engine import Army, simulate
+    from attack_scripts.war_orchestrator import resolve_defender_composition
+    cId = session["user_id"]
+    owned = Military.get_military(cId, read_only=True)
+    try:
+        enemy_id = int(request.args["enemy_id"])
+        runs = int(request.args.get("runs", PREVIEW_RUNS))
+        seed = request.args.get("seed")
+        seed = int(seed) if seed not in (None, "") else None
+        # Units pair up with the defender's in the order they are given
+        sent = {
+            unit: int(amount)
+            for unit, amount in request.args.items()
+            if unit in owned and amount != ""
+        }
+    except (KeyError, ValueError):
+        return jsonify({"error": "Invalid preview parameters"}), 400
+
+    if not 1 <= len(sent) <= 3:
+        return jsonify({"error": "Select between 1 and 3 unit types"}), 400
+    if any(amount < 0 or amount > owned.get(unit, 0) for unit, amount in sent.items()):
+        return jsonify({"error": "Invalid amount selected"}), 400
+    if seed is not None and seed < 0:
+        return jsonify({"error": "Invalid preview parameters"}), 400
+
+    with get_request_cursor(read_only=True) as db:
+        db.execute(
+            "SELECT 1 FROM wars WHERE ((attacker=%s AND defender=%s) "
+            "OR (attacker=%s AND defender=%s)) AND peace_date IS NULL LIMIT 1",
+            (cId, enemy_id, enemy_id, cId),
+        )
+        if db.fetchone() is None:
+            return jsonify({"error": "You are not at war with this nation"}), 404
+
+    _, defense_units = resolve_defender_composition(enemy_id)
+    preview = simulate(
+        Army(sent, military_snapshot(cId, read_only=True).unusable),
+        Army(defense_units, military_snapshot(enemy_id, read_only=True).unusable),
+        runs=min(max(runs, 1), MAX_PREVIEW_RUNS),
+        seed=seed,
+    )
+    return jsonify({field: preview[field] for field in PREVIEW_FIELDS})
+
+
 @wars_bp.route("/defense", methods=["GET", "POST"])
 @login_required
 def defense():
     cId = session["user_id"]
-    units = Military.get_military(cId)
-    current_defense = Military.get_defense(cId)
+    # Display only; saving a defence does not read these
+    units = Military.get_military(cId, read_only=True)
+    current_defense = Military.get_defense(cId, read_only=True)
 
     if request.method == "POST":
         # Save the user's defense selection
@@ -1150,93 +1215,20 @@ def wars():
 def find_targets():
     cId = session["user_id"]
     if request.method == "GET":
-        with get_request_cursor() as db:
-            db.execute("SELECT COUNT(id) FROM provinces WHERE userid=%s", (cId,))
-            provinces_row = db.fetchone()
-            user_provinces = provinces_row[0] if provinces_row else 0
-            min_provinces = max(0, user_provinces - 3)
-            max_provinces = user_provinces + 1
-            user_influence = get_influence(cId)
-            # Choose a sensible search range around the player's influence.
-            # For very new/low-influence players, expand the max_influence so
-            # they still see potential targets (otherwise max would be 0 and
-            # filter out viable targets).
-            min_influence = max(0.0, user_influence * 0.9)
-            max_influence = max(user_influence * 2.0, 100.0)
-            query = (
-                "SELECT users.id, users.username, users.flag, "
-                "COUNT(DISTINCT provinces.id) as provinces_count, "
-                "COALESCE(SUM("
-                "CASE WHEN ud.name='soldiers' THEN um.quantity * 0.02 "
-                "WHEN ud.name='artillery' THEN um.quantity * 1.6 "
-                "WHEN ud.name='tanks' THEN um.quantity * 0.8 "
-                "WHEN ud.name='fighters' THEN um.quantity * 3.5 "
-                "WHEN ud.name='bombers' THEN um.quantity * 2.5 "
-                "WHEN ud.name='apaches' THEN um.quantity * 3.2 "
-                "WHEN ud.name='submarines' THEN um.quantity * 4.5 "
-                "WHEN ud.name='destroyers' THEN um.quantity * 3 "
-                "WHEN ud.name='cruisers' THEN um.quantity * 5.5 "
-                "WHEN ud.name='icbms' THEN um.quantity * 250 "
-                "WHEN ud.name='nukes' THEN um.quantity * 500 "
-                "WHEN ud.name='spies' THEN um.quantity * 25 "
-                "ELSE 0 END), 0) as influence "
-                "FROM users "
-                "LEFT JOIN provinces ON users.id = provinces.userId "
-                "LEFT JOIN user_military um ON users.id = um.user_id "
-                "LEFT JOIN unit_dictionary ud "
-                "ON um.unit_id = ud.unit_id AND ud.is_active = TRUE "
-                "WHERE users.id != %s "
-                "GROUP BY users.id, users.username, users.flag "
-                "HAVING COUNT(DISTINCT provinces.id) BETWEEN %s AND %s "
-                "ORDER BY users.username "
-                "LIMIT 50"
-            )
-            db.execute(query, (cId, min_provinces, max_provinces))
-            targets = db.fetchall()
-        targets_list = []
-        for target in targets:
-            tid, tname, tflag, tprovinces, tinfluence = target
-            tflag = tflag or "default_flag.jpg"
-            if min_influence <= tinfluence <= max_influence:
-                targets_list.append(
-                    {
-                        "id": tid,
-                        "username": tname,
-                        "flag": tflag,
-                        "provinces": tprovinces,
-                        "influence": tinfluence,
-                    }
-                )
-
-        # Handle filtering
-        search = request.args.get("search", "").strip()
-        sort = request.args.get("sort", "influence")
-        sortway = request.args.get("sortway", "desc")
-
-        # Limit to 20 results after filtering and sorting
-        # (apply the slice after sort and search are applied so we don't drop
-        # candidates prematurely)
-        # the slice will be performed after sorting below
-
-        if search:
-            targets_list = [
-                t for t in targets_list if search.lower() in (t["username"] or "").lower()
-            ]
-
-        if sort == "influence":
-            rev = sortway == "desc"
-            targets_list.sort(key=lambda x: x["influence"], reverse=rev)
-        elif sort == "provinces":
-            rev = sortway == "desc"
-            targets_list.sort(key=lambda x: x["provinces"], reverse=rev)
-        elif sort == "username":
-            rev = sortway == "desc"
-            targets_list.sort(key=lambda x: x["username"].lower(), reverse=rev)
-
-        # take the top 20 after filtering/sorting
-        targets_list = targets_list[:20]
-
-        return render_template("find_targets.html", targets=targets_list)
+        from wars.service import find_targets as find_target_page
+
+        # Range-queried on the nation_influence snapshot; search, sort and
+        # keyset pagination (?after=) all happen in SQL
+        targets_list, next_cursor = find_target_page(
+            cId,
+            search=request.args.get("search", "").strip(),
+            sort=request.args.get("sort", "influence"),
+            sortway=request.args.get("sortway", "desc"),
+            after=request.args.get("after"),
+        )
+        return render_template(
+            "find_targets.html", targets=targets_list, next_cursor=next_cursor
+        )
     # POST - find a target by id or username and redirect
     defender_raw = request.form.get("defender")
     if not defender_raw:
@@ -1345,6 +1337,7 @@ def nuclear_strike():
             "INSERT INTO news (userId, icon, title, description) VALUES (%s, 'warning', 'NUCLEAR STRIKE', %s)",
             (target_id, personal_news)
         )
+    forget(attacker_id, target_id)
 
     return redirect(f"/country/id={target_id}")
 
@@ -1496,5 +1489,6 @@ def strategic_airstrike():
             "INSERT INTO news (userId, icon, title, description) VALUES (%s, 'warning', 'UNDER ATTACK', %s)",
             (target_id, defender_news)
         )
+    forget(attacker_id, target_id)
 
     return redirect(f"/country/id={target_id}")
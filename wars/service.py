@@ -18,6 +18,111 @@ def target_data(cId):
     return data
 
 
+TARGETS_PER_PAGE = 20
+
+# Sort options of /find_targets -> SQL key (ties broken by user id)
+TARGET_SORTS = {
+    "influence": "ni.influence",
+    "provinces": "ni.province_count",
+    "username": "LOWER(u.username)",
+}
+
+
+def target_window(cId):
+    """Province and influence ranges of the nations ``cId`` may attack.
+
+    Provinces follow declare_war: from one fewer up to three more than
+    ``cId`` has. Low-influence players get a wider influence ceiling so
+    they still see targets.
+    """
+    with get_request_cursor() as db:
+        db.execute("SELECT COUNT(id) FROM provinces WHERE userid=%s", (cId,))
+        prov_row = db.fetchone()
+        provinces = prov_row[0] if prov_row else 0
+    influence = get_influence(cId)
+    return {
+        "min_provinces": max(0, provinces - 1),
+        "max_provinces": provinces + 3,
+        "min_influence": max(0.0, influence * 0.9),
+        "max_influence": max(influence * 2.0, 100.0),
+    }
+
+
+def _like_pattern(search):
+    """``%search%`` for ILIKE ... ESCAPE '\\', matching ``search`` literally."""
+    escaped = search.replace("\\", "\\\\").replace("%", "\\%").replace("_", "\\_")
+    return f"%{escaped}%"
+
+
+def find_targets(cId, search="", sort="influence", sortway="desc", after=None):
+    """One page of war targets for ``cId`` from the nation_influence snapshot.
+
+    ``after`` is the ``next`` cursor of the previous page (``"<key>:<id>"``).
+    Returns ``(targets, next)`` where ``next`` is None on the last page.
+    Nations that joined since the last influence refresh are not listed yet.
+    """
+    if sort not in TARGET_SORTS:
+        sort = "influence"
+    descending = sortway != "asc"
+    key = TARGET_SORTS[sort]
+    window = target_window(cId)
+
+    conditions = [
+        "ni.war_eligible",
+        "ni.province_count BETWEEN %(min_provinces)s AND %(max_provinces)s",
+        "ni.influence BETWEEN %(min_influence)s AND %(max_influence)s",
+        "ni.user_id <> %(user_id)s",
+    ]
+    params = dict(window, user_id=cId, limit=TARGETS_PER_PAGE + 1)
+    if search:
+        conditions.append("u.username ILIKE %(search)s ESCAPE '\\'")
+        params["search"] = _like_pattern(search)
+    if after:
+        after_key, _, after_id = after.rpartition(":")
+        try:
+            params["after_id"] = int(after_id)
+            params["after_key"] = after_key if sort == "username" else int(after_key)
+        except ValueError:
+            pass
+        else:
+            conditions.append(
+                f"({key}, ni.user_id) {'<' if descending else '>'} "
+                "(%(after_key)s, %(after_id)s)"
+            )
+
+    direction = "DESC" if descending else "ASC"
+    with get_request_cursor(read_only=True) as db:
+        db.execute(
+            f"""
+            SELECT ni.user_id, u.username, u.flag, ni.province_count,
+                   ni.influence, {key} AS sort_key
+            FROM nation_influence ni
+            JOIN users u ON u.id = ni.user_id
+            WHERE {" AND ".join(conditions)}
+            ORDER BY sort_key {direction}, ni.user_id {direction}
+            LIMIT %(limit)s
+            """,
+            params,
+        )
+        rows = db.fetchall()
+
+    targets = [
+        {
+            "id": tid,
+            "username": tname,
+            "flag": tflag or "default_flag.jpg",
+            "provinces": tprovinces,
+            "influence": tinfluence,
+        }
+        for tid, tname, tflag, tprovinces, tinfluence, _ in rows[:TARGETS_PER_PAGE]
+    ]
+    next_cursor = None
+    if len(rows) > TARGETS_PER_PAGE:
+        last = rows[TARGETS_PER_PAGE - 1]
+        next_cursor = f"{last[5]}:{last[0]}"
+    return targets, next_cursor
+
+
 def update_supply(war_id):
     MAX_SUPPLY = 2000
     with get_request_cursor() as db: